@@ -3,4 +3,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "accessproj.settings.dev")
+# Under ASGI the verify endpoint is served by the async view (apps.api.v1.views.AsyncAccessVerifyView)
+os.environ.setdefault("ACCESS_VERIFY_ASYNC", "1")
 application = get_asgi_application()
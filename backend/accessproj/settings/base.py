@@ -22,6 +22,9 @@ INSTALLED_APPS = [
     "apps.access",
     "apps.api",
 ]
+# seed_benchmark (can delete users, groups and gates by prefix): dev/test settings only, or opt in explicitly
+if os.environ.get("ACCESS_BENCHMARKS", "0") == "1":
+    INSTALLED_APPS.append("benchmarks")
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
@@ -63,7 +66,8 @@ DATABASES = {
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD", "nfc"),
         "HOST": os.environ.get("DB_HOST", "db"),
         "PORT": int(os.environ.get("DB_PORT", 5432)),
-        "CONN_MAX_AGE": 60,
+        # Set to 0 under ASGI: each request may run on a different thread (see scripts/entrypoint.sh)
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
     }
 }
 
@@ -90,7 +94,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "apps.api.v1.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -102,6 +106,7 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_THROTTLE_RATES": {
         "access_verify": os.environ.get("ACCESS_VERIFY_RATE", "30/second"),
+        "gate_snapshot": os.environ.get("ACCESS_GATE_SNAPSHOT_RATE", "60/minute"),
         "user": "1000/day",
         "anon": "100/day",
     },
@@ -115,6 +120,83 @@ SPECTACULAR_SETTINGS = {
     "SERVE_PERMISSIONS": ["rest_framework.permissions.AllowAny"],
 }
 
+# Access hot path
+# Directory for mmap files shared by all workers on this host (defaults to <tmp>/openway-access)
+ACCESS_SHARED_STATE_DIR = os.environ.get("ACCESS_SHARED_STATE_DIR", "")
+# Answer /access/verify from the worker-local authorization snapshot instead of per-request queries
+ACCESS_AUTHZ_SNAPSHOT = os.environ.get("ACCESS_AUTHZ_SNAPSHOT", "1") == "1"
+# Without the snapshot, decide in one prepared SQL statement instead of the per-table ORM lookups
+ACCESS_AUTHZ_SINGLE_QUERY = os.environ.get("ACCESS_AUTHZ_SINGLE_QUERY", "1") == "1"
+# Authorization caches (snapshot, device registry, token auth) see changes made on other hosts or containers
+# within this many seconds: each worker re-reads a version row at most this often
+ACCESS_AUTHZ_MAX_STALENESS = float(os.environ.get("ACCESS_AUTHZ_MAX_STALENESS", 1))
+# The snapshot is rebuilt after this many seconds even if no change was seen
+ACCESS_AUTHZ_SNAPSHOT_TTL = float(os.environ.get("ACCESS_AUTHZ_SNAPSHOT_TTL", 300))
+# AccessEvent writer: rows are queued per worker and inserted in batches by a background thread
+ACCESS_EVENT_SINK = {
+    "BACKEND": "apps.access.events.BufferedEventSink",
+    "OPTIONS": {
+        "batch_size": int(os.environ.get("ACCESS_EVENT_BATCH_SIZE", 500)),
+        "flush_interval": float(os.environ.get("ACCESS_EVENT_FLUSH_INTERVAL", 0.5)),
+        # Throttled verifies are summarized into one RATE_LIMIT row per gate/IP per window (seconds)
+        "rate_limit_window": float(os.environ.get("ACCESS_RATE_LIMIT_EVENT_WINDOW", 10)),
+        # While the database is down: rows past this many per worker are kept only in the spill file...
+        "max_queue": int(os.environ.get("ACCESS_EVENT_QUEUE_MAX", 100_000)),
+        # ...and past this many bytes of spill files per worker, dropped (access_events_shed_total counts both)
+        "max_spill_bytes": int(os.environ.get("ACCESS_EVENT_SPILL_MAX_BYTES", 256 * 2**20)),
+    },
+}
+# GCRA state for the access_verify throttle: shared mmap table (single host) or Redis (multi-host)
+ACCESS_RATE_LIMIT = {"BACKEND": "apps.access.ratelimit.SharedMemoryBackend"}
+if os.environ.get("ACCESS_RATE_LIMIT_REDIS_URL"):
+    ACCESS_RATE_LIMIT = {
+        "BACKEND": "apps.access.ratelimit.RedisBackend",
+        "OPTIONS": {"url": os.environ["ACCESS_RATE_LIMIT_REDIS_URL"]},
+    }
+# PostgreSQL range partitioning of AccessEvent by created_at: "month" or "day"
+ACCESS_EVENT_PARTITION_INTERVAL = os.environ.get("ACCESS_EVENT_PARTITION_INTERVAL", "month")
+# Readers authenticate snapshot and heartbeat calls with "Authorization: Gate <key>" (manage.py gate_key <code>);
+# keys are HMACs of the gate code under this secret, derived from SECRET_KEY when empty
+ACCESS_GATE_KEY_SECRET = os.environ.get("ACCESS_GATE_KEY_SECRET", "")
+# Signed gate credentials (qr_payload): HMAC keys by version (0-127), "1:secret,2:secret";
+# defaults to one derived from SECRET_KEY
+ACCESS_CREDENTIAL_KEYS = dict(
+    item.split(":", 1) for item in os.environ.get("ACCESS_CREDENTIAL_KEYS", "").split(",") if item
+)
+ACCESS_CREDENTIAL_KEY_ID = int(os.environ.get("ACCESS_CREDENTIAL_KEY_ID", 0))  # 0 = newest key
+ACCESS_CREDENTIAL_TTL = int(os.environ.get("ACCESS_CREDENTIAL_TTL", 86400))
+# Serve /api/v1/access/verify from the async view (accessproj.asgi turns this on)
+ACCESS_VERIFY_ASYNC = os.environ.get("ACCESS_VERIFY_ASYNC", "0") == "1"
+# Per-request query count, DB time and hot-path timers in the access log and a Server-Timing header
+ACCESS_REQUEST_METRICS = os.environ.get("ACCESS_REQUEST_METRICS", "0") == "1"
+# Prometheus /metrics: verify latency, throttling, event queue, SQL and snapshot counters summed over all workers
+ACCESS_METRICS = os.environ.get("ACCESS_METRICS", "0") == "1"
+# Client addresses/networks (REMOTE_ADDR, comma-separated) allowed to scrape /metrics; labels include gate codes
+ACCESS_METRICS_ALLOWED_IPS = [
+    net for net in os.environ.get("ACCESS_METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if net
+]
+# Maximum number of {gate_id, token} items accepted by /api/v1/access/verify/batch
+ACCESS_VERIFY_BATCH_MAX = int(os.environ.get("ACCESS_VERIFY_BATCH_MAX", 64))
+# Events per transaction in POST /api/v1/access/events/bulk (the body is streamed, this bounds memory)
+ACCESS_EVENT_BULK_CHUNK = int(os.environ.get("ACCESS_EVENT_BULK_CHUNK", 1000))
+# Where queued-but-unwritten events are spilled for crash recovery (defaults to <shared dir>/event-spill)
+ACCESS_EVENT_SPILL_DIR = os.environ.get("ACCESS_EVENT_SPILL_DIR", "")
+# GET /api/v1/access/events/stream: recorded decisions are kept in a per-worker ring of this many events
+# (and at most this many wait to be relayed to other workers; older ones are dropped and counted)
+ACCESS_EVENT_STREAM = os.environ.get("ACCESS_EVENT_STREAM", "1") == "1"
+ACCESS_EVENT_STREAM_BUFFER = int(os.environ.get("ACCESS_EVENT_STREAM_BUFFER", 1000))
+# Relay decisions between workers with PostgreSQL LISTEN/NOTIFY (one extra connection per worker)
+ACCESS_EVENT_STREAM_FANOUT = os.environ.get("ACCESS_EVENT_STREAM_FANOUT", "1") == "1"
+# Under WSGI a stream holds a sync worker: end it after this many seconds (below the gunicorn timeout)
+ACCESS_EVENT_STREAM_WSGI_SECONDS = float(os.environ.get("ACCESS_EVENT_STREAM_WSGI_SECONDS", 55))
+# Gate heartbeats live in a host-wide mmap table; changed gates are upserted into GateStatus at most this often
+ACCESS_GATE_HEARTBEAT_FLUSH_INTERVAL = float(os.environ.get("ACCESS_GATE_HEARTBEAT_FLUSH_INTERVAL", 30))
+# GET /api/v1/gates/offline default: gates without a heartbeat for this many seconds
+ACCESS_GATE_OFFLINE_AFTER = float(os.environ.get("ACCESS_GATE_OFFLINE_AFTER", 90))
+# CachedTokenAuthentication: per-worker LRU of token -> user, entries live this many seconds (0 disables)
+ACCESS_TOKEN_AUTH_CACHE_TTL = float(os.environ.get("ACCESS_TOKEN_AUTH_CACHE_TTL", 300))
+ACCESS_TOKEN_AUTH_CACHE_SIZE = int(os.environ.get("ACCESS_TOKEN_AUTH_CACHE_SIZE", 10000))
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = os.environ.get(
     "CORS_ALLOWED_ORIGINS",
@@ -13,6 +13,9 @@ DATABASES = {
 
 ALLOWED_HOSTS = ["*"]        # чтобы можно было ходить по IP с телефона/ESP32
 
+if "benchmarks" not in INSTALLED_APPS:
+    INSTALLED_APPS = [*INSTALLED_APPS, "benchmarks"]  # seed_benchmark для нагрузочных тестов
+
 # (необязательно, но удобно видеть логи в консоли)
 LOGGING = {
     "version": 1,
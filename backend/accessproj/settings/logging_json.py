@@ -1,42 +1,185 @@
-"""JSON-structured logging configuration for production."""
-import logging
+"""JSON-structured logging configuration for production.
+
+Records are queued by :class:`QueueingStreamHandler` and formatted and written
+by a listener thread, so a slow log consumer never stalls a request.
+"""
+import atexit
 import json
-from datetime import datetime, timezone
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+
+# Added by AccessLogMiddleware when ACCESS_REQUEST_METRICS is on (see core.timing);
+# decision/reason are set on every verify line
+METRIC_FIELDS = (
+    "db_queries", "db_ms", "throttle_ms", "serialize_ms", "authz_ms", "view_ms", "decision", "reason",
+)
+# Emitted in this order after ts/level/logger/message, when present on the record
+RECORD_FIELDS = ("request_id", "method", "path", "status", "duration_ms", "user_id", *METRIC_FIELDS, "sample_rate")
+
+
+class _TimestampCache:
+    """ISO 8601 UTC timestamps for ``record.created``; the date/time part is formatted once per second."""
+
+    def __init__(self):
+        self._second = None
+        self._prefix = ""
+
+    def __call__(self, created: float) -> str:
+        # Same value and rounding as datetime.fromtimestamp(created, timezone.utc).isoformat()
+        second = int(created)
+        micros = round((created - second) * 1e6)
+        if micros >= 1_000_000:
+            second, micros = second + 1, micros - 1_000_000
+        if second != self._second:
+            self._prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+            self._second = second
+        if micros:
+            return f"{self._prefix}.{micros:06d}+00:00"
+        return f"{self._prefix}+00:00"
 
 
 class JSONFormatter(logging.Formatter):
     """Custom JSON formatter for structured logging."""
-    
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._timestamp = _TimestampCache()
+
     def format(self, record):
         """Format log record as JSON."""
+        # record.created, not "now": with queued handlers the record is formatted later, on another thread
         log_data = {
-            "ts": datetime.now(timezone.utc).isoformat(),
+            "ts": self._timestamp(record.created),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
         }
-        
-        # Add request context if available
-        if hasattr(record, "request_id"):
-            log_data["request_id"] = record.request_id
-        if hasattr(record, "method"):
-            log_data["method"] = record.method
-        if hasattr(record, "path"):
-            log_data["path"] = record.path
-        if hasattr(record, "status"):
-            log_data["status"] = record.status
-        if hasattr(record, "duration_ms"):
-            log_data["duration_ms"] = record.duration_ms
-        if hasattr(record, "user_id"):
-            log_data["user_id"] = record.user_id
-            
-        # Add exception info if present
-        if record.exc_info:
-            log_data["exception"] = self.formatException(record.exc_info)
-            
+
+        # Add request context and metrics if available; one dict lookup per field instead of hasattr/getattr
+        attrs = record.__dict__
+        log_data.update((name, attrs[name]) for name in RECORD_FIELDS if name in attrs)
+
+        # Add exception info if present (QueueingStreamHandler renders it before queueing)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            log_data["exception"] = record.exc_text
+
         return json.dumps(log_data)
 
 
+class QueueingStreamHandler(logging.handlers.QueueHandler):
+    """``StreamHandler`` whose formatting and writing happen on a listener thread.
+
+    The calling thread only copies the record and puts it on a bounded queue.
+    When the queue is full (the consumer of the stream has stalled) records are
+    dropped rather than blocking the request; the writer reports how many.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.SimpleQueue())  # C implementation; the bound is checked in enqueue()
+        self.maxsize = maxsize
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def setFormatter(self, fmt):  # noqa: N802 - logging API name
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Interpolate the message and render the traceback now: arguments and frames
+        # may change or go away once the caller returns. Formatting is left to the listener.
+        copied = logging.LogRecord.__new__(logging.LogRecord)
+        copied.__dict__.update(record.__dict__)  # what copy.copy does, minus its dispatch overhead
+        record = copied
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = (self.formatter or logging.Formatter()).formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+        else:
+            self.queue.put_nowait(record)
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        super().emit(record)
+
+    def _start(self):
+        # Once per process: a gunicorn worker forked after logging was configured needs its own thread
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._listener = _Listener(self)
+            self._listener.start()
+            self._pid = os.getpid()
+            atexit.register(self.flush_and_stop)
+
+    def flush_and_stop(self):
+        """Write out everything queued so far and stop the listener thread."""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+    def close(self):
+        self.flush_and_stop()
+        self.target.close()
+        super().close()
+
+
+class _Listener(logging.handlers.QueueListener):
+    def __init__(self, handler: QueueingStreamHandler):
+        super().__init__(handler.queue, handler.target)
+        self._handler = handler
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # may wait for the writer to make room; only happens at exit
+
+    def handle(self, record):
+        super().handle(record)
+        dropped, self._handler.dropped = self._handler.dropped, 0
+        if dropped:
+            notice = logging.makeLogRecord({
+                "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": f"Log queue full; dropped {dropped} records",
+            })
+            self._handler.target.handle(notice)
+
+
+class AllowSampler(logging.Filter):
+    """Keep a ``rate`` fraction of ALLOW access-log lines; DENY and everything else always pass.
+
+    Kept ALLOW lines carry ``sample_rate`` so log-based counts can be scaled back up.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if self.rate >= 1.0 or getattr(record, "decision", None) != "ALLOW":
+            return True
+        if random.random() >= self.rate:  # noqa: S311 - sampling, not security
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -49,10 +192,18 @@ LOGGING = {
             "style": "{",
         },
     },
+    "filters": {
+        "sample_allow": {
+            "()": "accessproj.settings.logging_json.AllowSampler",
+            # Fraction of ALLOW verify lines written to the access log (1 = all)
+            "rate": float(os.environ.get("ACCESS_LOG_ALLOW_SAMPLE_RATE", 1)),
+        },
+    },
     "handlers": {
         "console": {
-            "class": "logging.StreamHandler",
+            "()": "accessproj.settings.logging_json.QueueingStreamHandler",
             "formatter": "json",
+            "maxsize": int(os.environ.get("LOG_QUEUE_SIZE", 10000)),
         },
     },
     "root": {
@@ -69,6 +220,7 @@ LOGGING = {
             "handlers": ["console"],
             "level": "INFO",
             "propagate": False,
+            "filters": ["sample_allow"],
         },
         "apps": {
             "handlers": ["console"],
@@ -77,4 +229,3 @@ LOGGING = {
         },
     },
 }
-
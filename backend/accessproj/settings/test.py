@@ -3,6 +3,9 @@ from .base import *
 DEBUG = True
 ALLOWED_HOSTS = ['*']
 
+if "benchmarks" not in INSTALLED_APPS:
+    INSTALLED_APPS = [*INSTALLED_APPS, "benchmarks"]  # seed_benchmark is exercised by the benchmark tests
+
 # Use SQLite for faster, isolated tests
 DATABASES = {
     "default": {
@@ -19,6 +22,22 @@ CACHES = {
     }
 }
 
+# Write audit rows synchronously so tests can assert on them right after a request
+ACCESS_EVENT_SINK = {"BACKEND": "apps.access.events.ImmediateEventSink"}
+
+# No LISTEN/NOTIFY relay thread holding a connection open while test databases are torn down
+ACCESS_EVENT_STREAM_FANOUT = False
+
+# Tests flush gate heartbeats explicitly instead of from a background thread
+ACCESS_GATE_HEARTBEAT_FLUSH_INTERVAL = 0
+
+# Tests run in one process, where the host-local counter already invalidates caches: keep the periodic
+# version-row read out of assertNumQueries blocks (tests of it override this)
+ACCESS_AUTHZ_MAX_STALENESS = 3600
+
+# Process-local rate limiter state instead of the host-wide mmap table
+ACCESS_RATE_LIMIT = {"BACKEND": "apps.access.ratelimit.InMemoryBackend"}
+
 # Speed up password hashing in tests
 PASSWORD_HASHERS = [
     "django.contrib.auth.hashers.MD5PasswordHasher",
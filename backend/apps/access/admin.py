@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import AccessEvent, AccessPermission, AccessPoint
+from .models import AccessEvent, AccessPermission, AccessPoint, EffectivePermission, GateStatus
 
 
 @admin.register(AccessPoint)
@@ -14,9 +14,29 @@ class AccessPermissionAdmin(admin.ModelAdmin):
     list_filter = ("allow","access_point")
     search_fields = ("user__username","group__name","access_point__code")
 
+@admin.register(EffectivePermission)
+class EffectivePermissionAdmin(admin.ModelAdmin):
+    list_display = ("access_point","user","allow")
+    list_filter = ("allow","access_point")
+    search_fields = ("user__username","access_point__code")
+    readonly_fields = ("access_point","user","allow")
+
+    # Derived from AccessPermission by apps.access.effective; edit permissions instead
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(AccessEvent)
 class AccessEventAdmin(admin.ModelAdmin):
     list_display = ("created_at","access_point","user","device_id","decision","reason")
     list_filter = ("decision","reason","access_point")
     search_fields = ("user__username","access_point__code","reason")
     readonly_fields = ("created_at","raw")
+
+@admin.register(GateStatus)
+class GateStatusAdmin(admin.ModelAdmin):
+    list_display = ("access_point","last_seen","firmware","rssi")
+    search_fields = ("access_point__code","firmware")
+    readonly_fields = ("access_point","last_seen","firmware","rssi")
@@ -1 +1,11 @@
-# TODO
+from django.apps import AppConfig
+
+
+class AccessConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "apps.access"
+
+    def ready(self):
+        from . import credentials, signals  # noqa
+
+        credentials.check_settings()
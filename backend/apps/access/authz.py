@@ -0,0 +1,409 @@
+"""Authorization decisions for the verify endpoint.
+
+The hot path answers from a worker-local :class:`AuthzSnapshot` that maps
+gate codes, token keys and (gate, user) grants to plain Python containers.
+Every change to the underlying tables bumps a version (see
+``apps.access.signals`` and ``apps.access.versions``); a worker rebuilds its
+snapshot the first time it sees a newer one: at once for changes made on this
+host, within ``ACCESS_AUTHZ_MAX_STALENESS`` seconds for changes made anywhere
+else. Steady-state verifies make one small DB read per worker per that
+interval. A snapshot older than ``ACCESS_AUTHZ_SNAPSHOT_TTL`` seconds is
+rebuilt regardless.
+
+Device tokens and signed gate credentials (``apps.access.credentials``) are
+resolved through the device registry (``apps.access.devices``), which keeps
+itself current separately so that token rotation does not rebuild the snapshot.
+
+With the snapshot disabled, a verify is one SQL statement (``apps.access.decision_sql``).
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from rest_framework.authtoken.models import Token
+
+from apps.api.v1.constants import (
+    REASON_DEVICE_INACTIVE,
+    REASON_DEVICE_MISMATCH,
+    REASON_DEVICE_NOT_FOUND,
+    REASON_NO_PERMISSION,
+    REASON_OK,
+    REASON_TOKEN_INVALID,
+    REASON_UNKNOWN_GATE,
+)
+from apps.devices.models import Device
+from core import metrics
+
+from . import credentials, decision_sql
+from . import devices as device_registry
+from .models import AccessPoint, EffectivePermission
+from .versions import SharedVersion
+
+User = get_user_model()
+
+authz_version = SharedVersion("authz-version")
+
+
+class Decision(NamedTuple):
+    decision: str
+    reason: str
+    access_point_id: int | None = None
+    user_id: int | None = None
+    device_id: int | None = None
+
+    @property
+    def allowed(self) -> bool:
+        return self.decision == "ALLOW"
+
+
+@dataclass(frozen=True)
+class AuthzSnapshot:
+    version: tuple[int, int] | None  # authz_version.value() when the build started
+    gates: dict[str, int]  # gate code -> AccessPoint.id
+    tokens: dict[str, tuple[int, bool]]  # Token.key -> (user id, user.is_active)
+    grants: frozenset[tuple[int, int]]  # (AccessPoint.id, user id) with an effective allow
+    inactive_users: frozenset[int] = frozenset()
+    built_at: float = field(default_factory=time.monotonic)
+
+    def decide(self, gate_code: str, token: str, devices: device_registry.DeviceIndex | None = None) -> Decision:
+        ap_id = self.gates.get(gate_code)
+        if ap_id is None:
+            return Decision("DENY", REASON_UNKNOWN_GATE)
+        if devices is None:
+            devices = device_registry.get_index()
+        if credentials.looks_like_credential(token):
+            return self._decide_credential(ap_id, token, devices)
+        owner = self.tokens.get(token)
+        if owner is None:
+            device = devices.by_token(token)
+            if device is None:
+                return Decision("DENY", REASON_TOKEN_INVALID, ap_id)
+            return self._decide_device(ap_id, device.user_id, device.id, device)
+        user_id, is_active = owner
+        if not is_active:
+            return Decision("DENY", REASON_TOKEN_INVALID, ap_id, user_id)
+        if (ap_id, user_id) not in self.grants:
+            return Decision("DENY", REASON_NO_PERMISSION, ap_id, user_id)
+        return Decision("ALLOW", REASON_OK, ap_id, user_id)
+
+    def _decide_credential(self, ap_id: int, token: str, devices: device_registry.DeviceIndex) -> Decision:
+        try:
+            cred = credentials.parse(token)
+        except credentials.InvalidCredentialError:
+            return Decision("DENY", REASON_TOKEN_INVALID, ap_id)
+        return self._decide_device(ap_id, cred.user_id, cred.device_id, devices.get(cred.device_id))
+
+    def _decide_device(self, ap_id: int, user_id: int, device_id: int, device) -> Decision:
+        """Shared by device tokens and credentials; ``device`` is the registry entry for ``device_id``, if any."""
+        # Revocation: a deleted device leaves the registry, a deactivated one stays with is_active=False
+        reason = device_reason(device, user_id)
+        if reason is None and user_id in self.inactive_users:
+            reason = REASON_TOKEN_INVALID
+        if reason is None and (ap_id, user_id) not in self.grants:
+            reason = REASON_NO_PERMISSION
+        if reason is not None:
+            return Decision("DENY", reason, ap_id, user_id, device_id)
+        return Decision("ALLOW", REASON_OK, ap_id, user_id, device_id)
+
+
+def device_reason(device, user_id: int) -> str | None:
+    """DENY reason for a device (registry entry or model) presented on behalf of ``user_id``, or ``None``."""
+    if device is None:
+        return REASON_DEVICE_NOT_FOUND
+    if not device.is_active:
+        return REASON_DEVICE_INACTIVE
+    if device.user_id != user_id:
+        return REASON_DEVICE_MISMATCH  # credential signed for the previous owner of a reassigned device
+    return None
+
+
+def build_snapshot(version: tuple[int, int] | None) -> AuthzSnapshot:
+    """Load everything the verify decision needs in a handful of flat queries."""
+    gates = dict(AccessPoint.objects.values_list("code", "id"))
+    tokens = {
+        key: (user_id, is_active)
+        for key, user_id, is_active in Token.objects.values_list("key", "user_id", "user__is_active")
+    }
+    grants = EffectivePermission.objects.filter(allow=True).values_list("access_point_id", "user_id")
+    return AuthzSnapshot(
+        version=version,
+        gates=gates,
+        tokens=tokens,
+        grants=frozenset(grants),
+        inactive_users=frozenset(User.objects.filter(is_active=False).values_list("id", flat=True)),
+    )
+
+
+_snapshot: AuthzSnapshot | None = None
+_snapshot_lock = threading.Lock()
+
+
+def _is_current(snap: AuthzSnapshot | None, version: tuple[int, int] | None) -> bool:
+    return (
+        snap is not None
+        and version is not None
+        and snap.version == version
+        and time.monotonic() - snap.built_at < getattr(settings, "ACCESS_AUTHZ_SNAPSHOT_TTL", 300.0)
+    )
+
+
+def get_snapshot() -> AuthzSnapshot:
+    """Return the current snapshot, rebuilding it if another process bumped the version or it expired."""
+    global _snapshot
+    version = authz_version.value()
+    snap = _snapshot
+    if _is_current(snap, version):
+        metrics.AUTHZ_SNAPSHOT_LOOKUPS.labels("hit").inc()
+        return snap
+    with _snapshot_lock:
+        snap = _snapshot
+        if not _is_current(snap, version):
+            # Tag with the version read *before* loading: a bump that races the
+            # build makes the next request rebuild instead of serving stale data.
+            snap = _snapshot = build_snapshot(version)
+            metrics.AUTHZ_SNAPSHOT_LOOKUPS.labels("miss").inc()
+        else:
+            metrics.AUTHZ_SNAPSHOT_LOOKUPS.labels("hit").inc()
+    return snap
+
+
+def current_snapshot() -> AuthzSnapshot | None:
+    """This worker's last built snapshot, without checking or rebuilding."""
+    return _snapshot
+
+
+_gates_only: AuthzSnapshot | None = None  # with the snapshot off: just the gates, for the throttle
+
+
+def _gates_snapshot() -> AuthzSnapshot | None:
+    return _snapshot if getattr(settings, "ACCESS_AUTHZ_SNAPSHOT", True) else _gates_only
+
+
+def gate_codes() -> dict[str, int]:
+    """Gate code -> AccessPoint id from a current snapshot, loading it if needed."""
+    global _gates_only
+    if getattr(settings, "ACCESS_AUTHZ_SNAPSHOT", True):
+        return get_snapshot().gates
+    version = authz_version.value()
+    snap = _gates_only
+    if not _is_current(snap, version):
+        gates = dict(AccessPoint.objects.values_list("code", "id"))
+        snap = _gates_only = AuthzSnapshot(version=version, gates=gates, tokens={}, grants=frozenset())
+    return snap.gates
+
+
+def is_known_gate(code) -> bool:
+    """Whether ``code`` names a gate, normally without a query.
+
+    A code found in this worker's snapshot counts even if the snapshot is
+    stale; a miss is checked against a current one (which verify loads next
+    anyway). With ``ACCESS_AUTHZ_SNAPSHOT`` off, a gates-only snapshot is kept
+    the same way.
+    """
+    if not isinstance(code, str):
+        return False
+    snap = _gates_snapshot()
+    if snap is not None and (code in snap.gates or _is_current(snap, authz_version.value())):
+        return code in snap.gates
+    return code in gate_codes()
+
+
+async def ais_known_gate(code) -> bool:
+    if not isinstance(code, str):
+        return False
+    snap = _gates_snapshot()
+    if snap is not None and (code in snap.gates or _is_current(snap, authz_version.peek())):
+        return code in snap.gates
+    return await sync_to_async(is_known_gate)(code)
+
+
+def invalidate() -> None:
+    """Mark every worker's snapshot stale, now and again once the transaction commits.
+
+    The immediate bump drops the snapshots on this host; the on-commit bump
+    also reaches other hosts and covers a worker that rebuilt between the
+    write and the commit and so could not yet see the new rows.
+    """
+    authz_version.local.incr()
+    transaction.on_commit(authz_version.incr)
+
+
+def _permissions(ap, user):
+    return EffectivePermission.objects.filter(access_point=ap, user=user, allow=True)
+
+
+def _has_permission(ap, user) -> bool:
+    return _permissions(ap, user).exists()
+
+
+def _credential_from_db(ap, token: str) -> Decision:
+    try:
+        cred = credentials.parse(token)
+    except credentials.InvalidCredentialError:
+        return Decision("DENY", REASON_TOKEN_INVALID, ap.id)
+    device = Device.objects.select_related("user").filter(pk=cred.device_id).first()
+    return _device_from_db(ap, cred.user_id, cred.device_id, device)
+
+
+def _device_from_db(ap, user_id: int, device_id: int, device) -> Decision:
+    reason = device_reason(device, user_id)
+    if reason is None and not device.user.is_active:
+        reason = REASON_TOKEN_INVALID
+    if reason is None and not _has_permission(ap, device.user):
+        reason = REASON_NO_PERMISSION
+    if reason is not None:
+        return Decision("DENY", reason, ap.id, user_id, device_id)
+    return Decision("ALLOW", REASON_OK, ap.id, user_id, device_id)
+
+
+def decide_from_db(gate_code: str, token: str) -> Decision:
+    """Reference ORM implementation; ``decision_sql`` does the same in one query."""
+    ap = AccessPoint.objects.filter(code=gate_code).first()
+    if ap is None:
+        return Decision("DENY", REASON_UNKNOWN_GATE)
+    if credentials.looks_like_credential(token):
+        return _credential_from_db(ap, token)
+    token_obj = Token.objects.select_related("user").filter(key=token).first()
+    if token_obj is None:
+        device = Device.objects.select_related("user").filter(auth_token=token).first()
+        if device is None:
+            return Decision("DENY", REASON_TOKEN_INVALID, ap.id)
+        return _device_from_db(ap, device.user_id, device.id, device)
+    user = token_obj.user
+    if not user.is_active:
+        return Decision("DENY", REASON_TOKEN_INVALID, ap.id, user.id)
+    if not _has_permission(ap, user):
+        return Decision("DENY", REASON_NO_PERMISSION, ap.id, user.id)
+    return Decision("ALLOW", REASON_OK, ap.id, user.id)
+
+
+def decide(gate_code: str, token: str) -> Decision:
+    if getattr(settings, "ACCESS_AUTHZ_SNAPSHOT", True):
+        return get_snapshot().decide(gate_code, token)
+    if getattr(settings, "ACCESS_AUTHZ_SINGLE_QUERY", True):
+        return decision_sql.decide(gate_code, token)
+    return decide_from_db(gate_code, token)
+
+
+async def _acredential_from_db(ap, token: str) -> Decision:
+    try:
+        cred = credentials.parse(token)
+    except credentials.InvalidCredentialError:
+        return Decision("DENY", REASON_TOKEN_INVALID, ap.id)
+    device = await Device.objects.select_related("user").filter(pk=cred.device_id).afirst()
+    return await _adevice_from_db(ap, cred.user_id, cred.device_id, device)
+
+
+async def _adevice_from_db(ap, user_id: int, device_id: int, device) -> Decision:
+    reason = device_reason(device, user_id)
+    if reason is None and not device.user.is_active:
+        reason = REASON_TOKEN_INVALID
+    if reason is None and not await _permissions(ap, device.user).aexists():
+        reason = REASON_NO_PERMISSION
+    if reason is not None:
+        return Decision("DENY", reason, ap.id, user_id, device_id)
+    return Decision("ALLOW", REASON_OK, ap.id, user_id, device_id)
+
+
+async def adecide_from_db(gate_code: str, token: str) -> Decision:
+    """:func:`decide_from_db` on the async ORM; same branches in the same order."""
+    try:
+        ap = await AccessPoint.objects.aget(code=gate_code)
+    except AccessPoint.DoesNotExist:
+        return Decision("DENY", REASON_UNKNOWN_GATE)
+    if credentials.looks_like_credential(token):
+        return await _acredential_from_db(ap, token)
+    try:
+        token_obj = await Token.objects.select_related("user").aget(key=token)
+    except Token.DoesNotExist:
+        device = await Device.objects.select_related("user").filter(auth_token=token).afirst()
+        if device is None:
+            return Decision("DENY", REASON_TOKEN_INVALID, ap.id)
+        return await _adevice_from_db(ap, device.user_id, device.id, device)
+    user = token_obj.user
+    if not user.is_active:
+        return Decision("DENY", REASON_TOKEN_INVALID, ap.id, user.id)
+    if not await _permissions(ap, user).aexists():
+        return Decision("DENY", REASON_NO_PERMISSION, ap.id, user.id)
+    return Decision("ALLOW", REASON_OK, ap.id, user.id)
+
+
+async def adecide(gate_code: str, token: str) -> Decision:
+    if getattr(settings, "ACCESS_AUTHZ_SNAPSHOT", True):
+        snap = _snapshot
+        if not _is_current(snap, authz_version.peek()):
+            # Re-reading the version or rebuilding reads the DB; keep it off the event loop
+            snap = await sync_to_async(get_snapshot)()
+        else:
+            metrics.AUTHZ_SNAPSHOT_LOOKUPS.labels("hit").inc()
+        registry = device_registry.registry
+        devices = registry.get_index() if registry.is_current() else await sync_to_async(registry.get_index)()
+        return snap.decide(gate_code, token, devices)
+    if getattr(settings, "ACCESS_AUTHZ_SINGLE_QUERY", True):
+        return await decision_sql.adecide(gate_code, token)
+    return await adecide_from_db(gate_code, token)
+
+
+def decide_many_from_db(pairs: list[tuple[str, str]]) -> list[Decision]:
+    """ORM path for a batch of (gate code, token) pairs in a fixed number of queries.
+
+    Loads only the rows the batch refers to into a partial :class:`AuthzSnapshot`
+    and lets it decide, so single and batch verifies share one set of rules.
+    """
+    gates = dict(AccessPoint.objects.filter(code__in={gate for gate, _ in pairs}).values_list("code", "id"))
+    keys, device_ids = set(), set()
+    for gate, token in pairs:
+        if gate not in gates:
+            continue
+        if credentials.looks_like_credential(token):
+            try:
+                device_ids.add(credentials.parse(token).device_id)
+            except credentials.InvalidCredentialError:
+                pass
+        else:
+            keys.add(token)
+
+    tokens, user_ids, inactive_users, devices = {}, set(), set(), device_registry.DeviceIndex()
+    if keys:
+        for key, user_id, is_active in Token.objects.filter(key__in=keys).values_list(
+            "key", "user_id", "user__is_active"
+        ):
+            tokens[key] = (user_id, is_active)
+            user_ids.add(user_id)
+    device_tokens = keys - tokens.keys()  # not session tokens: maybe device tokens
+    if device_ids or device_tokens:
+        for device_id, user_id, is_active, auth_token, user_active in Device.objects.filter(
+            Q(pk__in=device_ids) | Q(auth_token__in=device_tokens)
+        ).values_list("id", "user_id", "is_active", "auth_token", "user__is_active"):
+            devices.put(device_id, user_id, is_active, auth_token)
+            user_ids.add(user_id)
+            if not user_active:
+                inactive_users.add(user_id)
+
+    grants = set()
+    if user_ids:
+        grants.update(EffectivePermission.objects.filter(
+            allow=True, user_id__in=user_ids, access_point_id__in=set(gates.values()),
+        ).values_list("access_point_id", "user_id"))
+
+    snap = AuthzSnapshot(
+        version=None,
+        gates=gates,
+        tokens=tokens,
+        grants=frozenset(grants),
+        inactive_users=frozenset(inactive_users),
+    )
+    return [snap.decide(gate, token, devices) for gate, token in pairs]
+
+
+def decide_many(pairs: list[tuple[str, str]]) -> list[Decision]:
+    if getattr(settings, "ACCESS_AUTHZ_SNAPSHOT", True):
+        snap, devices = get_snapshot(), device_registry.get_index()
+        return [snap.decide(gate, token, devices) for gate, token in pairs]
+    return decide_many_from_db(pairs)
@@ -0,0 +1,170 @@
+"""Stateless signed gate credentials.
+
+``DeviceRegisterView`` hands one out as ``qr_payload``. The verify endpoint
+checks it with one HMAC computation instead of an ``authtoken_token``
+lookup; only revocation (inactive devices/users) and permissions are read,
+from the in-process authorization snapshot.
+
+Wire format: ``ow1.`` + base64url(payload + mac), where the payload is::
+
+    flags/kid  1 byte   key version in the low 7 bits, 0x80 = group list truncated
+    user_id    varint
+    device_id  varint
+    expires    4 bytes  unix seconds, big endian
+    n_groups   varint, followed by that many group ids as varints
+
+and ``mac`` is the first 12 bytes of HMAC-SHA256(key[kid], "ow1" + payload).
+The whole string stays within the 128 characters the verify serializer
+accepts; group ids that do not fit are dropped and the truncation flag set.
+Group ids are informational for offline readers: the backend evaluates
+permissions against current group membership.
+"""
+import base64
+import hashlib
+import hmac
+import struct
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+PREFIX = "ow1."
+MAC_SIZE = 12
+MAX_LENGTH = 128
+_TRUNCATED = 0x80
+MAX_KEY_ID = 0x7F  # the key id shares the first byte with the truncation flag
+_EXPIRES = struct.Struct(">I")
+
+
+class InvalidCredentialError(Exception):
+    pass
+
+
+class Credential(NamedTuple):
+    key_id: int
+    user_id: int
+    device_id: int
+    expires: int
+    group_ids: tuple[int, ...]
+    groups_truncated: bool = False
+
+
+def _key_id(value, setting: str) -> int:
+    try:
+        kid = int(value)
+    except (TypeError, ValueError):
+        kid = -1
+    if not 0 <= kid <= MAX_KEY_ID:
+        raise ImproperlyConfigured(f"{setting}: key id {value!r} is not an integer from 0 to {MAX_KEY_ID}")
+    return kid
+
+
+def _keys() -> dict[int, bytes]:
+    configured = getattr(settings, "ACCESS_CREDENTIAL_KEYS", None)
+    if configured:
+        return {
+            _key_id(kid, "ACCESS_CREDENTIAL_KEYS"): secret.encode() if isinstance(secret, str) else secret
+            for kid, secret in configured.items()
+        }
+    # Derived from SECRET_KEY so a default install works; set dedicated keys to rotate independently
+    return {1: hashlib.sha256(b"openway-gate-credential:" + settings.SECRET_KEY.encode()).digest()}
+
+
+def _current_key_id() -> int:
+    return int(getattr(settings, "ACCESS_CREDENTIAL_KEY_ID", 0) or max(_keys()))
+
+
+def check_settings() -> None:
+    """Raise ``ImproperlyConfigured`` for key ids that do not fit the format (run at startup)."""
+    keys = _keys()
+    configured = getattr(settings, "ACCESS_CREDENTIAL_KEY_ID", 0)
+    if configured and _key_id(configured, "ACCESS_CREDENTIAL_KEY_ID") not in keys:
+        raise ImproperlyConfigured(f"ACCESS_CREDENTIAL_KEY_ID: no key with id {configured} in ACCESS_CREDENTIAL_KEYS")
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        if pos >= len(data) or shift > 63:
+            raise InvalidCredentialError("truncated varint")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _mac(key: bytes, payload: bytes) -> bytes:
+    return hmac.new(key, b"ow1" + payload, hashlib.sha256).digest()[:MAC_SIZE]
+
+
+def _encode(payload: bytes) -> str:
+    return PREFIX + base64.urlsafe_b64encode(payload).rstrip(b"=").decode()
+
+
+def issue(user_id: int, device_id: int, group_ids=(), ttl: int | None = None, now: float | None = None) -> str:
+    kid = _current_key_id()
+    key = _keys()[kid]
+    ttl = ttl if ttl is not None else getattr(settings, "ACCESS_CREDENTIAL_TTL", 86400)
+    expires = int((now if now is not None else time.time()) + ttl)
+    group_ids = tuple(group_ids)
+    groups = sorted(group_ids)
+    while True:
+        head = bytes([kid | (_TRUNCATED if len(groups) < len(group_ids) else 0)])
+        payload = (
+            head + _varint(user_id) + _varint(device_id) + _EXPIRES.pack(expires)
+            + _varint(len(groups)) + b"".join(_varint(g) for g in groups)
+        )
+        token = _encode(payload + _mac(key, payload))
+        if len(token) <= MAX_LENGTH or not groups:
+            return token
+        groups.pop()
+
+
+def looks_like_credential(token: str) -> bool:
+    return token.startswith(PREFIX)
+
+
+def parse(token: str, now: float | None = None) -> Credential:
+    """Verify signature and expiry. Raises :class:`InvalidCredentialError`."""
+    if not looks_like_credential(token) or len(token) > MAX_LENGTH:
+        raise InvalidCredentialError("not a gate credential")
+    body = token[len(PREFIX):]
+    try:
+        raw = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+    except ValueError:
+        raise InvalidCredentialError("bad encoding") from None
+    if len(raw) <= MAC_SIZE:
+        raise InvalidCredentialError("too short")
+    payload, mac = raw[:-MAC_SIZE], raw[-MAC_SIZE:]
+    kid = payload[0] & ~_TRUNCATED
+    key = _keys().get(kid)
+    if key is None or not hmac.compare_digest(mac, _mac(key, payload)):
+        raise InvalidCredentialError("bad signature")
+    user_id, pos = _read_varint(payload, 1)
+    device_id, pos = _read_varint(payload, pos)
+    if pos + _EXPIRES.size > len(payload):
+        raise InvalidCredentialError("truncated")
+    (expires,) = _EXPIRES.unpack_from(payload, pos)
+    n_groups, pos = _read_varint(payload, pos + _EXPIRES.size)
+    groups = []
+    for _ in range(n_groups):
+        group_id, pos = _read_varint(payload, pos)
+        groups.append(group_id)
+    if expires <= (now if now is not None else time.time()):
+        raise InvalidCredentialError("expired")
+    return Credential(kid, user_id, device_id, expires, tuple(groups), bool(payload[0] & _TRUNCATED))
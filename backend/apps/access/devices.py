@@ -0,0 +1,150 @@
+"""Worker-local device registry for the verify hot path.
+
+Verify accepts a device ``auth_token`` (from ``devices/register``) as well as
+a user session token, and signed credentials name a device id; both are
+resolved here without touching the database. Devices are indexed by id and
+by a digest of their token, so raw tokens are not kept as lookup keys.
+
+Device tokens rotate on every app start, so a change must not reload every
+device in every worker. Saves bump a version and workers then re-read only
+rows with a recent ``updated_at``; deletes bump a second version that forces a
+full reload. Both are :class:`~apps.access.versions.SharedVersion` objects, so
+other hosts see them within ``ACCESS_AUTHZ_MAX_STALENESS`` seconds, and the
+index is reloaded after ``ACCESS_AUTHZ_SNAPSHOT_TTL`` seconds regardless.
+Queryset ``update()`` and bulk inserts bypass the signals: call
+:func:`changed` after them.
+"""
+import hashlib
+import threading
+import time
+from datetime import timedelta
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.devices.models import Device
+
+from .versions import SharedVersion
+
+registry_version = SharedVersion("device-registry-version")
+registry_epoch = SharedVersion("device-registry-epoch")
+
+# How far back a refresh re-reads before the previous one: covers rows saved
+# before, but committed after, that refresh (and clock skew between hosts).
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+class DeviceEntry(NamedTuple):
+    id: int
+    user_id: int
+    is_active: bool
+    digest: bytes
+
+
+class DeviceIndex:
+    """Devices by id and by token digest."""
+
+    def __init__(self, rows=()):
+        self._by_id: dict[int, DeviceEntry] = {}
+        self._by_digest: dict[bytes, DeviceEntry] = {}
+        self.generation = 0  # bumped by every put(), for caches derived from the index
+        for row in rows:
+            self.put(*row)
+
+    def put(self, device_id: int, user_id: int, is_active: bool, auth_token: str) -> None:
+        entry = DeviceEntry(device_id, user_id, is_active, token_digest(auth_token))
+        old = self._by_id.get(device_id)
+        if old == entry:
+            return  # refreshes re-read recent rows that have not changed since
+        self.generation += 1
+        self._by_id[device_id] = entry
+        self._by_digest[entry.digest] = entry
+        if old is not None and old.digest != entry.digest:
+            self._by_digest.pop(old.digest, None)  # the rotated-out token stops resolving
+
+    def get(self, device_id: int) -> DeviceEntry | None:
+        return self._by_id.get(device_id)
+
+    def by_token(self, token: str) -> DeviceEntry | None:
+        return self._by_digest.get(token_digest(token))
+
+    def entries(self) -> list[DeviceEntry]:
+        return list(self._by_id.values())
+
+    def __len__(self):
+        return len(self._by_id)
+
+
+_COLUMNS = ("id", "user_id", "is_active", "auth_token")
+
+
+class DeviceRegistry:
+    def __init__(self):
+        self._index: DeviceIndex | None = None
+        self._version = self._epoch = None
+        self._watermark = None
+        self._loaded_at = 0.0  # monotonic time of the last full load
+        self._lock = threading.Lock()
+
+    def _expired(self) -> bool:
+        return time.monotonic() - self._loaded_at >= getattr(settings, "ACCESS_AUTHZ_SNAPSHOT_TTL", 300.0)
+
+    def is_current(self) -> bool:
+        """Whether :meth:`get_index` would return the index as is; never touches the database."""
+        version, epoch = registry_version.peek(), registry_epoch.peek()
+        return (
+            self._index is not None
+            and version is not None
+            and epoch is not None
+            and self._version == version
+            and self._epoch == epoch
+            and not self._expired()
+        )
+
+    def get_index(self) -> DeviceIndex:
+        """The up-to-date index, refreshing it first if another process changed a device."""
+        if self.is_current():
+            return self._index
+        with self._lock:
+            # Counters are read before loading, so a change racing the load triggers another refresh
+            version, epoch = registry_version.value(), registry_epoch.value()
+            if self._index is not None and (version, epoch) == (self._version, self._epoch) and not self._expired():
+                return self._index
+            started = timezone.now()
+            if self._index is None or epoch != self._epoch or self._expired():
+                self._index = DeviceIndex(Device.objects.values_list(*_COLUMNS).iterator(chunk_size=5000))
+                self._loaded_at = time.monotonic()
+            else:
+                # Updated in place: readers may see a device's new entry a moment before its old token drops
+                for row in Device.objects.filter(updated_at__gte=self._watermark - REFRESH_OVERLAP).values_list(
+                    *_COLUMNS
+                ):
+                    self._index.put(*row)
+            self._watermark = started
+            self._version, self._epoch = version, epoch
+            return self._index
+
+
+registry = DeviceRegistry()
+
+
+def get_index() -> DeviceIndex:
+    return registry.get_index()
+
+
+def changed() -> None:
+    """Make every worker re-read recently updated devices, now (this host) and once the transaction commits."""
+    registry_version.local.incr()
+    transaction.on_commit(registry_version.incr)
+
+
+def removed() -> None:
+    """Make every worker reload all devices (deleted rows leave no ``updated_at`` to find)."""
+    registry_epoch.local.incr()
+    transaction.on_commit(registry_epoch.incr)
@@ -0,0 +1,91 @@
+"""Materialized effective permissions: one row per (gate, user) that any permission applies to.
+
+An :class:`~.models.AccessPermission` names a user, a group or both, with
+``allow`` True or False. :class:`~.models.EffectivePermission` resolves them
+per user: a row exists when at least one permission applies to the user at
+the gate (directly or through a group), and its ``allow`` is False when any of
+them is a deny. A deny therefore wins over every grant, direct or group, so a
+single user can be locked out of a gate their group may use.
+
+Verify reads only this table: one probe of the (gate, user) unique index
+instead of evaluating ``user OR group IN user.groups`` per tap.
+
+Signals (``apps.access.signals``) keep it current: a permission change
+recomputes the affected users at that gate, a membership change the affected
+users at every gate. Deleting a gate or user cascades. ``bulk_create``,
+queryset ``update()`` and raw membership inserts bypass signals: call
+:func:`refresh` for the affected users afterwards, or run
+``manage.py rebuild_effective_permissions``.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from . import authz
+from .models import AccessPermission, EffectivePermission
+
+User = get_user_model()
+
+
+def compute(permissions, memberships, user_ids=None, gate_ids=None) -> dict[tuple[int, int], bool]:
+    """``(gate id, user id) -> allow`` from AccessPermission and user-group querysets.
+
+    ``user_ids`` / ``gate_ids`` limit the result (``None``: everyone, every
+    gate).
+    """
+    if gate_ids is not None:
+        permissions = permissions.filter(access_point_id__in=gate_ids)
+    if user_ids is not None:
+        memberships = memberships.filter(user_id__in=user_ids)
+    members_by_group: dict[int, list[int]] = {}
+    for user_id, group_id in memberships.values_list("user_id", "group_id"):
+        members_by_group.setdefault(group_id, []).append(user_id)
+
+    direct, shared = permissions.filter(user__isnull=False), permissions.filter(group__isnull=False)
+    if user_ids is not None:
+        direct, shared = direct.filter(user_id__in=user_ids), shared.filter(group_id__in=list(members_by_group))
+    rows = list(direct.values_list("access_point_id", "user_id", "allow"))
+    for ap_id, group_id, allow in shared.values_list("access_point_id", "group_id", "allow"):
+        rows.extend((ap_id, user_id, allow) for user_id in members_by_group.get(group_id, ()))
+
+    resolved: dict[tuple[int, int], bool] = {}
+    for ap_id, user_id, allow in rows:
+        resolved[ap_id, user_id] = resolved.get((ap_id, user_id), True) and allow
+    return resolved
+
+
+def refresh(user_ids=None, gate_ids=None) -> int:
+    """Bring the rows of these users at these gates (``None``: all) in line; returns rows changed.
+
+    Only differing rows are written. Any change invalidates the authz snapshot.
+    """
+    if (user_ids is not None and not user_ids) or (gate_ids is not None and not gate_ids):
+        return 0
+    with transaction.atomic():
+        wanted = compute(AccessPermission.objects.all(), User.groups.through.objects.all(), user_ids, gate_ids)
+        current = EffectivePermission.objects.all()
+        if user_ids is not None:
+            current = current.filter(user_id__in=user_ids)
+        if gate_ids is not None:
+            current = current.filter(access_point_id__in=gate_ids)
+        existing = {(ap_id, user_id): (pk, allow)
+                    for pk, ap_id, user_id, allow in current.values_list("pk", "access_point_id", "user_id", "allow")}
+        stale = [pk for key, (pk, allow) in existing.items() if wanted.get(key) != allow]
+        fresh = [
+            EffectivePermission(access_point_id=ap_id, user_id=user_id, allow=allow)
+            for (ap_id, user_id), allow in wanted.items()
+            if existing.get((ap_id, user_id), (None, None))[1] != allow
+        ]
+        if stale:
+            EffectivePermission.objects.filter(pk__in=stale).delete()
+        EffectivePermission.objects.bulk_create(fresh, batch_size=5000)
+        if stale or fresh:
+            authz.invalidate()
+    return len(stale) + len(fresh)
+
+
+def permission_users(user_id: int | None, group_id: int | None) -> set[int]:
+    """Users a permission row naming ``user_id`` and/or ``group_id`` applies to."""
+    users = {user_id} if user_id is not None else set()
+    if group_id is not None:
+        users.update(User.groups.through.objects.filter(group_id=group_id).values_list("user_id", flat=True))
+    return users
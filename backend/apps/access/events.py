@@ -0,0 +1,496 @@
+"""Sinks for AccessEvent audit rows written by the verify endpoints.
+
+``record()`` is what views call. With the buffered sink (the default) it only
+appends the row to an in-memory queue and a per-process spill file; a
+background thread drains the queue with ``bulk_create`` whenever it reaches
+``batch_size`` rows or ``flush_interval`` seconds pass, and once more at
+interpreter shutdown. Spill segments left behind by a crashed worker are
+replayed by the writer thread of the next process that starts a sink, so
+audit rows survive a crash (delivery is at-least-once: a crash between insert
+and segment removal replays that segment). Replay never runs on a request.
+
+Both stores are bounded for database outages. Past ``max_queue`` rows in
+memory, new rows go only to an overflow spill segment, replayed once a flush
+succeeds again; past ``max_spill_bytes`` of spill files per process, rows
+that do not fit in memory either are dropped. ``access_events_shed_total``
+counts both.
+
+Throttled verifies are not recorded one by one: every sink folds them into a
+:class:`RateLimitAggregator` and writes one summary row per gate/IP/window.
+Everything else recorded here is also published to live stream subscribers
+(:mod:`apps.access.live`).
+"""
+import atexit
+import fcntl
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from apps.api.v1.constants import REASON_RATE_LIMIT
+from core import metrics
+from core.shared import shared_state_dir
+
+from . import live
+from .models import AccessEvent
+
+logger = logging.getLogger("apps.access.events")
+
+EVENT_FIELDS = ("access_point_id", "user_id", "device_id", "decision", "reason", "raw", "created_at")
+
+
+@dataclass
+class _Window:
+    start: float
+    first_seen: float
+    count: int
+    sample: object
+
+
+class RateLimitAggregator:
+    """Counts throttled requests per (gate, client IP) in fixed time windows.
+
+    ``add()`` is a dict update; rows come out of ``drain()`` (or of ``add()``
+    when a key moves into a new window), one per key and window, with the
+    count and the first request of the window in ``raw``. Past ``max_keys``
+    distinct keys per window, further clients are folded into a single
+    ``("*", "*")`` entry so a spoofed-IP flood cannot grow memory.
+    """
+
+    OVERFLOW_KEY = ("*", "*")
+
+    def __init__(self, window: float = 10.0, max_keys: int = 10000, clock=time.time):
+        self.window = window
+        self.max_keys = max_keys
+        self.clock = clock
+        self._windows: dict[tuple[str, str], _Window] = {}
+        self._lock = threading.Lock()
+
+    def add(self, gate_id: str, ip: str, raw=None) -> list[dict]:
+        now = self.clock()
+        start = now - now % self.window
+        key = (str(gate_id or "")[:64], ip or "")
+        closed = []
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is not None and entry.start != start:
+                closed.append(self._summary(key, self._windows.pop(key)))
+                entry = None
+            if entry is None:
+                if len(self._windows) >= self.max_keys:
+                    key = self.OVERFLOW_KEY
+                    entry = self._windows.get(key)
+                if entry is None:
+                    entry = self._windows[key] = _Window(start, now, 0, raw)
+            entry.count += 1
+        return closed
+
+    def drain(self, final: bool = False) -> list[dict]:
+        """Pop finished windows (every window if ``final``) as AccessEvent fields."""
+        now = self.clock()
+        current = now - now % self.window
+        with self._lock:
+            done = [key for key, entry in self._windows.items() if final or entry.start < current]
+            return [self._summary(key, self._windows.pop(key)) for key in done]
+
+    def pending(self) -> int:
+        return len(self._windows)
+
+    def _summary(self, key: tuple[str, str], entry: _Window) -> dict:
+        gate_id, ip = key
+        return {
+            "access_point_id": None, "user_id": None, "device_id": None,
+            "decision": "DENY", "reason": REASON_RATE_LIMIT,
+            "raw": {
+                "gate_id": gate_id,
+                "ip": ip,
+                "count": entry.count,
+                "window_start": datetime.fromtimestamp(entry.start, tz=UTC).isoformat(),
+                "window_seconds": self.window,
+                "sample": entry.sample,
+            },
+            "created_at": datetime.fromtimestamp(entry.first_seen, tz=UTC),
+        }
+
+
+class EventSink:
+    """Interface for persisting AccessEvent rows."""
+
+    def __init__(self, rate_limit_window: float = 10.0):
+        self.rate_limits = RateLimitAggregator(window=rate_limit_window)
+
+    def record(self, **fields):
+        raise NotImplementedError
+
+    def record_many(self, rows):
+        for fields in rows:
+            self.record(**fields)
+
+    def record_rate_limited(self, gate_id, ip, raw=None):
+        for fields in self.rate_limits.add(gate_id, ip, raw):
+            self.record(**fields)
+
+    async def arecord(self, **fields):
+        await sync_to_async(self.record)(**fields)
+
+    async def arecord_many(self, rows):
+        await sync_to_async(self.record_many)(rows)
+
+    async def arecord_rate_limited(self, gate_id, ip, raw=None):
+        await sync_to_async(self.record_rate_limited)(gate_id, ip, raw)
+
+    def flush_rate_limits(self, final: bool = False) -> int:
+        summaries = self.rate_limits.drain(final)
+        for fields in summaries:
+            self.record(**fields)
+        return len(summaries)
+
+    def flush(self) -> int:
+        return self.flush_rate_limits()
+
+    def close(self):
+        self.flush_rate_limits(final=True)
+
+
+class ImmediateEventSink(EventSink):
+    """One INSERT per event, in the caller's transaction (tests, management commands)."""
+
+    def record(self, **fields):
+        AccessEvent.objects.create(**fields)
+
+    def record_many(self, rows):
+        AccessEvent.objects.bulk_create([AccessEvent(**fields) for fields in rows])
+
+
+class _SpillSegment:
+    """Append-only JSON-lines file holding events that are queued but not yet inserted.
+
+    The owning process keeps an exclusive ``flock`` on the segment for its whole
+    lifetime, which is how :func:`replay_spill` tells orphans from live files.
+    """
+
+    _seq = itertools.count()
+
+    def __init__(self, directory: Path):
+        name = f"events-{os.getpid()}-{next(self._seq)}.spill"
+        tmp = directory / f"{name}.tmp"
+        self.file = open(tmp, "a", encoding="utf-8")
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        # Only publish the name once locked, so a replaying process never sees it unlocked
+        self.path = directory / name
+        os.rename(tmp, self.path)
+
+        self.size = 0  # bytes written
+
+    @staticmethod
+    def encode(rows) -> str:
+        return "".join(json.dumps(fields, default=_json_default) + "\n" for fields in rows)
+
+    def write(self, data: str):
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)  # json.dumps escapes non-ASCII, so characters are bytes
+
+    def discard(self):
+        self.path.unlink(missing_ok=True)
+        self.file.close()
+
+    def release(self):
+        """Close without deleting: the unlocked file is replayed like a crashed worker's."""
+        self.file.close()
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _load_event(line: str) -> AccessEvent:
+    fields = json.loads(line)
+    fields["created_at"] = datetime.fromisoformat(fields["created_at"])
+    return AccessEvent(**{k: fields.get(k) for k in EVENT_FIELDS})
+
+
+def spill_dir() -> Path:
+    configured = getattr(settings, "ACCESS_EVENT_SPILL_DIR", "")
+    path = Path(configured) if configured else shared_state_dir() / "event-spill"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def replay_spill(directory: Path, batch_size: int = 500) -> int:
+    """Insert events from spill segments whose owner process is gone. Returns rows inserted."""
+    inserted = 0
+    for path in sorted(directory.glob("*.spill")):
+        try:
+            fh = open(path, encoding="utf-8")
+        except FileNotFoundError:
+            continue
+        with fh:
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # owned by a live worker
+            events = [_load_event(line) for line in fh if line.strip()]
+            if events:
+                AccessEvent.objects.bulk_create(events, batch_size=batch_size)
+                inserted += len(events)
+            path.unlink(missing_ok=True)
+    if inserted:
+        logger.warning("Replayed %s access events from spill files", inserted)
+    return inserted
+
+
+class BufferedEventSink(EventSink):
+    """Queue events in memory and write them in batches from a background thread."""
+
+    def __init__(self, batch_size=500, flush_interval=0.5, spill=True, background=True, rate_limit_window=10.0,
+                 max_queue=100_000, max_spill_bytes=256 * 2**20):
+        super().__init__(rate_limit_window)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill = spill
+        self.background = background
+        self.max_queue = max_queue
+        self.max_spill_bytes = max_spill_bytes
+        self._queue: deque = deque()
+        self._retry = 0  # rows at the front of the queue that the last (failed) flush took
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._segment: _SpillSegment | None = None
+        self._pending_segments: list[_SpillSegment] = []
+        self._overflow: _SpillSegment | None = None  # rows past max_queue, kept on disk only
+        self._spilled = 0  # bytes in this process's segments
+        self._replay_due = False
+        self._dropping = False
+        self._thread: threading.Thread | None = None
+        self._closed = False
+
+    def _start(self):
+        # Runs once per process; a gunicorn worker forked from a preloaded
+        # master starts its own thread and spill segment here.
+        self._pid = os.getpid()
+        self._queue.clear()
+        self._retry = 0
+        self._segment = self._overflow = None
+        self._pending_segments = []
+        self._spilled = 0
+        self._dropping = False
+        if self.spill:
+            self._segment = _SpillSegment(spill_dir())
+            self._replay_due = True  # segments of crashed workers, on the writer thread
+        if self.background:
+            self._thread = threading.Thread(target=self._run, name="access-event-writer", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, **fields):
+        self.record_many([fields])
+
+    def record_many(self, rows):
+        created_at = timezone.now()
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+            for fields in rows:
+                fields.setdefault("created_at", created_at)
+            room = max(self.max_queue - len(self._queue), 0)
+            kept, shed = rows[:room], rows[room:]
+            self._queue.extend(kept)
+            if kept and self._segment is not None:
+                self._spill(self._segment, kept)  # over the spill cap they are still written, just not durable
+            if shed:
+                self._shed(shed)
+            size = len(self._queue)
+        metrics.EVENT_QUEUE_DEPTH.set(size)
+        if size >= self.batch_size:
+            self._wakeup.set()
+
+    def _spill(self, segment: _SpillSegment, rows) -> bool:
+        data = segment.encode(rows)
+        if self._spilled + len(data) > self.max_spill_bytes:
+            return False
+        segment.write(data)
+        self._spilled += len(data)
+        return True
+
+    def _shed(self, rows):
+        """Rows past ``max_queue``: to the overflow segment while the spill cap allows, else dropped."""
+        if self.spill:
+            if self._overflow is None:
+                self._overflow = _SpillSegment(spill_dir())
+            if self._spill(self._overflow, rows):
+                metrics.EVENTS_SHED.labels("spilled").inc(len(rows))
+                return
+        metrics.EVENTS_SHED.labels("dropped").inc(len(rows))
+        if not self._dropping:  # once per outage, not per request
+            self._dropping = True
+            logger.error("Access event queue and spill are full; dropping events until a flush succeeds")
+
+    def record_rate_limited(self, gate_id, ip, raw=None):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._start()  # the writer thread is what drains finished windows
+        super().record_rate_limited(gate_id, ip, raw)
+
+    async def arecord(self, **fields):
+        if self._pid != os.getpid():
+            await sync_to_async(self.record)(**fields)  # first use opens the spill segment and starts the writer
+        else:
+            self.record(**fields)  # queue append, never touches the DB
+
+    async def arecord_many(self, rows):
+        if self._pid != os.getpid():
+            await sync_to_async(self.record_many)(rows)
+        else:
+            self.record_many(rows)
+
+    async def arecord_rate_limited(self, gate_id, ip, raw=None):
+        if self._pid != os.getpid():
+            await sync_to_async(self.record_rate_limited)(gate_id, ip, raw)
+        else:
+            self.record_rate_limited(gate_id, ip, raw)
+
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                if self._retry:
+                    # Retry only the rows of the pending segments, so an outage keeps one
+                    # pending segment instead of adding one per attempt
+                    batch = [self._queue.popleft() for _ in range(self._retry)]
+                else:
+                    if not self._queue:
+                        return 0
+                    batch = list(self._queue)
+                    self._queue.clear()
+                    if self._segment is not None:
+                        self._pending_segments.append(self._segment)
+                        self._segment = _SpillSegment(self._segment.path.parent)
+                metrics.EVENT_QUEUE_DEPTH.set(len(self._queue))
+                segments = list(self._pending_segments)
+            try:
+                AccessEvent.objects.bulk_create([AccessEvent(**fields) for fields in batch], batch_size=self.batch_size)
+            except Exception:
+                # Put the rows back; their spill segments stay pending until a
+                # later flush succeeds (or are replayed after a restart).
+                with self._lock:
+                    self._queue.extendleft(reversed(batch))
+                    self._retry = len(batch)
+                    metrics.EVENT_QUEUE_DEPTH.set(len(self._queue))
+                raise
+            with self._lock:
+                self._retry = 0
+                self._dropping = False
+                for segment in segments:
+                    self._pending_segments.remove(segment)
+                    self._spilled -= segment.size
+                    segment.discard()
+                if self._overflow is not None:
+                    # The database is back: hand shed rows to replay
+                    self._spilled -= self._overflow.size
+                    self._overflow.release()
+                    self._overflow = None
+                    self._replay_due = True
+            return len(batch)
+
+    def replay(self) -> int:
+        """Insert rows from unlocked spill segments (crashed workers, released overflow); writer thread only."""
+        self._replay_due = False
+        try:
+            return replay_spill(spill_dir(), self.batch_size)
+        except Exception:
+            self._replay_due = True
+            logger.exception("Failed to replay access event spill files; will retry")
+            return 0
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush_rate_limits()
+                self.flush()
+                if self._replay_due:
+                    self.replay()
+            except Exception:
+                logger.exception("Access event flush failed; will retry")
+            finally:
+                close_old_connections()
+
+    def close(self):
+        if self._closed or self._pid != os.getpid():
+            return
+        self._closed = True
+        self._wakeup.set()
+        try:
+            self.flush_rate_limits(final=True)
+            self.flush()
+        except Exception:
+            logger.exception("Final access event flush failed; rows remain in the spill file")
+
+
+_sink: EventSink | None = None
+_sink_lock = threading.Lock()
+
+
+def get_sink() -> EventSink:
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                conf = getattr(settings, "ACCESS_EVENT_SINK", {})
+                backend = import_string(conf.get("BACKEND", "apps.access.events.BufferedEventSink"))
+                _sink = backend(**conf.get("OPTIONS", {}))
+    return _sink
+
+
+def record(**fields):
+    """Record one AccessEvent through the configured sink."""
+    get_sink().record(**fields)
+    live.publish([fields])
+
+
+def record_many(rows):
+    """Record several AccessEvent rows (dicts of model fields) in one go."""
+    get_sink().record_many(rows)
+    live.publish(rows)
+
+
+def record_rate_limited(gate_id, ip, raw=None):
+    """Count one throttled request; summarized into one AccessEvent per gate/IP/window."""
+    get_sink().record_rate_limited(gate_id, ip, raw)
+
+
+async def arecord(**fields):
+    """:func:`record` for async views; does not block the event loop on the buffered sink."""
+    await get_sink().arecord(**fields)
+    live.publish([fields])
+
+
+async def arecord_many(rows):
+    """:func:`record_many` for async callers."""
+    await get_sink().arecord_many(rows)
+    live.publish(rows)
+
+
+async def arecord_rate_limited(gate_id, ip, raw=None):
+    await get_sink().arecord_rate_limited(gate_id, ip, raw)
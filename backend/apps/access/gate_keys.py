@@ -0,0 +1,44 @@
+"""Per-gate reader keys for the endpoints a reader calls as itself.
+
+A reader has no user token, so the gate snapshot and heartbeat endpoints
+authenticate it with a key bound to its gate code::
+
+    Authorization: Gate <key>
+
+The key is HMAC-SHA256(secret, "gate:" + code), hex, so nothing is stored and
+checking it costs one HMAC, no query. ``manage.py gate_key <code>`` prints it
+for provisioning. ``ACCESS_GATE_KEY_SECRET`` sets the secret (derived from
+``SECRET_KEY`` by default); changing it revokes every reader key at once.
+"""
+import hashlib
+import hmac
+
+from django.conf import settings
+
+KEYWORD = "Gate"
+KEY_LENGTH = 32  # hex characters
+
+
+def _secret() -> bytes:
+    configured = getattr(settings, "ACCESS_GATE_KEY_SECRET", "")
+    if configured:
+        return configured.encode()
+    return hashlib.sha256(b"openway-gate-key:" + settings.SECRET_KEY.encode()).digest()
+
+
+def gate_key(code: str) -> str:
+    return hmac.new(_secret(), b"gate:" + code.encode(), hashlib.sha256).hexdigest()[:KEY_LENGTH]
+
+
+def presented_key(authorization: str) -> str | None:
+    """The key from an ``Authorization: Gate <key>`` header value, or ``None``."""
+    keyword, _, key = authorization.partition(" ")
+    if keyword != KEYWORD or not key:
+        return None
+    return key.strip()
+
+
+def check(authorization: str, code: str) -> bool:
+    """Whether the ``Authorization`` header value carries the key of gate ``code``."""
+    key = presented_key(authorization)
+    return key is not None and hmac.compare_digest(key.encode(), gate_key(code).encode())
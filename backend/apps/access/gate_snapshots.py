@@ -0,0 +1,129 @@
+"""Per-gate allow lists for readers that decide offline.
+
+``GET /api/v1/gates/{code}/snapshot`` returns, for one gate, the digests of
+every token that verify would currently ALLOW there: session tokens of active
+users with a grant, and auth tokens of their active devices. A reader hashes
+the presented token the same way and binary-searches the list.
+
+Signed device credentials (``ow1.``, :mod:`apps.access.credentials`) are not
+listed: checking one needs the HMAC key, which readers must not hold, so a
+reader sends those to ``/access/verify`` and has no offline answer for them.
+Readers fetch their own gate with its reader key (:mod:`apps.access.gate_keys`).
+
+Encoding (big-endian)::
+
+    magic "OWS1" | u8 format (1) | u8 digest size | u16 reserved (0) | u32 gate id | u32 count
+    count x digest, sorted ascending, no duplicates
+
+where a digest is the first ``DIGEST_SIZE`` bytes of SHA-256 over the token.
+The ETag is derived from the body, so it is the same on every worker and host.
+
+Bodies are built lazily per gate and kept until the authz snapshot or the
+device registry changes, so gates polling with ``If-None-Match`` cost a
+couple of dict lookups.
+"""
+import hashlib
+import struct
+import threading
+from collections import defaultdict
+from typing import NamedTuple
+
+from . import authz
+from . import devices as device_registry
+
+MAGIC = b"OWS1"
+FORMAT = 1
+DIGEST_SIZE = 8
+HEADER = struct.Struct(">4sBBHII")
+CONTENT_TYPE = "application/vnd.openway.gate-snapshot"
+
+
+class GateExport(NamedTuple):
+    etag: str
+    body: bytes
+
+
+def encode(gate_id: int, digests) -> bytes:
+    entries = sorted(set(digests))
+    return HEADER.pack(MAGIC, FORMAT, DIGEST_SIZE, 0, gate_id, len(entries)) + b"".join(entries)
+
+
+def decode(body: bytes) -> tuple[int, list[bytes]]:
+    """``(gate id, digests)``; the reader-side counterpart of :func:`encode`, used by tests and tools."""
+    magic, fmt, size, _, gate_id, count = HEADER.unpack_from(body)
+    if magic != MAGIC or fmt != FORMAT:
+        raise ValueError("Not a gate snapshot")
+    start = HEADER.size
+    return gate_id, [body[start + i * size:start + (i + 1) * size] for i in range(count)]
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()[:DIGEST_SIZE]
+
+
+class _Exports:
+    """Encoded gates for one (authz snapshot, device index) state."""
+
+    def __init__(self, snap: authz.AuthzSnapshot, devices: device_registry.DeviceIndex):
+        self.snap = snap
+        self.devices = devices
+        self.generation = devices.generation
+        self.by_gate: dict[int, GateExport] = {}
+        self._users_by_gate: dict[int, list[int]] | None = None
+        self._digests_by_user: dict[int, list[bytes]] | None = None
+
+    def is_current(self, snap, devices) -> bool:
+        return snap is self.snap and devices is self.devices and devices.generation == self.generation
+
+    def get(self, gate_id: int) -> GateExport:
+        export = self.by_gate.get(gate_id)
+        if export is None:
+            if self._users_by_gate is None:
+                self._index()
+            digests = [
+                digest
+                for user_id in self._users_by_gate.get(gate_id, ())
+                for digest in self._digests_by_user.get(user_id, ())
+            ]
+            body = encode(gate_id, digests)
+            export = self.by_gate[gate_id] = GateExport(f'"{hashlib.sha256(body).hexdigest()[:32]}"', body)
+        return export
+
+    def _index(self):
+        # One pass over grants, tokens and devices serves every gate of this state
+        users_by_gate = defaultdict(list)
+        for ap_id, user_id in self.snap.grants:
+            if user_id not in self.snap.inactive_users:
+                users_by_gate[ap_id].append(user_id)
+        digests_by_user = defaultdict(list)
+        for key, (user_id, is_active) in self.snap.tokens.items():
+            if is_active:
+                digests_by_user[user_id].append(token_digest(key))
+        for device in self.devices.entries():
+            if device.is_active:
+                digests_by_user[device.user_id].append(device.digest[:DIGEST_SIZE])
+        self._users_by_gate, self._digests_by_user = users_by_gate, digests_by_user
+
+
+_exports: _Exports | None = None
+_lock = threading.Lock()
+
+
+def get(gate_code: str) -> GateExport | None:
+    """Encoded allow list for ``gate_code``, or ``None`` for an unknown gate."""
+    global _exports
+    snap, devices = authz.get_snapshot(), device_registry.get_index()
+    gate_id = snap.gates.get(gate_code)
+    if gate_id is None:
+        return None
+    exports = _exports
+    if exports is None or not exports.is_current(snap, devices):
+        with _lock:
+            exports = _exports
+            if exports is None or not exports.is_current(snap, devices):
+                exports = _exports = _Exports(snap, devices)
+    export = exports.by_gate.get(gate_id)
+    if export is None:
+        with _lock:
+            export = exports.get(gate_id)
+    return export
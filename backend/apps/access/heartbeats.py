@@ -0,0 +1,248 @@
+"""Gate heartbeats: last-seen time, firmware and RSSI per gate, answered from memory.
+
+Readers call ``/api/v1/gates/<code>/heartbeat`` before each tap and while idle.
+A heartbeat is one write into :class:`HeartbeatTable`, a table in a
+memory-mapped file shared by every worker on the host, so "which gates are
+offline" (:func:`offline`) needs no query whichever worker the readers hit.
+
+A thread per worker copies the slots that changed since the last flush into
+:class:`~apps.access.models.GateStatus` with one bulk upsert. The table keeps
+the time of the last flush, so however many workers run, the database sees at
+most one flush per ``ACCESS_GATE_HEARTBEAT_FLUSH_INTERVAL``. The file outlives
+worker restarts; a freshly created table is seeded from GateStatus, so gates
+silent since before then still report their last known heartbeat.
+"""
+import fcntl
+import logging
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from datetime import UTC, datetime
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from core.shared import open_shared_file
+
+from . import authz
+from .models import AccessPoint, GateStatus
+
+logger = logging.getLogger("apps.access.heartbeats")
+
+FIRMWARE_MAX = 32  # GateStatus.firmware max_length; ASCII, so it fits the slot
+RSSI_UNKNOWN = -32768
+
+
+class Beat(NamedTuple):
+    access_point_id: int
+    last_seen: float  # unix time
+    firmware: str
+    rssi: int | None
+
+    @property
+    def last_seen_at(self) -> datetime:
+        return datetime.fromtimestamp(self.last_seen, UTC)
+
+
+class HeartbeatTable:
+    """Open-addressed table of gate slots in a memory-mapped file.
+
+    A slot holds the gate id, its last heartbeat, the heartbeat last written
+    to the database, RSSI and firmware. The header holds the time of the last
+    flush and whether the table has been seeded. Writers lock the whole file
+    (``lockf``); a heartbeat touches a single slot, so the lock is held for
+    microseconds.
+    """
+
+    _HEADER = struct.Struct("<d?")  # last flush, seeded
+    _HEADER_SIZE = 64
+    _SLOT = struct.Struct("<QddhB37s")  # gate id, last seen, persisted, rssi, firmware length, firmware
+
+    def __init__(self, name="gate-heartbeats", slots=4096):
+        self.name = name
+        self.slots = slots
+        self._fd: int | None = None
+        self._mm = None
+        self._init_lock = threading.Lock()
+        self._lock = threading.Lock()  # lockf() excludes other processes only
+
+    def _map(self):
+        if self._mm is None:
+            with self._init_lock:
+                if self._mm is None:
+                    size = self._HEADER_SIZE + self.slots * self._SLOT.size
+                    self._fd, self._mm = open_shared_file(f"{self.name}.table", size)
+        return self._mm
+
+    @contextmanager
+    def _locked(self):
+        mm = self._map()
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield mm
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _find(self, mm, gate_id: int) -> int | None:
+        """Offset of the gate's slot, or of the empty slot it would take; None if the table is full."""
+        start = gate_id % self.slots
+        for i in range(self.slots):
+            offset = self._HEADER_SIZE + (start + i) % self.slots * self._SLOT.size
+            slot_id = self._SLOT.unpack_from(mm, offset)[0]
+            if slot_id in (gate_id, 0):
+                return offset
+        return None
+
+    @staticmethod
+    def _beat(fields: tuple) -> tuple[Beat, float]:
+        gate_id, last_seen, persisted, rssi, length, firmware = fields
+        beat = Beat(gate_id, last_seen, firmware[:length].decode("ascii", "replace"),
+                    None if rssi == RSSI_UNKNOWN else rssi)
+        return beat, persisted
+
+    def _read(self, mm, offset: int) -> tuple[Beat, float]:
+        return self._beat(self._SLOT.unpack_from(mm, offset))
+
+    def _occupied(self, mm):
+        """``(beat, persisted)`` for every used slot."""
+        for fields in self._SLOT.iter_unpack(mm[self._HEADER_SIZE:]):
+            if fields[0]:
+                yield self._beat(fields)
+
+    def _write(self, mm, offset: int, beat: Beat, persisted: float) -> None:
+        firmware = beat.firmware.encode("ascii", "replace")[:FIRMWARE_MAX]
+        rssi = RSSI_UNKNOWN if beat.rssi is None else beat.rssi
+        self._SLOT.pack_into(mm, offset, beat.access_point_id, beat.last_seen, persisted, rssi, len(firmware), firmware)
+
+    def beat(self, gate_id: int, firmware: str = "", rssi: int | None = None, now: float | None = None) -> None:
+        beat = Beat(gate_id, time.time() if now is None else now, firmware, rssi)
+        with self._locked() as mm:
+            offset = self._find(mm, gate_id)
+            if offset is None:
+                logger.warning("Gate heartbeat table is full; dropping heartbeat of gate %s", gate_id)
+                return
+            persisted = self._SLOT.unpack_from(mm, offset)[2]
+            self._write(mm, offset, beat, persisted)
+
+    def beats(self) -> dict[int, Beat]:
+        """Latest heartbeat per gate id."""
+        self.seed()
+        with self._locked() as mm:
+            return {beat.access_point_id: beat for beat, _persisted in self._occupied(mm)}
+
+    def seed(self) -> None:
+        """Fill a new table from GateStatus (once per table, not per worker)."""
+        if self._HEADER.unpack_from(self._map(), 0)[1]:
+            return
+        rows = [Beat(pk, last_seen.timestamp(), firmware, rssi)
+                for pk, last_seen, firmware, rssi in GateStatus.objects.values_list(
+                    "access_point_id", "last_seen", "firmware", "rssi")]
+        with self._locked() as mm:
+            last_flush, seeded = self._HEADER.unpack_from(mm, 0)
+            if seeded:
+                return
+            for beat in rows:
+                offset = self._find(mm, beat.access_point_id)
+                if offset is not None and self._read(mm, offset)[0].last_seen < beat.last_seen:
+                    self._write(mm, offset, beat, beat.last_seen)
+            self._HEADER.pack_into(mm, 0, last_flush, True)
+
+    def flush(self, interval: float = 0.0, now: float | None = None) -> int:
+        """Upsert heartbeats newer than what GateStatus holds, unless a flush ran within ``interval``.
+
+        Returns the number of gates written.
+        """
+        now = time.time() if now is None else now
+        self.seed()
+        with self._locked() as mm:
+            last_flush, seeded = self._HEADER.unpack_from(mm, 0)
+            if now - last_flush < interval:
+                return 0
+            self._HEADER.pack_into(mm, 0, now, seeded)  # claimed: other workers skip this round
+            dirty = [beat for beat, persisted in self._occupied(mm) if beat.last_seen > persisted]
+        if not dirty:
+            return 0
+        ids = [beat.access_point_id for beat in dirty]
+        existing = set(AccessPoint.objects.filter(id__in=ids).values_list("id", flat=True))  # gates may be deleted
+        rows = [
+            GateStatus(access_point_id=b.access_point_id, last_seen=b.last_seen_at, firmware=b.firmware, rssi=b.rssi)
+            for b in dirty if b.access_point_id in existing
+        ]
+        GateStatus.objects.bulk_create(rows, update_conflicts=True, unique_fields=["access_point"],
+                                       update_fields=["last_seen", "firmware", "rssi"])
+        with self._locked() as mm:
+            for beat in dirty:
+                offset = self._find(mm, beat.access_point_id)
+                current, persisted = self._read(mm, offset)
+                self._write(mm, offset, current, max(persisted, beat.last_seen))
+        return len(rows)
+
+    def reset(self):
+        mm = self._map()
+        mm[:] = bytes(len(mm))
+
+
+_table: HeartbeatTable | None = None
+_table_lock = threading.Lock()
+_flusher_pid: int | None = None
+
+
+def get_table() -> HeartbeatTable:
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = HeartbeatTable()
+    return _table
+
+
+def _run_flusher(table: HeartbeatTable, interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            table.flush(interval)
+        except Exception:
+            logger.exception("Gate heartbeat flush failed; will retry")
+        finally:
+            close_old_connections()
+
+
+def _ensure_flusher(table: HeartbeatTable) -> None:
+    global _flusher_pid
+    interval = getattr(settings, "ACCESS_GATE_HEARTBEAT_FLUSH_INTERVAL", 30.0)
+    if _flusher_pid == os.getpid() or interval <= 0:
+        return
+    with _table_lock:
+        if _flusher_pid != os.getpid():  # once per process, including forked workers
+            threading.Thread(target=_run_flusher, args=(table, interval), name="gate-heartbeat-flush",
+                             daemon=True).start()
+            _flusher_pid = os.getpid()
+
+
+def gate_ids() -> dict[str, int]:
+    """Gate code -> AccessPoint id, from the authorization snapshot when it is enabled."""
+    if getattr(settings, "ACCESS_AUTHZ_SNAPSHOT", True):
+        return authz.get_snapshot().gates
+    return dict(AccessPoint.objects.values_list("code", "id"))
+
+
+def beat(gate_id: int, firmware: str = "", rssi: int | None = None) -> None:
+    table = get_table()
+    table.beat(gate_id, firmware, rssi)
+    _ensure_flusher(table)
+
+
+def offline(after: float, now: float | None = None) -> list[tuple[str, Beat | None]]:
+    """Gates (code, last heartbeat or None if never seen) silent for at least ``after`` seconds."""
+    now = time.time() if now is None else now
+    beats = get_table().beats()
+    silent = []
+    for code, pk in sorted(gate_ids().items()):
+        last = beats.get(pk)
+        if last is None or now - last.last_seen >= after:
+            silent.append((code, last))
+    return silent
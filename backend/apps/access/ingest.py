@@ -0,0 +1,330 @@
+"""Bulk upload of AccessEvent rows recorded elsewhere (gate agents, readers back from an outage).
+
+``ingest()`` reads the request body as a stream, either NDJSON (one event per
+line) or a JSON array, optionally gzip-encoded, and writes every ``chunk``
+valid events in their own transaction. Memory stays bounded by the chunk
+size whatever the upload size. Each event carries a client-side
+``idempotency_key``; together with ``created_at`` it is unique in the table,
+so a batch resent after a lost response is counted as duplicates instead of
+being inserted twice.
+
+On PostgreSQL a chunk is ``COPY``-ed into a temporary table and moved with one
+``INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING``, which gives the
+accepted events. Other databases use ``bulk_create(ignore_conflicts=True)``
+after looking up the keys that already exist. Either way references to gates
+or users that no longer exist become NULL, as ``on_delete=SET_NULL`` would
+have made them, and the stored events are published to the live stream
+(:mod:`apps.access.live`) once their chunk commits. Invalid events are skipped
+and reported; a body that cannot be parsed raises :class:`MalformedBodyError`
+(chunks written before it stay, and resending is safe).
+"""
+import codecs
+import csv
+import gzip
+import io
+import json
+import re
+import zlib
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from apps.api.v1.constants import DECISIONS
+
+from . import live
+from .models import AccessEvent, AccessPoint
+
+User = get_user_model()
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq")
+JSON_TYPES = ("application/json",)
+MAX_EVENT_BYTES = 64 * 1024  # a longer line or array element is rejected, not buffered
+MAX_ERRORS = 20  # reported per response; the rest are only counted
+READ_SIZE = 64 * 1024
+MAX_ID = 2 ** 63 - 1
+MAX_DEVICE_ID = 2 ** 31 - 1  # AccessEvent.device_id is an IntegerField
+COLUMNS = ("access_point_id", "user_id", "device_id", "decision", "reason", "raw", "created_at", "idempotency_key")
+
+
+class MalformedBodyError(Exception):
+    """The body is not valid NDJSON/JSON (or gzip) as a whole."""
+
+
+@dataclass
+class Result:
+    accepted: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    errors: list[dict] = field(default_factory=list)
+
+    def reject(self, index: int, message: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"index": index, "error": message})
+
+
+def _id(value, name: str, maximum: int = MAX_ID) -> int | None:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 < value <= maximum:
+        raise ValueError(f"{name} must be a positive integer or null")
+    return value
+
+
+def _text(value, name: str, max_length: int, required: bool = True) -> str:
+    if value is None and not required:
+        return ""
+    if not isinstance(value, str) or (required and not value) or len(value) > max_length or "\x00" in value:
+        raise ValueError(f"{name} must be a string of at most {max_length} characters")
+    return value
+
+
+def clean_event(item) -> dict:
+    """Model fields for one uploaded event; ``ValueError`` with a message if it is invalid."""
+    if not isinstance(item, dict):
+        raise ValueError("event must be an object")
+    decision = item.get("decision")
+    if decision not in DECISIONS:
+        raise ValueError(f"decision must be one of {', '.join(DECISIONS)}")
+    created_at = item.get("created_at")
+    created_at = parse_datetime(created_at) if isinstance(created_at, str) else None
+    if created_at is None or created_at.tzinfo is None:
+        raise ValueError("created_at must be an ISO 8601 timestamp with a UTC offset")
+    raw = item.get("raw")
+    if raw is not None and "\\u0000" in json.dumps(raw):
+        raise ValueError("raw must not contain NUL characters")  # jsonb rejects them
+    return {
+        "access_point_id": _id(item.get("access_point_id"), "access_point_id"),
+        "user_id": _id(item.get("user_id"), "user_id"),
+        "device_id": _id(item.get("device_id"), "device_id", MAX_DEVICE_ID),
+        "decision": decision,
+        "reason": _text(item.get("reason"), "reason", 64, required=False),
+        "raw": raw,
+        "created_at": created_at,
+        "idempotency_key": _text(item.get("idempotency_key"), "idempotency_key", 64),
+    }
+
+
+def _iter_ndjson(stream) -> Iterator[tuple[int, object]]:
+    """``(index, item)`` per non-empty line; ``item`` is an exception for lines that are not valid JSON."""
+    index = 0
+    while True:
+        line = stream.readline(MAX_EVENT_BYTES + 1)
+        if not line:
+            return
+        if len(line) > MAX_EVENT_BYTES and not line.endswith(b"\n"):
+            while line and not line.endswith(b"\n"):  # drop the rest of the oversized line
+                line = stream.readline(READ_SIZE)
+            yield index, ValueError(f"event is larger than {MAX_EVENT_BYTES} bytes")
+            index += 1
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield index, json.loads(line)
+        except ValueError as exc:
+            yield index, ValueError(f"invalid JSON: {exc}")
+        index += 1
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _ArrayReader:
+    """Yields the elements of a top-level JSON array read from ``stream`` piecewise."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        data = self.stream.read(READ_SIZE)
+        try:
+            chunk = self.utf8.decode(data, final=not data)
+        except UnicodeDecodeError as exc:
+            raise MalformedBodyError(f"body is not UTF-8: {exc}") from None
+        self.text, self.pos = self.text[self.pos:] + chunk, 0
+        self.eof = not data
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self._fill():
+                raise MalformedBodyError("unexpected end of JSON array")
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if char not in chars:
+            raise MalformedBodyError(f"expected {' or '.join(repr(c) for c in chars)} at {char!r}")
+        self.pos += 1
+        return char
+
+    def _value(self):
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.text, self.pos)
+            except ValueError as exc:
+                # Possibly cut off at the end of what has been read so far: read on, up to the size limit
+                if len(self.text) - self.pos > MAX_EVENT_BYTES or not self._fill():
+                    raise MalformedBodyError(f"invalid JSON: {exc}") from None
+                continue
+            if end == len(self.text) and not self.eof and self._fill():
+                continue  # a number may continue in the next read
+            self.pos = end
+            return value
+
+    def __iter__(self) -> Iterator[tuple[int, object]]:
+        self._expect("[")
+        if self._peek() == "]":
+            self.pos += 1
+        else:
+            index = 0
+            while True:
+                self._peek()
+                yield index, self._value()
+                index += 1
+                if self._expect(",]") == "]":
+                    break
+        if self._peek_end():
+            raise MalformedBodyError("data after the JSON array")
+
+    def _peek_end(self) -> bool:
+        try:
+            self._peek()
+        except MalformedBodyError:
+            return False
+        return True
+
+
+def _user_table() -> str:
+    return connection.ops.quote_name(User._meta.db_table)
+
+
+def _copy_chunk(rows: list[dict]) -> list[dict]:
+    """PostgreSQL: COPY into a temp table, then one INSERT ... ON CONFLICT DO NOTHING; returns the rows inserted."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)  # None is written as an empty field, which COPY reads as NULL
+    for row in rows:
+        writer.writerow([
+            row["access_point_id"], row["user_id"], row["device_id"], row["decision"], row["reason"],
+            None if row["raw"] is None else json.dumps(row["raw"]), row["created_at"].isoformat(),
+            row["idempotency_key"],
+        ])
+    buf.seek(0)
+    qn = connection.ops.quote_name
+    with connection.cursor() as cur:
+        cur.execute(
+            "CREATE TEMP TABLE access_event_upload (access_point_id bigint, user_id bigint, device_id integer, "
+            "decision text, reason text, raw jsonb, created_at timestamptz, idempotency_key text, "
+            "ord serial) ON COMMIT DROP"
+        )
+        cur.cursor.copy_expert(f"COPY access_event_upload ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv, "
+                             f"FORCE_NOT_NULL (decision, reason, idempotency_key))", buf)
+        cur.execute(
+            f"INSERT INTO {qn(AccessEvent._meta.db_table)} ({', '.join(COLUMNS)}) "  # noqa: S608 - model identifiers
+            f"SELECT ap.id, u.id, t.device_id, t.decision, t.reason, t.raw, t.created_at, t.idempotency_key "
+            f"FROM access_event_upload t "
+            f"LEFT JOIN {qn(AccessPoint._meta.db_table)} ap ON ap.id = t.access_point_id "
+            f"LEFT JOIN {_user_table()} u ON u.id = t.user_id "
+            f"ORDER BY t.ord ON CONFLICT DO NOTHING RETURNING {', '.join(live.FIELDS)}, created_at"
+        )
+        names = [col[0] for col in cur.description]
+        inserted = [dict(zip(names, values, strict=True)) for values in cur.fetchall()]
+        cur.execute("DROP TABLE access_event_upload")  # ON COMMIT DROP does not fire inside an outer atomic()
+    return inserted
+
+
+def _bulk_create_chunk(rows: list[dict]) -> list[dict]:
+    """Any database: skip keys already stored (or repeated in the chunk), then bulk_create; returns rows inserted."""
+    existing = set(
+        AccessEvent.objects.filter(idempotency_key__in={row["idempotency_key"] for row in rows})
+        .values_list("idempotency_key", "created_at")
+    )
+    gates = set(AccessPoint.objects.filter(id__in={r["access_point_id"] for r in rows}).values_list("id", flat=True))
+    users = set(User.objects.filter(id__in={r["user_id"] for r in rows}).values_list("id", flat=True))
+    fresh = []
+    for row in rows:
+        key = (row["idempotency_key"], row["created_at"])
+        if key in existing:
+            continue
+        existing.add(key)
+        fresh.append({
+            **row,
+            "access_point_id": row["access_point_id"] if row["access_point_id"] in gates else None,
+            "user_id": row["user_id"] if row["user_id"] in users else None,
+        })
+    AccessEvent.objects.bulk_create([AccessEvent(**row) for row in fresh], ignore_conflicts=True)
+    return fresh
+
+
+def write_chunk(rows: list[dict]) -> int:
+    """Insert one chunk in one transaction; returns how many were new.
+
+    The new rows go to live stream subscribers once the transaction commits.
+    """
+    with transaction.atomic():
+        if connection.vendor == "postgresql" and connection.Database.__name__ == "psycopg2":
+            inserted = _copy_chunk(rows)
+        else:
+            inserted = _bulk_create_chunk(rows)
+        transaction.on_commit(lambda: live.publish(inserted))
+    return len(inserted)
+
+
+def open_body(stream, content_encoding: str):
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    if encoding == "identity":
+        return stream
+    raise ValueError(f'Unsupported Content-Encoding "{content_encoding}"')
+
+
+def ingest(stream, content_type: str, content_encoding: str = "", chunk: int = 1000) -> Result:
+    """Validate and store the events in a request body; see the module docstring."""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    body = open_body(stream, content_encoding)
+    if content_type in NDJSON_TYPES:
+        items = _iter_ndjson(body)
+    elif content_type in JSON_TYPES:
+        items = iter(_ArrayReader(body))
+    else:
+        raise ValueError(f'Unsupported media type "{content_type}"')
+    result = Result()
+    rows = []
+    try:
+        for index, item in items:
+            if isinstance(item, Exception):
+                result.reject(index, str(item))
+                continue
+            try:
+                rows.append(clean_event(item))
+            except ValueError as exc:
+                result.reject(index, str(exc))
+                continue
+            if len(rows) >= chunk:
+                _write(result, rows)
+                rows = []
+    except (OSError, EOFError, zlib.error) as exc:  # gzip.BadGzipFile is an OSError
+        raise MalformedBodyError(f"invalid gzip body: {exc}") from None
+    if rows:
+        _write(result, rows)
+    return result
+
+
+def _write(result: Result, rows: list[dict]) -> None:
+    inserted = write_chunk(rows)
+    result.accepted += inserted
+    result.duplicates += len(rows) - inserted
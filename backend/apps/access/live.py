@@ -0,0 +1,270 @@
+"""Live feed of access decisions for the event stream endpoint, without reading ``access_accessevent``.
+
+Every decision recorded through :mod:`apps.access.events` (and every event
+stored by the bulk upload) is also :func:`publish`-ed: it is appended to this
+worker's :class:`EventRing` right away, and a relay thread forwards it to the
+other workers with PostgreSQL ``NOTIFY`` on :data:`CHANNEL`, batched so a
+burst of taps costs one notification per :data:`FLUSH_INTERVAL` and ~7 KB. The
+same thread ``LISTEN``-s and appends what other workers (on any host) published
+to the local ring, skipping its own messages. Stream subscribers (:func:`stream`
+and :func:`astream`, formatted as server-sent events) only read the ring.
+
+On other databases, or with ``ACCESS_EVENT_STREAM_FANOUT`` off, each worker
+only sees its own decisions. Events carry ids and outcome only, never ``raw``
+(it holds the presented token).
+"""
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from core import metrics
+
+logger = logging.getLogger("apps.access.live")
+
+CHANNEL = "access_events"
+FLUSH_INTERVAL = 0.1
+MAX_PAYLOAD = 7000  # NOTIFY payloads must stay under 8000 bytes
+FIELDS = ("access_point_id", "user_id", "device_id", "decision", "reason")
+
+
+class EventRing:
+    """The last ``size`` events with increasing sequence numbers; readers wait for newer ones."""
+
+    def __init__(self, size: int = 1000):
+        self.origin = uuid.uuid4().hex[:12]  # tells this process's messages (and stream ids) apart
+        self.seq = 0
+        self._events: deque[tuple[int, dict]] = deque(maxlen=size)
+        self._cond = threading.Condition()
+        self._waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    def extend(self, events: list[dict]) -> None:
+        with self._cond:
+            for event in events:
+                self.seq += 1
+                self._events.append((self.seq, event))
+            self._cond.notify_all()
+            waiters, self._waiters = self._waiters, []
+        for loop, ready in waiters:  # one-shot: a subscriber re-registers after catching up
+            loop.call_soon_threadsafe(ready.set)
+
+    def after(self, seq: int) -> list[tuple[int, dict]]:
+        """Events newer than ``seq`` still held (older ones have been overwritten)."""
+        with self._cond:
+            if not self._events or self._events[-1][0] <= seq:
+                return []
+            start = max(0, len(self._events) - (self._events[-1][0] - seq))
+            return list(self._events)[start:]
+
+    def wait(self, seq: int, timeout: float) -> None:
+        with self._cond:
+            if self.seq <= seq:
+                self._cond.wait(timeout)
+
+    async def await_after(self, seq: int, timeout: float) -> None:
+        ready = asyncio.Event()
+        with self._cond:
+            if self.seq > seq:
+                return
+            self._waiters.append((asyncio.get_running_loop(), ready))
+        try:
+            await asyncio.wait_for(ready.wait(), timeout)
+        except TimeoutError:
+            with self._cond:
+                self._waiters = [w for w in self._waiters if w[1] is not ready]
+
+
+def _event(fields: dict) -> dict:
+    event = {name: fields.get(name) for name in FIELDS}
+    created_at = fields.get("created_at") or timezone.now()
+    event["created_at"] = created_at.isoformat() if hasattr(created_at, "isoformat") else created_at
+    return event
+
+
+class _Relay:
+    """Per-process NOTIFY sender and LISTEN receiver on its own thread and DB connection."""
+
+    def __init__(self, ring: EventRing, size: int = 1000, background: bool = True):
+        self.ring = ring
+        # While the database is unreachable the oldest unsent events give way: the stream is live, not a log
+        self.outbox: deque[dict] = deque(maxlen=size)
+        self._outbox_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="access-event-relay", daemon=True)
+        if background:
+            self.thread.start()
+
+    def send(self, events: list[dict]) -> None:
+        with self._outbox_lock:
+            dropped = max(0, len(self.outbox) + len(events) - self.outbox.maxlen)
+            self.outbox.extend(events)
+        if dropped:
+            metrics.EVENT_STREAM_DROPPED.inc(dropped)
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join(5)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Access event relay failed; reconnecting")
+                self.stopped.wait(1)
+            finally:
+                try:
+                    connection.close()
+                except Exception:  # noqa: BLE001,S110 - the connection is already broken
+                    pass
+
+    def _listen(self):
+        connection.ensure_connection()
+        pg = connection.connection
+        with connection.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL}")
+            while not self.stopped.is_set():
+                self._flush(cur)
+                if select.select([pg], [], [], FLUSH_INTERVAL)[0]:
+                    pg.poll()
+                    while pg.notifies:
+                        self._receive(pg.notifies.pop(0).payload)
+
+    def _flush(self, cur):
+        outbox = self.outbox
+        while outbox:
+            parts, size = [], 0
+            with self._outbox_lock:
+                while outbox and size < MAX_PAYLOAD:
+                    part = json.dumps(outbox.popleft(), separators=(",", ":"))
+                    parts.append(part)
+                    size += len(part) + 1
+            payload = f'{{"o":"{self.ring.origin}","e":[{",".join(parts)}]}}'
+            cur.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+
+    def _receive(self, payload: str):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if message.get("o") != self.ring.origin:
+            self.ring.extend(message.get("e") or [])
+
+
+_ring: EventRing | None = None
+_relay: _Relay | None = None
+_pid: int | None = None
+_lock = threading.Lock()
+
+
+def _fanout() -> bool:
+    return (
+        getattr(settings, "ACCESS_EVENT_STREAM_FANOUT", True)
+        and connection.vendor == "postgresql"
+        and connection.Database.__name__ == "psycopg2"
+    )
+
+
+def _start() -> None:
+    global _ring, _relay, _pid
+    with _lock:
+        if _pid == os.getpid():
+            return
+        # First use in this process (a forked gunicorn worker starts its own ring and relay)
+        size = getattr(settings, "ACCESS_EVENT_STREAM_BUFFER", 1000)
+        _ring = EventRing(size)
+        _relay = _Relay(_ring, size) if _fanout() else None
+        _pid = os.getpid()
+
+
+def stop() -> None:
+    """Stop this process's relay and drop the ring (tests; the relay thread is a daemon otherwise)."""
+    global _ring, _relay, _pid
+    with _lock:
+        if _relay is not None and _pid == os.getpid():
+            _relay.stop()
+        _ring = _relay = _pid = None
+
+
+def get_ring() -> EventRing:
+    if _pid != os.getpid():
+        _start()
+    return _ring
+
+
+def publish(rows) -> None:
+    """Feed recorded AccessEvent rows (dicts of model fields) to live subscribers on every worker."""
+    if not getattr(settings, "ACCESS_EVENT_STREAM", True):
+        return
+    ring = get_ring()
+    events = [_event(fields) for fields in rows]
+    ring.extend(events)
+    if _relay is not None:
+        _relay.send(events)
+
+
+# Server-sent events
+KEEPALIVE = 15.0  # seconds between comments on an idle stream, so proxies keep it open
+RETRY_MS = 2000
+
+
+def _start_seq(ring: EventRing, last_event_id: str) -> int:
+    """Resume after ``Last-Event-ID`` if it was issued by this worker's ring, else start from now."""
+    origin, _, seq = (last_event_id or "").partition(":")
+    if origin == ring.origin and seq.isdigit():
+        return min(int(seq), ring.seq)
+    return ring.seq
+
+
+def _frames(ring: EventRing, seq: int, gate_ids: set[int] | None, codes: dict[int, str]) -> tuple[int, bytes]:
+    """Events after ``seq`` for the selected gates as SSE messages, and the last seq read."""
+    held = ring.after(seq)
+    if not held:
+        return seq, b""
+    parts = []
+    for event_seq, event in held:
+        if gate_ids is None or event.get("access_point_id") in gate_ids:
+            data = json.dumps({"gate": codes.get(event.get("access_point_id")), **event}, separators=(",", ":"))
+            parts.append(f"id: {ring.origin}:{event_seq}\nevent: access\ndata: {data}\n\n")
+    return held[-1][0], "".join(parts).encode()
+
+
+def stream(gate_ids: set[int] | None, codes: dict[int, str], last_event_id: str = "", duration: float | None = None):
+    """SSE body for a sync (WSGI) response; ends after ``duration`` seconds so the worker is released."""
+    ring = get_ring()
+    seq = _start_seq(ring, last_event_id)
+    now = time.monotonic()
+    deadline = None if duration is None else now + duration
+    last_sent = now
+    yield f"retry: {RETRY_MS}\n\n".encode()
+    while deadline is None or now < deadline:
+        seq, body = _frames(ring, seq, gate_ids, codes)
+        if body or now - last_sent >= KEEPALIVE:
+            yield body or b": keep-alive\n\n"
+            last_sent = now
+        ring.wait(seq, KEEPALIVE if deadline is None else min(KEEPALIVE, deadline - now))
+        now = time.monotonic()
+
+
+async def astream(gate_ids: set[int] | None, codes: dict[int, str], last_event_id: str = ""):
+    """SSE body for an ASGI response: waits on the event loop, open until the client disconnects."""
+    ring = get_ring()
+    seq = _start_seq(ring, last_event_id)
+    last_sent = time.monotonic()
+    yield f"retry: {RETRY_MS}\n\n".encode()
+    while True:
+        seq, body = _frames(ring, seq, gate_ids, codes)
+        now = time.monotonic()
+        if body or now - last_sent >= KEEPALIVE:
+            yield body or b": keep-alive\n\n"
+            last_sent = now
+        await ring.await_after(seq, KEEPALIVE)
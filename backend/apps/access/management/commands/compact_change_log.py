@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from apps.access import changelog
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete change-log entries superseded by a later entry for the same object. Consumers at any "
+        "seq still converge, and since=0 keeps returning the complete current state. Safe to run anytime."
+    )
+
+    def handle(self, *args, **opts):
+        self.stdout.write(f"Deleted {changelog.compact()} superseded change-log entries")
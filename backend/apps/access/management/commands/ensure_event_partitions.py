@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.access import partitions
+
+
+class Command(BaseCommand):
+    help = "Pre-create upcoming AccessEvent partitions (PostgreSQL). Run daily from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ahead", type=int, default=3, help="Periods to create beyond the current one")
+
+    def handle(self, *args, **opts):
+        if not partitions.is_partitioned():
+            self.stdout.write("AccessEvent table is not partitioned on this database; nothing to do")
+            return
+        created = partitions.ensure_partitions(ahead=opts["ahead"])
+        for name in created:
+            self.stdout.write(f"Created partition {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} partitions created ({partitions.interval()}ly)"))
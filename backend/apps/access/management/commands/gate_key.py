@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.access import gate_keys
+from apps.access.models import AccessPoint
+
+
+class Command(BaseCommand):
+    help = (
+        "Print the reader key of each gate (all gates without arguments), for the "
+        "'Authorization: Gate <key>' header of the snapshot and heartbeat endpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("codes", nargs="*", help="Gate codes")
+
+    def handle(self, *args, codes, **opts):
+        known = set(AccessPoint.objects.values_list("code", flat=True))
+        unknown = sorted(set(codes) - known)
+        if unknown:
+            raise CommandError(f"Unknown gates: {', '.join(unknown)}")
+        for code in codes or sorted(known):
+            self.stdout.write(f"{code} {gate_keys.gate_key(code)}")
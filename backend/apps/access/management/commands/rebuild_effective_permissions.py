@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from apps.access import effective
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the effective-permission table from permissions and group memberships. Signals keep it "
+        "current; run this after bulk imports or raw SQL that bypassed them. Only differing rows are written."
+    )
+
+    def handle(self, *args, **opts):
+        self.stdout.write(f"Rebuilt effective permissions: {effective.refresh()} rows changed")
@@ -0,0 +1,45 @@
+import asyncio
+import signal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.access import authz
+from apps.access.verify_server import VerifyServer
+
+
+class Command(BaseCommand):
+    help = "Serve the binary verify protocol (apps.access.verify_server) for reader controllers over TCP/UDP."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="0.0.0.0")  # noqa: S104 - readers connect from the LAN
+        parser.add_argument("--port", type=int, default=8002, help="TCP port; 0 picks a free one, -1 disables TCP")
+        parser.add_argument("--udp-port", type=int, default=None, help="Also answer single-frame UDP datagrams")
+        parser.add_argument("--reuse-port", action="store_true",
+                            help="SO_REUSEPORT, so several processes can share the port (one per core)")
+        parser.add_argument("--idle-timeout", type=float, default=300.0,
+                            help="Close TCP connections silent for this many seconds (0 = never)")
+        parser.add_argument("--loop", choices=["asyncio", "uvloop"], default="asyncio")
+
+    def handle(self, *args, **opts):
+        if opts["loop"] == "uvloop":
+            import uvloop  # optional dependency, only needed for this loop
+
+            uvloop.run(self._serve(opts))
+        else:
+            asyncio.run(self._serve(opts))
+
+    async def _serve(self, opts):
+        if getattr(settings, "ACCESS_AUTHZ_SNAPSHOT", True):
+            await sync_to_async(authz.get_snapshot)()  # first taps should not wait for the build
+        server = VerifyServer(idle_timeout=opts["idle_timeout"])
+        port = opts["port"] if opts["port"] >= 0 else None
+        for transport, host, bound_port in await server.start(opts["host"], port, opts["udp_port"], opts["reuse_port"]):
+            self.stdout.write(f"Binary verify protocol on {transport} {host}:{bound_port}")
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await stop.wait()
+        await server.close()
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-17 19:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('access', '0002_accesspermission_access_acce_access__9a3b45_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='accessevent',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-17 19:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('access', '0003_accessevent_created_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accessevent',
+            index=models.Index(fields=['created_at'], name='access_acce_created_429dfa_idx'),
+        ),
+    ]
@@ -0,0 +1,107 @@
+"""Convert access_accessevent into a table range-partitioned by created_at.
+
+PostgreSQL only; other backends keep the plain table. Existing rows are
+copied into per-period partitions, and indexes and foreign keys are
+recreated under their original names so later Django migrations still find
+them. The primary key becomes (id, created_at) because PostgreSQL requires
+the partition key in every unique constraint; ids still come from a single
+sequence, so Django's ``pk`` lookups keep working.
+"""
+import re
+from datetime import UTC, date, datetime, timedelta
+
+from django.conf import settings
+from django.db import migrations
+
+# Frozen copies of the apps.access.partitions helpers as of this migration, so that
+# replaying the history does not depend on the current module.
+TABLE = "access_accessevent"
+DEFAULT_PARTITION = f"{TABLE}_default"
+LEGACY = f"{TABLE}_legacy"
+SEQUENCE = f"{TABLE}_part_id_seq"
+
+
+def _period_start(day: date, unit: str) -> date:
+    return day if unit == "day" else day.replace(day=1)
+
+
+def _next_period(start: date, unit: str) -> date:
+    if unit == "day":
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _bound(day: date) -> str:
+    return datetime(day.year, day.month, day.day, tzinfo=UTC).isoformat()
+
+
+def _create_partition_sql(start: date, end: date, unit: str) -> str:
+    name = f"{TABLE}_p{start:%Y_%m_%d}" if unit == "day" else f"{TABLE}_p{start:%Y_%m}"
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{TABLE}" '
+        f"FOR VALUES FROM ('{_bound(start)}') TO ('{_bound(end)}')"
+    )
+
+
+def partition_table(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != "postgresql":
+        return
+    unit = getattr(settings, "ACCESS_EVENT_PARTITION_INTERVAL", "month")
+    with conn.cursor() as cur:
+        cur.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{LEGACY}"')
+        cur.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [LEGACY, f"{TABLE}_pkey"],
+        )
+        indexes = cur.fetchall()
+        cur.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [LEGACY],
+        )
+        foreign_keys = cur.fetchall()
+        cur.execute(f'SELECT MIN(created_at), COALESCE(MAX(id), 0) FROM "{LEGACY}"')
+        oldest, max_id = cur.fetchone()
+
+        cur.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{LEGACY}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f"PARTITION BY RANGE (created_at)"
+        )
+        cur.execute(f'CREATE SEQUENCE "{SEQUENCE}"')
+        cur.execute(f"""ALTER TABLE "{TABLE}" ALTER COLUMN id SET DEFAULT nextval('"{SEQUENCE}"')""")
+        cur.execute(f'ALTER SEQUENCE "{SEQUENCE}" OWNED BY "{TABLE}".id')
+        cur.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+
+        today = datetime.now(UTC).date()
+        first = oldest.astimezone(UTC).date() if oldest else today
+        last = today
+        for _ in range(3):
+            last = _next_period(_period_start(last, unit), unit)
+        start = _period_start(first, unit)
+        while start <= last:
+            end = _next_period(start, unit)
+            cur.execute(_create_partition_sql(start, end, unit))
+            start = end
+
+        cur.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{LEGACY}"')
+        cur.execute("SELECT setval(%s, %s + 1, false)", [SEQUENCE, max_id])
+        cur.execute(f'DROP TABLE "{LEGACY}"')
+
+        cur.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY (id, created_at)')
+        for _name, indexdef in indexes:
+            cur.execute(re.sub(rf' ON (\S+\.)?"?{LEGACY}"? ', f' ON "{TABLE}" ', indexdef))
+        for name, definition in foreign_keys:
+            cur.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('access', '0004_accessevent_created_at_index'),
+    ]
+
+    operations = [
+        # Reversing leaves the partitioned table in place; Django uses it exactly like the plain one.
+        migrations.RunPython(partition_table, migrations.RunPython.noop),
+    ]
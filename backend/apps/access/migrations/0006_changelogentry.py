@@ -0,0 +1,75 @@
+# Generated by Django 5.0.14 on 2026-10-17 20:23
+
+import hashlib
+from itertools import islice
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Frozen copy of the apps.access.changelog entry format as of this migration, so that
+# replaying the history does not depend on the current module.
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _current_state(apps, entry_model):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    def upsert(kind, object_id, data):
+        return entry_model(kind=kind, object_id=str(object_id), op="upsert", data=data)
+
+    sources = [
+        (apps.get_model("access", "AccessPoint").objects.all(), lambda ap: upsert("gate", ap.pk, {"code": ap.code})),
+        (User.objects.only("id", "is_active"), lambda u: upsert("user", u.pk, {"active": u.is_active})),
+        (apps.get_model("access", "AccessPermission").objects.all(), lambda p: upsert("permission", p.pk, {
+            "gate": p.access_point_id, "user": p.user_id, "group": p.group_id, "allow": p.allow,
+        })),
+        (apps.get_model("authtoken", "Token").objects.only("key", "user_id"),
+         lambda t: upsert("token", _digest(t.key), {"user": t.user_id})),
+        (apps.get_model("devices", "Device").objects.only("id", "user_id", "is_active", "auth_token"),
+         lambda d: upsert("device", d.pk, {"user": d.user_id, "active": d.is_active, "token": _digest(d.auth_token)})),
+    ]
+    for queryset, build in sources:
+        for instance in queryset.order_by("pk").iterator(chunk_size=5000):
+            yield build(instance)
+    memberships = User._meta.get_field("groups").remote_field.through.objects.order_by("pk")
+    for user_id, group_id in memberships.values_list("user_id", "group_id").iterator(chunk_size=5000):
+        yield upsert("membership", f"{user_id}:{group_id}", {"user": user_id, "group": group_id})
+
+
+def seed_change_log(apps, schema_editor):
+    """Log the current state as upserts, so ``since=0`` bootstraps a consumer from existing data."""
+    entry_model = apps.get_model("access", "ChangeLogEntry")
+    entries = _current_state(apps, entry_model)
+    while batch := list(islice(entries, 5000)):
+        entry_model.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('access', '0005_partition_accessevent'),
+        ('authtoken', '0004_alter_tokenproxy_options'),
+        ('devices', '0004_device_registry_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=16)),
+                ('object_id', models.CharField(max_length=64)),
+                ('op', models.CharField(max_length=8)),
+                ('data', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'object_id', 'seq'], name='access_chan_kind_0b4fd0_idx')],
+            },
+        ),
+        migrations.RunPython(seed_change_log, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.14 on 2026-10-17 20:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('access', '0006_changelogentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accessevent',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='accessevent',
+            constraint=models.UniqueConstraint(
+                fields=('idempotency_key', 'created_at'), name='access_event_idempotency_key'
+            ),
+        ),
+    ]
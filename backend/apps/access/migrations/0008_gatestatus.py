@@ -0,0 +1,26 @@
+# Generated by Django 5.0.14 on 2026-10-17 20:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('access', '0007_accessevent_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GateStatus',
+            fields=[
+                ('access_point', models.OneToOneField(
+                    on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='status',
+                    serialize=False, to='access.accesspoint',
+                )),
+                ('last_seen', models.DateTimeField()),
+                ('firmware', models.CharField(blank=True, max_length=32)),
+                ('rssi', models.SmallIntegerField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.14 on 2026-10-17 20:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_effective_permissions(apps, schema_editor):
+    """Resolve the existing permissions, so verify keeps answering the same (plus deny overrides)."""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    model = apps.get_model("access", "EffectivePermission")
+    permissions = apps.get_model("access", "AccessPermission").objects.all()
+    members_by_group = {}
+    for user_id, group_id in User._meta.get_field("groups").remote_field.through.objects.values_list(
+        "user_id", "group_id",
+    ):
+        members_by_group.setdefault(group_id, []).append(user_id)
+
+    rows = list(permissions.filter(user__isnull=False).values_list("access_point_id", "user_id", "allow"))
+    for ap_id, group_id, allow in permissions.filter(group__isnull=False).values_list(
+        "access_point_id", "group_id", "allow",
+    ):
+        rows.extend((ap_id, user_id, allow) for user_id in members_by_group.get(group_id, ()))
+
+    # A deny wins over every grant, as in apps.access.effective.compute
+    resolved = {}
+    for ap_id, user_id, allow in rows:
+        resolved[ap_id, user_id] = resolved.get((ap_id, user_id), True) and allow
+    model.objects.bulk_create(
+        [model(access_point_id=ap_id, user_id=user_id, allow=allow) for (ap_id, user_id), allow in resolved.items()],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('access', '0008_gatestatus'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EffectivePermission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('allow', models.BooleanField()),
+                ('access_point', models.ForeignKey(
+                    db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                    to='access.accesspoint',
+                )),
+                ('user', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL,
+                )),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='effectivepermission',
+            constraint=models.UniqueConstraint(fields=('access_point', 'user'), name='effective_perm_gate_user_uniq'),
+        ),
+        migrations.RunPython(fill_effective_permissions, migrations.RunPython.noop),
+    ]
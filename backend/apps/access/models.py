@@ -2,6 +2,9 @@ from django.conf import settings
 from django.contrib.auth.models import Group
 from django.db import models
 from django.db.models import Q
+from django.utils import timezone
+
+from .querysets import ChangeLoggedQuerySet
 
 
 class AccessPoint(models.Model):
@@ -9,6 +12,8 @@ class AccessPoint(models.Model):
     name = models.CharField(max_length=128, blank=True)
     location = models.CharField(max_length=128, blank=True)
 
+    objects = ChangeLoggedQuerySet.as_manager()
+
     def __str__(self):
         return self.code
 
@@ -18,6 +23,8 @@ class AccessPermission(models.Model):
     group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True, blank=True)
     allow = models.BooleanField(default=True)
 
+    objects = ChangeLoggedQuerySet.as_manager()
+
     class Meta:
         unique_together = (("access_point", "user", "group"),)
         constraints = [
@@ -31,6 +38,18 @@ class AccessPermission(models.Model):
             models.Index(fields=["access_point", "group"]),
         ]
 
+class EffectivePermission(models.Model):
+    """Resolved access of a user at a gate: direct and group rows combined, a deny wins (see apps.access.effective)."""
+    access_point = models.ForeignKey(AccessPoint, on_delete=models.CASCADE, db_index=False, related_name="+")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    allow = models.BooleanField()
+
+    class Meta:
+        constraints = [
+            # verify probes (gate, user); gate snapshots scan by gate
+            models.UniqueConstraint(fields=["access_point", "user"], name="effective_perm_gate_user_uniq"),
+        ]
+
 class AccessEvent(models.Model):
     access_point = models.ForeignKey(AccessPoint, on_delete=models.SET_NULL, null=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
@@ -38,4 +57,44 @@ class AccessEvent(models.Model):
     decision = models.CharField(max_length=10)  # "ALLOW"/"DENY"
     reason = models.CharField(max_length=64, blank=True)
     raw = models.JSONField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set by the caller at decision time: buffered sinks insert rows later in batches
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Client-side key of events uploaded through /access/events/bulk; NULL for events recorded here
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        # On PostgreSQL the table is range-partitioned by created_at (see apps.access.partitions)
+        indexes = [
+            models.Index(fields=["created_at"]),
+        ]
+        constraints = [
+            # A partitioned table's unique keys must include created_at; a resent event carries the same one
+            models.UniqueConstraint(fields=["idempotency_key", "created_at"], name="access_event_idempotency_key"),
+        ]
+
+class ChangeLogEntry(models.Model):
+    """One change to sync-relevant state; served in ``seq`` order by the sync feed (see apps.access.changelog)."""
+    seq = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=16)  # gate/permission/membership/token/device/user
+    object_id = models.CharField(max_length=64)
+    op = models.CharField(max_length=8)  # "upsert"/"delete"
+    data = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            # compaction looks up later entries for the same object
+            models.Index(fields=["kind", "object_id", "seq"]),
+        ]
+
+class GateStatus(models.Model):
+    """Last heartbeat of a gate, copied in batches from the shared in-memory table (see apps.access.heartbeats)."""
+    access_point = models.OneToOneField(AccessPoint, on_delete=models.CASCADE, primary_key=True, related_name="status")
+    last_seen = models.DateTimeField()
+    firmware = models.CharField(max_length=32, blank=True)
+    rssi = models.SmallIntegerField(null=True, blank=True)  # dBm reported by the reader's Wi-Fi
+
+class CacheVersion(models.Model):
+    """Version of a worker-local cache, bumped on commit so every host sees changes (see apps.access.versions)."""
+    name = models.CharField(max_length=64, primary_key=True)
+    value = models.BigIntegerField(default=0)
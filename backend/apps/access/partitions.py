@@ -0,0 +1,133 @@
+"""Range partitioning of ``access_accessevent`` by ``created_at`` (PostgreSQL only).
+
+Migration ``0005_partition_accessevent`` turns the table into a partitioned
+parent with one child per day or month, named ``access_accessevent_pYYYY_MM``
+or ``access_accessevent_pYYYY_MM_DD``, plus a DEFAULT catch-all so an insert
+can never fail for lack of a partition. ``ensure_event_partitions`` creates
+upcoming partitions ahead of time and ``purge_access_events`` drops whole
+expired partitions instead of deleting rows. On other databases (SQLite in
+dev/tests) the table stays a plain table and these helpers are no-ops.
+"""
+from datetime import UTC, date, datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+
+TABLE = "access_accessevent"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def interval() -> str:
+    return getattr(settings, "ACCESS_EVENT_PARTITION_INTERVAL", "month")
+
+
+def period_start(day: date, unit: str) -> date:
+    return day if unit == "day" else day.replace(day=1)
+
+
+def next_period(start: date, unit: str) -> date:
+    if unit == "day":
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(start: date, unit: str) -> str:
+    if unit == "day":
+        return f"{TABLE}_p{start:%Y_%m_%d}"
+    return f"{TABLE}_p{start:%Y_%m}"
+
+
+def periods(first: date, last: date, unit: str) -> list[tuple[date, date]]:
+    """Consecutive ``[start, end)`` periods covering ``first`` through ``last``."""
+    result = []
+    start = period_start(first, unit)
+    while start <= last:
+        end = next_period(start, unit)
+        result.append((start, end))
+        start = end
+    return result
+
+
+def _bound(day: date) -> str:
+    return datetime(day.year, day.month, day.day, tzinfo=UTC).isoformat()
+
+
+def create_partition_sql(start: date, end: date, unit: str) -> str:
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(start, unit)}" PARTITION OF "{TABLE}" '
+        f"FOR VALUES FROM ('{_bound(start)}') TO ('{_bound(end)}')"
+    )
+
+
+def is_partitioned(conn=connection) -> bool:
+    if conn.vendor != "postgresql":
+        return False
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [TABLE],
+        )
+        return cur.fetchone() is not None
+
+
+def list_partitions(conn=connection) -> list[tuple[str, datetime, datetime]]:
+    """``(name, lower, upper)`` for every bounded partition, oldest first."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT c.relname,
+                   (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM \\(''([^'']+)''\\)'))[1]::timestamptz,
+                   (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'TO \\(''([^'']+)''\\)'))[1]::timestamptz
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = %s AND pg_table_is_visible(p.oid) AND c.relname <> %s
+            ORDER BY 2
+            """,
+            [TABLE, DEFAULT_PARTITION],
+        )
+        return cur.fetchall()
+
+
+def ensure_partitions(
+    ahead: int = 3, today: date | None = None, unit: str | None = None, conn=connection, since: date | None = None
+) -> list[str]:
+    """Create partitions from the current period (or ``since``) through ``ahead`` periods ahead.
+
+    Returns names created. ``since`` is for back-filling history, e.g. benchmark seeds.
+    """
+    unit = unit or interval()
+    today = today or datetime.now(UTC).date()
+    last = today
+    for _ in range(ahead):
+        last = next_period(period_start(last, unit), unit)
+    existing = {name for name, _, _ in list_partitions(conn)}
+    created = []
+    with transaction.atomic(using=conn.alias), conn.cursor() as cur:
+        for start, end in periods(min(since or today, today), last, unit):
+            name = partition_name(start, unit)
+            if name not in existing:
+                cur.execute(create_partition_sql(start, end, unit))
+                created.append(name)
+    return created
+
+
+def drop_partitions_before(cutoff: datetime, conn=connection) -> list[tuple[str, int]]:
+    """Detach and drop every partition whose upper bound is at or before ``cutoff``.
+
+    This is a catalog operation whose cost does not depend on the number of
+    rows. Returns ``(name, estimated_rows)`` per dropped partition, using the
+    planner's ``reltuples`` estimate so no partition is scanned.
+    """
+    dropped = []
+    for name, _lower, upper in list_partitions(conn):
+        if upper > cutoff:
+            break
+        with transaction.atomic(using=conn.alias), conn.cursor() as cur:
+            cur.execute("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE relname = %s", [name])
+            rows = cur.fetchone()[0]
+            cur.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+            cur.execute(f'DROP TABLE "{name}"')
+        dropped.append((name, rows))
+    return dropped
@@ -0,0 +1,52 @@
+"""Querysets that keep the change log complete under bulk writes.
+
+``bulk_create``, ``bulk_update`` and ``update()`` send no signals, so the
+change log receivers in :mod:`.signals` never see them. The models this app
+owns and syncs (gates, permissions, devices) use :class:`ChangeLoggedQuerySet`
+as their manager, which logs the written rows itself in the same transaction.
+Queryset ``delete()`` needs nothing here: the ``post_delete`` receivers make
+Django delete row by row and signal each one.
+
+Tokens, users and group memberships are not our models; code that bulk-writes
+them calls :func:`.changelog.record_many` itself, which a test enforces.
+"""
+from django.db import models, transaction
+
+BATCH_SIZE = 5000
+
+
+class ChangeLoggedQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            # Rows skipped by ignore_conflicts come back without a pk
+            self._log(obj for obj in objs if obj.pk is not None)
+        return objs
+
+    bulk_create.alters_data = True
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            updated = super().bulk_update(objs, fields, batch_size=batch_size)
+            self._log(objs)
+        return updated
+
+    bulk_update.alters_data = True
+
+    def update(self, **kwargs):
+        with transaction.atomic(using=self.db, savepoint=False):
+            # The filter may no longer match once updated: remember the rows first
+            pks = list(self.values_list("pk", flat=True))
+            updated = super().update(**kwargs)
+            base = self.model._base_manager.using(self.db)
+            for start in range(0, len(pks), BATCH_SIZE):
+                self._log(base.filter(pk__in=pks[start:start + BATCH_SIZE]))
+        return updated
+
+    update.alters_data = True
+
+    def _log(self, objs):
+        from . import changelog  # changelog imports the models that use this queryset
+
+        changelog.record_many(changelog.entry(obj) for obj in objs)
@@ -0,0 +1,193 @@
+"""GCRA rate limiting with O(1) state per key.
+
+The generic cell rate algorithm keeps a single number per key, the
+*theoretical arrival time* (TAT), instead of a list of request timestamps.
+For a rate of ``n`` requests per ``period`` the emission interval is
+``period / n``; a request is allowed if it does not push the TAT more than
+one ``period`` into the future, which gives the same "n per window" burst as
+DRF's ``SimpleRateThrottle``.
+
+Backends only store TATs:
+
+* :class:`SharedMemoryBackend` - a set-associative table in an mmap file,
+  shared by every worker on the host (default);
+* :class:`RedisBackend` - one key per client, updated atomically by a Lua
+  script, for multi-host deployments;
+* :class:`InMemoryBackend` - process-local dict, a stand-in for either of the
+  above in tests.
+"""
+import fcntl
+import hashlib
+import struct
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from core.shared import open_shared_file
+
+_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+# Float slack for TATs around 1.7e9 seconds, where doubles are only ~0.2us apart
+_EPSILON = 1e-6
+
+
+def parse_rate(rate: str) -> tuple[int, int]:
+    """Parse DRF-style rates such as ``"30/second"`` into ``(requests, seconds)``."""
+    num, period = rate.split("/")
+    return int(num), _PERIODS[period[0]]
+
+
+def gcra(tat: float, now: float, interval: float, period: float) -> tuple[float, float]:
+    """One GCRA step. Returns ``(new_tat, wait)``; ``wait == 0`` means allowed."""
+    new_tat = max(tat, now) + interval
+    allow_at = new_tat - period
+    if allow_at - now > _EPSILON:
+        return tat, allow_at - now
+    return new_tat, 0.0
+
+
+class InMemoryBackend:
+    blocking = False
+
+    def __init__(self):
+        self._tats: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, now: float, interval: float, period: float) -> float:
+        with self._lock:
+            tat, wait = gcra(self._tats.get(key, 0.0), now, interval, period)
+            self._tats[key] = tat
+            return wait
+
+    def reset(self):
+        with self._lock:
+            self._tats.clear()
+
+
+class SharedMemoryBackend:
+    """Set-associative TAT table in a memory-mapped file.
+
+    Each key hashes to one bucket of ``ways`` slots; a slot is a 64-bit key
+    hash plus a TAT double. Only that bucket's bytes are locked (``lockf``)
+    while it is updated. When a bucket is full the slot with the oldest TAT is
+    reused, which only ever forgets clients that have been idle longest.
+    """
+
+    _SLOT = struct.Struct("<Qd")
+
+    blocking = False  # a page-cache mmap update under a short file lock
+
+    def __init__(self, name="ratelimit", buckets=8192, ways=8):
+        self.name = name
+        self.buckets = buckets
+        self.ways = ways
+        self._bucket_size = self._SLOT.size * ways
+        self._fd: int | None = None
+        self._mm = None
+        self._init_lock = threading.Lock()
+        # lockf() excludes other processes only; threads of this process share the lock owner
+        self._thread_locks = [threading.Lock() for _ in range(64)]
+
+    def _map(self):
+        if self._mm is None:
+            with self._init_lock:
+                if self._mm is None:
+                    self._fd, self._mm = open_shared_file(f"{self.name}.table", self.buckets * self._bucket_size)
+        return self._mm
+
+    def hit(self, key: str, now: float, interval: float, period: float) -> float:
+        mm = self._map()
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        bucket = digest % self.buckets
+        base = bucket * self._bucket_size
+        with self._thread_locks[bucket % len(self._thread_locks)]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self._bucket_size, base)
+            try:
+                slot, tat = self._find(mm, base, digest)
+                new_tat, wait = gcra(tat, now, interval, period)
+                self._SLOT.pack_into(mm, slot, digest, new_tat)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self._bucket_size, base)
+        return wait
+
+    def _find(self, mm, base: int, digest: int) -> tuple[int, float]:
+        victim, victim_tat = base, float("inf")
+        for offset in range(base, base + self._bucket_size, self._SLOT.size):
+            slot_digest, tat = self._SLOT.unpack_from(mm, offset)
+            if slot_digest == digest:
+                return offset, tat
+            if tat < victim_tat:
+                victim, victim_tat = offset, tat
+        return victim, 0.0
+
+    def reset(self):
+        mm = self._map()
+        mm[:] = bytes(len(mm))
+
+
+class RedisBackend:
+    """TATs in Redis, updated by one atomic EVAL per request.
+
+    ``client`` may be any object with a redis-py compatible ``eval``; when it is
+    omitted a client is created from ``url`` (redis-py is then required).
+    """
+
+    blocking = True  # network round trip
+
+    SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local period = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+if tat < now then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - period
+if allow_at - now > 1e-6 then return tostring(allow_at - now) end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return '0'
+"""
+
+    def __init__(self, url="redis://localhost:6379/0", client=None, prefix="rl:"):
+        if client is None:
+            import redis  # optional dependency, only needed for this backend
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def hit(self, key: str, now: float, interval: float, period: float) -> float:
+        return float(self.client.eval(self.SCRIPT, 1, self.prefix + key, repr(now), repr(interval), repr(period)))
+
+
+class RateLimiter:
+    def __init__(self, backend, clock=time.time):
+        self.backend = backend
+        self.clock = clock
+
+    def hit(self, key: str, rate: str) -> float:
+        """Count one request for ``key``; returns seconds to wait, ``0`` if allowed."""
+        num, period = parse_rate(rate)
+        return self.backend.hit(key, self.clock(), period / num, period)
+
+    async def ahit(self, key: str, rate: str) -> float:
+        """:meth:`hit` for async views; backends that do network I/O run in a thread."""
+        if getattr(self.backend, "blocking", True):
+            return await sync_to_async(self.hit, thread_sensitive=False)(key, rate)
+        return self.hit(key, rate)
+
+
+_limiter: RateLimiter | None = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                conf = getattr(settings, "ACCESS_RATE_LIMIT", {})
+                backend = import_string(conf.get("BACKEND", "apps.access.ratelimit.SharedMemoryBackend"))
+                _limiter = RateLimiter(backend(**conf.get("OPTIONS", {})))
+    return _limiter
@@ -0,0 +1,145 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from apps.devices.models import Device
+
+from . import authz, changelog, devices, effective
+from .models import AccessPermission, AccessPoint
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=AccessPoint)
+@receiver(post_delete, sender=AccessPoint)
+@receiver(post_save, sender=AccessPermission)
+@receiver(post_delete, sender=AccessPermission)
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=User)
+def invalidate_authz_snapshot(sender, **kwargs):
+    authz.invalidate()
+
+
+@receiver(post_save, sender=User)
+def invalidate_on_user_change(sender, instance, update_fields=None, **kwargs):
+    # Skip saves that cannot change a decision, e.g. last_login on every sign-in
+    if update_fields is None or "is_active" in update_fields:
+        authz.invalidate()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_on_membership_change(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        authz.invalidate()
+
+
+@receiver(post_save, sender=Device)
+def refresh_device_registry(sender, **kwargs):
+    # Devices are not part of the authz snapshot: token rotation on every app
+    # start only makes workers re-read recently updated devices.
+    devices.changed()
+
+
+@receiver(post_delete, sender=Device)
+def reload_device_registry(sender, **kwargs):
+    devices.removed()
+
+
+# Change log for incremental sync (apps.access.changelog)
+
+@receiver(post_save, sender=AccessPoint)
+@receiver(post_save, sender=AccessPermission)
+@receiver(post_save, sender=Token)
+@receiver(post_save, sender=Device)
+@receiver(post_save, sender=User)
+def log_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if sender is User and update_fields is not None and "is_active" not in update_fields:
+        return  # last_login and the like are not synced
+    changelog.record(changelog.entry(instance))
+
+
+@receiver(post_delete, sender=AccessPoint)
+@receiver(post_delete, sender=AccessPermission)
+@receiver(post_delete, sender=Token)
+@receiver(post_delete, sender=Device)
+@receiver(post_delete, sender=User)
+def log_deletion(sender, instance, **kwargs):
+    changelog.record(changelog.entry(instance, deleted=True))
+
+
+@receiver(pre_delete, sender=User)
+@receiver(pre_delete, sender=Group)
+def log_cascaded_memberships(sender, instance, **kwargs):
+    # Membership rows go with the user or group without an m2m_changed signal
+    field = "user" if sender is User else "group"
+    pairs = User.groups.through.objects.filter(**{field: instance}).values_list("user_id", "group_id")
+    changelog.record_many(changelog.membership(user_id, group_id, deleted=True) for user_id, group_id in pairs)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def log_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        # pk_set is not provided for clear(): log what is about to be removed
+        field = "group" if reverse else "user"
+        pairs = sender.objects.filter(**{field: instance}).values_list("user_id", "group_id")
+    elif action in ("post_add", "post_remove"):
+        pairs = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+    else:
+        return
+    deleted = action != "post_add"
+    changelog.record_many(changelog.membership(user_id, group_id, deleted) for user_id, group_id in pairs)
+
+
+# Effective permissions (apps.access.effective)
+
+@receiver(pre_save, sender=AccessPermission)
+def remember_permission_scope(sender, instance, raw=False, **kwargs):
+    # An edit may move the row to another gate, user or group: the old scope needs a refresh too
+    if raw or instance.pk is None:
+        return
+    instance._effective_previous = sender.objects.filter(pk=instance.pk).values_list(
+        "access_point_id", "user_id", "group_id").first()
+
+
+@receiver(post_save, sender=AccessPermission)
+@receiver(post_delete, sender=AccessPermission)
+def refresh_permission_scope(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    scopes = [(instance.access_point_id, instance.user_id, instance.group_id)]
+    previous = getattr(instance, "_effective_previous", None)
+    if previous is not None and previous != scopes[0]:
+        scopes.append(previous)
+    for gate_id, user_id, group_id in scopes:
+        effective.refresh(effective.permission_users(user_id, group_id), {gate_id})
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def refresh_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        # As with the change log: the members are gone by post_clear
+        instance._effective_cleared = (
+            set(sender.objects.filter(group=instance).values_list("user_id", flat=True)) if reverse else {instance.pk}
+        )
+    elif action == "post_clear":
+        effective.refresh(getattr(instance, "_effective_cleared", set()))
+    elif action in ("post_add", "post_remove"):
+        effective.refresh(set(pk_set) if reverse else {instance.pk})
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_members(sender, instance, **kwargs):
+    # Memberships are deleted before the group's permissions, without signals
+    instance._effective_members = set(User.groups.through.objects.filter(group=instance).values_list(
+        "user_id", flat=True))
+
+
+@receiver(post_delete, sender=Group)
+def refresh_group_members(sender, instance, **kwargs):
+    effective.refresh(getattr(instance, "_effective_members", set()))
@@ -0,0 +1,383 @@
+"""Compact binary verify protocol for reader controllers (``manage.py serve_verify``).
+
+Same decisions, rate limit and AccessEvent rows as ``AccessVerifyView``, but
+without HTTP: a reader keeps one TCP connection open (or sends UDP
+datagrams) and a tap is a frame of a few dozen bytes. Integers are
+big-endian; a frame is a u16 body length followed by the body.
+
+Request body::
+
+    u8 version (1) | u8 type | u32 nonce | VERIFY only: u8 length, gate id | u8 length, token
+
+Response body::
+
+    u8 version | u8 type | u32 nonce (echoed) | VERIFY_RESULT only: u8 allow | u8 reason | u16 duration_ms
+
+``VERIFY`` (0x01) is answered with ``VERIFY_RESULT`` (0x81), ``PING`` (0x02)
+with ``PONG`` (0x82); an open connection answering pings replaces the
+``/health`` GET before every verify. ``ERROR`` (0x8F) means the server
+could not decide (fall back to HTTP). The reason byte indexes
+:data:`REASON_CODES`. Requests on one connection may be pipelined; answers
+come back in request order. A frame that cannot be delimited (body over
+:data:`MAX_BODY` or shorter than the header, version other than 1) closes
+the connection.
+
+Over UDP a datagram carries exactly one frame. An identical datagram from the
+same address within :data:`UDP_REPLAY_WINDOW` seconds (a retransmit) gets the
+cached answer instead of a second decision and audit row.
+"""
+import asyncio
+import logging
+import socket
+import struct
+import time
+from collections import OrderedDict, deque
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from apps.api.v1 import fastpath
+from apps.api.v1.constants import (
+    REASON_DEVICE_INACTIVE,
+    REASON_DEVICE_MISMATCH,
+    REASON_DEVICE_NOT_FOUND,
+    REASON_INVALID_REQUEST,
+    REASON_NO_PERMISSION,
+    REASON_OK,
+    REASON_RATE_LIMIT,
+    REASON_TOKEN_INVALID,
+    REASON_UNKNOWN_GATE,
+)
+from apps.api.v1.throttling import GateRateThrottle
+from core import metrics, timing
+
+from . import authz, events
+
+logger = logging.getLogger("apps.access.verify_server")
+
+VERSION = 1
+VERIFY, PING = 0x01, 0x02
+VERIFY_RESULT, PONG, ERROR = 0x81, 0x82, 0x8F
+
+# Reader firmware has these compiled in: append only
+REASON_CODES = (
+    REASON_OK,
+    REASON_UNKNOWN_GATE,
+    REASON_TOKEN_INVALID,
+    REASON_NO_PERMISSION,
+    REASON_INVALID_REQUEST,
+    REASON_RATE_LIMIT,
+    REASON_DEVICE_NOT_FOUND,
+    REASON_DEVICE_INACTIVE,
+    REASON_DEVICE_MISMATCH,
+)
+_REASON_CODE = {reason: code for code, reason in enumerate(REASON_CODES)}
+
+THROTTLE_SCOPE = "access_verify"  # shares the HTTP endpoint's rate and limiter keys
+MAX_BODY = 6 + 1 + 255 + 1 + 255
+MAX_PIPELINE = 256  # frames queued per connection before reading pauses
+UDP_BACKLOG = 4096  # datagrams queued before new ones are dropped
+UDP_REPLAY_WINDOW = 2.0
+UDP_REPLAY_SIZE = 8192
+
+_LENGTH = struct.Struct(">H")
+_HEADER = struct.Struct(">BBI")
+_REPLY = struct.Struct(">HBBI")
+_RESULT = struct.Struct(">HBBIBBH")
+
+
+class ProtocolError(Exception):
+    """The frame cannot be delimited or understood; the connection is closed."""
+
+
+def encode_verify(nonce: int, gate_id: str, token: str) -> bytes:
+    """Client side: a ``VERIFY`` frame (for tests, load generators and reader ports)."""
+    gate, tok = gate_id.encode(), token.encode()
+    body = _HEADER.pack(VERSION, VERIFY, nonce) + bytes([len(gate)]) + gate + bytes([len(tok)]) + tok
+    return _LENGTH.pack(len(body)) + body
+
+
+def encode_ping(nonce: int) -> bytes:
+    return _REPLY.pack(_HEADER.size, VERSION, PING, nonce)
+
+
+def decode_response(frame: bytes) -> tuple[int, int, str | None, str | None]:
+    """Client side: ``(type, nonce, decision, reason)`` of one response frame, length prefix included."""
+    _size, _version, kind, nonce = _REPLY.unpack_from(frame)
+    if kind != VERIFY_RESULT:
+        return kind, nonce, None, None
+    allow, code = frame[_REPLY.size], frame[_REPLY.size + 1]
+    return kind, nonce, "ALLOW" if allow else "DENY", REASON_CODES[code]
+
+
+def _reply(kind: int, nonce: int) -> bytes:
+    return _REPLY.pack(_HEADER.size, VERSION, kind, nonce)
+
+
+def _result(nonce: int, decision: str, reason: str) -> bytes:
+    allow = decision == "ALLOW"
+    return _RESULT.pack(
+        _RESULT.size - _LENGTH.size, VERSION, VERIFY_RESULT, nonce,
+        allow, _REASON_CODE[reason], fastpath.ALLOW_DURATION_MS if allow else 0,
+    )
+
+
+def _field(body: bytes, offset: int) -> tuple[str | None, int]:
+    """Length-prefixed UTF-8 string at ``offset``; ``(None, -1)`` if truncated or not UTF-8."""
+    if offset >= len(body):
+        return None, -1
+    end = offset + 1 + body[offset]
+    if end > len(body):
+        return None, -1
+    try:
+        return body[offset + 1:end].decode(), end
+    except UnicodeDecodeError:
+        return None, -1
+
+
+def parse_fields(body: bytes) -> tuple[str | None, str | None]:
+    """``(gate_id, token)`` of a ``VERIFY`` body; ``None`` for a field that is missing or malformed."""
+    gate_id, offset = _field(body, _HEADER.size)
+    if offset < 0:
+        return None, None
+    token, end = _field(body, offset)
+    if end != len(body):
+        return gate_id, None
+    return gate_id, token
+
+
+class VerifyServer:
+    """TCP and UDP listeners sharing one decision path; run by ``manage.py serve_verify``."""
+
+    def __init__(self, idle_timeout: float = 300.0):
+        self.idle_timeout = idle_timeout
+        self.throttle = GateRateThrottle()
+        self.connections: set[_StreamProtocol] = set()
+        self._servers: list[asyncio.AbstractServer] = []
+        self._datagrams: list[_DatagramProtocol] = []
+        self._sweeper: asyncio.Task | None = None
+
+    async def handle(self, body: bytes, ip: str) -> tuple[bytes, dict | None]:
+        """Answer one request body; returns the response frame and the AccessEvent row to record, if any."""
+        if len(body) < _HEADER.size:
+            raise ProtocolError(f"short frame ({len(body)} bytes)")
+        version, kind, nonce = _HEADER.unpack_from(body)
+        if version != VERSION:
+            raise ProtocolError(f"unsupported version {version}")
+        if kind == PING:
+            return _reply(PONG, nonce), None
+        started = time.perf_counter()
+        try:
+            decision, reason, gate, row = await self._verify(kind, body, ip)
+        except Exception:
+            logger.exception("Binary verify failed")
+            await sync_to_async(close_old_connections)()  # a dropped DB connection is reopened next time
+            return _reply(ERROR, nonce), None
+        metrics.VERIFY_DURATION.labels(decision, reason, gate).observe(time.perf_counter() - started)
+        return _result(nonce, decision, reason), row
+
+    async def _verify(self, kind: int, body: bytes, ip: str) -> tuple[str, str, str, dict | None]:
+        # Same order as AccessVerifyView: throttle on the raw gate id, then validate, then decide
+        gate_id, token = parse_fields(body) if kind == VERIFY else (None, None)
+        raw = {"gate_id": gate_id, "token": token}
+        if not await self.throttle.aallow_client(THROTTLE_SCOPE, gate_id, ip):
+            await events.arecord_rate_limited(gate_id, ip, raw=raw)
+            return "DENY", REASON_RATE_LIMIT, "", None
+        data = fastpath.validate_verify_request(raw)
+        if data is None:
+            row = {"access_point_id": None, "user_id": None, "device_id": None,
+                   "decision": "DENY", "reason": REASON_INVALID_REQUEST, "raw": raw}
+            return "DENY", REASON_INVALID_REQUEST, "", row
+        with timing.timer("authz"):
+            result = await authz.adecide(data["gate_id"], data["token"])
+        row = {"access_point_id": result.access_point_id, "user_id": result.user_id, "device_id": result.device_id,
+               "decision": result.decision, "reason": result.reason, "raw": data}
+        gate = data["gate_id"] if result.access_point_id is not None else ""
+        return result.decision, result.reason, gate, row
+
+    async def start(self, host: str, port: int | None, udp_port: int | None = None,
+                    reuse_port: bool = False) -> list[tuple[str, str, int]]:
+        """Open the listeners; returns ``(transport, host, port)`` for each bound address."""
+        loop = asyncio.get_running_loop()
+        bound = []
+        if port is not None:
+            server = await loop.create_server(
+                lambda: _StreamProtocol(self), host, port, reuse_port=reuse_port or None, backlog=1024,
+            )
+            self._servers.append(server)
+            bound += [("tcp", *sock.getsockname()[:2]) for sock in server.sockets]
+        if udp_port is not None:
+            transport, protocol = await loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(self), local_addr=(host, udp_port), reuse_port=reuse_port or None,
+            )
+            self._datagrams.append(protocol)
+            bound.append(("udp", *transport.get_extra_info("sockname")[:2]))
+        if self.idle_timeout:
+            self._sweeper = loop.create_task(self._sweep())
+        return bound
+
+    async def _sweep(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(min(self.idle_timeout / 4, 30))
+            cutoff = loop.time() - self.idle_timeout
+            for conn in [c for c in self.connections if c.last_seen < cutoff]:
+                conn.transport.close()  # half-open or silent reader: its next tap reconnects
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+        for server in self._servers:
+            server.close()
+        for protocol in self._datagrams:
+            protocol.transport.close()
+        tasks = [conn.task for conn in self.connections] + [p.task for p in self._datagrams]
+        for conn in list(self.connections):
+            conn.transport.close()
+        for server in self._servers:
+            await server.wait_closed()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class _StreamProtocol(asyncio.Protocol):
+    """One reader connection: ``data_received`` splits frames, ``_serve`` answers them in order."""
+
+    def __init__(self, server: VerifyServer):
+        self.server = server
+        self.buffer = bytearray()
+        self.frames: deque[bytes] = deque()
+        self.ready = asyncio.Event()
+        self.writable = asyncio.Event()
+        self.writable.set()
+        self.closed = False
+        self.paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        peer = transport.get_extra_info("peername")
+        self.ip = peer[0] if peer else ""
+        loop = asyncio.get_running_loop()
+        self.last_seen = loop.time()
+        self.server.connections.add(self)
+        self.task = loop.create_task(self._serve())
+
+    def data_received(self, data):
+        self.last_seen = asyncio.get_running_loop().time()
+        buf = self.buffer
+        buf += data
+        offset = 0
+        while len(buf) - offset >= _LENGTH.size:
+            (size,) = _LENGTH.unpack_from(buf, offset)
+            if size > MAX_BODY:
+                logger.info("Closing %s: %s-byte frame", self.ip, size)
+                self.transport.close()
+                return
+            end = offset + _LENGTH.size + size
+            if end > len(buf):
+                break
+            self.frames.append(bytes(buf[offset + _LENGTH.size:end]))
+            offset = end
+        del buf[:offset]
+        if self.frames:
+            self.ready.set()
+            if len(self.frames) >= MAX_PIPELINE and not self.paused:
+                self.paused = True
+                self.transport.pause_reading()
+
+    def connection_lost(self, exc):
+        self.closed = True
+        self.server.connections.discard(self)
+        self.writable.set()
+        self.ready.set()
+
+    def pause_writing(self):
+        self.writable.clear()
+
+    def resume_writing(self):
+        self.writable.set()
+
+    async def _serve(self):
+        while True:
+            await self.ready.wait()
+            if self.closed:
+                return
+            self.ready.clear()
+            frames, self.frames = self.frames, deque()
+            if self.paused:
+                self.paused = False
+                self.transport.resume_reading()
+            replies, rows = [], []
+            try:
+                for body in frames:
+                    reply, row = await self.server.handle(body, self.ip)
+                    replies.append(reply)
+                    if row is not None:
+                        rows.append(row)
+            except ProtocolError as exc:
+                logger.info("Closing %s: %s", self.ip, exc)
+                self.closed = True
+            if replies and not self.transport.is_closing():
+                self.transport.writelines(replies)
+            if rows:
+                await events.arecord_many(rows)  # one sink append per batch of pipelined taps
+            if self.closed:
+                self.transport.close()
+                return
+            await self.writable.wait()  # the reader is not reading its answers: stop taking requests
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server: VerifyServer):
+        self.server = server
+        self.pending: deque[tuple[bytes, tuple]] = deque()
+        self.ready = asyncio.Event()
+        self.recent: OrderedDict[tuple, tuple[float, bytes]] = OrderedDict()
+        self.dropped = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.task = asyncio.get_running_loop().create_task(self._serve())
+
+    def datagram_received(self, data, addr):
+        if len(self.pending) >= UDP_BACKLOG:
+            self.dropped += 1  # the reader retransmits; queueing more only adds latency
+            return
+        self.pending.append((data, addr))
+        self.ready.set()
+
+    def connection_lost(self, exc):
+        self.task.cancel()
+
+    async def _serve(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            batch, self.pending = self.pending, deque()
+            now = loop.time()
+            recent = self.recent
+            while recent and next(iter(recent.values()))[0] <= now:
+                recent.popitem(last=False)
+            rows = []
+            for data, addr in batch:
+                if len(data) < _LENGTH.size or _LENGTH.unpack_from(data)[0] != len(data) - _LENGTH.size:
+                    continue
+                cached = recent.get((addr, data))
+                if cached is not None:
+                    self.transport.sendto(cached[1], addr)
+                    continue
+                try:
+                    reply, row = await self.server.handle(data[_LENGTH.size:], addr[0])
+                except ProtocolError:
+                    continue
+                recent[addr, data] = (now + UDP_REPLAY_WINDOW, reply)
+                if len(recent) > UDP_REPLAY_SIZE:
+                    recent.popitem(last=False)
+                self.transport.sendto(reply, addr)
+                if row is not None:
+                    rows.append(row)
+            if rows:
+                await events.arecord_many(rows)
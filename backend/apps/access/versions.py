@@ -0,0 +1,74 @@
+"""Cache versions that every process sees, on this host at once and elsewhere within seconds.
+
+Worker-local caches (the authz snapshot, the device registry, the token
+authentication cache) are dropped when their version changes. A
+:class:`SharedVersion` is two numbers:
+
+* a host-local :class:`~core.shared.SharedCounter`, one load from an mmap
+  file, so workers on the host that made the change see it on their next
+  request;
+* a :class:`~.models.CacheVersion` row, bumped once the change commits, which
+  each worker re-reads at most every ``ACCESS_AUTHZ_MAX_STALENESS`` seconds.
+  This is what reaches other hosts, ``docker compose run`` containers and
+  processes with a different shared state directory.
+
+A bump lost between commit and ``on_commit`` (a crashed process) is covered
+by the caches' own hard TTL (``ACCESS_AUTHZ_SNAPSHOT_TTL``).
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F
+
+from core.shared import SharedCounter
+
+from .models import CacheVersion
+
+logger = logging.getLogger("apps.access.versions")
+
+
+def max_staleness() -> float:
+    return getattr(settings, "ACCESS_AUTHZ_MAX_STALENESS", 1.0)
+
+
+class SharedVersion:
+    def __init__(self, name: str):
+        self.name = name
+        self.local = SharedCounter(name)
+        self._stored = 0
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+
+    def peek(self) -> tuple[int, int] | None:
+        """``(stored, local)`` without touching the database, or ``None`` when the stored value is due a re-read."""
+        if time.monotonic() - self._checked >= max_staleness():
+            return None
+        return self._stored, self.local.value()
+
+    def value(self) -> tuple[int, int]:
+        """``(stored, local)``, re-reading the stored value if it is older than the staleness bound."""
+        if time.monotonic() - self._checked >= max_staleness():
+            self.refresh()
+        return self._stored, self.local.value()
+
+    def refresh(self) -> None:
+        with self._lock:
+            try:
+                stored = CacheVersion.objects.filter(name=self.name).values_list("value", flat=True).first()
+            except DatabaseError:
+                # Keep answering from the caches; their TTL bounds how long they can be stale
+                logger.warning("Could not read cache version %s", self.name, exc_info=True)
+            else:
+                self._stored = stored or 0
+            self._checked = time.monotonic()
+
+    def incr(self) -> None:
+        """Bump both: call it once the change has committed (``transaction.on_commit``)."""
+        self.local.incr()
+        if not CacheVersion.objects.filter(name=self.name).update(value=F("value") + 1):
+            _, created = CacheVersion.objects.get_or_create(name=self.name, defaults={"value": 1})
+            if not created:  # another process created it first
+                CacheVersion.objects.filter(name=self.name).update(value=F("value") + 1)
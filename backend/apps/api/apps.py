@@ -7,5 +7,4 @@ class ApiConfig(AppConfig):
     label = "api"
 
     def ready(self):
-        # No signals to register for now; keep startup fast
-        return None
+        from . import signals  # noqa
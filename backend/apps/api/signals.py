@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .v1 import authentication
+
+User = get_user_model()
+
+# Fields of a cached user that authentication or permission checks read
+AUTH_FIELDS = {"is_active", "password", "is_staff", "is_superuser"}
+
+
+@receiver(post_delete, sender=Token)
+@receiver(post_delete, sender=User)
+def invalidate_token_cache(sender, **kwargs):
+    authentication.invalidate()
+
+
+@receiver(post_save, sender=User)
+def invalidate_token_cache_on_user_change(sender, instance, update_fields=None, **kwargs):
+    # Skip saves such as last_login on every sign-in
+    if update_fields is None or AUTH_FIELDS.intersection(update_fields):
+        authentication.invalidate()
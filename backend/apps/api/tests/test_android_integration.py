@@ -72,8 +72,8 @@ class AndroidIntegrationTestCase(TestCase):
         # Check token length (64 hex characters)
         self.assertEqual(len(response_data['token']), 64)
 
-        # Check qr_payload equals token
-        self.assertEqual(response_data['qr_payload'], response_data['token'])
+        # Check qr_payload is a signed gate credential
+        self.assertTrue(response_data['qr_payload'].startswith('ow1.'))
 
     def test_register_rotate_false_keeps_token(self):
         """Test that rotate=False keeps the same token when updating android_device_id."""
@@ -0,0 +1,116 @@
+"""DRF token authentication that remembers recently seen tokens.
+
+:class:`CachedTokenAuthentication` is a drop-in for ``TokenAuthentication``
+(also in ``DEFAULT_AUTHENTICATION_CLASSES``): each worker keeps a bounded LRU
+of token key -> (user, token) whose entries expire after
+``ACCESS_TOKEN_AUTH_CACHE_TTL`` seconds, so an app calling the device
+endpoints on every start costs no auth query once its token is cached.
+
+Deleting a token, deactivating a user, changing their password or staff flags
+bumps a version (``apps.api.signals``); every worker drops its whole cache the
+next time it sees a newer one, the same scheme as the authorization snapshot
+(:class:`apps.access.versions.SharedVersion`): workers on this host at once,
+workers on other hosts within ``ACCESS_AUTHZ_MAX_STALENESS`` seconds.
+Failed lookups are never cached, so a new token works right away.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+
+from apps.access.versions import SharedVersion
+
+token_auth_version = SharedVersion("token-auth-version")
+
+
+class TokenCache:
+    """LRU of ``key -> (user, token)`` with a per-entry TTL, tagged with the version it was filled at."""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.version = None
+        self._entries: OrderedDict[str, tuple[float, object, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sync(self, version) -> None:
+        """Forget everything if the tokens or users changed since the entries were stored."""
+        if version != self.version:
+            with self._lock:
+                self._entries.clear()
+                self.version = version
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, user, token = entry
+            if expires <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user, token
+
+    def put(self, key: str, user, token, version) -> None:
+        with self._lock:
+            if version != self.version:
+                return  # loaded before an invalidation this cache has already seen
+            self._entries[key] = (self.clock() + self.ttl, user, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache: TokenCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> TokenCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TokenCache(getattr(settings, "ACCESS_TOKEN_AUTH_CACHE_SIZE", 10000),
+                                    getattr(settings, "ACCESS_TOKEN_AUTH_CACHE_TTL", 300.0))
+    return _cache
+
+
+def invalidate() -> None:
+    """Drop cached tokens in every worker, now and again once the transaction commits.
+
+    The immediate bump reaches this host; the on-commit bump also reaches
+    other hosts and covers a worker that cached the old rows between the
+    write and the commit.
+    """
+    token_auth_version.local.incr()
+    transaction.on_commit(token_auth_version.incr)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cache = get_cache()
+        if cache.ttl <= 0:
+            return super().authenticate_credentials(key)
+        version = token_auth_version.value()  # read before loading, like the authz snapshot
+        cache.sync(version)
+        hit = cache.get(key)
+        if hit is None:
+            user, token = super().authenticate_credentials(key)  # raises for unknown keys and inactive users
+            cache.put(key, user, token, version)
+        else:
+            user, token = hit
+        # Requests may set attributes on request.user: hand out copies, not the cached objects
+        return copy.copy(user), copy.copy(token)
@@ -0,0 +1,71 @@
+"""Serializer-free request validation and responses for the verify endpoint.
+
+``AccessVerifyView`` answers every request with one of a dozen fixed bodies,
+so they are encoded once at import. ``validate_verify_request`` mirrors
+``VerifyRequestSerializer`` field for field (see ``tests/api/test_verify_fastpath.py``)
+without building a serializer per request.
+"""
+import json
+
+from django.http import HttpResponse
+
+from .constants import DECISIONS, REASON_OK, REASONS
+
+ALLOW_DURATION_MS = 800
+TOKEN_MIN_LENGTH = 8
+TOKEN_MAX_LENGTH = 128
+
+
+def _payload(decision: str, reason: str) -> dict:
+    # Same key order and separators as VerifyResponseSerializer + JSONRenderer
+    if decision == "ALLOW":
+        return {"decision": decision, "duration_ms": ALLOW_DURATION_MS, "reason": reason}
+    return {"decision": decision, "reason": reason}
+
+
+_PAYLOADS = {(d, r): _payload(d, r) for d in DECISIONS for r in REASONS if (d == "ALLOW") == (r == REASON_OK)}
+_BODIES = {
+    key: json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+    for key, payload in _PAYLOADS.items()
+}
+
+
+def payload(decision: str, reason: str) -> dict:
+    """A fresh copy of the response dict, for callers that embed it in a larger body."""
+    return dict(_PAYLOADS[decision, reason])
+
+
+def verify_response(decision: str, reason: str) -> HttpResponse:
+    """200 response with the pre-encoded body for ``(decision, reason)``."""
+    resp = HttpResponse(_BODIES[decision, reason], content_type="application/json")
+    resp.data = dict(_PAYLOADS[decision, reason])  # what a DRF Response would expose, for tests and middleware
+    return resp
+
+
+def _clean_char(value, min_length=None, max_length=None):
+    """``serializers.CharField().run_validation`` without the exception machinery; ``None`` if invalid."""
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return None
+    value = str(value).strip()
+    if not value or "\x00" in value:
+        return None
+    if min_length is not None and len(value) < min_length:
+        return None
+    if max_length is not None and len(value) > max_length:
+        return None
+    if not value.isascii() and any(0xD800 <= ord(ch) <= 0xDFFF for ch in value):
+        return None
+    return value
+
+
+def validate_verify_request(data) -> dict | None:
+    """Validated ``{"gate_id", "token"}`` or ``None`` where the serializer would raise."""
+    if not hasattr(data, "get"):
+        return None
+    gate_id = _clean_char(data.get("gate_id"))
+    if gate_id is None:
+        return None
+    token = _clean_char(data.get("token"), TOKEN_MIN_LENGTH, TOKEN_MAX_LENGTH)
+    if token is None:
+        return None
+    return {"gate_id": gate_id, "token": token}
@@ -0,0 +1,12 @@
+from rest_framework.permissions import BasePermission
+
+from apps.access import gate_keys
+
+
+class GateKeyOrStaff(BasePermission):
+    """The reader key of the gate in the URL (``Authorization: Gate <key>``), or a staff user."""
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        return gate_keys.check(request.headers.get("Authorization", ""), view.kwargs["code"])
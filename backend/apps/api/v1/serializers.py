@@ -1,5 +1,7 @@
 from rest_framework import serializers
 
+from apps.access import changelog
+
 from .constants import DECISIONS, REASONS
 
 
@@ -12,6 +14,13 @@ class VerifyResponseSerializer(serializers.Serializer):
     duration_ms = serializers.IntegerField(required=False, min_value=0)
     reason = serializers.ChoiceField(choices=list(REASONS))
 
+class VerifyBatchRequestSerializer(serializers.Serializer):
+    # Items are validated one by one in the view: a malformed item is DENY/INVALID_REQUEST, not a 400
+    items = serializers.ListField(allow_empty=False)
+
+class VerifyBatchResponseSerializer(serializers.Serializer):
+    results = VerifyResponseSerializer(many=True)
+
 class DeviceRegisterRequestSerializer(serializers.Serializer):
     # Ротация по умолчанию включена — вариант А (обновляем токен при входе/возврате приложения)
     rotate = serializers.BooleanField(required=False, default=True)
@@ -41,3 +50,54 @@ class DeviceRevokeRequestSerializer(serializers.Serializer):
 class DeviceRevokeResponseSerializer(serializers.Serializer):
     device_id = serializers.IntegerField()
     is_active = serializers.BooleanField()
+
+class SyncChangesQuerySerializer(serializers.Serializer):
+    since = serializers.IntegerField(required=False, default=0, min_value=0)
+    limit = serializers.IntegerField(required=False, default=changelog.DEFAULT_LIMIT, min_value=1,
+                                     max_value=changelog.MAX_LIMIT)
+
+class SyncChangeSerializer(serializers.Serializer):
+    seq = serializers.IntegerField()
+    kind = serializers.ChoiceField(choices=["gate", "permission", "membership", "token", "device", "user"])
+    op = serializers.ChoiceField(choices=[changelog.UPSERT, changelog.DELETE])
+    id = serializers.CharField()
+    data = serializers.JSONField(allow_null=True)
+
+class SyncChangesResponseSerializer(serializers.Serializer):
+    changes = SyncChangeSerializer(many=True)
+    next = serializers.IntegerField(help_text="Pass as since on the next call")
+    more = serializers.BooleanField(help_text="More changes are waiting: call again right away")
+
+class AccessEventUploadSerializer(serializers.Serializer):
+    idempotency_key = serializers.CharField(max_length=64, help_text="Client-generated, unique per event")
+    access_point_id = serializers.IntegerField(allow_null=True)
+    user_id = serializers.IntegerField(allow_null=True)
+    device_id = serializers.IntegerField(allow_null=True)
+    decision = serializers.ChoiceField(choices=DECISIONS)
+    reason = serializers.CharField(max_length=64, allow_blank=True)
+    created_at = serializers.DateTimeField(help_text="Decision time, ISO 8601 with offset")
+    raw = serializers.JSONField(allow_null=True, required=False)
+
+class AccessEventBulkErrorSerializer(serializers.Serializer):
+    index = serializers.IntegerField(help_text="Position of the event in the upload")
+    error = serializers.CharField()
+
+class AccessEventBulkResponseSerializer(serializers.Serializer):
+    accepted = serializers.IntegerField(help_text="Events stored by this request")
+    duplicates = serializers.IntegerField(help_text="Events already stored earlier (same key and created_at)")
+    rejected = serializers.IntegerField(help_text="Invalid events, skipped")
+    errors = AccessEventBulkErrorSerializer(many=True, help_text="First rejected events")
+
+class GateOfflineQuerySerializer(serializers.Serializer):
+    after = serializers.FloatField(required=False, min_value=1,
+                                   help_text="Seconds without a heartbeat; defaults to ACCESS_GATE_OFFLINE_AFTER")
+
+class GateOfflineItemSerializer(serializers.Serializer):
+    gate = serializers.CharField()
+    last_seen = serializers.DateTimeField(allow_null=True, help_text="null if the gate never sent a heartbeat")
+    firmware = serializers.CharField(allow_blank=True)
+    rssi = serializers.IntegerField(allow_null=True)
+
+class GateOfflineResponseSerializer(serializers.Serializer):
+    after = serializers.FloatField()
+    gates = GateOfflineItemSerializer(many=True)
@@ -0,0 +1,74 @@
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from apps.access import authz
+from apps.access.ratelimit import get_limiter
+from core import metrics, timing
+
+UNKNOWN_GATE = "unknown"
+
+
+class GateRateThrottle(BaseThrottle):
+    """Per gate + client IP throttle backed by the shared GCRA limiter.
+
+    Uses the rate configured for the view's ``throttle_scope`` in
+    ``DEFAULT_THROTTLE_RATES``, like ``ScopedRateThrottle``, but keeps O(1)
+    state per key in a store shared by all workers instead of per-process
+    timestamp lists in the Django cache.
+
+    The gate id comes from the request, so only known gate codes
+    (:func:`apps.access.authz.is_known_gate`) get a bucket of their own; anything
+    else is charged to one ``unknown`` bucket per client, and made-up ids can
+    neither fill the limiter table nor dodge the limit.
+    """
+
+    def __init__(self):
+        self._wait = None
+
+    def allow_request(self, request, view):
+        gate = view.kwargs.get("code")  # gates/<code>/... endpoints
+        if gate is None and hasattr(request.data, "get"):
+            gate = request.data.get("gate_id")
+        return self.allow_gate(request, view, gate)
+
+    def allow_gate(self, request, view, gate) -> bool:
+        """Charge one request against ``gate``; used directly by the batch endpoint, once per item."""
+        scope = getattr(view, "throttle_scope", None)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope else None
+        if rate is None:
+            return True
+        with timing.timer("throttle"):
+            gate = gate if authz.is_known_gate(gate) else UNKNOWN_GATE
+            self._wait = get_limiter().hit(self._key(request, scope, gate), rate)
+        if self._wait:
+            metrics.THROTTLED.labels(scope).inc()
+        return self._wait == 0
+
+    async def aallow_gate(self, request, view, gate) -> bool:
+        """:meth:`allow_gate` for async views (``request`` may be a plain Django request)."""
+        scope = getattr(view, "throttle_scope", None)
+        if scope is None:
+            return True
+        return await self.aallow_client(scope, gate, self.get_ident(request))
+
+    async def aallow_client(self, scope, gate, ident) -> bool:
+        """Charge ``gate`` for a client known only by its IP ``ident`` (the binary verify server)."""
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+        with timing.timer("throttle"):
+            gate = gate if await authz.ais_known_gate(gate) else UNKNOWN_GATE
+            self._wait = await get_limiter().ahit(self._client_key(scope, gate, ident), rate)
+        if self._wait:
+            metrics.THROTTLED.labels(scope).inc()
+        return self._wait == 0
+
+    def _key(self, request, scope, gate) -> str:
+        return self._client_key(scope, gate, self.get_ident(request))
+
+    @staticmethod
+    def _client_key(scope, gate, ident) -> str:
+        return f"{scope}:{gate}:{ident}"
+
+    def wait(self):
+        return self._wait
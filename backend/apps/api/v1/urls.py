@@ -1,10 +1,35 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework.authtoken.views import obtain_auth_token
 
-from .views import AccessVerifyView, DeviceListMeView, DeviceRegisterView, DeviceRevokeView
+from .views import (
+    AccessEventBulkView,
+    AccessEventStreamView,
+    AccessVerifyBatchView,
+    AccessVerifyView,
+    AsyncAccessVerifyView,
+    DeviceListMeView,
+    DeviceRegisterView,
+    DeviceRevokeView,
+    GateHeartbeatView,
+    GateOfflineView,
+    GateSnapshotView,
+    SyncChangesView,
+)
 
 urlpatterns = [
-    path("access/verify", AccessVerifyView.as_view(), name="access-verify"),
+    path(
+        "access/verify",
+        AsyncAccessVerifyView.as_view() if settings.ACCESS_VERIFY_ASYNC else AccessVerifyView.as_view(),
+        name="access-verify",
+    ),
+    path("access/verify/batch", AccessVerifyBatchView.as_view(), name="access-verify-batch"),
+    path("access/events/bulk", AccessEventBulkView.as_view(), name="access-events-bulk"),
+    path("access/events/stream", AccessEventStreamView.as_view(), name="access-events-stream"),
+    path("gates/<str:code>/snapshot", GateSnapshotView.as_view(), name="gate-snapshot"),
+    path("gates/<str:code>/heartbeat", GateHeartbeatView.as_view(), name="gate-heartbeat"),
+    path("gates/offline", GateOfflineView.as_view(), name="gates-offline"),
+    path("sync/changes", SyncChangesView.as_view(), name="sync-changes"),
     path("auth/token", obtain_auth_token, name="auth-token"),
     path("devices/register", DeviceRegisterView.as_view(), name="devices-register"),
     path("devices/me", DeviceListMeView.as_view(), name="devices-me"),
@@ -1,65 +1,83 @@
+import io
+import json
 import secrets
+import time
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
-from django.db.models import Q
-from drf_spectacular.utils import OpenApiResponse, extend_schema
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_schema
 from rest_framework import status
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.authtoken.models import Token
-from rest_framework.exceptions import Throttled, ValidationError
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import NotFound, ParseError, Throttled, UnsupportedMediaType, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
-from rest_framework.throttling import ScopedRateThrottle
 from rest_framework.views import APIView
 
-from apps.access.models import AccessEvent, AccessPermission, AccessPoint
+from apps.access import authz, changelog, credentials, events, gate_keys, gate_snapshots, heartbeats, ingest, live
+from apps.access.models import AccessPoint
 from apps.devices.models import Device
+from core import metrics, timing
 
-from .constants import (
-    REASON_INVALID_REQUEST,
-    REASON_NO_PERMISSION,
-    REASON_OK,
-    REASON_RATE_LIMIT,
-    REASON_TOKEN_INVALID,
-    REASON_UNKNOWN_GATE,
-)
+from . import fastpath
+from .authentication import CachedTokenAuthentication
+from .constants import REASON_INVALID_REQUEST, REASON_RATE_LIMIT
+from .permissions import GateKeyOrStaff
 from .serializers import (
+    AccessEventBulkResponseSerializer,
+    AccessEventUploadSerializer,
     DeviceMeItemSerializer,
     DeviceRegisterRequestSerializer,
     DeviceRegisterResponseSerializer,
     DeviceRevokeRequestSerializer,
     DeviceRevokeResponseSerializer,
+    GateOfflineQuerySerializer,
+    GateOfflineResponseSerializer,
+    SyncChangesQuerySerializer,
+    SyncChangesResponseSerializer,
+    VerifyBatchRequestSerializer,
+    VerifyBatchResponseSerializer,
     VerifyRequestSerializer,
     VerifyResponseSerializer,
 )
+from .throttling import GateRateThrottle
 
 User = get_user_model()
 
-def _respond(decision, reason, duration_ms=None):
-    payload = {"decision": decision, "reason": reason}
-    if duration_ms is not None:
-        payload["duration_ms"] = duration_ms
-    ser = VerifyResponseSerializer(data=payload)
-    ser.is_valid(raise_exception=True)
-    return Response(ser.validated_data, status=status.HTTP_200_OK)
+def _respond(decision, reason, started, gate=""):
+    timing.annotate(decision, reason)
+    # gate is only set once it resolved to an AccessPoint, so request garbage cannot add label values
+    metrics.VERIFY_DURATION.labels(decision, reason, gate).observe(time.perf_counter() - started)
+    with timing.timer("serialize"):
+        return fastpath.verify_response(decision, reason)
 
 class AccessVerifyView(APIView):
     authentication_classes: list = []
     permission_classes: list = []
-    throttle_classes = [ScopedRateThrottle]
+    throttle_classes = [GateRateThrottle]
     throttle_scope = "access_verify"
 
-    def dispatch(self, request, *args, **kwargs):
-        try:
-            return super().dispatch(request, *args, **kwargs)
-        except Throttled:
-            # Log and return 200 DENY/RATE_LIMIT
-            AccessEvent.objects.create(
-                access_point=None, user=None, device_id=None,
-                decision="DENY", reason=REASON_RATE_LIMIT, raw=request.data
-            )
-            return _respond("DENY", REASON_RATE_LIMIT)
+    def initial(self, request, *args, **kwargs):
+        self.started = time.perf_counter()  # before the throttle check, which initial() runs
+        super().initial(request, *args, **kwargs)
+
+    def handle_exception(self, exc):
+        # APIView.dispatch turns Throttled into a 429 before it can propagate,
+        # so the 200 DENY/RATE_LIMIT contract has to be applied here.
+        # Throttled requests are only counted; one summary row per gate/IP/window is written.
+        if isinstance(exc, Throttled):
+            data = self.request.data
+            gate_id = data.get("gate_id") if hasattr(data, "get") else None
+            events.record_rate_limited(gate_id, GateRateThrottle().get_ident(self.request), raw=data)
+            return _respond("DENY", REASON_RATE_LIMIT, self.started)
+        return super().handle_exception(exc)
 
     @extend_schema(
         operation_id="access-verify",
@@ -67,58 +85,362 @@ class AccessVerifyView(APIView):
         request=VerifyRequestSerializer,
         responses={200: OpenApiResponse(response=VerifyResponseSerializer, description="ALLOW/DENY with reason")},
     )
-    @transaction.atomic
     def post(self, request):
-        # Normalize malformed payloads to 200/DENY + logging
-        try:
-            req = VerifyRequestSerializer(data=request.data)
-            req.is_valid(raise_exception=True)
-        except ValidationError:
-            AccessEvent.objects.create(
-                access_point=None, user=None, device_id=None,
+        # Normalize malformed payloads to 200/DENY + logging.
+        # Same rules as VerifyRequestSerializer, checked without building one per request.
+        with timing.timer("serialize"):
+            data = fastpath.validate_verify_request(request.data)
+        if data is None:
+            events.record(
+                access_point_id=None, user_id=None, device_id=None,
                 decision="DENY", reason=REASON_INVALID_REQUEST, raw=request.data
             )
-            return _respond("DENY", REASON_INVALID_REQUEST)
+            return _respond("DENY", REASON_INVALID_REQUEST, self.started)
 
-        data = req.validated_data
+        with timing.timer("authz"):
+            result = authz.decide(data["gate_id"], data["token"])
+        events.record(access_point_id=result.access_point_id, user_id=result.user_id, device_id=result.device_id,
+                      decision=result.decision, reason=result.reason, raw=data)
+        gate = data["gate_id"] if result.access_point_id is not None else ""
+        return _respond(result.decision, result.reason, self.started, gate)
 
-        # Gate
+
+def _reject_constant(value):
+    raise ValueError(f"Out of range float values are not JSON compliant: {value!r}")
+
+
+def _parse_body(request):
+    """Body the way DRF's default parsers would see it; ``(data, error_response)``."""
+    if not request.body:
+        return {}, None
+    content_type = request.content_type or ""
+    if content_type == "application/json" or content_type.endswith("+json"):
         try:
-            ap = AccessPoint.objects.get(code=data["gate_id"])
-        except AccessPoint.DoesNotExist:
-            AccessEvent.objects.create(access_point=None, user=None, device_id=None,
-                                       decision="DENY", reason=REASON_UNKNOWN_GATE, raw=data)
-            return _respond("DENY", REASON_UNKNOWN_GATE)
-
-        # Token → User
-        token = data["token"].strip()
-        token_obj = Token.objects.select_related("user").filter(key=token).first()
-        if not token_obj:
-            AccessEvent.objects.create(access_point=ap, user=None, device_id=None,
-                                       decision="DENY", reason=REASON_TOKEN_INVALID, raw=data)
-            return _respond("DENY", REASON_TOKEN_INVALID)
-
-        user = token_obj.user
-        if not user.is_active:
-            AccessEvent.objects.create(access_point=ap, user=user, device_id=None,
-                                       decision="DENY", reason=REASON_TOKEN_INVALID, raw=data)
-            return _respond("DENY", REASON_TOKEN_INVALID)
-
-        # RBAC: check if user or any of their groups has permission
-        has_perm = AccessPermission.objects.filter(
-            Q(access_point=ap, user=user, allow=True) |
-            Q(access_point=ap, group__in=user.groups.all(), allow=True)
-        ).exists()
-        if not has_perm:
-            AccessEvent.objects.create(access_point=ap, user=user, device_id=None,
-                                       decision="DENY", reason=REASON_NO_PERMISSION, raw=data)
-            return _respond("DENY", REASON_NO_PERMISSION)
-
-        # OK - Access granted
-        AccessEvent.objects.create(access_point=ap, user=user, device_id=None,
-                                   decision="ALLOW", reason=REASON_OK, raw=data)
-        return _respond("ALLOW", REASON_OK, duration_ms=800)
+            return json.loads(request.body, parse_constant=_reject_constant), None
+        except ValueError as exc:
+            return None, JsonResponse({"detail": f"JSON parse error - {exc}"}, status=400)
+    if content_type in ("application/x-www-form-urlencoded", "multipart/form-data"):
+        return request.POST, None
+    return None, JsonResponse({"detail": f'Unsupported media type "{content_type}" in request.'}, status=415)
+
+
+class AsyncAccessVerifyView(View):
+    """
+    Асинхронная версия AccessVerifyView для ASGI (uvicorn): тот же контракт и те же причины,
+    но ожидание БД не занимает поток воркера, поэтому один процесс держит много проверок сразу.
+    Включается ACCESS_VERIFY_ASYNC=1 (accessproj.asgi выставляет его по умолчанию).
+    """
+    http_method_names = ["post", "options"]
+    throttle_scope = "access_verify"
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token-less endpoint like the DRF view, which is CSRF-exempt too
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def post(self, request):
+        started = time.perf_counter()
+        data, error = _parse_body(request)
+        if error is not None:
+            return error
+        throttle = GateRateThrottle()
+        gate_id = data.get("gate_id") if hasattr(data, "get") else None
+        if not await throttle.aallow_gate(request, self, gate_id):
+            await events.arecord_rate_limited(gate_id, throttle.get_ident(request), raw=data)
+            return _respond("DENY", REASON_RATE_LIMIT, started)
+
+        with timing.timer("serialize"):
+            valid = fastpath.validate_verify_request(data)
+        if valid is None:
+            await events.arecord(
+                access_point_id=None, user_id=None, device_id=None,
+                decision="DENY", reason=REASON_INVALID_REQUEST, raw=data
+            )
+            return _respond("DENY", REASON_INVALID_REQUEST, started)
+
+        with timing.timer("authz"):
+            result = await authz.adecide(valid["gate_id"], valid["token"])
+        await events.arecord(access_point_id=result.access_point_id, user_id=result.user_id,
+                             device_id=result.device_id, decision=result.decision, reason=result.reason, raw=valid)
+        gate = valid["gate_id"] if result.access_point_id is not None else ""
+        return _respond(result.decision, result.reason, started, gate)
+
+class AccessVerifyBatchView(APIView):
+    """
+    Пакетная проверка для контроллера с несколькими считывателями: до ACCESS_VERIFY_BATCH_MAX
+    пар {gate_id, token} за один запрос. Гейты, токены и права читаются фиксированным числом
+    запросов, события пишутся одной пачкой; результаты возвращаются в порядке items.
+    """
+    authentication_classes: list = []
+    permission_classes: list = []
+    throttle_classes: list = []  # rate limit is charged per item and gate, below
+    throttle_scope = "access_verify"
+
+    @extend_schema(
+        operation_id="access-verify-batch",
+        tags=["Access"],
+        request=VerifyBatchRequestSerializer,
+        responses={200: OpenApiResponse(response=VerifyBatchResponseSerializer,
+                                        description="Per-item ALLOW/DENY in request order")},
+    )
+    def post(self, request):
+        envelope = VerifyBatchRequestSerializer(data=request.data)
+        envelope.is_valid(raise_exception=True)
+        items = envelope.validated_data["items"]
+        limit = settings.ACCESS_VERIFY_BATCH_MAX
+        if len(items) > limit:
+            raise ValidationError({"items": [f"Ensure this field has no more than {limit} elements."]})
+
+        throttle = GateRateThrottle()
+        results, rows, pending = [None] * len(items), [None] * len(items), []
+        for i, item in enumerate(items):
+            gate_id = item.get("gate_id") if isinstance(item, dict) else None
+            if not throttle.allow_gate(request, self, gate_id):
+                events.record_rate_limited(gate_id, throttle.get_ident(request), raw=item)
+                results[i] = fastpath.payload("DENY", REASON_RATE_LIMIT)
+                continue
+            data = fastpath.validate_verify_request(item)
+            if data is None:
+                rows[i] = {"access_point_id": None, "user_id": None, "device_id": None,
+                           "decision": "DENY", "reason": REASON_INVALID_REQUEST, "raw": item}
+                results[i] = fastpath.payload("DENY", REASON_INVALID_REQUEST)
+                continue
+            pending.append((i, data))
+
+        with timing.timer("authz"):
+            decisions = authz.decide_many([(data["gate_id"], data["token"]) for _, data in pending])
+        for (i, data), result in zip(pending, decisions, strict=True):
+            rows[i] = {"access_point_id": result.access_point_id, "user_id": result.user_id,
+                       "device_id": result.device_id, "decision": result.decision, "reason": result.reason,
+                       "raw": data}
+            results[i] = fastpath.payload(result.decision, result.reason)
+        events.record_many([row for row in rows if row is not None])
+        return Response({"results": results}, status=status.HTTP_200_OK)
 
+class GateSnapshotView(APIView):
+    """
+    Список разрешённых на гейте токенов (SHA-256 дайджесты, см. apps.access.gate_snapshots),
+    чтобы считыватель решал локально и ходил в backend только для аудита.
+    Тело кодируется один раз на версию данных; If-None-Match с текущим ETag отвечает 304 без тела.
+    Доступ: ключ считывателя этого гейта (Authorization: Gate <key>, см. apps.access.gate_keys) или staff-токен.
+    Подписанные учётные данные устройств (ow1.…) в список не входят: их считыватель проверяет онлайн.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [GateKeyOrStaff]
+    # Per gate + IP instead of the default anon 100/day, which would lock polling readers out
+    throttle_classes = [GateRateThrottle]
+    throttle_scope = "gate_snapshot"
+
+    @extend_schema(
+        operation_id="gate-snapshot",
+        tags=["Access"],
+        parameters=[OpenApiParameter("If-None-Match", str, OpenApiParameter.HEADER, required=False)],
+        responses={
+            (200, gate_snapshots.CONTENT_TYPE): OpenApiResponse(response=OpenApiTypes.BINARY,
+                                                                description="Sorted token digests allowed at the gate"),
+            304: OpenApiResponse(description="Unchanged since the ETag in If-None-Match"),
+            401: OpenApiResponse(description="Missing or wrong gate key"),
+            404: OpenApiResponse(description="Unknown gate"),
+            429: OpenApiResponse(description="Polling faster than the gate_snapshot rate"),
+        },
+    )
+    def get(self, request, code):
+        export = gate_snapshots.get(code)
+        if export is None:
+            return Response({"detail": "Gate not found"}, status=status.HTTP_404_NOT_FOUND)
+        if_none_match = request.headers.get("If-None-Match", "")
+        if if_none_match.strip() == "*" or export.etag in (e.removeprefix("W/") for e in parse_etags(if_none_match)):
+            resp = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            resp = HttpResponse(export.body, content_type=gate_snapshots.CONTENT_TYPE)
+        resp["ETag"] = export.etag
+        resp["Cache-Control"] = "no-cache"  # readers always revalidate; 304s are cheap
+        return resp
+
+class GateHeartbeatView(View):
+    """
+    Пульс считывателя (прошивка вызывает перед каждой проверкой и в простое): время, версия
+    прошивки (fw) и RSSI пишутся в общую для воркеров таблицу в памяти (apps.access.heartbeats),
+    в GateStatus — пачкой не чаще ACCESS_GATE_HEARTBEAT_FLUSH_INTERVAL. Вне DRF и без троттлинга,
+    ответ {"status": "ok"} как у /health. Считыватель предъявляет ключ своего гейта
+    (Authorization: Gate <key>, см. apps.access.gate_keys) — одна HMAC, без запросов к БД.
+    """
+    http_method_names = ["get", "post", "options"]
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Readers have no session or CSRF token, same as /access/verify
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def get(self, request, code):
+        # Checked first: without the key nobody learns which gate codes exist either
+        if not gate_keys.check(request.headers.get("Authorization", ""), code):
+            resp = JsonResponse({"status": "unauthorized"}, status=401)
+            resp["WWW-Authenticate"] = gate_keys.KEYWORD
+            return resp
+        gate_id = heartbeats.gate_ids().get(code)
+        if gate_id is None:
+            return JsonResponse({"status": "unknown-gate"}, status=404)
+        firmware = request.GET.get("fw", "")
+        if len(firmware) > heartbeats.FIRMWARE_MAX or not (firmware.isascii() and firmware.isprintable()):
+            return JsonResponse({"status": "invalid", "detail": "fw must be printable ASCII, at most 32 characters"},
+                                status=400)
+        try:
+            rssi = int(request.GET["rssi"]) if request.GET.get("rssi") else None
+            if rssi is not None and not -200 <= rssi <= 0:
+                raise ValueError(rssi)
+        except ValueError:
+            return JsonResponse({"status": "invalid", "detail": "rssi must be an integer dBm <= 0"}, status=400)
+        heartbeats.beat(gate_id, firmware, rssi)
+        return JsonResponse({"status": "ok"})
+
+    post = get
+
+class GateOfflineView(APIView):
+    """
+    Гейты без пульса дольше after секунд (по умолчанию ACCESS_GATE_OFFLINE_AFTER), включая
+    ни разу не присылавшие его. Читается из таблицы в памяти, а не из GateStatus.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+    throttle_classes: list = []  # monitoring polls it every few seconds
+
+    @extend_schema(
+        operation_id="gates-offline",
+        tags=["Access"],
+        parameters=[GateOfflineQuerySerializer],
+        responses={200: GateOfflineResponseSerializer},
+    )
+    def get(self, request):
+        query = GateOfflineQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        after = query.validated_data.get("after", settings.ACCESS_GATE_OFFLINE_AFTER)
+        gates = [
+            {"gate": code, "last_seen": beat and beat.last_seen_at, "firmware": beat.firmware if beat else "",
+             "rssi": beat and beat.rssi}
+            for code, beat in heartbeats.offline(after)
+        ]
+        return Response(GateOfflineResponseSerializer({"after": after, "gates": gates}).data)
+
+class SyncChangesView(APIView):
+    """
+    Инкрементальная синхронизация: изменения гейтов, прав, членства в группах, токенов,
+    устройств и активности пользователей после since, по возрастанию seq (см. apps.access.changelog).
+    Клиент сохраняет next и повторяет запрос, пока more=true; since=0 — полная начальная загрузка.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+    throttle_classes: list = []  # consumers poll continuously under one service account
+
+    @extend_schema(
+        operation_id="sync-changes",
+        tags=["Sync"],
+        parameters=[SyncChangesQuerySerializer],
+        responses={200: OpenApiResponse(response=SyncChangesResponseSerializer,
+                                        description="Latest change per object, in seq order")},
+    )
+    def get(self, request):
+        query = SyncChangesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        items, next_since, more = changelog.changes(query.validated_data["since"], query.validated_data["limit"])
+        return Response({"changes": items, "next": next_since, "more": more})
+
+class AccessEventBulkView(APIView):
+    """
+    Загрузка событий доступа, записанных вне backend (gate agent, считыватель после обрыва связи):
+    NDJSON или JSON-массив, можно gzip. Тело читается потоком и пишется пачками по
+    ACCESS_EVENT_BULK_CHUNK в отдельных транзакциях (см. apps.access.ingest); повторная отправка
+    с теми же idempotency_key и created_at считается в duplicates и не создаёт дублей.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+    throttle_classes: list = []  # agents upload every second under one service account
+
+    @extend_schema(
+        operation_id="access-events-bulk",
+        tags=["Access"],
+        request={"application/x-ndjson": AccessEventUploadSerializer,
+                 "application/json": AccessEventUploadSerializer(many=True)},
+        responses={200: AccessEventBulkResponseSerializer},
+    )
+    def post(self, request):
+        # request.data would buffer and parse the whole body; read the raw stream instead
+        stream = request.stream or io.BytesIO()
+        try:
+            result = ingest.ingest(
+                stream, request.content_type, request.META.get("HTTP_CONTENT_ENCODING", ""),
+                chunk=settings.ACCESS_EVENT_BULK_CHUNK,
+            )
+        except ingest.MalformedBodyError as exc:
+            raise ParseError(str(exc)) from None
+        except ValueError as exc:
+            raise UnsupportedMediaType(request.content_type, detail=f"{exc} in request.") from None
+        return Response({"accepted": result.accepted, "duplicates": result.duplicates,
+                         "rejected": result.rejected, "errors": result.errors})
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets Accept: text/event-stream through content negotiation; the view streams the body itself."""
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data, renderer_context=renderer_context)
+
+class AccessEventStreamView(APIView):
+    """
+    Живая лента решений доступа (Server-Sent Events): каждое событие — id, event: access и JSON
+    без raw. Читается из кольцевого буфера воркера (apps.access.live), таблица событий не читается;
+    gate= (можно несколько, через запятую) фильтрует по коду гейта. После переподключения
+    EventSource с Last-Event-ID к тому же воркеру пропущенные события досылаются из буфера.
+    Под WSGI поток закрывается через ACCESS_EVENT_STREAM_WSGI_SECONDS, клиент переподключается сам.
+    """
+    authentication_classes = [CachedTokenAuthentication, SessionAuthentication]  # EventSource cannot set headers
+    permission_classes = [IsAdminUser]
+    throttle_classes: list = []  # a dashboard reconnects every minute under WSGI
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def handle_exception(self, exc):
+        # 401/403/404 are JSON even when EventSource asked for text/event-stream
+        self.request.accepted_renderer, self.request.accepted_media_type = JSONRenderer(), "application/json"
+        return super().handle_exception(exc)
+
+    @extend_schema(
+        operation_id="access-events-stream",
+        tags=["Access"],
+        parameters=[
+            OpenApiParameter("gate", str, OpenApiParameter.QUERY, required=False,
+                             description="Gate code(s), comma-separated or repeated"),
+            OpenApiParameter("Last-Event-ID", str, OpenApiParameter.HEADER, required=False),
+        ],
+        responses={
+            (200, "text/event-stream"): OpenApiResponse(response=OpenApiTypes.STR,
+                                                        description="event: access, data: JSON per decision"),
+            404: OpenApiResponse(description="Unknown gate"),
+        },
+    )
+    def get(self, request):
+        if not settings.ACCESS_EVENT_STREAM:
+            raise NotFound("Event stream is disabled.")
+        wanted = {code.strip() for value in request.query_params.getlist("gate") for code in value.split(",")}
+        wanted.discard("")
+        codes = dict(AccessPoint.objects.values_list("id", "code"))
+        gate_ids = None
+        if wanted:
+            gate_ids = {pk for pk, code in codes.items() if code in wanted}
+            missing = wanted - {codes[pk] for pk in gate_ids}
+            if missing:
+                raise NotFound(f"Unknown gate: {', '.join(sorted(missing))}.")
+        last_event_id = request.headers.get("Last-Event-ID", "")
+        if isinstance(request._request, ASGIRequest):
+            body = live.astream(gate_ids, codes, last_event_id)
+        else:
+            # A sync worker is held for the whole response: end it and let EventSource reconnect
+            body = live.stream(gate_ids, codes, last_event_id, duration=settings.ACCESS_EVENT_STREAM_WSGI_SECONDS)
+        resp = StreamingHttpResponse(body, content_type="text/event-stream")
+        resp["Cache-Control"] = "no-cache"
+        resp["X-Accel-Buffering"] = "no"  # nginx would otherwise buffer the stream
+        return resp
 
 class DeviceRegisterView(APIView):
     """
@@ -127,7 +449,7 @@ class DeviceRegisterView(APIView):
     rotate=False позволяет привязать android_device_id без смены токена.
     Аутентификация — по пользовательскому DRF Token (пользователь должен быть залогинен в приложении).
     """
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     @extend_schema(
@@ -165,19 +487,20 @@ class DeviceRegisterView(APIView):
         device.save()
 
         # 5) Ответ клиенту
-        # qr_payload — оставим простым, чтобы не ломать логику: инкапсулирует сам токен (можно заменить на свой формат)
+        # qr_payload — подписанный credential (apps.access.credentials): verify проверяет его без запроса в БД
+        group_ids = user.groups.values_list("id", flat=True)
         payload = {
             "device_id": device.id,
             "token": device.auth_token,
             "android_device_id": device.android_device_id or "",
-            "qr_payload": device.auth_token,
+            "qr_payload": credentials.issue(user.id, device.id, group_ids),
         }
         ser_out = DeviceRegisterResponseSerializer(payload)
         return Response(ser_out.data, status=status.HTTP_200_OK)
 
 
 class DeviceListMeView(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     @extend_schema(
@@ -200,7 +523,7 @@ class DeviceListMeView(APIView):
 
 
 class DeviceRevokeView(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     @extend_schema(
@@ -224,6 +547,6 @@ class DeviceRevokeView(APIView):
         if not device:
             return Response({"detail":"Device not found"}, status=status.HTTP_404_NOT_FOUND)
         device.is_active = False
-        device.save(update_fields=["is_active"])
+        device.save(update_fields=["is_active", "updated_at"])  # updated_at: the device registry refreshes by it
         resp = {"device_id": device.id, "is_active": device.is_active}
         return Response(DeviceRevokeResponseSerializer(resp).data, status=status.HTTP_200_OK)
@@ -22,7 +22,7 @@ class Command(BaseCommand):
             raise CommandError(f"Device id {device_id} not found") from None
 
         device.auth_token = token
-        device.save(update_fields=["auth_token"])
+        device.save(update_fields=["auth_token", "updated_at"])  # updated_at: the device registry refreshes by it
 
         self.stdout.write(self.style.SUCCESS("Token set:"))
         self.stdout.write(f"  device_id = {device.id}")
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-17 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0003_alter_device_totp_secret'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='device',
+            name='android_device_id',
+            field=models.CharField(blank=True, db_index=True, max_length=128, null=True),
+        ),
+    ]
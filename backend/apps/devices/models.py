@@ -1,13 +1,18 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from apps.access.querysets import ChangeLoggedQuerySet
+
 User = get_user_model()
 
 class Device(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="devices")
     name = models.CharField(max_length=100, blank=True)
-    android_device_id = models.CharField(max_length=128, blank=True, null=True)
+    android_device_id = models.CharField(max_length=128, blank=True, null=True, db_index=True)
     totp_secret = models.CharField(max_length=64, blank=True)  # base32 - kept for future use
     auth_token = models.CharField(max_length=64, unique=True)  # static token for auth
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # device registry refreshes by it
+
+    objects = ChangeLoggedQuerySet.as_manager()
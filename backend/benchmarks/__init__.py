@@ -0,0 +1,7 @@
+"""Benchmarks and load tests for the access API.
+
+* ``python manage.py seed_benchmark`` - seed a realistic dataset and write a manifest;
+* ``python -m benchmarks.loadgen`` - replay mixed traffic and report throughput/latency as JSON;
+* ``python -m benchmarks.bench_verify_response`` - verify fast path microbenchmark;
+* ``python -m benchmarks.bench_logging`` - access-log formatter and handler throughput.
+"""
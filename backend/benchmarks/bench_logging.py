@@ -0,0 +1,104 @@
+"""Access-log throughput: the previous inline JSON formatter vs. the queued pipeline.
+
+    python -m benchmarks.bench_logging [--number N]
+
+Reports formatter records/sec and, for the handlers, what a request thread
+pays per access-log line: format + write with ``StreamHandler``, or copy +
+enqueue with ``QueueingStreamHandler`` (the listener formats and writes).
+Output goes to ``os.devnull`` so the numbers exclude the log consumer.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+import timeit
+from datetime import UTC, datetime
+
+from accessproj.settings.logging_json import METRIC_FIELDS, JSONFormatter, QueueingStreamHandler
+
+
+class LegacyJSONFormatter(logging.Formatter):
+    """The formatter as it was before the queued pipeline, for comparison."""
+
+    def format(self, record):
+        log_data = {
+            "ts": datetime.now(UTC).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if hasattr(record, "request_id"):
+            log_data["request_id"] = record.request_id
+        if hasattr(record, "method"):
+            log_data["method"] = record.method
+        if hasattr(record, "path"):
+            log_data["path"] = record.path
+        if hasattr(record, "status"):
+            log_data["status"] = record.status
+        if hasattr(record, "duration_ms"):
+            log_data["duration_ms"] = record.duration_ms
+        if hasattr(record, "user_id"):
+            log_data["user_id"] = record.user_id
+        for field in METRIC_FIELDS:
+            if hasattr(record, field):
+                log_data[field] = getattr(record, field)
+        if record.exc_info:
+            log_data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(log_data)
+
+
+EXTRA = {
+    "request_id": "6f1c2a52-0b8e-4f4e-9a63-5a4c1d1e2b3f", "method": "POST", "path": "/api/v1/access/verify",
+    "status": 200, "duration_ms": 3, "decision": "ALLOW", "reason": "OK",
+}
+
+
+def make_record():
+    record = logging.LogRecord("django.request", logging.INFO, __file__, 0, "POST /api/v1/access/verify 200 3ms",
+                               None, None)
+    record.__dict__.update(EXTRA)
+    return record
+
+
+def bench_formatters(number, repeat):
+    record = make_record()
+    results = {}
+    for name, formatter in (("legacy", LegacyJSONFormatter()), ("compiled", JSONFormatter())):
+        best = min(timeit.repeat(lambda f=formatter: f.format(record), number=number, repeat=repeat))
+        results[name] = number / best
+        print(f"{name + ' formatter':>22}: {results[name]:12,.0f} records/s")
+    print(f"{'speedup':>22}: {results['compiled'] / results['legacy']:12.2f}x")
+
+
+def bench_handlers(number, repeat):
+    sink = open(os.devnull, "w")  # noqa: SIM115 - closed below
+    stream = logging.StreamHandler(sink)
+    stream.setFormatter(LegacyJSONFormatter())
+    queued = QueueingStreamHandler(sink, maxsize=number * 2)
+    queued.setFormatter(JSONFormatter())
+    record = make_record()
+    for name, handler in (("StreamHandler", stream), ("QueueingStreamHandler", queued)):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(number):
+                handler.handle(record)
+            best = min(best, time.perf_counter() - started)
+            if handler is queued:
+                queued.flush_and_stop()  # drain before the next round
+        print(f"{name:>22}: {best / number * 1e6:8.2f} us/record on the request thread")
+    sink.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    bench_formatters(args.number, args.repeat)
+    bench_handlers(args.number, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Per-request CPU of verify validation + response: DRF serializers vs. ``apps.api.v1.fastpath``.
+
+    python -m benchmarks.bench_verify_response [--number N]
+
+Measures only the work around the decision (validate the body, build and
+encode the response), which is what the fast path replaced.
+"""
+import argparse
+import os
+import timeit
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "accessproj.settings.test")
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.response import Response  # noqa: E402
+
+from apps.api.v1 import fastpath  # noqa: E402
+from apps.api.v1.serializers import VerifyRequestSerializer, VerifyResponseSerializer  # noqa: E402
+
+BODY = {"gate_id": "gate-01", "token": "0123456789abcdef0123456789abcdef01234567"}
+RENDERER = JSONRenderer()
+
+
+def serializer_path():
+    req = VerifyRequestSerializer(data=BODY)
+    req.is_valid(raise_exception=True)
+    ser = VerifyResponseSerializer(data={"decision": "ALLOW", "reason": "OK", "duration_ms": 800})
+    ser.is_valid(raise_exception=True)
+    resp = Response(ser.validated_data, status=200)
+    return RENDERER.render(resp.data)  # what finalize_response + render would do
+
+
+def fast_path():
+    fastpath.validate_verify_request(BODY)
+    return fastpath.verify_response("ALLOW", "OK").content
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    for name, fn in (("serializer", serializer_path), ("fastpath", fast_path)):
+        best = min(timeit.repeat(fn, number=args.number, repeat=args.repeat))
+        results[name] = best / args.number * 1e6
+        print(f"{name:>10}: {results[name]:8.2f} us/request")
+    saved = results["serializer"] - results["fastpath"]
+    print(f"{'saved':>10}: {saved:8.2f} us/request ({results['serializer'] / results['fastpath']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""Load driver: replay mixed access-API traffic and report throughput and latency as JSON.
+
+    python -m benchmarks.loadgen --manifest benchmarks/manifest.json --url http://localhost:8001 \\
+        --duration 30 --concurrency 32 --out reports/bench.json
+
+Scenarios (weights via ``--mix name=weight,...``):
+
+* ``verify_allow`` / ``verify_credential`` - tokens or signed credentials at permitted gates;
+* ``verify_deny`` - NO_PERMISSION, UNKNOWN_GATE and TOKEN_INVALID in equal parts;
+* ``verify_invalid`` - missing fields and short tokens (INVALID_REQUEST);
+* ``verify_throttled`` - every worker hammers the manifest's ``throttle_gate``;
+* ``devices_register`` / ``devices_me`` - the device endpoints, authenticated by user token.
+
+The rate limiter keys on gate and client IP, and all traffic comes from this
+host: the other scenarios spread over the manifest's gates to stay under
+``ACCESS_VERIFY_RATE`` while ``verify_throttled`` concentrates on one gate.
+With few gates, raise the server's rate or the report fills with RATE_LIMIT.
+
+``--transport inprocess`` drives the Django test client in this process
+instead of HTTP, which also yields exact DB queries per request. Over HTTP the
+count is read from the ``db`` entry of the ``Server-Timing`` header when the
+server sends one.
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import UTC, datetime
+from urllib.parse import urlsplit
+
+DEFAULT_MIX = {
+    "verify_allow": 45,
+    "verify_credential": 10,
+    "verify_deny": 20,
+    "verify_invalid": 5,
+    "verify_throttled": 5,
+    "devices_register": 5,
+    "devices_me": 10,
+}
+VERIFY = "/api/v1/access/verify"
+_QUERIES = re.compile(r"(?:^|,)\s*db;[^,]*?desc=\"?(\d+)")
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = dict(DEFAULT_MIX)
+    if text:
+        mix = {}
+        for part in text.split(","):
+            name, _, weight = part.partition("=")
+            if name.strip() not in DEFAULT_MIX:
+                raise SystemExit(f"unknown scenario {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+            mix[name.strip()] = float(weight or 1)
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+class Traffic:
+    """Builds ``(scenario, method, path, body, token)`` requests from a seed manifest."""
+
+    def __init__(self, manifest: dict, mix: dict[str, float], rng: random.Random):
+        self.rng = rng
+        self.gates = manifest["gates"]
+        self.throttle_gate = manifest.get("throttle_gate") or self.gates[-1]
+        self.users = [u for u in manifest["users"] if u["is_active"]]
+        # The throttle gate is kept out of the other scenarios so their answers are not RATE_LIMIT
+        self.allowed = [
+            {**u, "allowed_gates": [g for g in u["allowed_gates"] if g != self.throttle_gate]} for u in self.users
+        ]
+        self.allowed = [u for u in self.allowed if u["allowed_gates"]]
+        self.names = list(mix)
+        self.weights = list(mix.values())
+
+    def next(self):
+        scenario = self.rng.choices(self.names, self.weights)[0]
+        return (scenario, *getattr(self, scenario)())
+
+    def verify_allow(self):
+        user = self.rng.choice(self.allowed)
+        return "POST", VERIFY, {"gate_id": self.rng.choice(user["allowed_gates"]), "token": user["token"]}, None
+
+    def verify_credential(self):
+        user = self.rng.choice(self.allowed)
+        return "POST", VERIFY, {"gate_id": self.rng.choice(user["allowed_gates"]), "token": user["credential"]}, None
+
+    def verify_deny(self):
+        user = self.rng.choice(self.users)
+        kind = self.rng.randrange(3)
+        if kind == 0:
+            denied = sorted(set(self.gates) - set(user["allowed_gates"]) - {self.throttle_gate})
+            if denied:
+                return "POST", VERIFY, {"gate_id": self.rng.choice(denied), "token": user["token"]}, None
+        if kind == 1:
+            return "POST", VERIFY, {"gate_id": f"unknown-{self.rng.randrange(10**6)}", "token": user["token"]}, None
+        return "POST", VERIFY, {"gate_id": self.rng.choice(self.gates), "token": os.urandom(20).hex()}, None
+
+    def verify_invalid(self):
+        if self.rng.random() < 0.5:
+            return "POST", VERIFY, {"gate_id": self.rng.choice(self.gates), "token": "short"}, None
+        return "POST", VERIFY, {"gate_id": self.rng.choice(self.gates)}, None
+
+    def verify_throttled(self):
+        return "POST", VERIFY, {"gate_id": self.throttle_gate, "token": self.rng.choice(self.users)["token"]}, None
+
+    def devices_register(self):
+        user = self.rng.choice(self.users)
+        return "POST", "/api/v1/devices/register", {"rotate": False, "android_device_id": user["username"]}, \
+            user["token"]
+
+    def devices_me(self):
+        return "GET", "/api/v1/devices/me", None, self.rng.choice(self.users)["token"]
+
+
+class HttpTransport:
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        self.host, self.port, self.https = parts.hostname, parts.port, parts.scheme == "https"
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self.local.conn = cls(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def request(self, method, path, body, token):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Token {token}"
+        payload = json.dumps(body) if body is not None else None
+        try:
+            conn = self._conn()
+            conn.request(method, path, body=payload, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except (OSError, http.client.HTTPException):
+            self.local.conn = None  # reconnect on the next request
+            raise
+        match = _QUERIES.search(resp.getheader("Server-Timing") or "")
+        return resp.status, data, int(match.group(1)) if match else None
+
+
+class InProcessTransport:
+    """Django test client in this process; DB queries are counted with ``connection.execute_wrapper``."""
+
+    def __init__(self):
+        from django.db import connection
+        from django.test import Client
+
+        self.client = Client()
+        self.connection = connection
+
+    def request(self, method, path, body, token):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        headers = {"HTTP_AUTHORIZATION": f"Token {token}"} if token else {}
+        with self.connection.execute_wrapper(count):
+            if method == "GET":
+                resp = self.client.get(path, **headers)
+            else:
+                resp = self.client.post(path, json.dumps(body), content_type="application/json", **headers)
+        return resp.status_code, resp.content, queries
+
+
+def percentile(sorted_values: list[float], pct: float) -> float | None:
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))  # nearest rank
+    return round(sorted_values[rank], 3)
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.reasons = defaultdict(Counter)
+        self.queries = defaultdict(list)
+        self.errors = Counter()
+
+    def add(self, scenario, elapsed_ms, status, body, queries):
+        reason = None
+        if status == 200 and body[:1] == b"{":
+            try:
+                reason = json.loads(body).get("reason")
+            except ValueError:
+                pass
+        with self.lock:
+            self.latencies[scenario].append(elapsed_ms)
+            self.statuses[scenario][str(status)] += 1
+            if reason:
+                self.reasons[scenario][reason] += 1
+            if queries is not None:
+                self.queries[scenario].append(queries)
+
+    def error(self, scenario, exc):
+        with self.lock:
+            self.errors[f"{scenario}: {type(exc).__name__}"] += 1
+
+    def summary(self, scenario, wall):
+        lat = sorted(self.latencies[scenario])
+        queries = self.queries[scenario]
+        return {
+            "requests": len(lat),
+            "rps": round(len(lat) / wall, 1),
+            "mean_ms": round(sum(lat) / len(lat), 3) if lat else None,
+            "p50_ms": percentile(lat, 50),
+            "p95_ms": percentile(lat, 95),
+            "p99_ms": percentile(lat, 99),
+            "max_ms": round(lat[-1], 3) if lat else None,
+            "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+            "status": dict(self.statuses[scenario]),
+            "reasons": dict(self.reasons[scenario]),
+        }
+
+
+def run(traffic_factory, transport, concurrency: int, duration: float | None, requests: int | None, warmup: int = 0):
+    recorder = Recorder()
+    deadline = time.monotonic() + duration if duration else None
+    budget = iter(range(requests)) if requests else None
+    budget_lock = threading.Lock()
+
+    def take() -> bool:
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        if budget is not None:
+            with budget_lock:
+                return next(budget, None) is not None
+        return True
+
+    def worker(index):
+        traffic = traffic_factory(index)
+        for _ in range(warmup):
+            _scenario, method, path, body, token = traffic.next()
+            with contextlib.suppress(Exception):  # warm-up failures show up in the measured run
+                transport.request(method, path, body, token)
+        while take():
+            scenario, method, path, body, token = traffic.next()
+            started = time.perf_counter()
+            try:
+                status, data, queries = transport.request(method, path, body, token)
+            except Exception as exc:  # noqa: BLE001 - any failure is counted, not fatal
+                recorder.error(scenario, exc)
+                continue
+            recorder.add(scenario, (time.perf_counter() - started) * 1000, status, data, queries)
+
+    started = time.monotonic()
+    if concurrency == 1:
+        worker(0)
+    else:
+        threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    wall = max(time.monotonic() - started, 1e-9)
+
+    scenarios = {name: recorder.summary(name, wall) for name in sorted(recorder.latencies)}
+    all_lat = sorted(v for values in recorder.latencies.values() for v in values)
+    all_queries = [q for values in recorder.queries.values() for q in values]
+    return {
+        "totals": {
+            "requests": len(all_lat),
+            "errors": sum(recorder.errors.values()),
+            "duration_s": round(wall, 3),
+            "rps": round(len(all_lat) / wall, 1),
+            "p50_ms": percentile(all_lat, 50),
+            "p95_ms": percentile(all_lat, 95),
+            "p99_ms": percentile(all_lat, 99),
+            "queries_per_request": round(sum(all_queries) / len(all_queries), 2) if all_queries else None,
+        },
+        "scenarios": scenarios,
+        "errors": dict(recorder.errors),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--manifest", default="benchmarks/manifest.json", help="Written by manage.py seed_benchmark")
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--transport", choices=("http", "inprocess"), default="http")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run (ignored with --requests)")
+    parser.add_argument("--requests", type=int, default=None, help="Stop after this many requests")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per worker")
+    parser.add_argument("--mix", default="", help="e.g. verify_allow=70,verify_deny=30")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default="-", help="JSON report path, '-' for stdout")
+    args = parser.parse_args(argv)
+
+    with open(args.manifest) as fh:
+        manifest = json.load(fh)
+    mix = parse_mix(args.mix)
+
+    if args.transport == "inprocess":
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "accessproj.settings.dev")
+        import django
+
+        django.setup()
+        transport, concurrency = InProcessTransport(), 1  # one test client, one DB connection
+    else:
+        transport, concurrency = HttpTransport(args.url, args.timeout), args.concurrency
+
+    report = run(
+        lambda i: Traffic(manifest, mix, random.Random(args.seed * 1000 + i)),  # noqa: S311 - reproducible load
+        transport,
+        concurrency,
+        None if args.requests else args.duration,
+        args.requests,
+        args.warmup,
+    )
+    report["meta"] = {
+        "started_at": datetime.now(UTC).isoformat(),
+        "target": "inprocess" if args.transport == "inprocess" else args.url,
+        "concurrency": concurrency,
+        "mix": mix,
+        "dataset": manifest.get("counts"),
+    }
+    text = json.dumps(report, indent=2)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w") as fh:
+            fh.write(text + "\n")
+        totals = report["totals"]
+        print(f"{totals['requests']} requests, {totals['rps']} req/s, p50 {totals['p50_ms']} ms, "
+              f"p99 {totals['p99_ms']} ms -> {args.out}", file=sys.stderr)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import csv
+import io
+import json
+import random
+import secrets
+import time
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.authtoken.models import Token
+
+from apps.access import authz, changelog, credentials, effective, partitions
+from apps.access import devices as device_registry
+from apps.access.models import AccessEvent, AccessPermission, AccessPoint
+from apps.devices.models import Device
+
+User = get_user_model()
+REASONS_DENY = ("TOKEN_INVALID", "NO_PERMISSION", "UNKNOWN_GATE", "INVALID_REQUEST", "RATE_LIMIT")
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a benchmark dataset: N gates, M users in K groups with a permission fan-out, one device "
+        "and token per user, and historical AccessEvents. Writes a JSON manifest for benchmarks.loadgen."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--gates", type=int, default=200)
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--groups", type=int, default=50)
+        parser.add_argument("--groups-per-user", type=int, default=2)
+        parser.add_argument("--gates-per-group", type=int, default=10, help="Permission fan-out per group")
+        parser.add_argument("--direct-grants", type=float, default=0.05,
+                            help="Fraction of users that also get one direct user permission")
+        parser.add_argument("--inactive", type=float, default=0.02, help="Fraction of deactivated users")
+        parser.add_argument("--events", type=int, default=1_000_000, help="Historical AccessEvent rows")
+        parser.add_argument("--days", type=int, default=90, help="Spread events over this many past days")
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--prefix", default="bench")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--manifest", default="benchmarks/manifest.json")
+        parser.add_argument("--manifest-users", type=int, default=1000, help="Users sampled into the manifest")
+        parser.add_argument("--clear", action="store_true", help="Delete a previous dataset with the same prefix")
+
+    def handle(self, *args, **opts):
+        self.rng = random.Random(opts["seed"])  # noqa: S311 - reproducible fixtures, not secrets
+        prefix = opts["prefix"]
+        started = time.monotonic()
+        if opts["clear"]:
+            self._clear(prefix)
+
+        with transaction.atomic():
+            gates = self._gates(prefix, opts["gates"])
+            groups = self._groups(prefix, opts["groups"])
+            users = self._users(prefix, opts["users"], opts["inactive"])
+            allowed = self._permissions(gates, groups, users, opts)
+            tokens, devices = self._tokens_and_devices(users)
+        self.stdout.write(f"Seeded {len(gates)} gates, {len(groups)} groups, {len(users)} users "
+                          f"({time.monotonic() - started:.1f}s)")
+
+        if opts["events"]:
+            self._events(gates, users, devices, opts)
+        # bulk inserts bypass the signals (the change log is written next to each insert)
+        authz.invalidate()
+        device_registry.changed()
+
+        manifest = self._manifest(prefix, gates, users, tokens, devices, allowed, opts)
+        path = Path(opts["manifest"])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(manifest, indent=1))
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.monotonic() - started:.1f}s; manifest: {path}"))
+
+    def _clear(self, prefix):
+        gates = AccessPoint.objects.filter(code__startswith=f"{prefix}-gate-")
+        AccessEvent.objects.filter(access_point__in=gates).delete()
+        gates.delete()
+        Group.objects.filter(name__startswith=f"{prefix}-group-").delete()
+        User.objects.filter(username__startswith=f"{prefix}-user-").delete()
+
+    def _gates(self, prefix, n):
+        AccessPoint.objects.bulk_create(
+            [AccessPoint(code=f"{prefix}-gate-{i:05d}", name=f"Benchmark gate {i}") for i in range(n)],
+            batch_size=1000,
+        )
+        return list(AccessPoint.objects.filter(code__startswith=f"{prefix}-gate-").order_by("id"))
+
+    def _groups(self, prefix, n):
+        Group.objects.bulk_create([Group(name=f"{prefix}-group-{i:04d}") for i in range(n)])
+        return list(Group.objects.filter(name__startswith=f"{prefix}-group-").order_by("id"))
+
+    def _users(self, prefix, n, inactive):
+        password = make_password(None)  # unusable; hashing once keeps seeding fast
+        User.objects.bulk_create(
+            [
+                User(username=f"{prefix}-user-{i:07d}", password=password, is_active=self.rng.random() >= inactive)
+                for i in range(n)
+            ],
+            batch_size=5000,
+        )
+        users = list(User.objects.filter(username__startswith=f"{prefix}-user-").order_by("id"))
+        changelog.record_many(changelog.entry(u) for u in users)
+        return users
+
+    def _permissions(self, gates, groups, users, opts) -> dict[int, set[int]]:
+        """Group memberships and grants; returns allowed gate ids per user id."""
+        group_gates = {g.id: self.rng.sample(gates, min(opts["gates_per_group"], len(gates))) for g in groups}
+        AccessPermission.objects.bulk_create(
+            [
+                AccessPermission(access_point=ap, group_id=gid, allow=True)
+                for gid, aps in group_gates.items()
+                for ap in aps
+            ],
+            batch_size=5000,
+        )
+        allowed: dict[int, set[int]] = {}
+        memberships, direct = [], []
+        for user in users:
+            mine = self.rng.sample(groups, min(opts["groups_per_user"], len(groups))) if groups else []
+            memberships.extend(User.groups.through(user_id=user.id, group_id=g.id) for g in mine)
+            allowed[user.id] = {ap.id for g in mine for ap in group_gates[g.id]}
+            if gates and self.rng.random() < opts["direct_grants"]:
+                ap = self.rng.choice(gates)
+                if ap.id not in allowed[user.id]:
+                    direct.append(AccessPermission(access_point=ap, user=user, allow=True))
+                    allowed[user.id].add(ap.id)
+        User.groups.through.objects.bulk_create(memberships, batch_size=10000)
+        AccessPermission.objects.bulk_create(direct, batch_size=5000)
+        changelog.record_many(changelog.membership(m.user_id, m.group_id) for m in memberships)
+        effective.refresh()  # the bulk inserts above bypass the signals
+        return allowed
+
+    def _tokens_and_devices(self, users):
+        tokens = [Token(key=Token.generate_key(), user=u) for u in users]
+        Token.objects.bulk_create(tokens, batch_size=5000)
+        Device.objects.bulk_create(
+            [Device(user=u, name="Benchmark device", auth_token=secrets.token_hex(32)) for u in users],
+            batch_size=5000,
+        )
+        changelog.record_many(changelog.entry(t) for t in tokens)  # devices log their own bulk_create
+        devices = dict(Device.objects.filter(user_id__gte=users[0].id, user_id__lte=users[-1].id)
+                       .values_list("user_id", "id")) if users else {}
+        return {t.user_id: t.key for t in tokens}, devices
+
+    def _events(self, gates, users, devices, opts):
+        total, batch_size = opts["events"], opts["batch_size"]
+        now = datetime.now(UTC)
+        oldest = now - timedelta(days=opts["days"])
+        if partitions.is_partitioned():
+            partitions.ensure_partitions(since=oldest.date())
+        span = (now - oldest).total_seconds()
+        insert = self._copy_events if connection.vendor == "postgresql" else self._bulk_create_events
+        started, done = time.monotonic(), 0
+        while done < total:
+            rows = []
+            for _ in range(min(batch_size, total - done)):
+                gate, user = self.rng.choice(gates), self.rng.choice(users)
+                allow = self.rng.random() < 0.8
+                rows.append((
+                    gate.id, user.id, devices.get(user.id), "ALLOW" if allow else "DENY",
+                    "OK" if allow else self.rng.choice(REASONS_DENY),
+                    {"gate_id": gate.code, "token": "…"},
+                    oldest + timedelta(seconds=self.rng.random() * span),
+                ))
+            with transaction.atomic():
+                insert(rows)
+            done += len(rows)
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"  events: {done}/{total} ({done / max(elapsed, 1e-6):.0f} rows/s)")
+
+    def _bulk_create_events(self, rows):
+        AccessEvent.objects.bulk_create([
+            AccessEvent(access_point_id=ap, user_id=u, device_id=d, decision=dec, reason=r, raw=raw, created_at=ts)
+            for ap, u, d, dec, r, raw, ts in rows
+        ])
+
+    def _copy_events(self, rows):
+        # COPY is several times faster than multi-row INSERT for millions of rows
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for ap, u, d, dec, r, raw, ts in rows:
+            writer.writerow([ap, u, "" if d is None else d, dec, r, json.dumps(raw), ts.isoformat()])
+        buf.seek(0)
+        with connection.cursor() as cur:
+            cur.copy_expert(
+                f"COPY {AccessEvent._meta.db_table} (access_point_id, user_id, device_id, decision, reason, raw, "
+                f"created_at) FROM STDIN WITH (FORMAT csv)",
+                buf,
+            )
+
+    def _manifest(self, prefix, gates, users, tokens, devices, allowed, opts):
+        codes = {g.id: g.code for g in gates}
+        sample = self.rng.sample(users, min(opts["manifest_users"], len(users)))
+        return {
+            "prefix": prefix,
+            "seeded_at": datetime.now(UTC).isoformat(),
+            "counts": {k: opts[k] for k in ("gates", "users", "groups", "events")},
+            "gates": [g.code for g in gates],
+            # Reserved for throttled traffic so it does not skew the other scenarios' rate limits
+            "throttle_gate": gates[-1].code if gates else None,
+            "users": [
+                {
+                    "username": u.username,
+                    "token": tokens[u.id],
+                    "is_active": u.is_active,
+                    "allowed_gates": sorted(codes[ap] for ap in allowed[u.id]),
+                    "credential": credentials.issue(u.id, devices[u.id], ttl=30 * 86400),
+                }
+                for u in sample
+            ],
+        }
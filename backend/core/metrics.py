@@ -0,0 +1,381 @@
+"""Prometheus metrics aggregated across all workers on one host (``ACCESS_METRICS``).
+
+Every process writes its samples into its own memory-mapped file under
+``<shared state dir>/metrics``. Recording a sample is a ``struct`` read and
+write at an offset cached per label set, no syscall. ``/metrics`` reads every
+worker's file and sums the samples (gauges only for processes that are still
+alive), so the numbers cover all gunicorn workers whichever one answers the
+scrape.
+
+A worker records from several threads at once: gthread and runserver request
+threads, ``sync_to_async`` threads under ASGI (SQL counters, snapshot
+rebuilds) next to the event loop, and background writers. Counter increments
+are a read-modify-write, so they take the store's lock; it is uncontended in
+the common case. Gauge sets are a single write and take no lock.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from core.shared import shared_state_dir
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_F64 = struct.Struct("<d")
+_INITIAL_SIZE = 1 << 16
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+class _ProcessStore:
+    """Append-only ``key -> float64`` map in a file owned by one process.
+
+    Layout: a u64 count of used bytes, then entries of ``u32 key length, key,
+    padding to 8 bytes, f64 value``. An entry is written before the header
+    covers it, so readers in other processes never see a partial one.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)  # a dead worker may have had our pid
+        os.ftruncate(self._fd, _INITIAL_SIZE)
+        self._capacity = _INITIAL_SIZE
+        self._mm = mmap.mmap(self._fd, _INITIAL_SIZE)
+        self._used = _U64.size
+        _U64.pack_into(self._mm, 0, self._used)
+        self._offsets: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def slot(self, key: str) -> int:
+        """Offset of the value for ``key``, appending a zeroed entry on first use."""
+        offset = self._offsets.get(key)
+        if offset is None:
+            with self._lock:
+                offset = self._offsets.get(key)
+                if offset is None:
+                    offset = self._offsets[key] = self._append(key.encode())
+        return offset
+
+    def _append(self, encoded: bytes) -> int:
+        start = self._used
+        value_at = _align(start + _U32.size + len(encoded))
+        end = value_at + _F64.size
+        if end > self._capacity:
+            while self._capacity < end:
+                self._capacity *= 2
+            os.ftruncate(self._fd, self._capacity)
+            # The old mapping is left for the GC: a concurrent writer may still hold it,
+            # and its writes land in the same file.
+            self._mm = mmap.mmap(self._fd, self._capacity)
+        mm = self._mm
+        _U32.pack_into(mm, start, len(encoded))
+        mm[start + _U32.size:start + _U32.size + len(encoded)] = encoded
+        _F64.pack_into(mm, value_at, 0.0)
+        self._used = end
+        _U64.pack_into(mm, 0, end)
+        return value_at
+
+    def add(self, offset: int, amount: float) -> None:
+        with self._lock:
+            mm = self._mm
+            _F64.pack_into(mm, offset, _F64.unpack_from(mm, offset)[0] + amount)
+
+    def set(self, offset: int, value: float) -> None:
+        _F64.pack_into(self._mm, offset, value)
+
+
+class _NullStore:
+    """Used when ``ACCESS_METRICS`` is off: recording costs a dict lookup and a call."""
+
+    def slot(self, key: str) -> int:
+        return 0
+
+    def add(self, offset: int, amount: float) -> None:
+        pass
+
+    def set(self, offset: int, value: float) -> None:
+        pass
+
+
+_store: _ProcessStore | _NullStore | None = None
+_store_lock = threading.Lock()
+
+
+def metrics_dir() -> Path:
+    path = shared_state_dir() / "metrics"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if getattr(settings, "ACCESS_METRICS", False):
+                    _store = _ProcessStore(metrics_dir() / f"{os.getpid()}.db")
+                else:
+                    _store = _NullStore()
+    return _store
+
+
+def _read(path: Path):
+    """``(key, value)`` pairs from another process's store file."""
+    data = path.read_bytes()
+    if len(data) < _U64.size:
+        return
+    used = min(_U64.unpack_from(data, 0)[0], len(data))
+    pos = _U64.size
+    while pos + _U32.size <= used:
+        length = _U32.unpack_from(data, pos)[0]
+        value_at = _align(pos + _U32.size + length)
+        if value_at + _F64.size > used:
+            break
+        yield data[pos + _U32.size:pos + _U32.size + length].decode(), _F64.unpack_from(data, value_at)[0]
+        pos = value_at + _F64.size
+
+
+def _alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_REGISTRY: dict[str, "_Metric"] = {}
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: dict[tuple, object] = {}
+        _REGISTRY[name] = self
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values!r}")
+            child = self._children[values] = self._child([str(v) for v in values])
+        return child
+
+    def _key(self, values: list[str], part="") -> str:
+        return json.dumps([self.name, values, part], ensure_ascii=False, separators=(",", ":"))
+
+    def _render_labels(self, values, extra=()) -> str:
+        pairs = [*zip(self.labelnames, values, strict=True), *extra]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def render(self, samples: dict) -> list[str]:
+        if not samples and not self.labelnames:
+            samples = {((), ""): 0.0}
+        return [f"{self.name}{self._render_labels(values)} {value!r}" for (values, _), value in sorted(samples.items())]
+
+
+class _ValueChild:
+    __slots__ = ("_offset",)
+
+    def __init__(self, offset: int):
+        self._offset = offset
+
+
+class _CounterChild(_ValueChild):
+    __slots__ = ()
+
+    def inc(self, amount: float = 1.0) -> None:
+        _get_store().add(self._offset, amount)
+
+
+class _GaugeChild(_ValueChild):
+    __slots__ = ()
+
+    def set(self, value: float) -> None:
+        _get_store().set(self._offset, value)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self, values):
+        return _CounterChild(_get_store().slot(self._key(values)))
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """Summed over live workers; samples of exited processes are dropped."""
+
+    kind = "gauge"
+
+    def _child(self, values):
+        return _GaugeChild(_get_store().slot(self._key(values)))
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_buckets", "_sum")
+
+    def __init__(self, bounds, buckets, sum_offset):
+        self._bounds = bounds
+        self._buckets = buckets
+        self._sum = sum_offset
+
+    def observe(self, value: float) -> None:
+        store = _get_store()
+        store.add(self._buckets[bisect_left(self._bounds, value)], 1.0)
+        store.add(self._sum, value)
+
+
+class Histogram(_Metric):
+    """Per-bucket counts are stored; cumulative ``_bucket`` and ``_count`` are derived when rendering."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _child(self, values):
+        store = _get_store()
+        buckets = [store.slot(self._key(values, i)) for i in range(len(self.buckets) + 1)]  # last one is +Inf
+        return _HistogramChild(self.buckets, buckets, store.slot(self._key(values, "sum")))
+
+    def render(self, samples: dict) -> list[str]:
+        series: dict[tuple, list] = defaultdict(lambda: [[0.0] * (len(self.buckets) + 1), 0.0])
+        for (values, part), value in samples.items():
+            if part == "sum":
+                series[values][1] += value
+            else:
+                series[values][0][part] += value
+        lines = []
+        for values, (counts, total) in sorted(series.items()):
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, None), counts, strict=True):
+                cumulative += count
+                le = "+Inf" if bound is None else repr(float(bound))
+                lines.append(f"{self.name}_bucket{self._render_labels(values, [('le', le)])} {cumulative!r}")
+            lines.append(f"{self.name}_sum{self._render_labels(values)} {total!r}")
+            lines.append(f"{self.name}_count{self._render_labels(values)} {cumulative!r}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def collect() -> dict[str, dict[tuple, float]]:
+    """Samples summed over every worker's file: ``{metric: {(label values, part): value}}``."""
+    samples: dict[str, dict[tuple, float]] = defaultdict(lambda: defaultdict(float))
+    for path in metrics_dir().glob("*.db"):
+        try:
+            live = _alive(int(path.stem))
+            entries = list(_read(path))
+        except (ValueError, OSError):
+            continue  # not ours, or removed by a concurrent cleanup
+        for key, value in entries:
+            name, values, part = json.loads(key)
+            metric = _REGISTRY.get(name)
+            if metric is None or (metric.kind == "gauge" and not live):
+                continue
+            samples[name][tuple(values), part] += value
+    return samples
+
+
+def exposition() -> str:
+    """Prometheus text format (0.0.4) for every registered metric."""
+    samples = collect()
+    lines = []
+    for metric in _REGISTRY.values():
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render(samples.get(metric.name, {})))
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    """Forget this process's store and cached offsets; the next sample opens a fresh file."""
+    global _store
+    with _store_lock:
+        _store = None
+        for metric in _REGISTRY.values():
+            metric._children.clear()
+
+
+# A worker forked from a preloaded master must not write into the master's file
+os.register_at_fork(after_in_child=reset)
+
+
+def _count_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        alias = context["connection"].alias
+        DB_QUERIES.labels(alias).inc()
+        DB_QUERY_SECONDS.labels(alias).inc(time.perf_counter() - started)
+
+
+def _install(sender, connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def install_db_wrapper() -> None:
+    """Count SQL on this thread's open connections and every one opened later (idempotent)."""
+    connection_created.connect(_install, dispatch_uid="core.metrics.count_query")
+    for conn in connections.all(initialized_only=True):
+        _install(None, conn)
+
+
+VERIFY_DURATION = Histogram(
+    "access_verify_duration_seconds",
+    "Time to answer /api/v1/access/verify, by decision, reason and gate (empty for unknown gates).",
+    ("decision", "reason", "gate"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+THROTTLED = Counter("access_throttled_total", "Requests rejected by the gate rate limiter.", ("scope",))
+EVENT_QUEUE_DEPTH = Gauge("access_event_queue_depth", "Access events queued in worker memory, not yet written.")
+EVENTS_SHED = Counter(
+    "access_events_shed_total",
+    "Access events past the worker's queue limit: spilled = kept only in the spill file, dropped = lost.",
+    ("result",),
+)
+EVENT_STREAM_DROPPED = Counter(
+    "access_event_stream_dropped_total",
+    "Live events dropped before reaching other workers because the relay outbox was full.",
+)
+DB_QUERIES = Counter("access_db_queries_total", "SQL statements executed.", ("alias",))
+DB_QUERY_SECONDS = Counter("access_db_query_seconds_total", "Time spent executing SQL statements.", ("alias",))
+AUTHZ_SNAPSHOT_LOOKUPS = Counter(
+    "access_authz_snapshot_lookups_total",
+    "Authorization snapshot lookups: hit = served from the worker's snapshot, miss = rebuilt first.",
+    ("result",),
+)
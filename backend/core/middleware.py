@@ -1,18 +1,37 @@
-"""Custom middleware for request tracking and logging."""
+"""Custom middleware for request tracking and logging.
+
+Both classes work under WSGI and ASGI: with an async ``get_response`` they
+stay on the event loop instead of making Django adapt them through a thread.
+"""
 import time
 import uuid
 import logging
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject, empty
+
+from core import metrics as prometheus
+from core import timing
+
 logger = logging.getLogger("django.request")
 
 
 class RequestIdMiddleware:
     """Middleware to add X-Request-ID to requests and responses."""
     
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
     
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
         # Get or generate request ID
         request_id = request.headers.get("X-Request-ID", str(uuid.uuid4()))
         request.request_id = request_id
@@ -25,20 +44,85 @@ class RequestIdMiddleware:
         
         return response
 
+    async def __acall__(self, request):
+        request_id = request.headers.get("X-Request-ID", str(uuid.uuid4()))
+        request.request_id = request_id
+        response = await self.get_response(request)
+        response["X-Request-ID"] = request_id
+        return response
+
 
 class AccessLogMiddleware:
-    """Middleware to log all requests in JSON format."""
+    """Middleware to log all requests in JSON format.
+
+    With ``ACCESS_REQUEST_METRICS`` on, each request also gets query count, DB
+    time, hot-path timers and the verify decision (see ``core.timing``), as log
+    fields and in a ``Server-Timing`` header.
+    """
     
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        is_async = iscoroutinefunction(get_response)
+        if is_async:
+            markcoroutinefunction(self)
+        if getattr(settings, "ACCESS_METRICS", False):
+            prometheus.install_db_wrapper()
+        self.metrics = getattr(settings, "ACCESS_REQUEST_METRICS", False)
+        if self.metrics:
+            timing.install_db_wrapper()
+            # Only defined when needed: a sync hook under ASGI would cost a thread hop per request
+            self.process_view = self._aprocess_view if is_async else self._process_view
     
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
         # Record start time
         start_time = time.time()
         
+        metrics = token = None
+        if self.metrics:
+            metrics, token = timing.start()
+
         # Process request
-        response = self.get_response(request)
-        
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                timing.stop(token)
+        self._log(request, response, start_time, getattr(request, "user", None), metrics)
+        return response
+
+    async def __acall__(self, request):
+        start_time = time.time()
+        metrics = token = None
+        if self.metrics:
+            metrics, token = timing.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                timing.stop(token)
+        user = getattr(request, "user", None)
+        if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+            # Not resolved by the view (DRF replaces it with the authenticated user);
+            # evaluating it here would load the session synchronously.
+            user = await request.auser()
+        self._log(request, response, start_time, user, metrics)
+        return response
+
+    def _process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = timing.current()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self._process_view(request, view_func, view_args, view_kwargs)
+
+    def _log(self, request, response, start_time, user, metrics=None):
         # Calculate duration
         duration_ms = int((time.time() - start_time) * 1000)
         
@@ -52,14 +136,25 @@ class AccessLogMiddleware:
         }
         
         # Add user ID if authenticated
-        if hasattr(request, "user") and request.user.is_authenticated:
-            log_extra["user_id"] = request.user.id
+        if user is not None and user.is_authenticated:
+            log_extra["user_id"] = user.id
+
+        # Verify decision, also without metrics: the access log samples ALLOW lines by it
+        data = getattr(response, "data", None)
+        if isinstance(data, dict) and "decision" in data:
+            log_extra["decision"] = data["decision"]
+            log_extra["reason"] = data.get("reason")
+
+        if metrics is not None:
+            now = time.perf_counter()
+            if metrics.view_started is not None:
+                metrics.add("view", (now - metrics.view_started) * 1000)
+            log_extra.update(metrics.log_fields())
+            response["Server-Timing"] = metrics.server_timing((now - metrics.started) * 1000)
         
         # Log the request
         logger.info(
             f"{request.method} {request.path} {response.status_code} {duration_ms}ms",
             extra=log_extra
         )
-        
-        return response
 
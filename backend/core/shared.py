@@ -0,0 +1,64 @@
+"""Memory-mapped primitives shared between worker processes on one host."""
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+_U64 = struct.Struct("<Q")
+
+
+def shared_state_dir() -> Path:
+    """Directory holding the mmap files shared by all workers of this host."""
+    configured = getattr(settings, "ACCESS_SHARED_STATE_DIR", "")
+    path = Path(configured) if configured else Path(tempfile.gettempdir()) / "openway-access"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def open_shared_file(name: str, size: int) -> tuple[int, mmap.mmap]:
+    """Open (creating if needed) a shared file of at least ``size`` bytes and map it."""
+    fd = os.open(shared_state_dir() / name, os.O_RDWR | os.O_CREAT, 0o600)
+    if os.fstat(fd).st_size < size:
+        os.ftruncate(fd, size)
+    return fd, mmap.mmap(fd, size)
+
+
+class SharedCounter:
+    """Monotonic 64-bit counter living in a memory-mapped file.
+
+    Reading is a single load from the mapping, so it is cheap enough for the
+    verify hot path. Increments take an exclusive ``flock`` so concurrent
+    workers never lose an update.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._fd: int | None = None
+        self._mm: mmap.mmap | None = None
+        self._lock = threading.Lock()
+
+    def _map(self) -> mmap.mmap:
+        if self._mm is None:
+            with self._lock:
+                if self._mm is None:
+                    self._fd, self._mm = open_shared_file(f"{self.name}.counter", _U64.size)
+        return self._mm
+
+    def value(self) -> int:
+        return _U64.unpack_from(self._map(), 0)[0]
+
+    def incr(self) -> int:
+        mm = self._map()
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                value = _U64.unpack_from(mm, 0)[0] + 1
+                _U64.pack_into(mm, 0, value)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return value
@@ -0,0 +1,112 @@
+"""Opt-in per-request instrumentation (``ACCESS_REQUEST_METRICS``).
+
+``AccessLogMiddleware`` starts a :class:`RequestMetrics` for each request and
+keeps it in a context variable, so it follows the request into
+``sync_to_async`` threads under ASGI. Code on the hot path adds to it with
+:func:`timer` and :func:`annotate`; both are no-ops when instrumentation is
+off. SQL is counted and timed by a wrapper that :func:`install_db_wrapper`
+adds to every database connection as it is opened.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Emitted in this order in Server-Timing and as "<name>_ms" log fields
+SPANS = ("throttle", "serialize", "authz", "view")
+
+
+class RequestMetrics:
+    __slots__ = ("db_ms", "decision", "queries", "reason", "spans", "started", "view_started")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.queries = 0
+        self.db_ms = 0.0
+        self.spans: dict[str, float] = {}
+        self.decision = None
+        self.reason = None
+
+    def add(self, name: str, ms: float):
+        self.spans[name] = self.spans.get(name, 0.0) + ms
+
+    def log_fields(self) -> dict:
+        fields = {"db_queries": self.queries, "db_ms": round(self.db_ms, 3)}
+        for name in SPANS:
+            if name in self.spans:
+                fields[f"{name}_ms"] = round(self.spans[name], 3)
+        if self.decision is not None:
+            fields["decision"] = self.decision
+            fields["reason"] = self.reason
+        return fields
+
+    def server_timing(self, total_ms: float) -> str:
+        parts = [f'db;dur={self.db_ms:.3f};desc="{self.queries} queries"']
+        parts += [f"{name};dur={self.spans[name]:.3f}" for name in SPANS if name in self.spans]
+        if self.decision is not None:
+            parts.append(f'decision;desc="{self.decision} {self.reason}"')
+        parts.append(f"total;dur={total_ms:.3f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[RequestMetrics | None] = ContextVar("request_metrics", default=None)
+
+
+def current() -> RequestMetrics | None:
+    return _current.get()
+
+
+def start() -> tuple[RequestMetrics, object]:
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def stop(token) -> None:
+    _current.reset(token)
+
+
+@contextmanager
+def timer(name: str):
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, (time.perf_counter() - started) * 1000)
+
+
+def annotate(decision: str, reason: str) -> None:
+    """Record the verify outcome for the access log."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.decision, metrics.reason = decision, reason
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_ms += (time.perf_counter() - started) * 1000
+
+
+def _install(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def install_db_wrapper() -> None:
+    """Count and time SQL on this thread's open connections and every one opened later (idempotent)."""
+    connection_created.connect(_install, dispatch_uid="core.timing.record_query")
+    for conn in connections.all(initialized_only=True):
+        _install(None, conn)
@@ -1,8 +1,14 @@
+import ipaddress
+
+from django.conf import settings
 from django.db import connection
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.views.decorators.http import require_GET
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 
+from core import metrics as prometheus
+
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
@@ -21,3 +27,21 @@ def ready(request):
         return JsonResponse({"status": "ready"})
     except Exception:
         return JsonResponse({"status": "not-ready"}, status=503)
+
+
+def _metrics_client_allowed(addr: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(addr)
+    except ValueError:
+        return False
+    return any(ip in ipaddress.ip_network(net, strict=False) for net in settings.ACCESS_METRICS_ALLOWED_IPS)
+
+
+@require_GET
+def metrics(request):
+    """Prometheus scrape target; sums the samples of every worker on this host."""
+    if not settings.ACCESS_METRICS:
+        raise Http404
+    if not _metrics_client_allowed(request.META.get("REMOTE_ADDR", "")):
+        return HttpResponseForbidden()
+    return HttpResponse(prometheus.exposition(), content_type=prometheus.CONTENT_TYPE)
@@ -7,20 +7,41 @@ set -e
 ./scripts/wait-for-db.sh
 
 python manage.py migrate --noinput
+python manage.py ensure_event_partitions
 python manage.py collectstatic --noinput || true
 
+# Per-worker /metrics files of a previous run would otherwise be summed into the new one
+rm -rf "${ACCESS_SHARED_STATE_DIR:-${TMPDIR:-/tmp}/openway-access}/metrics"
+
 # Conditional server startup based on environment
-if [[ "$DJANGO_SETTINGS_MODULE" == *"prod"* ]]; then
+# SERVER_MODE=asgi runs uvicorn workers under gunicorn: verify waits on the DB
+# without holding a worker, so each process serves many turnstiles at once.
+if [[ "$DJANGO_SETTINGS_MODULE" == *"prod"* && "${SERVER_MODE:-wsgi}" == "asgi" ]]; then
+    echo "Starting production server with Gunicorn + Uvicorn workers (ASGI)..."
+    # Persistent connections are per thread; under ASGI they would pile up, so use short-lived ones
+    export DB_CONN_MAX_AGE="${DB_CONN_MAX_AGE:-0}"
+    exec gunicorn accessproj.asgi:application \
+        --worker-class uvicorn_worker.UvicornWorker \
+        --bind 0.0.0.0:8000 \
+        --workers "${WEB_WORKERS:-4}" \
+        --timeout 120 \
+        --graceful-timeout 30 \
+        --access-logfile - \
+        --error-logfile -
+elif [[ "$DJANGO_SETTINGS_MODULE" == *"prod"* ]]; then
     echo "Starting production server with Gunicorn..."
     exec gunicorn accessproj.wsgi:application \
         --bind 0.0.0.0:8000 \
-        --workers 4 \
+        --workers "${WEB_WORKERS:-4}" \
         --timeout 120 \
         --access-logfile - \
         --error-logfile -
 elif [[ "$DJANGO_SETTINGS_MODULE" == *"test"* ]]; then
     echo "Test environment detected, running tests..."
     exec python manage.py test
+elif [[ "${SERVER_MODE:-wsgi}" == "asgi" ]]; then
+    echo "Starting development server with Uvicorn (ASGI)..."
+    exec uvicorn accessproj.asgi:application --host 0.0.0.0 --port 8000 --reload
 else
     echo "Starting development server..."
     exec python manage.py runserver 0.0.0.0:8000
@@ -0,0 +1,180 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from django.test import override_settings
+from django.utils.timezone import now
+
+from apps.access import events
+from apps.access.events import BufferedEventSink, RateLimitAggregator, replay_spill
+from apps.access.models import AccessEvent, AccessPoint
+
+
+@pytest.fixture
+def spill_path(tmp_path):
+    with override_settings(ACCESS_EVENT_SPILL_DIR=str(tmp_path)):
+        yield tmp_path
+
+
+@pytest.mark.django_db
+class TestBufferedEventSink:
+    def test_record_queues_until_flush(self, spill_path):
+        gate = AccessPoint.objects.create(code="gate-q")
+        sink = BufferedEventSink(background=False)
+        sink.record(access_point_id=gate.id, user_id=None, device_id=None, decision="ALLOW", reason="OK", raw={})
+        sink.record(access_point_id=None, user_id=None, device_id=None, decision="DENY", reason="UNKNOWN_GATE")
+
+        assert AccessEvent.objects.count() == 0
+        assert sink.queue_depth() == 2
+        assert len(list(spill_path.glob("*.spill"))) == 1
+
+        assert sink.flush() == 2
+        assert AccessEvent.objects.count() == 2
+        assert sink.queue_depth() == 0
+        # The flushed segment is gone; only the fresh (empty) one remains
+        remaining = list(spill_path.glob("*.spill"))
+        assert len(remaining) == 1
+        assert remaining[0].read_text() == ""
+        sink.close()
+
+    def test_created_at_is_decision_time(self, spill_path):
+        sink = BufferedEventSink(background=False, spill=False)
+        decided_at = now() - timedelta(minutes=5)
+        sink.record(decision="DENY", reason="UNKNOWN_GATE", created_at=decided_at)
+        sink.flush()
+        assert AccessEvent.objects.get().created_at == decided_at
+
+    def test_failed_flush_keeps_rows(self, spill_path, monkeypatch):
+        sink = BufferedEventSink(background=False)
+        sink.record(decision="DENY", reason="UNKNOWN_GATE")
+
+        def boom(*args, **kwargs):
+            raise RuntimeError("db down")
+
+        monkeypatch.setattr(AccessEvent.objects, "bulk_create", boom)
+        with pytest.raises(RuntimeError):
+            sink.flush()
+        assert sink.queue_depth() == 1
+        monkeypatch.undo()
+
+        assert sink.flush() == 1
+        assert AccessEvent.objects.count() == 1
+        assert [p.read_text() for p in spill_path.glob("*.spill")] == [""]
+
+    def test_replay_orphaned_spill(self, spill_path):
+        created = now().isoformat()
+        lines = [
+            {"decision": "DENY", "reason": "UNKNOWN_GATE", "raw": {"gate_id": "x"}, "created_at": created},
+            {"decision": "DENY", "reason": "INVALID_REQUEST", "raw": None, "created_at": created},
+        ]
+        (spill_path / "events-99999-0.spill").write_text("".join(json.dumps(line) + "\n" for line in lines))
+
+        assert replay_spill(spill_path) == 2
+        assert AccessEvent.objects.filter(decision="DENY").count() == 2
+        assert list(spill_path.glob("*.spill")) == []
+
+    def test_replay_skips_live_segments(self, spill_path):
+        sink = BufferedEventSink(background=False)
+        sink.record(decision="DENY", reason="UNKNOWN_GATE")
+        assert replay_spill(spill_path) == 0
+        assert sink.flush() == 1
+        assert AccessEvent.objects.count() == 1
+
+    def test_recording_never_replays(self, spill_path):
+        created = now().isoformat()
+        line = {"decision": "DENY", "reason": "UNKNOWN_GATE", "raw": None, "created_at": created}
+        (spill_path / "events-99999-0.spill").write_text(json.dumps(line) + "\n")
+        sink = BufferedEventSink(background=False)
+        sink.record(decision="DENY", reason="UNKNOWN_GATE")
+        assert AccessEvent.objects.count() == 0  # the orphan waits for the writer thread
+        assert sink.replay() == 1
+        assert sink.flush() == 1
+        assert AccessEvent.objects.count() == 2
+        sink.close()
+
+    def test_rows_past_the_queue_limit_are_spilled_then_replayed(self, spill_path, monkeypatch):
+        sink = BufferedEventSink(background=False, max_queue=2)
+        monkeypatch.setattr(AccessEvent.objects, "bulk_create", mock.Mock(side_effect=RuntimeError("db down")))
+        for _ in range(5):
+            sink.record(decision="DENY", reason="UNKNOWN_GATE")
+        assert sink.queue_depth() == 2
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                sink.flush()
+        assert len(list(spill_path.glob("*.spill"))) == 3  # pending, current and overflow: not one per attempt
+        assert replay_spill(spill_path) == 0  # the overflow segment is still this worker's
+        monkeypatch.undo()
+
+        assert sink.flush() == 2
+        assert sink.replay() == 3
+        assert AccessEvent.objects.count() == 5
+        assert [p.read_text() for p in spill_path.glob("*.spill")] == [""]
+        sink.close()
+
+    def test_rows_past_the_spill_limit_are_dropped(self, spill_path):
+        sink = BufferedEventSink(background=False, max_queue=1, max_spill_bytes=300)  # rows are ~140 bytes
+        for _ in range(5):
+            sink.record(decision="DENY", reason="UNKNOWN_GATE", raw={"pad": "x" * 20})
+        assert sum(p.stat().st_size for p in spill_path.glob("*.spill")) <= 300
+        assert sink.flush() == 1
+        assert sink.replay() == 1  # one queued, one spilled, the rest lost
+        assert AccessEvent.objects.count() == 2
+        sink.close()
+
+
+@pytest.mark.django_db
+def test_verify_records_through_configured_sink(client):
+    assert isinstance(events.get_sink(), events.ImmediateEventSink)
+    client.post("/api/v1/access/verify", {"gate_id": "nope", "token": "whatever-token"},
+                content_type="application/json")
+    assert AccessEvent.objects.filter(reason="UNKNOWN_GATE").count() == 1
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimitAggregator:
+    def test_one_summary_per_gate_ip_and_window(self):
+        clock = FakeClock()
+        agg = RateLimitAggregator(window=10, clock=clock)
+        for _ in range(500):
+            assert agg.add("gate-01", "10.0.0.1", {"gate_id": "gate-01"}) == []
+        agg.add("gate-01", "10.0.0.2")
+        assert agg.drain() == []  # window still open
+
+        clock.now += 10
+        closed = agg.add("gate-01", "10.0.0.1")
+        assert [row["raw"]["count"] for row in closed] == [500]
+        assert closed[0]["raw"]["sample"] == {"gate_id": "gate-01"}
+        assert closed[0]["reason"] == "RATE_LIMIT"
+
+        drained = agg.drain()
+        assert [(row["raw"]["ip"], row["raw"]["count"]) for row in drained] == [("10.0.0.2", 1)]
+        assert [row["raw"]["count"] for row in agg.drain(final=True)] == [1]
+        assert agg.pending() == 0
+
+    def test_overflow_key_bounds_memory(self):
+        agg = RateLimitAggregator(window=10, max_keys=2, clock=FakeClock())
+        for i in range(50):
+            agg.add("gate-01", f"10.0.0.{i}")
+        rows = agg.drain(final=True)
+        assert len(rows) == 3
+        assert sum(row["raw"]["count"] for row in rows) == 50
+        assert ("*", 48) in [(row["raw"]["ip"], row["raw"]["count"]) for row in rows]
+
+
+@pytest.mark.django_db
+def test_buffered_sink_writes_rate_limit_summaries(spill_path):
+    sink = BufferedEventSink(background=False, spill=False, rate_limit_window=60)
+    for _ in range(100):
+        sink.record_rate_limited("gate-01", "10.0.0.9", {"gate_id": "gate-01"})
+    sink.close()
+    rows = list(AccessEvent.objects.all())
+    assert {row.reason for row in rows} == {"RATE_LIMIT"}
+    assert sum(row.raw["count"] for row in rows) == 100
@@ -0,0 +1,96 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from apps.access import authz, credentials, ratelimit
+from apps.access.models import AccessEvent, AccessPermission, AccessPoint
+from apps.api.v1.views import AsyncAccessVerifyView
+from apps.devices.models import Device
+
+User = get_user_model()
+VERIFY_URL = "/api/v1/access/verify"
+
+
+class AsyncVerifyTests(TestCase):
+    def setUp(self):
+        ratelimit.get_limiter().backend.reset()
+        self.factory = AsyncRequestFactory()
+        self.view = AsyncAccessVerifyView.as_view()
+        self.gate = AccessPoint.objects.create(code="gate-01")
+        self.group = Group.objects.create(name="Staff")
+        self.user = User.objects.create_user(username="async", password="x")
+        self.user.groups.add(self.group)
+        AccessPermission.objects.create(access_point=self.gate, group=self.group, allow=True)
+        self.token = Token.objects.create(user=self.user).key
+        self.lonely = Token.objects.create(user=User.objects.create_user(username="lonely", password="x")).key
+        self.device = Device.objects.create(user=self.user)
+
+    async def post(self, body, content_type="application/json"):
+        if content_type == "application/json" and not isinstance(body, (str, bytes)):
+            body = json.dumps(body)
+        resp = await self.view(self.factory.post(VERIFY_URL, body, content_type=content_type))
+        return resp.status_code, (json.loads(resp.content) if resp.content else None)
+
+    def cases(self):
+        return [
+            ("gate-01", self.token),
+            ("gate-02", self.token),
+            ("gate-01", "x" * 40),
+            ("gate-01", self.lonely),
+            ("gate-01", credentials.issue(self.user.id, self.device.id)),
+            ("gate-01", credentials.issue(self.user.id, self.device.id + 100)),
+        ]
+
+    async def test_allow(self):
+        status, body = await self.post({"gate_id": "gate-01", "token": self.token})
+        self.assertEqual((status, body), (200, {"decision": "ALLOW", "duration_ms": 800, "reason": "OK"}))
+        event = await AccessEvent.objects.aget()
+        self.assertEqual((event.reason, event.user_id), ("OK", self.user.id))
+
+    @override_settings(ACCESS_AUTHZ_SNAPSHOT=False)
+    async def test_async_orm_path_matches_sync_path(self):
+        for gate, token in await sync_to_async(self.cases)():
+            expected = await sync_to_async(authz.decide_from_db)(gate, token)
+            self.assertEqual(await authz.adecide_from_db(gate, token), expected)
+            _status, body = await self.post({"gate_id": gate, "token": token})
+            self.assertEqual((body["decision"], body["reason"]), (expected.decision, expected.reason))
+
+    async def test_snapshot_path_matches_orm_path(self):
+        for gate, token in await sync_to_async(self.cases)():
+            expected = await sync_to_async(authz.decide_from_db)(gate, token)
+            self.assertEqual(await authz.adecide(gate, token), expected)
+
+    async def test_invalid_request_is_logged(self):
+        status, body = await self.post({"gate_id": "gate-01", "token": "short"})
+        self.assertEqual((status, body["reason"]), (200, "INVALID_REQUEST"))
+        self.assertEqual(await AccessEvent.objects.filter(reason="INVALID_REQUEST").acount(), 1)
+
+    async def test_form_body_and_parse_errors(self):
+        status, body = await self.post(f"gate_id=gate-01&token={self.token}", "application/x-www-form-urlencoded")
+        self.assertEqual((status, body["reason"]), (200, "OK"))
+        status, body = await self.post("{not json")
+        self.assertEqual(status, 400)
+        self.assertTrue(body["detail"].startswith("JSON parse error"))
+        status, _ = await self.post("gate_id", "text/plain")
+        self.assertEqual(status, 415)
+
+    @override_settings(REST_FRAMEWORK={"DEFAULT_THROTTLE_RATES": {"access_verify": "1/minute"}})
+    async def test_rate_limit(self):
+        item = {"gate_id": "gate-01", "token": self.token}
+        self.assertEqual((await self.post(item))[1]["reason"], "OK")
+        self.assertEqual((await self.post(item))[1]["reason"], "RATE_LIMIT")
+
+    async def test_get_not_allowed(self):
+        resp = await self.view(self.factory.get(VERIFY_URL))
+        self.assertEqual(resp.status_code, 405)
+
+
+class AsyncMiddlewareTests(TestCase):
+    async def test_request_id_under_asgi(self):
+        resp = await self.async_client.get("/healthz", headers={"X-Request-ID": "abc-123"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["X-Request-ID"], "abc-123")
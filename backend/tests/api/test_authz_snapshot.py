@@ -0,0 +1,116 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from apps.access import authz
+from apps.access.models import AccessPermission, AccessPoint, CacheVersion
+
+User = get_user_model()
+VERIFY_URL = "/api/v1/access/verify"
+
+
+class AuthzSnapshotTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.gate = AccessPoint.objects.create(code="gate-01", name="Main Gate")
+        self.group = Group.objects.create(name="Staff")
+        self.user = User.objects.create_user(username="snap", password="x", is_active=True)
+        self.user.groups.add(self.group)
+        self.token = Token.objects.create(user=self.user)
+        self.perm = AccessPermission.objects.create(access_point=self.gate, group=self.group, allow=True)
+
+    def verify(self, gate="gate-01", token=None):
+        resp = self.client.post(VERIFY_URL, {"gate_id": gate, "token": token or self.token.key}, format="json")
+        return resp.json()
+
+    def test_warm_snapshot_makes_no_reads(self):
+        self.verify()
+        with CaptureQueriesContext(connection) as ctx:
+            body = self.verify()
+        self.assertEqual(body["decision"], "ALLOW")
+        selects = [q["sql"] for q in ctx.captured_queries if q["sql"].lstrip().upper().startswith("SELECT")]
+        self.assertEqual(selects, [])
+
+    def test_snapshot_is_reused_until_version_changes(self):
+        first = authz.get_snapshot()
+        self.assertIs(authz.get_snapshot(), first)
+        AccessPoint.objects.create(code="gate-02")
+        second = authz.get_snapshot()
+        self.assertIsNot(second, first)
+        self.assertGreater(second.version, first.version)
+        self.assertIn("gate-02", second.gates)
+
+    def test_membership_change_is_visible(self):
+        self.assertEqual(self.verify()["reason"], "OK")
+        self.user.groups.remove(self.group)
+        self.assertEqual(self.verify()["reason"], "NO_PERMISSION")
+        self.user.groups.add(self.group)
+        self.assertEqual(self.verify()["reason"], "OK")
+
+    def test_permission_delete_is_visible(self):
+        self.assertEqual(self.verify()["reason"], "OK")
+        self.perm.delete()
+        self.assertEqual(self.verify()["reason"], "NO_PERMISSION")
+
+    def test_token_delete_and_user_deactivation_are_visible(self):
+        self.assertEqual(self.verify()["reason"], "OK")
+        self.user.is_active = False
+        self.user.save(update_fields=["is_active"])
+        self.assertEqual(self.verify()["reason"], "TOKEN_INVALID")
+        key = self.token.key
+        self.token.delete()
+        self.assertEqual(self.verify(token=key)["reason"], "TOKEN_INVALID")
+
+    @override_settings(ACCESS_AUTHZ_MAX_STALENESS=0)
+    def test_change_committed_on_another_host_is_seen(self):
+        self.assertEqual(self.verify()["reason"], "OK")
+        stored, local = authz.authz_version.value()
+        # What another host does: change the rows (its signals bump its own mmap counter) and the version row
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        CacheVersion.objects.update_or_create(name="authz-version", defaults={"value": stored + 1})
+        self.assertEqual(self.verify()["reason"], "TOKEN_INVALID")
+        self.assertEqual(authz.authz_version.local.value(), local)
+
+    def test_commit_bumps_the_version_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            AccessPoint.objects.create(code="gate-02")
+        self.assertEqual(CacheVersion.objects.get(name="authz-version").value, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            AccessPoint.objects.create(code="gate-03")
+        self.assertEqual(CacheVersion.objects.get(name="authz-version").value, 2)
+
+    def test_snapshot_expires_without_changes(self):
+        snap = authz.get_snapshot()
+        with override_settings(ACCESS_AUTHZ_SNAPSHOT_TTL=0):
+            self.assertIsNot(authz.get_snapshot(), snap)
+
+    def test_last_login_update_keeps_snapshot(self):
+        snap = authz.get_snapshot()
+        self.user.save(update_fields=["last_login"])
+        self.assertIs(authz.get_snapshot(), snap)
+
+    def test_snapshot_matches_orm_path(self):
+        other = User.objects.create_user(username="direct", password="x")
+        other_token = Token.objects.create(user=other)
+        AccessPermission.objects.create(access_point=self.gate, user=other, allow=True)
+        denied = User.objects.create_user(username="denied", password="x")
+        denied_token = Token.objects.create(user=denied)
+        cases = [
+            ("gate-01", self.token.key),
+            ("gate-01", other_token.key),
+            ("gate-01", denied_token.key),
+            ("gate-01", "missing-token"),
+            ("unknown", self.token.key),
+        ]
+        snap = authz.get_snapshot()
+        for gate, token in cases:
+            self.assertEqual(snap.decide(gate, token), authz.decide_from_db(gate, token), (gate, token))
+
+    @override_settings(ACCESS_AUTHZ_SNAPSHOT=False)
+    def test_orm_path_when_snapshot_disabled(self):
+        self.assertEqual(self.verify()["reason"], "OK")
+        self.assertEqual(self.verify(gate="unknown")["reason"], "UNKNOWN_GATE")
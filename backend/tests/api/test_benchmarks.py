@@ -0,0 +1,48 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+from apps.access import ratelimit
+from apps.access.models import AccessEvent, AccessPermission, AccessPoint
+from benchmarks import loadgen
+
+
+class SeedAndLoadTests(TransactionTestCase):
+    # Six gates cannot spread 200 back-to-back verifies under the default per-gate rate
+    @override_settings(REST_FRAMEWORK={"DEFAULT_THROTTLE_RATES": {
+        "access_verify": "1000/second", "user": "1000/day", "anon": "100/day",
+    }})
+    def test_seed_then_replay_in_process(self):
+        tmp = Path(tempfile.mkdtemp())
+        manifest_path = str(tmp / "manifest.json")
+        call_command("seed_benchmark", gates=6, users=20, groups=3, gates_per_group=2, events=250,
+                     batch_size=100, manifest=manifest_path, stdout=StringIO())
+        self.assertEqual(AccessPoint.objects.filter(code__startswith="bench-gate-").count(), 6)
+        self.assertEqual(AccessEvent.objects.count(), 250)
+        self.assertEqual(AccessPermission.objects.filter(group__isnull=False).count(), 6)
+        manifest = json.loads(Path(manifest_path).read_text())
+        self.assertEqual(len(manifest["users"]), 20)
+
+        ratelimit.get_limiter().backend.reset()
+        report_path = str(tmp / "report.json")
+        report = loadgen.main(["--manifest", manifest_path, "--transport", "inprocess", "--requests", "200",
+                               "--warmup", "0", "--out", report_path])
+        self.assertEqual(json.loads(Path(report_path).read_text())["totals"], report["totals"])
+        self.assertEqual(report["totals"]["requests"], 200)
+        self.assertEqual(report["errors"], {})
+        scenarios = report["scenarios"]
+        self.assertEqual(set(scenarios["verify_allow"]["reasons"]), {"OK"})
+        self.assertEqual(set(scenarios["verify_invalid"]["reasons"]), {"INVALID_REQUEST"})
+        self.assertNotIn("OK", scenarios["verify_deny"]["reasons"])
+        self.assertEqual(set(scenarios["devices_me"]["status"]), {"200"})
+        for name in ("p50_ms", "p95_ms", "p99_ms", "queries_per_request"):
+            self.assertIsNotNone(scenarios["verify_allow"][name])
+
+    def test_percentile_is_nearest_rank(self):
+        values = [float(v) for v in range(1, 101)]
+        self.assertEqual([loadgen.percentile(values, p) for p in (50, 95, 99, 100)], [50.0, 95.0, 99.0, 100.0])
+        self.assertIsNone(loadgen.percentile([], 50))
@@ -0,0 +1,96 @@
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from apps.access import authz, credentials, decision_sql
+from apps.access.models import AccessEvent, AccessPermission, AccessPoint
+from apps.devices.models import Device
+
+User = get_user_model()
+VERIFY_URL = "/api/v1/access/verify"
+
+
+class DecisionSqlTests(TestCase):
+    def setUp(self):
+        self.gate = AccessPoint.objects.create(code="gate-01")
+        AccessPoint.objects.create(code="gate-02")
+        group = Group.objects.create(name="Staff")
+        AccessPermission.objects.create(access_point=self.gate, group=group, allow=True)
+
+        self.member = self.user("member", groups=[group])
+        self.direct = self.user("direct")
+        AccessPermission.objects.create(access_point=self.gate, user=self.direct, allow=True)
+        self.denied = self.user("denied")
+        AccessPermission.objects.create(access_point=self.gate, user=self.denied, allow=False)
+        self.inactive = self.user("inactive", is_active=False, groups=[group])
+
+        self.phone = Device.objects.create(user=self.direct, auth_token="p" * 64)
+        self.revoked = Device.objects.create(user=self.direct, auth_token="r" * 64, is_active=False)
+        self.orphan = Device.objects.create(user=self.inactive, auth_token="o" * 64)
+        self.moved = Device.objects.create(user=self.member, auth_token="m" * 64)
+
+    def user(self, username, groups=(), **fields):
+        user = User.objects.create_user(username=username, password="x", **fields)
+        user.groups.set(groups)
+        Token.objects.create(user=user, key=username.ljust(40, "0"))
+        return user
+
+    def cases(self):
+        tokens = [
+            "member".ljust(40, "0"), "direct".ljust(40, "0"), "denied".ljust(40, "0"), "inactive".ljust(40, "0"),
+            "missing-token", "p" * 64, "r" * 64, "o" * 64, "u" * 64,
+            credentials.issue(self.direct.id, self.phone.id),
+            credentials.issue(self.direct.id, self.revoked.id),
+            credentials.issue(self.direct.id, self.moved.id),
+            credentials.issue(self.inactive.id, self.orphan.id),
+            credentials.issue(self.direct.id, 10**6),
+            credentials.issue(self.direct.id, self.phone.id)[:-4] + "AAAA",
+        ]
+        return [(gate, token) for gate in ("gate-01", "gate-02", "nope") for token in tokens]
+
+    def test_matches_orm_path(self):
+        cases = self.cases()
+        expected = [authz.decide_from_db(gate, token) for gate, token in cases]
+        self.assertEqual({d.reason for d in expected}, {
+            "OK", "NO_PERMISSION", "TOKEN_INVALID", "UNKNOWN_GATE",
+            "DEVICE_INACTIVE", "DEVICE_MISMATCH", "DEVICE_NOT_FOUND",
+        })
+        for (gate, token), want in zip(cases, expected, strict=True):
+            self.assertEqual(decision_sql.decide(gate, token), want, (gate, token))
+
+    def test_async_matches_orm_path(self):
+        cases = self.cases()[:15]
+        expected = [authz.decide_from_db(gate, token) for gate, token in cases]
+        self.assertEqual([async_to_sync(decision_sql.adecide)(gate, token) for gate, token in cases], expected)
+
+    def test_one_round_trip_per_decision(self):
+        decision_sql.decide("gate-01", "member".ljust(40, "0"))  # PREPARE on PostgreSQL
+        with self.assertNumQueries(1):
+            self.assertTrue(decision_sql.decide("gate-01", "member".ljust(40, "0")).allowed)
+        with self.assertNumQueries(1):
+            self.assertEqual(decision_sql.decide("gate-01", "p" * 64).device_id, self.phone.id)
+
+    def test_prepares_again_after_reconnect(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("PREPARE is PostgreSQL only")
+        decision_sql.decide("gate-01", "member".ljust(40, "0"))
+        with connection.cursor() as cursor:  # what a new DB-API connection looks like
+            cursor.execute(f"DEALLOCATE {decision_sql.STATEMENT_NAME}")
+        connection._access_decide_prepared = None
+        with self.assertNumQueries(2):  # PREPARE + EXECUTE
+            self.assertTrue(decision_sql.decide("gate-01", "member".ljust(40, "0")).allowed)
+
+    @override_settings(ACCESS_AUTHZ_SNAPSHOT=False)
+    def test_verify_uses_single_query_without_snapshot(self):
+        client = APIClient()
+        decision_sql.decide("gate-01", "p" * 64)
+        authz.gate_codes()  # the throttle's gate list, re-read only when gates change
+        with self.assertNumQueries(2):  # the decision + the audit row
+            resp = client.post(VERIFY_URL, {"gate_id": "gate-01", "token": "p" * 64}, format="json")
+        self.assertEqual(resp.json()["reason"], "OK")
+        event = AccessEvent.objects.get()
+        self.assertEqual((event.user_id, event.device_id), (self.direct.id, self.phone.id))
@@ -0,0 +1,161 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from apps.access import authz, credentials, devices, ratelimit
+from apps.access.models import AccessEvent, AccessPermission, AccessPoint, CacheVersion
+from apps.devices.models import Device
+
+User = get_user_model()
+VERIFY_URL = "/api/v1/access/verify"
+
+
+class DeviceTokenVerifyTests(TestCase):
+    def setUp(self):
+        ratelimit.get_limiter().backend.reset()
+        devices.removed()  # drop devices left in the registry by rolled-back tests
+        self.client = APIClient()
+        self.gate = AccessPoint.objects.create(code="gate-01")
+        self.user = User.objects.create_user(username="phone", password="x")
+        AccessPermission.objects.create(access_point=self.gate, user=self.user, allow=True)
+        self.session = Token.objects.create(user=self.user).key
+        self.register(android_device_id="emu-5554")
+
+    def register(self, **data):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.session}")
+        resp = self.client.post("/api/v1/devices/register", data, format="json")
+        self.client.credentials()
+        self.device_id, self.device_token, self.qr = resp.data["device_id"], resp.data["token"], resp.data["qr_payload"]
+        return resp
+
+    def verify(self, token=None, gate="gate-01"):
+        body = {"gate_id": gate, "token": token or self.device_token}
+        return self.client.post(VERIFY_URL, body, format="json").json()
+
+    def test_device_token_allows_and_records_device(self):
+        self.assertEqual(self.verify(), {"decision": "ALLOW", "reason": "OK", "duration_ms": 800})
+        event = AccessEvent.objects.get()
+        self.assertEqual((event.user_id, event.device_id), (self.user.id, self.device_id))
+
+    def test_warm_device_lookup_makes_no_reads(self):
+        self.verify()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.verify()["decision"], "ALLOW")
+            self.assertEqual(self.verify(self.qr)["decision"], "ALLOW")
+        selects = [q["sql"] for q in ctx.captured_queries if q["sql"].lstrip().upper().startswith("SELECT")]
+        self.assertEqual(selects, [])
+
+    def test_rotation_is_incremental_and_keeps_the_snapshot(self):
+        old = self.device_token
+        self.verify()
+        snap = authz.get_snapshot()
+        self.register()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.verify(old)["reason"], "TOKEN_INVALID")
+        device_reads = [q["sql"] for q in ctx.captured_queries if 'FROM "devices_device"' in q["sql"]]
+        self.assertEqual(len(device_reads), 1)
+        self.assertIn("updated_at", device_reads[0])
+        self.assertEqual(self.verify()["decision"], "ALLOW")
+        self.assertIs(authz.get_snapshot(), snap)
+
+    def test_revoke_by_android_id_applies_immediately(self):
+        self.assertEqual(self.verify()["decision"], "ALLOW")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.session}")
+        resp = self.client.post("/api/v1/devices/revoke", {"android_device_id": "emu-5554"}, format="json")
+        self.client.credentials()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.verify()["reason"], "DEVICE_INACTIVE")
+        self.assertEqual(self.verify(self.qr)["reason"], "DEVICE_INACTIVE")
+
+    def test_set_token_and_bind_device_commands(self):
+        self.verify()
+        call_command("set_token", device_id=self.device_id, token="t" * 43, stdout=StringIO())
+        self.assertEqual(self.verify()["reason"], "TOKEN_INVALID")
+        self.assertEqual(self.verify("t" * 43)["decision"], "ALLOW")
+        call_command("bind_device", username="phone", token="b" * 64, stdout=StringIO())
+        self.assertEqual(self.verify("b" * 64)["decision"], "ALLOW")
+
+    def test_partial_saves_of_an_old_device_reach_warm_workers(self):
+        Device.objects.filter(pk=self.device_id).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.verify()["decision"], "ALLOW")  # warm registry, watermark now
+        call_command("set_token", device_id=self.device_id, token="s" * 43, stdout=StringIO())
+        self.assertEqual(self.verify()["reason"], "TOKEN_INVALID")
+        self.assertEqual(self.verify("s" * 43)["decision"], "ALLOW")
+
+        Device.objects.filter(pk=self.device_id).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.verify(self.qr)["decision"], "ALLOW")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.session}")
+        self.client.post("/api/v1/devices/revoke", {"device_id": self.device_id}, format="json")
+        self.client.credentials()
+        self.assertEqual(self.verify(self.qr)["reason"], "DEVICE_INACTIVE")
+
+    @override_settings(ACCESS_AUTHZ_MAX_STALENESS=0)
+    def test_revoke_committed_on_another_host_is_seen(self):
+        self.assertEqual(self.verify(self.qr)["reason"], "OK")
+        # Another host: its signals bump its own mmap counter, only the version row is shared
+        Device.objects.filter(pk=self.device_id).update(is_active=False, updated_at=timezone.now())
+        stored, _ = devices.registry_version.value()
+        CacheVersion.objects.update_or_create(name="device-registry-version", defaults={"value": stored + 1})
+        self.assertEqual(self.verify(self.qr)["reason"], "DEVICE_INACTIVE")
+
+    def test_registry_reloads_after_ttl(self):
+        self.assertEqual(self.verify()["reason"], "OK")
+        Device.objects.filter(pk=self.device_id).update(is_active=False)  # no signal, no version bump
+        self.assertEqual(self.verify()["reason"], "OK")
+        with override_settings(ACCESS_AUTHZ_SNAPSHOT_TTL=0):
+            self.assertEqual(self.verify()["reason"], "DEVICE_INACTIVE")
+
+    def test_credential_of_deleted_device(self):
+        self.verify()
+        Device.objects.filter(pk=self.device_id).delete()
+        self.assertEqual(self.verify(self.qr)["reason"], "DEVICE_NOT_FOUND")
+        self.assertEqual(self.verify()["reason"], "TOKEN_INVALID")
+
+    def test_credential_of_reassigned_device(self):
+        other = User.objects.create_user(username="other", password="x")
+        device = Device.objects.get(pk=self.device_id)
+        device.user = other
+        device.save()
+        self.assertEqual(self.verify(self.qr)["reason"], "DEVICE_MISMATCH")
+
+    def test_inactive_owner_and_missing_permission(self):
+        AccessPoint.objects.create(code="gate-02")
+        self.assertEqual(self.verify(gate="gate-02")["reason"], "NO_PERMISSION")
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.verify()["reason"], "TOKEN_INVALID")
+
+    def test_orm_paths_match_snapshot(self):
+        other = User.objects.create_user(username="other", password="x")
+        revoked = Device.objects.create(user=self.user, auth_token="r" * 64, is_active=False)
+        moved = Device.objects.create(user=other, auth_token="m" * 64)
+        cases = [
+            ("gate-01", self.device_token), ("gate-01", self.qr), ("gate-01", "r" * 64),
+            ("gate-01", credentials.issue(self.user.id, revoked.id)),
+            ("gate-01", credentials.issue(self.user.id, moved.id)),
+            ("gate-01", credentials.issue(self.user.id, 10**6)),
+            ("gate-01", "u" * 64), ("nope", self.device_token),
+        ]
+        expected = [authz.get_snapshot().decide(gate, token) for gate, token in cases]
+        self.assertEqual([d.reason for d in expected], [
+            "OK", "OK", "DEVICE_INACTIVE", "DEVICE_INACTIVE", "DEVICE_MISMATCH", "DEVICE_NOT_FOUND",
+            "TOKEN_INVALID", "UNKNOWN_GATE",
+        ])
+        self.assertEqual([authz.decide_from_db(gate, token) for gate, token in cases], expected)
+        self.assertEqual(authz.decide_many_from_db(cases), expected)
+
+    @override_settings(ACCESS_AUTHZ_SNAPSHOT=False)
+    def test_orm_path_accepts_device_tokens(self):
+        self.assertEqual(self.verify()["decision"], "ALLOW")
+        self.assertEqual(AccessEvent.objects.get().device_id, self.device_id)
+
+    def test_android_device_id_is_indexed(self):
+        self.assertTrue(Device._meta.get_field("android_device_id").db_index)
@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.test import Client, TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from apps.access import authz, decision_sql, effective
+from apps.access.models import AccessPermission, AccessPoint, EffectivePermission
+
+User = get_user_model()
+VERIFY_URL = "/api/v1/access/verify"
+
+
+class EffectivePermissionTests(TestCase):
+    def setUp(self):
+        self.gate = AccessPoint.objects.create(code="gate-01")
+        self.other_gate = AccessPoint.objects.create(code="gate-02")
+        self.group = Group.objects.create(name="Staff")
+        self.perm = AccessPermission.objects.create(access_point=self.gate, group=self.group, allow=True)
+        self.alice = User.objects.create_user(username="alice", password="x")
+        self.bob = User.objects.create_user(username="bob", password="x")
+        self.group.user_set.add(self.alice, self.bob)
+
+    def rows(self):
+        return set(EffectivePermission.objects.values_list("access_point__code", "user__username", "allow"))
+
+    def reasons(self, username, gate="gate-01"):
+        user = User.objects.get(username=username)
+        token, _ = Token.objects.get_or_create(user=user)
+        verify = APIClient().post(VERIFY_URL, {"gate_id": gate, "token": token.key}, format="json").json()["reason"]
+        return {verify, authz.decide_from_db(gate, token.key).reason, decision_sql.decide(gate, token.key).reason}
+
+    def test_deny_overrides_grants(self):
+        AccessPermission.objects.create(access_point=self.gate, user=self.alice, allow=False)
+        self.assertEqual(self.rows(), {("gate-01", "alice", False), ("gate-01", "bob", True)})
+        self.assertEqual(self.reasons("alice"), {"NO_PERMISSION"})
+        self.assertEqual(self.reasons("bob"), {"OK"})
+
+        # A group deny beats a direct grant as well
+        AccessPermission.objects.create(access_point=self.other_gate, user=self.bob, allow=True)
+        AccessPermission.objects.create(access_point=self.other_gate, group=self.group, allow=False)
+        self.assertEqual(self.reasons("bob", "gate-02"), {"NO_PERMISSION"})
+
+    def test_permission_edits_and_deletes(self):
+        self.perm.access_point = self.other_gate
+        self.perm.save()
+        self.assertEqual(self.rows(), {("gate-02", "alice", True), ("gate-02", "bob", True)})
+        self.perm.allow = False
+        self.perm.save(update_fields=["allow"])
+        self.assertEqual(self.rows(), {("gate-02", "alice", False), ("gate-02", "bob", False)})
+        self.perm.delete()
+        self.assertEqual(self.rows(), set())
+
+    def test_membership_changes(self):
+        self.alice.groups.remove(self.group)
+        self.assertEqual(self.rows(), {("gate-01", "bob", True)})
+        self.alice.groups.add(self.group)
+        self.group.user_set.clear()
+        self.assertEqual(self.rows(), set())
+        self.group.user_set.set([self.bob])
+        self.bob.groups.clear()
+        self.assertEqual(self.rows(), set())
+
+    def test_deleting_a_group_user_or_gate(self):
+        AccessPermission.objects.create(access_point=self.other_gate, user=self.alice, allow=True)
+        self.group.delete()
+        self.assertEqual(self.rows(), {("gate-02", "alice", True)})
+        self.alice.delete()
+        self.assertEqual(self.rows(), set())
+
+        AccessPermission.objects.create(access_point=self.gate, user=self.bob, allow=True)
+        self.gate.delete()
+        self.assertEqual(self.rows(), set())
+
+    def test_refresh_writes_only_differences(self):
+        self.assertEqual(effective.refresh(), 0)
+        EffectivePermission.objects.filter(user=self.alice).delete()  # e.g. raw SQL that bypassed the signals
+        EffectivePermission.objects.create(access_point=self.other_gate, user=self.bob, allow=True)
+        expected = {("gate-01", "alice", True), ("gate-01", "bob", True)}
+        snap = authz.get_snapshot()
+        out = StringIO()
+        call_command("rebuild_effective_permissions", stdout=out)
+        self.assertIn("2 rows changed", out.getvalue())
+        self.assertEqual(self.rows(), expected)
+        self.assertIsNot(authz.get_snapshot(), snap)
+
+    def test_snapshot_grants_come_from_the_table(self):
+        AccessPermission.objects.create(access_point=self.gate, user=self.bob, allow=False)
+        self.assertEqual(authz.get_snapshot().grants, {(self.gate.id, self.alice.id)})
+
+    def test_admin_is_view_only(self):
+        admin = User.objects.create_superuser(username="admin", password="x")
+        client = Client()
+        client.force_login(admin)
+        row = EffectivePermission.objects.get(user=self.alice)
+        self.assertEqual(client.get(f"/admin/access/effectivepermission/{row.pk}/change/").status_code, 200)
+        self.assertEqual(client.get("/admin/access/effectivepermission/add/").status_code, 403)
+        self.assertEqual(client.post(f"/admin/access/effectivepermission/{row.pk}/delete/").status_code, 403)
+        self.assertTrue(EffectivePermission.objects.filter(pk=row.pk).exists())
@@ -0,0 +1,127 @@
+import gzip
+import json
+import uuid
+from datetime import UTC, datetime, timedelta
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from apps.access import ingest
+from apps.access.models import AccessEvent, AccessPoint
+
+User = get_user_model()
+URL = "/api/v1/access/events/bulk"
+
+
+def ndjson(events):
+    return b"".join(json.dumps(e).encode() + b"\n" for e in events)
+
+
+class AccessEventBulkTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="agent", password="x", is_staff=True)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.admin).key}")
+        self.gate = AccessPoint.objects.create(code="gate-01")
+        self.user = User.objects.create_user(username="u1", password="x")
+        self.when = datetime(2026, 5, 1, 12, tzinfo=UTC)
+
+    def event(self, n=0, **fields):
+        # What gate_agent.outbox.make_event produces
+        return {
+            "idempotency_key": uuid.uuid4().hex, "access_point_id": self.gate.id, "user_id": self.user.id,
+            "device_id": None, "decision": "ALLOW", "reason": "OK",
+            "created_at": (self.when + timedelta(seconds=n)).isoformat(), "raw": {"gate_id": "gate-01"},
+            **fields,
+        }
+
+    def upload(self, body, content_type="application/x-ndjson", gzipped=False):
+        extra = {"HTTP_CONTENT_ENCODING": "gzip"} if gzipped else {}
+        return self.client.post(URL, gzip.compress(body) if gzipped else body, content_type=content_type, **extra)
+
+    def test_requires_staff(self):
+        self.assertEqual(APIClient().post(URL, b"", content_type="application/x-ndjson").status_code, 401)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+        self.assertEqual(client.post(URL, b"", content_type="application/x-ndjson").status_code, 403)
+
+    @override_settings(ACCESS_EVENT_BULK_CHUNK=3)
+    def test_gzip_ndjson_is_stored_once(self):
+        events = [self.event(i) for i in range(7)]
+        resp = self.upload(ndjson(events), gzipped=True)
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertEqual(resp.json(), {"accepted": 7, "duplicates": 0, "rejected": 0, "errors": []})
+
+        # The response was lost: the agent resends the batch, plus one new event
+        resp = self.upload(ndjson(events + [self.event(8)]), gzipped=True)
+        self.assertEqual(resp.json()["accepted"], 1)
+        self.assertEqual(resp.json()["duplicates"], 7)
+        self.assertEqual(AccessEvent.objects.count(), 8)
+
+        row = AccessEvent.objects.get(idempotency_key=events[0]["idempotency_key"])
+        self.assertEqual((row.access_point_id, row.user_id, row.decision, row.reason, row.created_at, row.raw),
+                         (self.gate.id, self.user.id, "ALLOW", "OK", self.when, {"gate_id": "gate-01"}))
+
+    def test_repeated_key_within_one_upload(self):
+        event = self.event()
+        resp = self.upload(ndjson([event, event]))
+        self.assertEqual((resp.json()["accepted"], resp.json()["duplicates"]), (1, 1))
+
+    def test_json_array_streamed_in_small_reads(self):
+        events = [self.event(i, raw={"note": "x" * 50, "n": 1234567}) for i in range(5)]
+        with mock.patch.object(ingest, "READ_SIZE", 7):
+            resp = self.upload(json.dumps(events, indent=1).encode(), content_type="application/json")
+        self.assertEqual(resp.json()["accepted"], 5)
+        self.assertEqual(sorted(AccessEvent.objects.values_list("raw__n", flat=True)), [1234567] * 5)
+        self.assertEqual(self.upload(b" [ ] ", content_type="application/json").json()["accepted"], 0)
+
+    def test_invalid_events_are_skipped_and_reported(self):
+        lines = [
+            json.dumps(self.event(0)).encode(),
+            b"{not json",
+            json.dumps(self.event(1, decision="MAYBE")).encode(),
+            json.dumps(self.event(2, created_at="2026-05-01T12:00:00")).encode(),
+            json.dumps(self.event(3, idempotency_key="")).encode(),
+            json.dumps(self.event(4, access_point_id="1")).encode(),
+            json.dumps(self.event(5, raw={"x": "a\x00b"})).encode(),
+            b"",
+            json.dumps(self.event(6)).encode(),
+        ]
+        body = self.upload(b"\n".join(lines)).json()
+        self.assertEqual((body["accepted"], body["rejected"]), (2, 6))
+        self.assertEqual([e["index"] for e in body["errors"]], [1, 2, 3, 4, 5, 6])
+
+    def test_oversized_line_is_rejected_without_buffering(self):
+        with mock.patch.object(ingest, "MAX_EVENT_BYTES", 400):
+            body = self.upload(ndjson([self.event(0, raw={"x": "y" * 1000}), self.event(1)])).json()
+        self.assertEqual((body["accepted"], body["rejected"]), (1, 1))
+
+    def test_references_to_deleted_rows_become_null(self):
+        resp = self.upload(ndjson([self.event(0, access_point_id=self.gate.id + 100, user_id=self.user.id + 100)]))
+        self.assertEqual(resp.json()["accepted"], 1)
+        row = AccessEvent.objects.get()
+        self.assertEqual((row.access_point_id, row.user_id), (None, None))
+
+    def test_malformed_bodies(self):
+        self.assertEqual(self.upload(b'[{"a": 1} {"b": 2}]', content_type="application/json").status_code, 400)
+        self.assertEqual(self.upload(b'[{"a": 1}', content_type="application/json").status_code, 400)
+        self.assertEqual(self.upload(b"[] []", content_type="application/json").status_code, 400)
+        resp = self.client.post(URL, b"not gzip", content_type="application/x-ndjson", HTTP_CONTENT_ENCODING="gzip")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.upload(b"x", content_type="text/csv").status_code, 415)
+        resp = self.client.post(URL, b"x", content_type="application/x-ndjson", HTTP_CONTENT_ENCODING="br")
+        self.assertEqual(resp.status_code, 415)
+        self.assertFalse(AccessEvent.objects.exists())
+
+    @skipUnless(connection.vendor == "postgresql", "COPY path is PostgreSQL only")
+    @override_settings(ACCESS_EVENT_BULK_CHUNK=2)
+    def test_postgres_copies_into_partitioned_table(self):
+        events = [self.event(i, reason="") for i in range(3)]
+        with mock.patch.object(ingest, "_copy_chunk", wraps=ingest._copy_chunk) as copy:
+            self.assertEqual(self.upload(ndjson(events + events[:1])).json()["duplicates"], 1)
+        self.assertEqual(copy.call_count, 2)
+        self.assertEqual(list(AccessEvent.objects.values_list("reason", "device_id").distinct()), [("", None)])
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from datetime import UTC, datetime
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from apps.access import events, live
+from apps.access.models import AccessPermission, AccessPoint
+
+User = get_user_model()
+URL = "/api/v1/access/events/stream"
+
+
+def messages(chunk: bytes) -> list[dict]:
+    return [json.loads(line[6:]) for line in chunk.decode().splitlines() if line.startswith("data: ")]
+
+
+class EventRingTests(TestCase):
+    def test_after_returns_only_events_still_held(self):
+        ring = live.EventRing(size=3)
+        ring.extend([{"n": n} for n in range(5)])
+        self.assertEqual(ring.after(0), [(3, {"n": 2}), (4, {"n": 3}), (5, {"n": 4})])
+        self.assertEqual(ring.after(4), [(5, {"n": 4})])
+        self.assertEqual(ring.after(5), [])
+
+    async def test_async_waiter_is_woken_from_another_thread(self):
+        ring = live.EventRing()
+        threading.Timer(0.05, ring.extend, [[{"n": 1}]]).start()
+        started = time.monotonic()
+        await ring.await_after(0, 5)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(ring.after(0), [(1, {"n": 1})])
+
+
+class AccessEventStreamTests(TestCase):
+    def setUp(self):
+        live.stop()
+        self.addCleanup(live.stop)
+        self.admin = User.objects.create_user(username="admin", password="x", is_staff=True)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.admin).key}")
+        self.gate = AccessPoint.objects.create(code="gate-01")
+        self.other = AccessPoint.objects.create(code="gate-02")
+        group = Group.objects.create(name="Staff")
+        self.user = User.objects.create_user(username="u1", password="x")
+        self.user.groups.add(group)
+        for gate in (self.gate, self.other):
+            AccessPermission.objects.create(access_point=gate, group=group, allow=True)
+        self.token = Token.objects.create(user=self.user).key
+
+    def open(self, client=None, **extra):
+        resp = (client or self.client).get(URL, HTTP_ACCEPT="text/event-stream", **extra)
+        self.assertEqual(resp.status_code, 200, getattr(resp, "content", b""))
+        # Not resp.close(): the test client closes it when the iterator is dropped, without closing the DB connection
+        return resp, iter(resp.streaming_content)
+
+    def verify(self, gate):
+        self.assertEqual(APIClient().post("/api/v1/access/verify", {"gate_id": gate, "token": self.token},
+                                          format="json").status_code, 200)
+
+    def test_requires_staff(self):
+        self.assertEqual(APIClient().get(URL, HTTP_ACCEPT="text/event-stream").status_code, 401)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {self.token}")
+        resp = client.get(URL, HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(resp.status_code, 403)
+        self.assertIn("detail", resp.json())  # JSON, not text/event-stream
+
+    def test_session_login_is_enough_for_eventsource(self):
+        client = APIClient()
+        client.force_login(self.admin)
+        resp, body = self.open(client)
+        self.assertEqual((resp["Content-Type"], resp["Cache-Control"]), ("text/event-stream", "no-cache"))
+        self.assertEqual(next(body), f"retry: {live.RETRY_MS}\n\n".encode())
+
+    def test_unknown_gate(self):
+        resp = self.client.get(URL, {"gate": "gate-01,nope"}, HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(resp.status_code, 404)
+        self.assertIn("nope", resp.json()["detail"])
+
+    def test_streams_decisions_for_the_selected_gate_without_raw(self):
+        _resp, body = self.open(data={"gate": "gate-01"})
+        next(body)
+        self.verify("gate-02")
+        self.verify("gate-01")
+        chunk = next(body)
+        self.assertNotIn(self.token.encode(), chunk)
+        self.assertRegex(chunk.decode(), r"^id: \w+:2\nevent: access\ndata: ")
+        [message] = messages(chunk)
+        self.assertEqual(
+            {k: message[k] for k in ("gate", "access_point_id", "user_id", "decision", "reason")},
+            {"gate": "gate-01", "access_point_id": self.gate.id, "user_id": self.user.id,
+             "decision": "ALLOW", "reason": "OK"},
+        )
+        self.assertNotIn("raw", message)
+
+    def test_reconnect_resumes_after_last_event_id(self):
+        events.record(access_point_id=self.gate.id, decision="DENY", reason="TOKEN_INVALID", raw={})
+        last_id = f"{live.get_ring().origin}:1"
+        events.record_many([{"access_point_id": self.gate.id, "decision": "DENY", "reason": reason, "raw": {}}
+                            for reason in ("NO_PERMISSION", "INACTIVE_USER")])
+        _resp, body = self.open(HTTP_LAST_EVENT_ID=last_id)
+        next(body)
+        self.assertEqual([m["reason"] for m in messages(next(body))], ["NO_PERMISSION", "INACTIVE_USER"])
+
+        # An id from another worker (or before a restart) cannot be resumed: the stream starts live
+        _resp, body = self.open(HTTP_LAST_EVENT_ID="elsewhere:1")
+        next(body)
+        self.verify("gate-01")
+        self.assertEqual([m["reason"] for m in messages(next(body))], ["OK"])
+
+    @override_settings(ACCESS_EVENT_STREAM_WSGI_SECONDS=0.2)
+    def test_wsgi_stream_ends_so_the_client_reconnects(self):
+        _resp, body = self.open()
+        started = time.monotonic()
+        self.assertEqual(len(list(body)), 1)
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_bulk_uploaded_events_are_published_once(self):
+        row = {"idempotency_key": uuid.uuid4().hex, "access_point_id": self.gate.id, "decision": "ALLOW",
+               "reason": "OK", "created_at": datetime(2026, 5, 1, 12, tzinfo=UTC).isoformat()}
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post("/api/v1/access/events/bulk", json.dumps(row), content_type="application/x-ndjson")
+        [(_seq, event)] = live.get_ring().after(0)
+        self.assertEqual((event["access_point_id"], event["created_at"]), (self.gate.id, "2026-05-01T12:00:00+00:00"))
+
+    async def test_asgi_stream_waits_on_the_loop(self):
+        await self.async_client.aforce_login(self.admin)
+        resp = await self.async_client.get(URL, {"gate": "gate-01"}, headers={"Accept": "text/event-stream"})
+        self.assertEqual(resp.status_code, 200)
+        body = aiter(resp.streaming_content)
+        try:
+            self.assertTrue((await anext(body)).startswith(b"retry:"))
+            pending = asyncio.ensure_future(anext(body))
+            await asyncio.sleep(0.05)
+            self.assertFalse(pending.done())
+            await events.arecord_many([{"access_point_id": self.gate.id, "decision": "ALLOW", "reason": "OK"}])
+            self.assertEqual(messages(await asyncio.wait_for(pending, 5))[0]["gate"], "gate-01")
+        finally:
+            await body.aclose()
+
+
+@skipUnless(connection.vendor == "postgresql", "LISTEN/NOTIFY fan-out is PostgreSQL only")
+@override_settings(ACCESS_EVENT_STREAM_FANOUT=True)
+class EventRelayTests(TransactionTestCase):
+    def setUp(self):
+        live.stop()
+        self.addCleanup(live.stop)
+
+    def wait_for(self, ring, seq):
+        deadline = time.monotonic() + 5
+        while ring.seq < seq and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+    def test_other_workers_events_arrive_and_own_are_not_duplicated(self):
+        ring = live.get_ring()
+        self.assertIsNotNone(live._relay)
+        time.sleep(0.3)  # let the relay LISTEN
+        live.publish([{"access_point_id": 1, "decision": "ALLOW", "reason": "OK"}])
+        payload = json.dumps({"o": "another", "e": [{"access_point_id": 2, "decision": "DENY", "reason": "X"}]})
+        with connection.cursor() as cur:
+            cur.execute("SELECT pg_notify(%s, %s)", [live.CHANNEL, payload])
+        self.wait_for(ring, 2)
+        time.sleep(0.3)  # our own notification has come back by now, and must have been skipped
+        self.assertEqual([event["access_point_id"] for _seq, event in ring.after(0)], [1, 2])
@@ -0,0 +1,106 @@
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from apps.access import credentials
+from apps.access.models import AccessEvent, AccessPermission, AccessPoint
+from apps.devices.models import Device
+
+User = get_user_model()
+
+
+class CredentialFormatTests(TestCase):
+    def test_roundtrip(self):
+        token = credentials.issue(42, 7, group_ids=[3, 1], ttl=60, now=1_000_000)
+        cred = credentials.parse(token, now=1_000_010)
+        self.assertEqual((cred.user_id, cred.device_id, cred.group_ids, cred.expires), (42, 7, (1, 3), 1_000_060))
+        self.assertFalse(cred.groups_truncated)
+
+    def test_expired_and_tampered_are_rejected(self):
+        token = credentials.issue(42, 7, ttl=60, now=1_000_000)
+        with self.assertRaises(credentials.InvalidCredentialError):
+            credentials.parse(token, now=1_000_061)
+        body = token[len(credentials.PREFIX):]
+        flipped = body[:3] + ("A" if body[3] != "A" else "B") + body[4:]
+        with self.assertRaises(credentials.InvalidCredentialError):
+            credentials.parse(credentials.PREFIX + flipped, now=1_000_000)
+
+    def test_many_groups_fit_serializer_limit(self):
+        token = credentials.issue(10**9, 10**9, group_ids=range(100_000, 100_200))
+        self.assertLessEqual(len(token), credentials.MAX_LENGTH)
+        self.assertTrue(credentials.parse(token).groups_truncated)
+
+    def test_key_rotation(self):
+        with override_settings(ACCESS_CREDENTIAL_KEYS={1: "old-key"}):
+            old = credentials.issue(1, 1)
+        with override_settings(ACCESS_CREDENTIAL_KEYS={1: "old-key", 2: "new-key"}):
+            self.assertEqual(credentials.parse(old).key_id, 1)
+            self.assertEqual(credentials.parse(credentials.issue(1, 1)).key_id, 2)
+        with override_settings(ACCESS_CREDENTIAL_KEYS={2: "new-key"}):
+            with self.assertRaises(credentials.InvalidCredentialError):
+                credentials.parse(old)
+
+    def test_key_ids_must_fit_seven_bits(self):
+        with override_settings(ACCESS_CREDENTIAL_KEYS={0: "a", 127: "b"}, ACCESS_CREDENTIAL_KEY_ID=127):
+            credentials.check_settings()
+        for keys, key_id in (({128: "a"}, 0), ({-1: "a"}, 0), ({"v2": "a"}, 0), ({1: "a"}, 128), ({1: "a"}, 2)):
+            with self.subTest(keys=keys, key_id=key_id):
+                with override_settings(ACCESS_CREDENTIAL_KEYS=keys, ACCESS_CREDENTIAL_KEY_ID=key_id):
+                    with self.assertRaises(ImproperlyConfigured):
+                        credentials.check_settings()
+
+    def test_startup_rejects_a_key_id_that_does_not_fit(self):
+        with override_settings(ACCESS_CREDENTIAL_KEYS={200: "a"}):
+            with self.assertRaises(ImproperlyConfigured):
+                apps.get_app_config("access").ready()
+
+
+class CredentialVerifyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.gate = AccessPoint.objects.create(code="gate-01")
+        self.group = Group.objects.create(name="Staff")
+        self.user = User.objects.create_user(username="cred", password="x")
+        self.user.groups.add(self.group)
+        AccessPermission.objects.create(access_point=self.gate, group=self.group, allow=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+        resp = self.client.post("/api/v1/devices/register", {}, format="json")
+        self.device_id = resp.data["device_id"]
+        self.qr = resp.data["qr_payload"]
+        self.client.credentials()
+
+    def verify(self, token=None):
+        return self.client.post("/api/v1/access/verify", {"gate_id": "gate-01", "token": token or self.qr},
+                                format="json").json()
+
+    def test_register_issues_credential_that_verifies(self):
+        self.assertEqual(credentials.parse(self.qr).group_ids, (self.group.id,))
+        self.assertEqual(self.verify()["decision"], "ALLOW")
+        event = AccessEvent.objects.get()
+        self.assertEqual((event.user_id, event.device_id), (self.user.id, self.device_id))
+
+    def test_revoked_device_is_denied(self):
+        self.assertEqual(self.verify()["decision"], "ALLOW")
+        device = Device.objects.get(pk=self.device_id)
+        device.is_active = False
+        device.save()
+        self.assertEqual(self.verify()["reason"], "DEVICE_INACTIVE")
+
+    def test_group_change_applies_before_expiry(self):
+        self.user.groups.clear()
+        self.assertEqual(self.verify()["reason"], "NO_PERMISSION")
+
+    def test_forged_credential_is_invalid(self):
+        with override_settings(ACCESS_CREDENTIAL_KEYS={1: "attacker"}):
+            forged = credentials.issue(self.user.id, self.device_id)
+        self.assertEqual(self.verify(forged)["reason"], "TOKEN_INVALID")
+
+    @override_settings(ACCESS_AUTHZ_SNAPSHOT=False)
+    def test_orm_path_accepts_credentials(self):
+        self.assertEqual(self.verify()["decision"], "ALLOW")
+        Device.objects.filter(pk=self.device_id).update(is_active=False)
+        self.assertEqual(self.verify()["reason"], "DEVICE_INACTIVE")
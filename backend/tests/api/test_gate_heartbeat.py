@@ -0,0 +1,130 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from apps.access import authz, gate_keys, heartbeats
+from apps.access.models import AccessPoint, GateStatus
+from apps.api.v1 import authentication
+
+User = get_user_model()
+
+
+def url(code="gate-01"):
+    return f"/api/v1/gates/{code}/heartbeat"
+
+
+def key(code="gate-01"):
+    return f"Gate {gate_keys.gate_key(code)}"
+
+
+class GateHeartbeatTests(TestCase):
+    def setUp(self):
+        self.table = heartbeats.get_table()
+        self.table.reset()
+        self.client = self.client_class(HTTP_AUTHORIZATION=key())
+        self.gate = AccessPoint.objects.create(code="gate-01")
+        self.other = AccessPoint.objects.create(code="gate-02")
+        self.silent = AccessPoint.objects.create(code="gate-03")
+
+    def test_heartbeat_is_not_throttled_and_makes_no_queries(self):
+        authz.get_snapshot()
+        with self.assertNumQueries(0):
+            for rssi in range(-100, 1):  # past the default anon throttle of 100/day
+                resp = self.client.get(url(), {"fw": "1.4.2", "rssi": rssi})
+                self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {"status": "ok"})
+        beat = self.table.beats()[self.gate.id]
+        self.assertEqual((beat.firmware, beat.rssi), ("1.4.2", 0))
+        self.assertAlmostEqual(beat.last_seen, time.time(), delta=5)
+
+    def test_post_needs_no_csrf_token(self):
+        client = self.client_class(enforce_csrf_checks=True, HTTP_AUTHORIZATION=key())
+        self.assertEqual(client.post(url() + "?fw=2.0").status_code, 200)
+        self.assertEqual(self.table.beats()[self.gate.id].rssi, None)
+
+    def test_rejects_unknown_gate_and_bad_values(self):
+        unknown = self.client.get(url("nope"), HTTP_AUTHORIZATION=key("nope"))
+        self.assertEqual(unknown.json(), {"status": "unknown-gate"})
+        self.assertEqual(self.client.get(url(), {"fw": "x" * 33}).status_code, 400)
+        self.assertEqual(self.client.get(url(), {"fw": "v\x01"}).status_code, 400)
+        self.assertEqual(self.client.get(url(), {"rssi": "strong"}).status_code, 400)
+        self.assertEqual(self.client.get(url(), {"rssi": "5"}).status_code, 400)
+        self.assertEqual(self.table.beats(), {})
+
+    def test_rejects_heartbeats_without_the_gate_key(self):
+        anonymous = self.client_class()
+        resp = anonymous.get(url(), {"fw": "1.0"})
+        self.assertEqual((resp.status_code, resp.json()), (401, {"status": "unauthorized"}))
+        self.assertEqual(anonymous.get(url(), HTTP_AUTHORIZATION=key("gate-02")).status_code, 401)
+        self.assertEqual(anonymous.get(url(), HTTP_AUTHORIZATION="Gate 0123").status_code, 401)
+        self.assertEqual(anonymous.get(url("nope")).status_code, 401)  # not 404: gate codes stay private
+        self.assertEqual(self.table.beats(), {})
+
+    def test_flush_upserts_changed_gates_at_most_once_per_interval(self):
+        now = time.time()
+        self.table.beat(self.gate.id, "1.0", -60, now=now - 5)
+        self.table.beat(self.other.id, "1.0", -70, now=now - 5)
+        with self.assertNumQueries(3):  # seed, gates that still exist, one upsert
+            self.assertEqual(self.table.flush(30, now=now), 2)
+        self.assertEqual(GateStatus.objects.get(pk=self.gate.id).rssi, -60)
+
+        self.table.beat(self.gate.id, "1.1", -50, now=now + 1)
+        self.assertEqual(self.table.flush(30, now=now + 2), 0)  # another worker flushed 2 s ago
+        with self.assertNumQueries(2):
+            self.assertEqual(self.table.flush(30, now=now + 31), 1)  # only the gate that beat again
+        status = GateStatus.objects.get(pk=self.gate.id)
+        self.assertEqual((status.firmware, status.rssi), ("1.1", -50))
+        self.assertAlmostEqual(status.last_seen.timestamp(), now + 1, places=3)
+        self.assertEqual(self.table.flush(30, now=now + 62), 0)
+
+    def test_flush_skips_deleted_gates(self):
+        self.table.beat(self.gate.id)
+        self.table.beat(self.other.id)
+        self.other.delete()
+        self.assertEqual(self.table.flush(), 1)
+        self.assertEqual(list(GateStatus.objects.values_list("pk", flat=True)), [self.gate.id])
+
+    def test_new_table_is_seeded_from_gate_status(self):
+        self.table.beat(self.gate.id, "0.9", -80, now=time.time() - 600)
+        self.table.flush()
+        self.table.reset()  # e.g. the host rebooted and the mmap file is gone
+        [(code, beat)] = [item for item in heartbeats.offline(60) if item[1] is not None]
+        self.assertEqual((code, beat.firmware, beat.rssi), ("gate-01", "0.9", -80))
+        self.assertEqual(self.table.flush(), 0)  # seeded rows are already persisted
+
+
+class GateOfflineTests(TestCase):
+    def setUp(self):
+        heartbeats.get_table().reset()
+        self.client = APIClient()
+        admin = User.objects.create_user(username="monitor", password="x", is_staff=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=admin).key}")
+        now = time.time()
+        for code, age in (("gate-01", 5), ("gate-02", 300)):
+            gate = AccessPoint.objects.create(code=code)
+            heartbeats.get_table().beat(gate.id, "1.2", -65, now=now - age)
+        AccessPoint.objects.create(code="gate-03")
+
+    def test_offline_gates_from_memory(self):
+        heartbeats.offline(60)  # builds the authz snapshot and seeds the table once
+        authentication.token_auth_version.value()  # and the token cache's periodic version read
+        with self.assertNumQueries(1):  # the token lookup only
+            resp = self.client.get("/api/v1/gates/offline", {"after": 60})
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(body["after"], 60)
+        self.assertEqual([g["gate"] for g in body["gates"]], ["gate-02", "gate-03"])
+        self.assertEqual((body["gates"][0]["firmware"], body["gates"][0]["rssi"]), ("1.2", -65))
+        self.assertEqual(body["gates"][1], {"gate": "gate-03", "last_seen": None, "firmware": "", "rssi": None})
+
+        self.assertEqual([g["gate"] for g in self.client.get("/api/v1/gates/offline").json()["gates"]],
+                         ["gate-02", "gate-03"])
+
+    def test_requires_staff(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=User.objects.create_user('u')).key}")
+        self.assertEqual(client.get("/api/v1/gates/offline").status_code, 403)
+        self.assertEqual(self.client.get("/api/v1/gates/offline", {"after": 0}).status_code, 400)
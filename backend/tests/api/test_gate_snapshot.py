@@ -0,0 +1,129 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+from rest_framework.throttling import AnonRateThrottle
+
+from apps.access import devices, gate_keys, gate_snapshots, ratelimit
+from apps.access.models import AccessPermission, AccessPoint
+from apps.devices.models import Device
+
+User = get_user_model()
+URL = "/api/v1/gates/gate-01/snapshot"
+
+
+class GateSnapshotTests(TestCase):
+    def setUp(self):
+        devices.removed()
+        ratelimit.get_limiter().backend.reset()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Gate {gate_keys.gate_key('gate-01')}")
+        self.gate = AccessPoint.objects.create(code="gate-01")
+        AccessPoint.objects.create(code="gate-02")
+        self.user = User.objects.create_user(username="allowed", password="x")
+        AccessPermission.objects.create(access_point=self.gate, user=self.user, allow=True)
+        self.session = Token.objects.create(user=self.user).key
+        Device.objects.create(user=self.user, auth_token="d" * 64)
+        Device.objects.create(user=self.user, auth_token="r" * 64, is_active=False)
+        stranger = User.objects.create_user(username="stranger", password="x")
+        Token.objects.create(user=stranger)
+        Device.objects.create(user=stranger, auth_token="s" * 64)
+
+    def digests(self, resp):
+        self.assertEqual(resp["Content-Type"], gate_snapshots.CONTENT_TYPE)
+        gate_id, digests = gate_snapshots.decode(resp.content)
+        self.assertEqual(gate_id, self.gate.id)
+        self.assertEqual(digests, sorted(digests))
+        return set(digests)
+
+    def test_lists_only_tokens_that_verify_allows(self):
+        resp = self.client.get(URL)
+        self.assertEqual(resp.status_code, 200)
+        expected = {gate_snapshots.token_digest(self.session), gate_snapshots.token_digest("d" * 64)}
+        self.assertEqual(self.digests(resp), expected)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Gate {gate_keys.gate_key('gate-02')}")
+        other = self.client.get("/api/v1/gates/gate-02/snapshot")
+        self.assertEqual(gate_snapshots.decode(other.content)[1], [])
+
+    def test_inactive_user_is_left_out(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.digests(self.client.get(URL)), set())
+
+    def test_conditional_get(self):
+        resp = self.client.get(URL)
+        etag = resp["ETag"]
+        self.assertEqual(resp["Cache-Control"], "no-cache")
+        for header in (etag, f'W/{etag}', f'"other", {etag}', "*"):
+            cached = self.client.get(URL, HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(cached.status_code, 304, header)
+            self.assertEqual(cached.content, b"")
+            self.assertEqual(cached["ETag"], etag)
+        self.assertEqual(self.client.get(URL, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_etag_follows_grants_and_devices(self):
+        etag = self.client.get(URL)["ETag"]
+        self.assertEqual(self.client.get(URL)["ETag"], etag)
+        newcomer = User.objects.create_user(username="newcomer", password="x")
+        Token.objects.create(user=newcomer)
+        self.assertEqual(self.client.get(URL, HTTP_IF_NONE_MATCH=etag).status_code, 304)  # not allowed here yet
+        AccessPermission.objects.create(access_point=self.gate, user=newcomer, allow=True)
+        after_grant = self.client.get(URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(after_grant.status_code, 200)
+        self.assertNotEqual(after_grant["ETag"], etag)
+        Device.objects.create(user=newcomer, auth_token="n" * 64)
+        resp = self.client.get(URL, HTTP_IF_NONE_MATCH=after_grant["ETag"])
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(gate_snapshots.token_digest("n" * 64), self.digests(resp))
+
+    def test_body_is_encoded_once_per_state(self):
+        first = gate_snapshots.get("gate-01")
+        self.assertIs(gate_snapshots.get("gate-01"), first)
+        Device.objects.filter(auth_token="d" * 64).get().save()  # unchanged row re-read by the refresh
+        self.assertIs(gate_snapshots.get("gate-01"), first)
+
+    def test_polling_is_not_throttled_by_the_anon_rate(self):
+        cache.clear()
+        with mock.patch.object(AnonRateThrottle, "THROTTLE_RATES", {"anon": "1/day"}):
+            self.assertEqual([self.client.get(URL).status_code for _ in range(3)], [200] * 3)
+
+    def test_polling_faster_than_the_gate_rate_is_throttled(self):
+        with mock.patch.dict(api_settings.DEFAULT_THROTTLE_RATES, {"gate_snapshot": "2/minute"}):
+            self.assertEqual([self.client.get(URL).status_code for _ in range(3)], [200, 200, 429])
+
+    def test_requires_the_gate_key_or_staff(self):
+        anonymous = APIClient()
+        self.assertEqual(anonymous.get(URL).status_code, 401)
+        anonymous.credentials(HTTP_AUTHORIZATION=f"Gate {gate_keys.gate_key('gate-02')}")  # another gate's key
+        self.assertEqual(anonymous.get(URL).status_code, 401)
+        anonymous.credentials(HTTP_AUTHORIZATION=f"Token {self.session}")  # a user that is not staff
+        self.assertEqual(anonymous.get(URL).status_code, 403)
+        staff = User.objects.create_user(username="ops", password="x", is_staff=True)
+        anonymous.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=staff).key}")
+        self.assertEqual(anonymous.get(URL).status_code, 200)
+
+    def test_gate_key_command(self):
+        out = StringIO()
+        call_command("gate_key", "gate-01", stdout=out)
+        self.assertEqual(out.getvalue(), f"gate-01 {gate_keys.gate_key('gate-01')}\n")
+        self.assertNotEqual(gate_keys.gate_key("gate-01"), gate_keys.gate_key("gate-02"))
+        with self.assertRaises(CommandError):
+            call_command("gate_key", "nope")
+
+    def test_unknown_gate(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Gate {gate_keys.gate_key('nope')}")
+        self.assertEqual(self.client.get("/api/v1/gates/nope/snapshot").status_code, 404)
+        self.assertIsNone(gate_snapshots.get("nope"))
+
+    def test_encoding_round_trip(self):
+        digests = [gate_snapshots.token_digest(t) for t in ("b", "a", "b")]
+        gate_id, decoded = gate_snapshots.decode(gate_snapshots.encode(7, digests))
+        self.assertEqual((gate_id, decoded), (7, sorted(set(digests))))
+        with self.assertRaises(ValueError):
+            gate_snapshots.decode(b"XXXX" + bytes(12))
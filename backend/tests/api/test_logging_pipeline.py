@@ -0,0 +1,135 @@
+import io
+import json
+import logging
+import sys
+from datetime import UTC, datetime
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from accessproj.settings.logging_json import AllowSampler, JSONFormatter, QueueingStreamHandler
+from apps.access import ratelimit
+from apps.access.models import AccessPermission, AccessPoint
+from benchmarks.bench_logging import EXTRA, LegacyJSONFormatter, make_record
+
+User = get_user_model()
+
+
+def _record(msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord("django.request", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class JSONFormatterTests(SimpleTestCase):
+    def test_same_fields_as_previous_formatter(self):
+        record = make_record()
+        record.user_id = 7
+        new, old = json.loads(JSONFormatter().format(record)), json.loads(LegacyJSONFormatter().format(record))
+        self.assertEqual(list(new), list(old))
+        self.assertEqual({k: v for k, v in new.items() if k != "ts"}, {k: v for k, v in old.items() if k != "ts"})
+
+    def test_only_present_fields(self):
+        data = json.loads(JSONFormatter().format(_record(status=200)))
+        self.assertEqual(list(data), ["ts", "level", "logger", "message", "status"])
+        self.assertEqual(data["message"], "hello world")
+
+    def test_timestamp_matches_isoformat(self):
+        formatter = JSONFormatter()
+        for created in (1760000000.0, 1760000000.5, 1760000000.9999996, 1760000001.000001, 1760003599.123456):
+            record = _record()
+            record.created = created
+            expected = datetime.fromtimestamp(created, UTC).isoformat()
+            self.assertEqual(json.loads(formatter.format(record))["ts"], expected)
+
+    def test_exception(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = _record(exc_info=sys.exc_info())
+        self.assertIn("ValueError: boom", json.loads(JSONFormatter().format(record))["exception"])
+
+
+class QueueingStreamHandlerTests(SimpleTestCase):
+    def make_handler(self, **kwargs):
+        stream = io.StringIO()
+        handler = QueueingStreamHandler(stream, **kwargs)
+        handler.setFormatter(JSONFormatter())
+        self.addCleanup(handler.close)
+        return handler, stream
+
+    def lines(self, stream):
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    def test_written_by_listener(self):
+        handler, stream = self.make_handler()
+        handler.handle(make_record())
+        handler.handle(_record())
+        handler.flush_and_stop()
+        lines = self.lines(stream)
+        self.assertEqual([line["message"] for line in lines], ["POST /api/v1/access/verify 200 3ms", "hello world"])
+        self.assertEqual(lines[0]["decision"], EXTRA["decision"])
+
+    def test_message_and_traceback_captured_on_the_calling_thread(self):
+        handler, stream = self.make_handler()
+        args = ["before"]
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.LogRecord("apps", logging.ERROR, __file__, 1, "value %s", (args,), sys.exc_info())
+        handler.handle(record)
+        args[0] = "after"
+        handler.flush_and_stop()
+        [line] = self.lines(stream)
+        self.assertEqual(line["message"], "value ['before']")
+        self.assertIn("ValueError: boom", line["exception"])
+        self.assertIsNotNone(record.exc_info)  # the caller's record is left untouched
+
+    def test_drops_instead_of_blocking_when_full(self):
+        handler, stream = self.make_handler(maxsize=2)
+        for _ in range(5):
+            handler.enqueue(handler.prepare(_record()))  # listener not started: nothing drains
+        self.assertEqual(handler.dropped, 3)
+        handler._start()
+        handler.flush_and_stop()
+        lines = self.lines(stream)
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[1]["message"], "Log queue full; dropped 3 records")
+
+
+class AllowSamplerTests(SimpleTestCase):
+    def test_deny_and_other_records_always_pass(self):
+        sampler = AllowSampler(0)
+        self.assertTrue(sampler.filter(_record(decision="DENY")))
+        self.assertTrue(sampler.filter(_record()))
+        self.assertFalse(sampler.filter(_record(decision="ALLOW")))
+
+    def test_kept_allow_lines_carry_rate(self):
+        sampler = AllowSampler(0.25)
+        with mock.patch("accessproj.settings.logging_json.random.random", side_effect=[0.1, 0.9]):
+            kept, dropped = _record(decision="ALLOW"), _record(decision="ALLOW")
+            self.assertTrue(sampler.filter(kept))
+            self.assertFalse(sampler.filter(dropped))
+        self.assertEqual(json.loads(JSONFormatter().format(kept))["sample_rate"], 0.25)
+
+    def test_rate_one_keeps_everything_unchanged(self):
+        record = _record(decision="ALLOW")
+        self.assertTrue(AllowSampler(1).filter(record))
+        self.assertFalse(hasattr(record, "sample_rate"))
+
+
+class AccessLogDecisionTests(TestCase):
+    def test_verify_decision_logged_without_request_metrics(self):
+        ratelimit.get_limiter().backend.reset()
+        gate = AccessPoint.objects.create(code="gate-01")
+        user = User.objects.create_user(username="logged", password="x")
+        AccessPermission.objects.create(access_point=gate, user=user, allow=True)
+        token = Token.objects.create(user=user).key
+        with self.assertLogs("django.request", level="INFO") as logs:
+            APIClient().post("/api/v1/access/verify", {"gate_id": "gate-01", "token": token}, format="json")
+        record = logs.records[-1]
+        self.assertEqual((record.decision, record.reason), ("ALLOW", "OK"))
+        self.assertFalse(hasattr(record, "db_queries"))
@@ -0,0 +1,192 @@
+import os
+import sys
+import tempfile
+import threading
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from apps.access import authz, live, ratelimit
+from apps.access.events import BufferedEventSink
+from apps.access.models import AccessPermission, AccessPoint
+from core import metrics
+
+User = get_user_model()
+VERIFY_URL = "/api/v1/access/verify"
+
+
+def _samples(text: str) -> dict[str, float]:
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            samples[name] = float(value)
+    return samples
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        ratelimit.get_limiter().backend.reset()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        shared_dir = override_settings(ACCESS_SHARED_STATE_DIR=tmp.name, ACCESS_METRICS=True)
+        shared_dir.enable()
+        self.addCleanup(shared_dir.disable)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.client = APIClient()
+
+    def scrape(self) -> dict[str, float]:
+        resp = self.client.get("/metrics")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], metrics.CONTENT_TYPE)
+        return _samples(resp.content.decode())
+
+
+class MetricsEndpointTests(MetricsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.gate = AccessPoint.objects.create(code="gate-01")
+        self.user = User.objects.create_user(username="metrics", password="x")
+        AccessPermission.objects.create(access_point=self.gate, user=self.user, allow=True)
+        self.token = Token.objects.create(user=self.user).key
+
+    def verify(self, gate="gate-01", token=None):
+        return self.client.post(VERIFY_URL, {"gate_id": gate, "token": token or self.token}, format="json")
+
+    def test_verify_latency_by_decision_reason_and_gate(self):
+        self.verify()
+        self.verify()
+        self.verify(token="x" * 40)
+        self.verify(gate="no-such-gate")
+        samples = self.scrape()
+        allow = 'decision="ALLOW",reason="OK",gate="gate-01"'
+        self.assertEqual(samples[f"access_verify_duration_seconds_count{{{allow}}}"], 2)
+        self.assertEqual(samples[f'access_verify_duration_seconds_bucket{{{allow},le="+Inf"}}'], 2)
+        self.assertGreater(samples[f"access_verify_duration_seconds_sum{{{allow}}}"], 0)
+        self.assertEqual(samples['access_verify_duration_seconds_count{decision="DENY",reason="TOKEN_INVALID",'
+                                 'gate="gate-01"}'], 1)
+        # Unknown gate codes come from the request body and must not become label values
+        self.assertEqual(samples['access_verify_duration_seconds_count{decision="DENY",reason="UNKNOWN_GATE",'
+                                 'gate=""}'], 1)
+
+    def test_buckets_are_cumulative(self):
+        for _ in range(3):
+            self.verify()
+        labels = 'decision="ALLOW",reason="OK",gate="gate-01"'
+        buckets = [
+            value for name, value in self.scrape().items()
+            if name.startswith(f"access_verify_duration_seconds_bucket{{{labels}")
+        ]
+        self.assertEqual(len(buckets), len(metrics.VERIFY_DURATION.buckets) + 1)
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], 3)
+
+    @override_settings(REST_FRAMEWORK={"DEFAULT_THROTTLE_RATES": {"access_verify": "1/minute"}})
+    def test_throttled_requests_are_counted(self):
+        self.verify()
+        resp = self.verify()
+        self.assertEqual(resp.json()["reason"], "RATE_LIMIT")
+        samples = self.scrape()
+        self.assertEqual(samples['access_throttled_total{scope="access_verify"}'], 1)
+        self.assertEqual(
+            samples['access_verify_duration_seconds_count{decision="DENY",reason="RATE_LIMIT",gate=""}'], 1
+        )
+
+    def test_db_queries_are_counted(self):
+        before = self.scrape().get('access_db_queries_total{alias="default"}', 0)
+        self.verify()
+        self.assertGreater(self.scrape()['access_db_queries_total{alias="default"}'], before)
+
+    @override_settings(ACCESS_AUTHZ_SNAPSHOT=True)
+    def test_snapshot_hits_and_misses(self):
+        authz.invalidate()
+        self.verify()
+        self.verify()
+        samples = self.scrape()
+        self.assertEqual(samples['access_authz_snapshot_lookups_total{result="miss"}'], 1)
+        self.assertEqual(samples['access_authz_snapshot_lookups_total{result="hit"}'], 1)
+
+    def test_event_queue_depth(self):
+        sink = BufferedEventSink(spill=False, background=False)
+        sink.record(access_point_id=None, user_id=None, device_id=None, decision="DENY", reason="INVALID_REQUEST")
+        sink.record(access_point_id=None, user_id=None, device_id=None, decision="DENY", reason="INVALID_REQUEST")
+        self.assertEqual(self.scrape()["access_event_queue_depth"], 2)
+        sink.flush()
+        self.assertEqual(self.scrape()["access_event_queue_depth"], 0)
+
+    def test_shed_events(self):
+        sink = BufferedEventSink(spill=False, background=False, max_queue=1)
+        sink.record_many([{"decision": "DENY", "reason": "INVALID_REQUEST"} for _ in range(3)])
+        self.assertEqual(self.scrape()['access_events_shed_total{result="dropped"}'], 2)
+        sink.flush()
+
+    def test_relay_outbox_drops_the_oldest_events(self):
+        relay = live._Relay(live.EventRing(), size=3, background=False)
+        relay.send([{"reason": str(i)} for i in range(2)])
+        relay.send([{"reason": str(i)} for i in range(2, 5)])
+        self.assertEqual([event["reason"] for event in relay.outbox], ["2", "3", "4"])
+        self.assertEqual(self.scrape()["access_event_stream_dropped_total"], 2)
+
+    @override_settings(ACCESS_METRICS=False)
+    def test_disabled(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    @override_settings(ACCESS_METRICS_ALLOWED_IPS=["10.0.0.0/8"])
+    def test_only_allowed_clients_scrape(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.1.2.3").status_code, 200)
+
+
+class MetricsStoreTests(MetricsTestCase):
+    def test_samples_of_other_workers_are_summed(self):
+        metrics.THROTTLED.labels("access_verify").inc()
+        metrics.EVENT_QUEUE_DEPTH.set(5)
+        pid = os.fork()
+        if pid == 0:  # a second worker writing to its own file
+            try:
+                metrics.THROTTLED.labels("access_verify").inc(2)
+                metrics.EVENT_QUEUE_DEPTH.set(7)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        samples = self.scrape()
+        self.assertEqual(samples['access_throttled_total{scope="access_verify"}'], 3)
+        # Counters of exited workers still count; their gauges do not
+        self.assertEqual(samples["access_event_queue_depth"], 5)
+
+    def test_concurrent_increments_are_not_lost(self):
+        counter = metrics.THROTTLED.labels("threads")
+
+        def work():
+            for _ in range(20000):
+                counter.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        previous = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # switch threads as often as possible
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(previous)
+        self.assertEqual(self.scrape()['access_throttled_total{scope="threads"}'], 160000)
+
+    def test_store_grows(self):
+        for i in range(3000):
+            metrics.DB_QUERIES.labels(f"alias-{i:04d}").inc(i)
+        samples = metrics.collect()["access_db_queries_total"]
+        self.assertEqual(len(samples), 3000)
+        self.assertEqual(samples[("alias-2999",), ""], 2999)
+
+    def test_label_values_are_escaped(self):
+        metrics.THROTTLED.labels('a"b\\c\nd').inc()
+        self.assertIn('access_throttled_total{scope="a\\"b\\\\c\\nd"} 1.0', metrics.exposition())
+
+    def test_wrong_label_count(self):
+        with self.assertRaises(ValueError):
+            metrics.THROTTLED.labels()
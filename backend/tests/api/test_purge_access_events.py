@@ -92,3 +92,43 @@ class TestPurgeAccessEvents:
         assert AccessEvent.objects.count() == 1
         assert "Deleted 0 events older than 365 days" in out.getvalue()
 
+    def _old_events(self, n, days=100):
+        gate = AccessPoint.objects.create(code=f"gate-old-{n}")
+        AccessEvent.objects.bulk_create(
+            [AccessEvent(access_point=gate, decision="DENY", reason="NO_PERMISSION",
+                         created_at=now() - timedelta(days=days)) for _ in range(n)]
+        )
+
+    def test_purge_in_chunks(self):
+        """Test that --batch-size deletes in several chunks and reports progress."""
+        self._old_events(7)
+        AccessEvent.objects.create(decision="ALLOW", reason="OK")
+
+        out = StringIO()
+        call_command("purge_access_events", "--days", "90", "--batch-size", "3", stdout=out)
+
+        assert AccessEvent.objects.count() == 1
+        assert out.getvalue().count("rows/s") == 3
+        assert "Deleted 7 events older than 90 days" in out.getvalue()
+
+    def test_dry_run_only_counts(self):
+        """Test that --dry-run reports the count and deletes nothing."""
+        self._old_events(4)
+
+        out = StringIO()
+        call_command("purge_access_events", "--days", "90", "--dry-run", stdout=out)
+
+        assert AccessEvent.objects.count() == 4
+        assert "Would delete 4 events older than 90 days" in out.getvalue()
+
+    def test_max_runtime_stops_early_and_resumes(self):
+        """Test that --max-runtime stops after a chunk and a re-run finishes the job."""
+        self._old_events(5)
+
+        out = StringIO()
+        call_command("purge_access_events", "--days", "90", "--batch-size", "2", "--max-runtime", "0", stdout=out)
+        assert AccessEvent.objects.count() == 3
+        assert "re-run" in out.getvalue()
+
+        call_command("purge_access_events", "--days", "90", "--batch-size", "2", stdout=StringIO())
+        assert AccessEvent.objects.count() == 0
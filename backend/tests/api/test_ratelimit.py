@@ -0,0 +1,111 @@
+import pytest
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.access import events, ratelimit
+from apps.access.models import AccessEvent, AccessPoint
+from apps.access.ratelimit import InMemoryBackend, RateLimiter, RedisBackend, SharedMemoryBackend, gcra, parse_rate
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class LocalRedis:
+    """Stand-in for redis-py: runs the GCRA step the Lua script performs."""
+
+    def __init__(self):
+        self.store = {}
+        self.calls = []
+
+    def eval(self, script, numkeys, key, now, interval, period):
+        self.calls.append((numkeys, key))
+        new_tat, wait = gcra(float(self.store.get(key, 0.0)), float(now), float(interval), float(period))
+        self.store[key] = new_tat
+        return str(wait).encode()
+
+
+def test_parse_rate():
+    assert parse_rate("30/second") == (30, 1)
+    assert parse_rate("10/minute") == (10, 60)
+    assert parse_rate("1000/day") == (1000, 86400)
+
+
+@pytest.mark.parametrize("make_backend", [
+    InMemoryBackend,
+    lambda: RedisBackend(client=LocalRedis()),
+])
+def test_burst_then_steady_rate(make_backend):
+    clock = FakeClock()
+    limiter = RateLimiter(make_backend(), clock=clock)
+    assert all(limiter.hit("k", "3/second") == 0 for _ in range(3))
+    wait = limiter.hit("k", "3/second")
+    assert wait == pytest.approx(1 / 3)
+    clock.now += 1 / 3
+    assert limiter.hit("k", "3/second") == 0
+    # Other keys are independent
+    assert limiter.hit("other", "3/second") == 0
+
+
+def test_shared_memory_backend_is_shared_between_instances(settings, tmp_path):
+    settings.ACCESS_SHARED_STATE_DIR = str(tmp_path)
+    clock = FakeClock()
+    first = RateLimiter(SharedMemoryBackend(buckets=16, ways=2), clock=clock)
+    second = RateLimiter(SharedMemoryBackend(buckets=16, ways=2), clock=clock)
+    assert first.hit("gate-01:10.0.0.1", "2/second") == 0
+    assert second.hit("gate-01:10.0.0.1", "2/second") == 0
+    assert first.hit("gate-01:10.0.0.1", "2/second") > 0
+    assert second.hit("gate-02:10.0.0.1", "2/second") == 0
+
+
+def test_shared_memory_backend_evicts_oldest_when_bucket_full(settings, tmp_path):
+    settings.ACCESS_SHARED_STATE_DIR = str(tmp_path)
+    clock = FakeClock()
+    limiter = RateLimiter(SharedMemoryBackend(buckets=1, ways=2), clock=clock)
+    for key in ("a", "b", "c"):
+        assert limiter.hit(key, "1/minute") == 0
+        clock.now += 1
+    # "a" had the oldest TAT and was evicted by "c", so it starts fresh; "c" is still limited
+    assert limiter.hit("a", "1/minute") == 0
+    assert limiter.hit("c", "1/minute") > 0
+
+
+@override_settings(REST_FRAMEWORK={"DEFAULT_THROTTLE_RATES": {"access_verify": "2/minute"}})
+class GateRateThrottleTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        ratelimit.get_limiter().backend.reset()
+        events.get_sink().rate_limits.drain(final=True)
+
+    def post(self, gate, ip="10.0.0.1"):
+        return self.client.post("/api/v1/access/verify", {"gate_id": gate, "token": "whatever-token"},
+                                format="json", REMOTE_ADDR=ip).json()
+
+    def test_limit_is_per_gate_and_ip(self):
+        AccessPoint.objects.bulk_create([AccessPoint(code="gate-a"), AccessPoint(code="gate-b")])
+        self.assertEqual(self.post("gate-a")["reason"], "TOKEN_INVALID")
+        self.assertEqual(self.post("gate-a")["reason"], "TOKEN_INVALID")
+        self.assertEqual(self.post("gate-a"), {"decision": "DENY", "reason": "RATE_LIMIT"})
+        self.assertEqual(self.post("gate-a"), {"decision": "DENY", "reason": "RATE_LIMIT"})
+        self.assertEqual(self.post("gate-b")["reason"], "TOKEN_INVALID")
+        self.assertEqual(self.post("gate-a", ip="10.0.0.2")["reason"], "TOKEN_INVALID")
+
+        # Throttled requests are summarized, not written one by one
+        self.assertFalse(AccessEvent.objects.filter(reason="RATE_LIMIT").exists())
+        events.get_sink().flush_rate_limits(final=True)
+        summary = AccessEvent.objects.get(reason="RATE_LIMIT")
+        self.assertEqual((summary.raw["gate_id"], summary.raw["ip"], summary.raw["count"]), ("gate-a", "10.0.0.1", 2))
+
+    def test_unknown_gates_share_one_bucket(self):
+        self.assertEqual(self.post("gate-x")["reason"], "UNKNOWN_GATE")
+        self.assertEqual(self.post("gate-y")["reason"], "UNKNOWN_GATE")
+        # A fresh made-up id does not get a fresh allowance
+        self.assertEqual(self.post("gate-z"), {"decision": "DENY", "reason": "RATE_LIMIT"})
+        self.assertEqual(self.post(["not", "a", "code"]), {"decision": "DENY", "reason": "RATE_LIMIT"})
+        self.assertEqual(self.post("gate-x", ip="10.0.0.2")["reason"], "UNKNOWN_GATE")
+        AccessPoint.objects.create(code="gate-z")
+        self.assertEqual(self.post("gate-z")["reason"], "TOKEN_INVALID")
@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from apps.access import ratelimit
+from apps.access.models import AccessPermission, AccessPoint
+from benchmarks.loadgen import _QUERIES
+from core import timing
+
+User = get_user_model()
+VERIFY_URL = "/api/v1/access/verify"
+
+
+def _timing(header: str) -> dict[str, str]:
+    entries = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        entries[name] = params
+    return entries
+
+
+@override_settings(ACCESS_REQUEST_METRICS=True, ACCESS_AUTHZ_SNAPSHOT=False)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        ratelimit.get_limiter().backend.reset()
+        self.client = APIClient()
+        self.gate = AccessPoint.objects.create(code="gate-01")
+        self.user = User.objects.create_user(username="metrics", password="x")
+        AccessPermission.objects.create(access_point=self.gate, user=self.user, allow=True)
+        self.token = Token.objects.create(user=self.user).key
+
+    def verify(self, token=None):
+        return self.client.post(VERIFY_URL, {"gate_id": "gate-01", "token": token or self.token}, format="json")
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.verify()
+        entries = _timing(resp["Server-Timing"])
+        self.assertEqual(list(entries), ["db", "throttle", "serialize", "authz", "view", "decision", "total"])
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', entries["db"])
+        self.assertEqual(entries["decision"], 'desc="ALLOW OK"')
+        self.assertEqual(int(_QUERIES.search(resp["Server-Timing"]).group(1)), len(ctx.captured_queries))
+
+    def test_log_fields(self):
+        with self.assertLogs("django.request", level="INFO") as logs:
+            self.verify(token="x" * 40)
+        record = logs.records[-1]
+        self.assertEqual((record.decision, record.reason), ("DENY", "TOKEN_INVALID"))
+        self.assertGreater(record.db_queries, 0)
+        for field in ("db_ms", "throttle_ms", "serialize_ms", "authz_ms", "view_ms"):
+            self.assertGreaterEqual(getattr(record, field), 0)
+
+    def test_other_endpoints_get_db_and_view_only(self):
+        resp = self.client.get("/ready")
+        entries = _timing(resp["Server-Timing"])
+        self.assertTrue(entries["db"].endswith('desc="1 queries"'))
+        self.assertNotIn("decision", entries)
+        self.assertIn("view", entries)
+
+    @override_settings(ACCESS_REQUEST_METRICS=False)
+    def test_disabled_by_default(self):
+        resp = self.verify()
+        self.assertNotIn("Server-Timing", resp)
+        self.assertIsNone(timing.current())
+
+
+@override_settings(ACCESS_REQUEST_METRICS=True)
+class AsyncRequestMetricsTests(TestCase):
+    async def test_metrics_under_asgi(self):
+        resp = await self.async_client.get("/ready")
+        self.assertIn('desc="1 queries"', resp["Server-Timing"])
+
+
+def test_timers_are_noops_without_a_request():
+    with timing.timer("authz"):
+        pass
+    timing.annotate("ALLOW", "OK")
+    assert timing.current() is None
@@ -0,0 +1,257 @@
+import ast
+import threading
+from io import StringIO
+from pathlib import Path
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from apps.access import changelog
+from apps.access.devices import token_digest
+from apps.access.models import AccessPermission, AccessPoint, ChangeLogEntry
+from apps.devices.models import Device
+
+User = get_user_model()
+URL = "/api/v1/sync/changes"
+BACKEND = Path(__file__).resolve().parents[2]
+
+
+def apply(state, changes):
+    """What a consumer does: keep the latest data per object, drop tombstones."""
+    for change in changes:
+        key = (change["kind"], change["id"])
+        if change["op"] == "delete":
+            state.pop(key, None)
+        else:
+            state[key] = change["data"]
+    return state
+
+
+class SyncChangesTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="sync", password="x", is_staff=True)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.admin).key}")
+        self.start = self.seq()
+
+    def seq(self):
+        return ChangeLogEntry.objects.order_by("-seq").values_list("seq", flat=True).first() or 0
+
+    def fetch(self, since=None, **params):
+        resp = self.client.get(URL, {"since": self.start if since is None else since, **params})
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return resp.json()
+
+    def test_requires_staff(self):
+        self.assertEqual(APIClient().get(URL).status_code, 401)
+        user = User.objects.create_user(username="plain", password="x")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+        self.assertEqual(client.get(URL).status_code, 403)
+
+    def test_changes_carry_state_without_raw_tokens(self):
+        gate = AccessPoint.objects.create(code="gate-01")
+        user = User.objects.create_user(username="u1", password="x")
+        group = Group.objects.create(name="staff")
+        perm = AccessPermission.objects.create(access_point=gate, group=group)
+        user.groups.add(group)
+        token = Token.objects.create(user=user)
+        device = Device.objects.create(user=user, auth_token="d" * 64)
+        body = self.fetch()
+        self.assertEqual([(c["kind"], c["op"], c["id"], c["data"]) for c in body["changes"]], [
+            ("gate", "upsert", str(gate.id), {"code": "gate-01"}),
+            ("user", "upsert", str(user.id), {"active": True}),
+            ("permission", "upsert", str(perm.id), {"gate": gate.id, "user": None, "group": group.id, "allow": True}),
+            ("membership", "upsert", f"{user.id}:{group.id}", {"user": user.id, "group": group.id}),
+            ("token", "upsert", token_digest(token.key).hex(), {"user": user.id}),
+            ("device", "upsert", str(device.id),
+             {"user": user.id, "active": True, "token": token_digest("d" * 64).hex()}),
+        ])
+        self.assertEqual(body["next"], self.seq())
+        self.assertFalse(body["more"])
+        self.assertNotIn(token.key, str(body))
+
+    def test_deletes_and_membership_removals(self):
+        user = User.objects.create_user(username="u1", password="x")
+        groups = [Group.objects.create(name=f"g{i}") for i in range(3)]
+        user.groups.add(*groups)
+        groups[0].user_set.remove(user)
+        since = self.seq()
+        user.groups.clear()
+        self.assertEqual(
+            sorted(c["id"] for c in self.fetch(since)["changes"] if c["op"] == "delete"),
+            [f"{user.id}:{groups[1].id}", f"{user.id}:{groups[2].id}"],
+        )
+        user.groups.add(groups[1])
+        Token.objects.create(user=user)
+        since = self.seq()
+        user.delete()
+        kinds = {(c["kind"], c["op"]) for c in self.fetch(since)["changes"]}
+        self.assertEqual(kinds, {("membership", "delete"), ("token", "delete"), ("user", "delete")})
+
+    def test_unrelated_saves_are_not_logged(self):
+        user = User.objects.create_user(username="u1", password="x")
+        since = self.seq()
+        user.last_login = user.date_joined
+        user.save(update_fields=["last_login"])
+        Group.objects.create(name="empty")
+        self.assertEqual(self.fetch(since)["changes"], [])
+        user.is_active = False
+        user.save(update_fields=["is_active"])
+        self.assertEqual(self.fetch(since)["changes"][0]["data"], {"active": False})
+
+    def test_paging_and_page_compaction(self):
+        user = User.objects.create_user(username="u1", password="x")
+        device = Device.objects.create(user=user, auth_token="a" * 64)
+        for token in ("b" * 64, "c" * 64):
+            device.auth_token = token
+            device.save()
+        gates = [AccessPoint.objects.create(code=f"gate-{i}") for i in range(3)]
+        first = self.fetch(limit=4)
+        self.assertTrue(first["more"])
+        self.assertEqual([c["kind"] for c in first["changes"]], ["user", "device"])
+        self.assertEqual(first["changes"][1]["data"]["token"], token_digest("c" * 64).hex())
+        rest = self.fetch(first["next"], limit=4)
+        self.assertFalse(rest["more"])
+        self.assertEqual([c["id"] for c in rest["changes"]], [str(g.id) for g in gates])
+        self.assertEqual(self.fetch(rest["next"]), {"changes": [], "next": rest["next"], "more": False})
+
+    def test_cost_is_one_query_per_page(self):
+        for i in range(20):
+            AccessPoint.objects.create(code=f"gate-{i}")
+        with self.assertNumQueries(2):  # token auth + the page
+            self.assertEqual(len(self.fetch(limit=50)["changes"]), 20)
+
+    def test_compaction_keeps_full_state(self):
+        user = User.objects.create_user(username="u1", password="x")
+        gate = AccessPoint.objects.create(code="gate-01")
+        perm = AccessPermission.objects.create(access_point=gate, user=user)
+        perm.allow = False
+        perm.save()
+        device = Device.objects.create(user=user, auth_token="a" * 64)
+        device.is_active = False
+        device.save()
+        Token.objects.create(user=user).delete()
+        midway = self.seq()
+        consumer = apply({}, self.fetch(0, limit=5000)["changes"])
+        gate.code = "gate-renamed"
+        gate.save()
+        before = apply({}, self.fetch(0, limit=5000)["changes"])
+        out = StringIO()
+        call_command("compact_change_log", stdout=out)
+        self.assertIn("superseded", out.getvalue())
+        self.assertEqual(apply({}, self.fetch(0, limit=5000)["changes"]), before)
+        self.assertEqual(apply(consumer, self.fetch(midway, limit=5000)["changes"]), before)
+        self.assertEqual(before[("permission", str(perm.id))]["allow"], False)
+        self.assertEqual(
+            ChangeLogEntry.objects.filter(kind="device", object_id=str(device.id)).count(), 1
+        )
+
+    def test_bulk_writes_of_gates_permissions_and_devices_are_logged(self):
+        user = User.objects.create_user(username="u1", password="x")
+        gates = AccessPoint.objects.bulk_create([AccessPoint(code=f"gate-{i}") for i in range(3)])
+        perms = AccessPermission.objects.bulk_create([AccessPermission(access_point=g, user=user) for g in gates])
+        Device.objects.bulk_create([Device(user=user, auth_token=c * 64) for c in "ab"])
+        gates[0].code = "gate-renamed"
+        AccessPoint.objects.bulk_update(gates[:1], ["code"])
+        AccessPermission.objects.filter(allow=True, access_point=gates[1]).update(allow=False)
+        Device.objects.filter(auth_token="a" * 64).update(is_active=False)
+        AccessPoint.objects.filter(pk=gates[2].pk).delete()  # and its permission with it
+        state = apply({}, self.fetch(limit=5000)["changes"])
+        self.assertEqual(
+            {key[1]: data["code"] for key, data in state.items() if key[0] == "gate"},
+            {str(gates[0].id): "gate-renamed", str(gates[1].id): "gate-1"},
+        )
+        self.assertEqual(
+            {key[1]: data["allow"] for key, data in state.items() if key[0] == "permission"},
+            {str(perms[0].id): True, str(perms[1].id): False},
+        )
+        self.assertEqual(
+            sorted((data["token"], data["active"]) for key, data in state.items() if key[0] == "device"),
+            sorted([(token_digest("a" * 64).hex(), False), (token_digest("b" * 64).hex(), True)]),
+        )
+
+    def test_invalid_query(self):
+        self.assertEqual(self.client.get(URL, {"since": -1}).status_code, 400)
+        self.assertEqual(self.client.get(URL, {"limit": 10**6}).status_code, 400)
+
+
+class UnloggedBulkWriteTests(SimpleTestCase):
+    """Tokens, users and memberships have no change-logged queryset: their bulk writers log by hand."""
+
+    UNLOGGED = ("Token.objects", "User.objects", "through.objects", "get_user_model().objects")
+    BULK = {"bulk_create", "bulk_update", "update"}
+
+    def bulk_writes_without_record_many(self, source, name):
+        misses = []
+        for func in ast.walk(ast.parse(source)):
+            if not isinstance(func, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+            calls = [node for node in ast.walk(func) if isinstance(node, ast.Call)]
+            names = {ast.unparse(call.func).rpartition(".")[2] for call in calls}
+            for call in calls:
+                target = call.func
+                if (isinstance(target, ast.Attribute) and target.attr in self.BULK
+                        and any(model in ast.unparse(target.value) for model in self.UNLOGGED)
+                        and "record_many" not in names):
+                    misses.append(f"{name}:{call.lineno} {ast.unparse(target)}")
+        return misses
+
+    def test_bulk_writes_call_record_many(self):
+        sources = [
+            path for package in ("apps", "core", "benchmarks") for path in (BACKEND / package).rglob("*.py")
+            if "migrations" not in path.parts
+        ]
+        misses = [
+            miss for path in sources
+            for miss in self.bulk_writes_without_record_many(path.read_text(), path.relative_to(BACKEND))
+        ]
+        self.assertEqual(misses, [])
+
+    def test_check_catches_a_bulk_write(self):
+        source = "def deactivate(ids):\n    User.objects.filter(pk__in=ids).update(is_active=False)\n"
+        self.assertEqual(self.bulk_writes_without_record_many(source, "sample.py"), [
+            "sample.py:2 User.objects.filter(pk__in=ids).update",
+        ])
+        logged = source + "    changelog.record_many(changelog.entry(u) for u in User.objects.filter(pk__in=ids))\n"
+        self.assertEqual(self.bulk_writes_without_record_many(logged, "sample.py"), [])
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="seq allocation is serialized with an advisory lock")
+class ChangeLogCommitOrderTests(TransactionTestCase):
+    def test_later_writer_waits_for_earlier_commit(self):
+        holding, release, done = threading.Event(), threading.Event(), threading.Event()
+
+        def first():
+            try:
+                with transaction.atomic():
+                    changelog.record(changelog.membership(1, 1))
+                    holding.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        def second():
+            try:
+                changelog.record(changelog.membership(2, 2))
+                done.set()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=first), threading.Thread(target=second)]
+        threads[0].start()
+        holding.wait(5)
+        threads[1].start()
+        self.assertFalse(done.wait(0.3))  # cannot take a seq while the first transaction is open
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertTrue(done.is_set())
+        self.assertEqual(list(ChangeLogEntry.objects.order_by("seq").values_list("object_id", flat=True)),
+                         ["1:1", "2:2"])
@@ -0,0 +1,114 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from apps.access.models import CacheVersion
+from apps.api.v1 import authentication
+from apps.api.v1.authentication import CachedTokenAuthentication, TokenCache
+
+User = get_user_model()
+URL = "/api/v1/devices/me"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenCacheTests(TestCase):
+    def test_entries_expire_and_the_least_recently_used_is_evicted(self):
+        clock = FakeClock()
+        cache = TokenCache(max_size=2, ttl=10, clock=clock)
+        cache.sync(1)
+        cache.put("a", "ua", "ta", 1)
+        cache.put("b", "ub", "tb", 1)
+        cache.get("a")
+        cache.put("c", "uc", "tc", 1)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (("ua", "ta"), None, ("uc", "tc")))
+        clock.now = 10
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 1)
+
+    def test_newer_version_clears_and_stale_fills_are_dropped(self):
+        cache = TokenCache()
+        cache.sync(1)
+        cache.put("a", "u", "t", 1)
+        cache.sync(3)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", "u", "t", 1)  # loaded before the bump to 3
+        self.assertIsNone(cache.get("a"))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="u1", password="x")
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        authentication.token_auth_version.value()  # keep the periodic version-row read out of the counts
+
+    def get(self, queries):
+        with self.assertNumQueries(queries):
+            return self.client.get(URL)
+
+    def test_cached_token_costs_no_auth_query(self):
+        self.assertEqual(self.get(2).status_code, 200)  # token lookup + the devices
+        self.assertEqual(self.get(1).status_code, 200)
+        self.user.last_login = self.user.date_joined
+        self.user.save(update_fields=["last_login"])
+        self.get(1)
+
+    def test_deleted_token_is_rejected_at_once(self):
+        self.get(2)
+        self.token.delete()
+        self.assertEqual(self.client.get(URL).status_code, 401)
+
+    def test_deactivated_user_is_rejected_at_once(self):
+        self.get(2)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(URL).status_code, 401)
+
+    def test_password_change_reloads_the_user(self):
+        self.get(2)
+        self.user.set_password("y")
+        self.user.save(update_fields=["password"])
+        self.assertEqual(self.get(2).status_code, 200)
+
+    def test_another_worker_invalidation_is_seen(self):
+        self.get(2)
+        authentication.token_auth_version.local.incr()  # what a signal in another process on this host does
+        self.get(2)
+
+    @override_settings(ACCESS_AUTHZ_MAX_STALENESS=0)
+    def test_another_host_invalidation_is_seen(self):
+        self.assertEqual(self.get(3).status_code, 200)  # version row + token lookup + the devices
+        User.objects.filter(pk=self.user.pk).update(is_active=False)  # no signal on this host
+        stored, _ = authentication.token_auth_version.value()
+        CacheVersion.objects.update_or_create(name="token-auth-version", defaults={"value": stored + 1})
+        self.assertEqual(self.client.get(URL).status_code, 401)
+
+    def test_hands_out_copies_and_never_caches_failures(self):
+        auth = CachedTokenAuthentication()
+        first, _ = auth.authenticate_credentials(self.token.key)
+        first.username = "changed by a view"
+        second, token = auth.authenticate_credentials(self.token.key)
+        self.assertEqual((second.username, token.key), ("u1", self.token.key))
+
+        key = "f" * 40
+        with self.assertRaises(AuthenticationFailed):
+            auth.authenticate_credentials(key)
+        Token.objects.create(user=User.objects.create_user(username="u2"), key=key)
+        self.assertEqual(auth.authenticate_credentials(key)[0].username, "u2")
+
+    @override_settings(ACCESS_TOKEN_AUTH_CACHE_TTL=0)
+    def test_ttl_zero_disables_the_cache(self):
+        authentication._cache = None
+        self.addCleanup(setattr, authentication, "_cache", None)
+        self.get(2)
+        self.get(2)
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from apps.access import authz, credentials, ratelimit
+from apps.access.models import AccessEvent, AccessPermission, AccessPoint
+from apps.devices.models import Device
+
+User = get_user_model()
+BATCH_URL = "/api/v1/access/verify/batch"
+
+
+class VerifyBatchTests(TestCase):
+    def setUp(self):
+        ratelimit.get_limiter().backend.reset()
+        self.client = APIClient()
+        self.gate1 = AccessPoint.objects.create(code="gate-01")
+        self.gate2 = AccessPoint.objects.create(code="gate-02")
+        self.group = Group.objects.create(name="Staff")
+        self.staff = User.objects.create_user(username="staff", password="x")
+        self.staff.groups.add(self.group)
+        self.direct = User.objects.create_user(username="direct", password="x")
+        self.inactive = User.objects.create_user(username="gone", password="x", is_active=False)
+        AccessPermission.objects.create(access_point=self.gate1, group=self.group, allow=True)
+        AccessPermission.objects.create(access_point=self.gate2, user=self.direct, allow=True)
+        self.staff_token = Token.objects.create(user=self.staff).key
+        self.direct_token = Token.objects.create(user=self.direct).key
+        self.inactive_token = Token.objects.create(user=self.inactive).key
+        device = Device.objects.create(user=self.staff)
+        self.credential = credentials.issue(self.staff.id, device.id)
+
+    def items(self):
+        return [
+            {"gate_id": "gate-01", "token": self.staff_token},
+            {"gate_id": "gate-02", "token": self.staff_token},
+            {"gate_id": "gate-02", "token": self.direct_token},
+            {"gate_id": "nope", "token": self.direct_token},
+            {"gate_id": "gate-01", "token": "x" * 40},
+            {"gate_id": "gate-01", "token": self.inactive_token},
+            {"gate_id": "gate-01", "token": "short"},
+            {"gate_id": "gate-01", "token": self.credential},
+        ]
+
+    expected = [
+        ("ALLOW", "OK"), ("DENY", "NO_PERMISSION"), ("ALLOW", "OK"), ("DENY", "UNKNOWN_GATE"),
+        ("DENY", "TOKEN_INVALID"), ("DENY", "TOKEN_INVALID"), ("DENY", "INVALID_REQUEST"), ("ALLOW", "OK"),
+    ]
+
+    def post(self, items):
+        return self.client.post(BATCH_URL, {"items": items}, format="json")
+
+    def test_results_in_request_order(self):
+        resp = self.post(self.items())
+        self.assertEqual(resp.status_code, 200)
+        results = resp.json()["results"]
+        self.assertEqual([(r["decision"], r["reason"]) for r in results], self.expected)
+        self.assertEqual(results[0]["duration_ms"], 800)
+        self.assertEqual(AccessEvent.objects.count(), len(self.expected))
+
+    def test_matches_single_verify(self):
+        for item, expected in zip(self.items(), self.expected, strict=True):
+            body = self.client.post("/api/v1/access/verify", item, format="json").json()
+            self.assertEqual((body["decision"], body["reason"]), expected)
+
+    @override_settings(ACCESS_AUTHZ_SNAPSHOT=False)
+    def test_orm_path_uses_fixed_number_of_queries(self):
+        authz.gate_codes()  # the throttle's gate list, re-read only when gates change
+        with CaptureQueriesContext(connection) as small:
+            self.post(self.items()[:2])
+        with CaptureQueriesContext(connection) as large:
+            results = self.post(self.items() * 4).json()["results"]
+        self.assertEqual([(r["decision"], r["reason"]) for r in results], self.expected * 4)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries) + 1)  # + the device lookup
+        self.assertLessEqual(len(large.captured_queries), 5)
+
+    def test_orm_path_matches_snapshot(self):
+        pairs = [(i["gate_id"], i["token"]) for i in self.items()]
+        self.assertEqual(authz.decide_many_from_db(pairs), [authz.get_snapshot().decide(g, t) for g, t in pairs])
+
+    @override_settings(ACCESS_VERIFY_BATCH_MAX=3)
+    def test_envelope_errors_are_400(self):
+        self.assertEqual(self.post(self.items()).status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.client.post(BATCH_URL, {"gate_id": "gate-01"}, format="json").status_code, 400)
+
+    def test_non_object_item_is_invalid_request(self):
+        results = self.post(["oops", {"gate_id": "gate-01", "token": self.staff_token}]).json()["results"]
+        self.assertEqual([r["reason"] for r in results], ["INVALID_REQUEST", "OK"])
+
+    @override_settings(REST_FRAMEWORK={"DEFAULT_THROTTLE_RATES": {"access_verify": "2/minute"}})
+    def test_rate_limit_is_charged_per_item(self):
+        item = {"gate_id": "gate-01", "token": self.staff_token}
+        results = self.post([item, item, item, {"gate_id": "gate-02", "token": self.direct_token}]).json()["results"]
+        self.assertEqual([r["reason"] for r in results], ["OK", "OK", "RATE_LIMIT", "OK"])
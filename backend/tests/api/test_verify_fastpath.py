@@ -0,0 +1,59 @@
+import json
+
+import pytest
+from rest_framework.renderers import JSONRenderer
+
+from apps.api.v1 import fastpath
+from apps.api.v1.constants import DECISIONS, REASON_OK, REASONS
+from apps.api.v1.serializers import VerifyRequestSerializer, VerifyResponseSerializer
+
+REQUESTS = [
+    {"gate_id": "gate-01", "token": "a" * 8},
+    {"gate_id": "gate-01", "token": "a" * 7},
+    {"gate_id": "gate-01", "token": "a" * 128},
+    {"gate_id": "gate-01", "token": "a" * 129},
+    {"gate_id": "gate-01", "token": "  " + "a" * 8 + "\n"},
+    {"gate_id": "gate-01", "token": "  " + "a" * 6 + "  "},
+    {"gate_id": " gate-01 ", "token": "a" * 10, "extra": 1},
+    {"gate_id": "", "token": "a" * 10},
+    {"gate_id": "   ", "token": "a" * 10},
+    {"gate_id": None, "token": "a" * 10},
+    {"gate_id": 17, "token": 123456789},
+    {"gate_id": 1.5, "token": "a" * 10},
+    {"gate_id": True, "token": "a" * 10},
+    {"gate_id": ["gate-01"], "token": "a" * 10},
+    {"gate_id": {"x": 1}, "token": "a" * 10},
+    {"gate_id": "gate-01"},
+    {"token": "a" * 10},
+    {"gate_id": "gate\x00", "token": "a" * 10},
+    {"gate_id": "gate-01", "token": "ключ-доступа-1"},
+    {"gate_id": "gate-01", "token": "a" * 8 + "\ud800"},
+    {},
+    [],
+    "gate-01",
+    None,
+]
+
+
+@pytest.mark.parametrize("data", REQUESTS)
+def test_validator_matches_serializer(data):
+    ser = VerifyRequestSerializer(data=data)
+    expected = dict(ser.validated_data) if ser.is_valid() else None
+    assert fastpath.validate_verify_request(data) == expected
+
+
+RESPONSES = [(d, r) for d in DECISIONS for r in REASONS if (d == "ALLOW") == (r == REASON_OK)]
+
+
+@pytest.mark.parametrize("decision,reason", RESPONSES)
+def test_prebuilt_body_matches_serializer(decision, reason):
+    payload = {"decision": decision, "reason": reason}
+    if decision == "ALLOW":
+        payload["duration_ms"] = 800
+    ser = VerifyResponseSerializer(data=payload)
+    ser.is_valid(raise_exception=True)
+    resp = fastpath.verify_response(decision, reason)
+    assert resp.status_code == 200
+    assert resp["Content-Type"] == "application/json"
+    assert resp.content == JSONRenderer().render(ser.validated_data)
+    assert json.loads(resp.content) == resp.data == payload
@@ -0,0 +1,150 @@
+import asyncio
+import contextlib
+import struct
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.throttling import SimpleRateThrottle
+
+from apps.access import authz, credentials, ratelimit
+from apps.access.models import AccessEvent, AccessPermission, AccessPoint
+from apps.access.verify_server import (
+    PONG,
+    VERIFY_RESULT,
+    VerifyServer,
+    decode_response,
+    encode_ping,
+    encode_verify,
+    parse_fields,
+)
+from apps.devices.models import Device
+
+User = get_user_model()
+
+
+class VerifyServerTests(TestCase):
+    def setUp(self):
+        ratelimit.get_limiter().backend.reset()
+        self.gate = AccessPoint.objects.create(code="gate-01")
+        self.group = Group.objects.create(name="Staff")
+        self.user = User.objects.create_user(username="reader", password="x")
+        self.user.groups.add(self.group)
+        AccessPermission.objects.create(access_point=self.gate, group=self.group, allow=True)
+        self.token = Token.objects.create(user=self.user).key
+        self.lonely = Token.objects.create(user=User.objects.create_user(username="lonely", password="x")).key
+        self.device = Device.objects.create(user=self.user, auth_token="d" * 40)
+
+    def cases(self):
+        return [
+            ("gate-01", self.token),
+            ("gate-02", self.token),
+            ("gate-01", "x" * 40),
+            ("gate-01", self.lonely),
+            ("gate-01", self.device.auth_token),
+            ("gate-01", credentials.issue(self.user.id, self.device.id)),
+            ("gate-01", credentials.issue(self.user.id, self.device.id + 100)),
+        ]
+
+    @contextlib.asynccontextmanager
+    async def serve(self):
+        # Async tests each run on their own loop, so everything is torn down inside the test
+        server = VerifyServer()
+        bound = await server.start("127.0.0.1", 0, udp_port=0)
+        self.writers = []
+        try:
+            yield {transport: port for transport, _host, port in bound}
+        finally:
+            for writer in self.writers:
+                writer.close()
+            await server.close()
+
+    async def connect(self, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        self.writers.append(writer)
+        return reader, writer
+
+    async def read_frame(self, reader):
+        head = await asyncio.wait_for(reader.readexactly(2), 5)
+        return head + await reader.readexactly(struct.unpack(">H", head)[0])
+
+    async def test_pipelined_verifies_match_http_decisions_in_order(self):
+        async with self.serve() as ports:
+            reader, writer = await self.connect(ports["tcp"])
+            cases = await sync_to_async(self.cases)()
+            writer.write(b"".join(encode_verify(1000 + i, gate, token) for i, (gate, token) in enumerate(cases)))
+            writer.write(encode_ping(7))
+            for i, (gate, token) in enumerate(cases):
+                expected = await sync_to_async(authz.decide_from_db)(gate, token)
+                frame = await self.read_frame(reader)
+                self.assertEqual(decode_response(frame), (VERIFY_RESULT, 1000 + i, expected.decision, expected.reason))
+            self.assertEqual(decode_response(await self.read_frame(reader)), (PONG, 7, None, None))
+
+            events = [e async for e in AccessEvent.objects.order_by("id")]
+            self.assertEqual(len(events), len(cases))
+            self.assertEqual((events[0].decision, events[0].user_id, events[0].raw),
+                             ("ALLOW", self.user.id, {"gate_id": "gate-01", "token": self.token}))
+
+    async def test_allow_carries_duration(self):
+        async with self.serve() as ports:
+            reader, writer = await self.connect(ports["tcp"])
+            writer.write(encode_verify(1, "gate-01", self.token))
+            frame = await self.read_frame(reader)
+            self.assertEqual(struct.unpack(">HBBIBBH", frame)[-1], 800)
+
+    async def test_malformed_fields_are_invalid_request(self):
+        async with self.serve() as ports:
+            reader, writer = await self.connect(ports["tcp"])
+            bad_utf8 = struct.pack(">HBBI", 10, 1, 1, 3) + b"\x02\xff\xfe\x01x"
+            writer.write(encode_verify(1, "gate-01", "short") + encode_verify(2, "  ", self.token) + bad_utf8)
+            for nonce in (1, 2, 3):
+                self.assertEqual(decode_response(await self.read_frame(reader)),
+                                 (VERIFY_RESULT, nonce, "DENY", "INVALID_REQUEST"))
+            self.assertEqual(await AccessEvent.objects.filter(reason="INVALID_REQUEST").acount(), 3)
+
+    async def test_undelimited_frame_closes_connection(self):
+        async with self.serve() as ports:
+            for garbage in (struct.pack(">H", 4000), struct.pack(">HBBI", 6, 9, 1, 1), struct.pack(">HB", 1, 1)):
+                reader, writer = await self.connect(ports["tcp"])
+                writer.write(garbage)
+                self.assertEqual(await asyncio.wait_for(reader.read(), 5), b"")
+
+    async def test_rate_limited_taps_are_denied_and_summarized(self):
+        async with self.serve() as ports:
+            reader, writer = await self.connect(ports["tcp"])
+            with mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, {"access_verify": "2/minute"}):
+                writer.write(b"".join(encode_verify(i, "gate-01", self.token) for i in range(4)))
+                reasons = [decode_response(await self.read_frame(reader))[3] for _ in range(4)]
+            self.assertEqual(reasons, ["OK", "OK", "RATE_LIMIT", "RATE_LIMIT"])
+            self.assertEqual(await AccessEvent.objects.filter(reason="OK").acount(), 2)
+
+    async def test_udp_answers_and_absorbs_retransmits(self):
+        async with self.serve() as ports:
+            loop = asyncio.get_running_loop()
+            answers = asyncio.Queue()
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: type("Client", (asyncio.DatagramProtocol,), {
+                    "datagram_received": lambda self, data, addr: answers.put_nowait(data),
+                })(),
+                remote_addr=("127.0.0.1", ports["udp"]),
+            )
+            frame = encode_verify(42, "gate-01", self.token)
+            try:
+                transport.sendto(frame)
+                first = await asyncio.wait_for(answers.get(), 5)
+                transport.sendto(frame)
+                second = await asyncio.wait_for(answers.get(), 5)
+            finally:
+                transport.close()
+            self.assertEqual(first, second)
+            self.assertEqual(decode_response(first), (VERIFY_RESULT, 42, "ALLOW", "OK"))
+            self.assertEqual(await AccessEvent.objects.acount(), 1)
+
+    def test_parse_fields(self):
+        body = encode_verify(1, "gate-01", self.token)[2:]
+        self.assertEqual(parse_fields(body), ("gate-01", self.token))
+        self.assertEqual(parse_fields(body + b"x"), ("gate-01", None))
+        self.assertEqual(parse_fields(body[:9]), (None, None))
@@ -9,8 +9,11 @@ const char* WIFI_PASS = "MOKAMOKA";
 static const char* BACKEND_HOST = "192.168.10.228"; 
 static const uint16_t BACKEND_PORT = 8001;
 static const char* VERIFY_PATH = "/api/v1/access/verify";
-static const char* HEALTH_PATH = "/health";
 static const char* GATE_ID = "GATE-01";
+// Пульс гейта: backend помечает гейт онлайн и хранит версию прошивки и RSSI
+static const char* GATES_PATH = "/api/v1/gates/";  // + GATE_ID + "/heartbeat"
+static const char* FIRMWARE_VERSION = "1.0.0";
+static const uint32_t HEARTBEAT_EVERY_MS = 30000;
 static const uint32_t HTTP_TIMEOUT_MS = 7000;
 
 // ====== BLE UUID ======
@@ -81,9 +84,10 @@ bool wifiEnsure() {
 bool httpHealth() {
   if (!wifiEnsure()) return false;
   HTTPClient http;
-  String url = String("http://") + BACKEND_HOST + ":" + String(BACKEND_PORT) + HEALTH_PATH;
+  String url = String("http://") + BACKEND_HOST + ":" + String(BACKEND_PORT) + GATES_PATH + GATE_ID
+      + "/heartbeat?fw=" + FIRMWARE_VERSION + "&rssi=" + String(WiFi.RSSI());
   http.setTimeout(HTTP_TIMEOUT_MS);
-  if (!http.begin(url)) { Serial.println("[HTTP] begin fail (/health)"); return false; }
+  if (!http.begin(url)) { Serial.println("[HTTP] begin fail (heartbeat)"); return false; }
   int code = http.GET();
   String resp = http.getString();
   Serial.printf("[HTTP] GET %s -> %d (%s), %s\n",
@@ -95,10 +99,10 @@ bool httpHealth() {
 bool verifyToken(const String& token) {
   if (!wifiEnsure()) { Serial.println("[WiFi] connect fail"); return false; }
 
-  // Быстрый пинг /health (даст понять, виден ли сервер и порт)
+  // Быстрый пульс (даст понять, виден ли сервер и порт)
   if (!httpHealth()) {
-    Serial.println("[HTTP] /health not reachable");
-    oledMsg("NET ERR", "/health fail");
+    Serial.println("[HTTP] heartbeat not reachable");
+    oledMsg("NET ERR", "heartbeat fail");
     return false;
   }
 
@@ -178,5 +182,11 @@ void setup() {
 }
 
 void loop() {
+  // Пульс и в простое, чтобы backend не считал гейт офлайн между проходами
+  static uint32_t lastHeartbeat = 0;
+  if (millis() - lastHeartbeat >= HEARTBEAT_EVERY_MS) {
+    lastHeartbeat = millis();
+    httpHealth();
+  }
   delay(500);
 }
@@ -0,0 +1,11 @@
+"""OpenWay gate agent: answers reader verifies at the edge.
+
+Runs next to one or more readers and serves the backend's verify contract
+(``POST /api/v1/access/verify``, ``GET /health``) from a local copy of the
+authorization data, kept current through the backend change feed
+(``GET /api/v1/sync/changes``). Decisions are recorded on disk and shipped
+upstream in gzip batches (``POST /api/v1/access/events/bulk``).
+
+Standard library only, so it runs on whatever Python the gate box has.
+"""
+__version__ = "0.1.0"
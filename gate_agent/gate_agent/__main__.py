@@ -0,0 +1,39 @@
+"""``python -m gate_agent`` — run the agent until SIGINT/SIGTERM.
+
+Settings come from ``GATE_AGENT_*`` environment variables (see ``config.py``);
+the flags below override the most common ones.
+"""
+import argparse
+import logging
+import signal
+import threading
+
+from .config import Config
+from .server import Agent
+
+
+def main(argv=None):
+    config = Config.from_env()
+    parser = argparse.ArgumentParser(prog="gate-agent", description=__doc__.splitlines()[0])
+    parser.add_argument("--backend-url", default=config.backend_url)
+    parser.add_argument("--listen-port", type=int, default=config.listen_port)
+    parser.add_argument("--data-dir", default=config.data_dir)
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+    config.backend_url = args.backend_url.rstrip("/")
+    config.listen_port, config.data_dir = args.listen_port, args.data_dir
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    if not config.token:
+        logging.getLogger("gate_agent").warning("GATE_AGENT_TOKEN is not set: sync and uploads will be rejected")
+
+    agent = Agent(config)
+    stopped = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stopped.set())
+    agent.start()
+    stopped.wait()
+    agent.stop()
+
+
+if __name__ == "__main__":
+    main()
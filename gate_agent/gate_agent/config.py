@@ -0,0 +1,45 @@
+"""Agent settings, read from ``GATE_AGENT_*`` environment variables."""
+import os
+import socket
+from dataclasses import dataclass, field
+
+
+def parse_keys(value: str) -> dict[int, bytes]:
+    """``"1:<hex>,2:<hex>"`` -> ``{1: key, 2: key}``: the backend's credential keys, hex-encoded."""
+    keys = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        kid, _, secret = item.partition(":")
+        keys[int(kid)] = bytes.fromhex(secret)
+    return keys
+
+
+@dataclass
+class Config:
+    backend_url: str = "http://localhost:8000"
+    token: str = ""  # staff token: reads the change feed and uploads events
+    listen_host: str = "0.0.0.0"  # noqa: S104 - readers connect over the local network
+    listen_port: int = 8001  # BACKEND_PORT in the reader firmware
+    data_dir: str = "gate-agent-data"
+    agent_id: str = field(default_factory=socket.gethostname)
+    sync_interval: float = 2.0
+    upload_interval: float = 1.0
+    batch_size: int = 500  # events per uploaded segment
+    max_buffer_bytes: int = 64 * 1024 * 1024  # oldest segments are dropped past this
+    request_timeout: float = 10.0
+    credential_keys: dict[int, bytes] = field(default_factory=dict)  # without them signed credentials are DENY
+
+    @classmethod
+    def from_env(cls, environ=None) -> "Config":
+        env = os.environ if environ is None else environ
+        config = cls()
+        for name, convert in (
+            ("backend_url", str), ("token", str), ("listen_host", str), ("listen_port", int),
+            ("data_dir", str), ("agent_id", str), ("sync_interval", float), ("upload_interval", float),
+            ("batch_size", int), ("max_buffer_bytes", int), ("request_timeout", float),
+            ("credential_keys", parse_keys),
+        ):
+            value = env.get(f"GATE_AGENT_{name.upper()}")
+            if value:
+                setattr(config, name, convert(value))
+        config.backend_url = config.backend_url.rstrip("/")
+        return config
@@ -0,0 +1,72 @@
+"""Reader side of the backend's signed gate credentials (``apps.access.credentials``).
+
+Wire format: ``ow1.`` + base64url(payload + mac), payload = flags/kid byte,
+user id varint, device id varint, 4-byte big-endian expiry, group count and
+group ids as varints; mac = first 12 bytes of HMAC-SHA256(key, "ow1" + payload).
+"""
+import base64
+import hashlib
+import hmac
+import struct
+import time
+from typing import NamedTuple
+
+PREFIX = "ow1."
+MAC_SIZE = 12
+MAX_LENGTH = 128
+_TRUNCATED = 0x80
+_EXPIRES = struct.Struct(">I")
+
+
+class InvalidCredentialError(Exception):
+    pass
+
+
+class Credential(NamedTuple):
+    key_id: int
+    user_id: int
+    device_id: int
+    expires: int
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        if pos >= len(data) or shift > 63:
+            raise InvalidCredentialError("truncated varint")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def looks_like_credential(token: str) -> bool:
+    return token.startswith(PREFIX)
+
+
+def parse(token: str, keys: dict[int, bytes], now: float | None = None) -> Credential:
+    """Verify signature and expiry. Raises :class:`InvalidCredentialError`."""
+    if not looks_like_credential(token) or len(token) > MAX_LENGTH:
+        raise InvalidCredentialError("not a gate credential")
+    body = token[len(PREFIX):]
+    try:
+        raw = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+    except ValueError:
+        raise InvalidCredentialError("bad encoding") from None
+    if len(raw) <= MAC_SIZE:
+        raise InvalidCredentialError("too short")
+    payload, mac = raw[:-MAC_SIZE], raw[-MAC_SIZE:]
+    kid = payload[0] & ~_TRUNCATED
+    key = keys.get(kid)
+    if key is None or not hmac.compare_digest(mac, hmac.new(key, b"ow1" + payload, hashlib.sha256).digest()[:MAC_SIZE]):
+        raise InvalidCredentialError("bad signature")
+    user_id, pos = _read_varint(payload, 1)
+    device_id, pos = _read_varint(payload, pos)
+    if pos + _EXPIRES.size > len(payload):
+        raise InvalidCredentialError("truncated")
+    (expires,) = _EXPIRES.unpack_from(payload, pos)
+    if expires <= (now if now is not None else time.time()):
+        raise InvalidCredentialError("expired")
+    return Credential(kid, user_id, device_id, expires)
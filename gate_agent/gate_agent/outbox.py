@@ -0,0 +1,134 @@
+"""Access events waiting to go upstream, buffered on disk.
+
+A verify only appends its event to an in-memory list. The shipper thread
+seals that list into gzip NDJSON segments under ``<data_dir>/outbox`` (at
+most ``batch_size`` events each) and uploads them oldest first; a segment is
+deleted once the backend accepts it. Failed uploads are retried with
+exponential backoff, and every event carries an idempotency key, so a
+segment resent after a lost response is not counted twice. Past
+``max_bytes`` the oldest segments are dropped. A crash loses only the events
+of the last ``upload_interval`` that were not sealed yet.
+"""
+import gzip
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from datetime import UTC, datetime
+from pathlib import Path
+
+from .state import Decision
+from .upstream import Backend, UpstreamError
+
+logger = logging.getLogger("gate_agent.outbox")
+
+MAX_BACKOFF = 60.0
+SUFFIX = ".ndjson.gz"
+
+
+def make_event(result: Decision, gate_code: str | None) -> dict:
+    return {
+        "idempotency_key": uuid.uuid4().hex,
+        "access_point_id": result.access_point_id,
+        "user_id": result.user_id,
+        "device_id": result.device_id,
+        "decision": result.decision,
+        "reason": result.reason,
+        "created_at": datetime.now(UTC).isoformat(),
+        "raw": {"gate_id": gate_code},  # never the token
+    }
+
+
+class Outbox:
+    def __init__(self, directory: Path, batch_size: int = 500, max_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.rejected = directory / "rejected"
+        self.rejected.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.dropped = 0  # events lost to the size limit
+        self._pending: list[dict] = []
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+
+    def add(self, event: dict) -> None:
+        with self._lock:
+            self._pending.append(event)
+
+    def seal(self) -> int:
+        """Write pending events to segments; returns how many were written."""
+        with self._lock:
+            events, self._pending = self._pending, []
+        for start in range(0, len(events), self.batch_size):
+            chunk = events[start:start + self.batch_size]
+            body = gzip.compress(b"".join(json.dumps(e, separators=(",", ":")).encode() + b"\n" for e in chunk))
+            path = self.directory / f"{time.time_ns():020d}-{next(self._counter):06d}{SUFFIX}"
+            tmp = path.with_name(path.name + ".part")  # never picked up half-written
+            tmp.write_bytes(body)
+            tmp.replace(path)
+        if events:
+            self._enforce_limit()
+        return len(events)
+
+    def segments(self) -> list[Path]:
+        return sorted(self.directory.glob(f"*{SUFFIX}"))
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _enforce_limit(self) -> None:
+        segments = self.segments()
+        sizes = [path.stat().st_size for path in segments]
+        total = sum(sizes)
+        for path, size in zip(segments, sizes, strict=True):
+            if total <= self.max_bytes:
+                break
+            with gzip.open(path) as f:
+                self.dropped += sum(1 for _ in f)
+            path.unlink()
+            total -= size
+            logger.error("Event buffer over %s bytes: dropped oldest segment %s", self.max_bytes, path.name)
+
+
+class Shipper:
+    def __init__(self, outbox: Outbox, backend: Backend, interval: float):
+        self.outbox = outbox
+        self.backend = backend
+        self.interval = interval
+        self.uploaded = 0  # segments accepted by the backend
+        self._delay = interval
+        self._next_attempt = 0.0
+
+    def ship_once(self) -> bool:
+        """Seal pending events and upload segments oldest first; False if the backend is unreachable."""
+        self.outbox.seal()
+        if time.monotonic() < self._next_attempt:
+            return False
+        for path in self.outbox.segments():
+            try:
+                self.backend.upload_events(path.read_bytes())
+            except UpstreamError as exc:
+                if exc.retryable:
+                    # Jittered so agents that lost the backend together do not return in lockstep
+                    self._next_attempt = time.monotonic() + self._delay * random.uniform(0.5, 1.0)  # noqa: S311
+                    self._delay = min(self._delay * 2, MAX_BACKOFF)
+                    logger.warning("Event upload failed, %s segment(s) buffered: %s", len(self.outbox.segments()), exc)
+                    return False
+                logger.error("Event upload rejected, moved %s aside: %s", path.name, exc)
+                path.replace(self.outbox.rejected / path.name)
+                continue
+            path.unlink()
+            self.uploaded += 1
+        self._delay = self.interval
+        return True
+
+    def run(self, stop: threading.Event) -> None:
+        while not stop.wait(self.interval):
+            try:
+                self.ship_once()
+            except Exception:
+                logger.exception("Event shipping failed")
+        self.outbox.seal()  # whatever could not be sent stays on disk for the next start
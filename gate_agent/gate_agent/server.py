@@ -0,0 +1,185 @@
+"""The reader-facing HTTP server and the agent that ties state, sync and outbox together.
+
+Serves the backend contract the reader firmware already calls:
+
+* ``POST /api/v1/access/verify`` -> ``200`` with the same bodies as the backend
+  (``{"decision":"ALLOW","duration_ms":800,"reason":"OK"}`` /
+  ``{"decision":"DENY","reason":...}``); malformed input is ``DENY/INVALID_REQUEST``
+* ``GET /health`` -> ``{"status":"ok"}`` once authorization data is loaded, ``503`` before
+* ``GET /agent/status`` -> sync position and event buffer, for operators
+"""
+import json
+import logging
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from . import outbox as outbox_module
+from .config import Config
+from .outbox import Outbox, Shipper
+from .state import Decision, State
+from .sync import Syncer
+from .upstream import Backend
+
+logger = logging.getLogger("gate_agent")
+
+VERIFY_PATH = "/api/v1/access/verify"
+HEALTH_PATH = "/health"
+STATUS_PATH = "/agent/status"
+INVALID_REQUEST = "INVALID_REQUEST"
+ALLOW_DURATION_MS = 800
+TOKEN_MIN_LENGTH = 8
+TOKEN_MAX_LENGTH = 128
+
+
+def _body(payload: dict) -> bytes:
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+def response_body(decision: str, reason: str) -> bytes:
+    # Same key order and separators as the backend (apps.api.v1.fastpath)
+    if decision == "ALLOW":
+        return _body({"decision": decision, "duration_ms": ALLOW_DURATION_MS, "reason": reason})
+    return _body({"decision": decision, "reason": reason})
+
+
+def _clean(value, min_length=None, max_length=None):
+    """The backend's ``CharField`` rules for verify input; ``None`` if invalid."""
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return None
+    value = str(value).strip()
+    if not value or "\x00" in value:
+        return None
+    if min_length is not None and len(value) < min_length:
+        return None
+    if max_length is not None and len(value) > max_length:
+        return None
+    if not value.isascii() and any(0xD800 <= ord(ch) <= 0xDFFF for ch in value):
+        return None
+    return value
+
+
+def parse_verify_request(body: bytes, content_type: str) -> tuple[dict | None, tuple[int, bytes] | None]:
+    """``(data, None)`` or ``(None, (status, body))`` for requests the backend would reject outright."""
+    content_type = content_type.split(";")[0].strip()
+    if not body:
+        return {}, None
+    if content_type == "application/json" or content_type.endswith("+json"):
+        try:
+            return json.loads(body), None
+        except ValueError as exc:
+            return None, (400, _body({"detail": f"JSON parse error - {exc}"}))
+    if content_type == "application/x-www-form-urlencoded":
+        return {k: v[-1] for k, v in urllib.parse.parse_qs(body.decode(errors="replace")).items()}, None
+    return None, (415, _body({"detail": f'Unsupported media type "{content_type}" in request.'}))
+
+
+class Agent:
+    def __init__(self, config: Config):
+        self.config = config
+        data_dir = Path(config.data_dir)
+        data_dir.mkdir(parents=True, exist_ok=True)
+        self.state = State(config.credential_keys)
+        if self.state.load(data_dir / "state.json"):
+            logger.info("Loaded authorization data at seq %s", self.state.seq)
+        self.backend = Backend(config)
+        self.syncer = Syncer(self.state, self.backend, data_dir / "state.json", config.sync_interval)
+        self.outbox = Outbox(data_dir / "outbox", config.batch_size, config.max_buffer_bytes)
+        self.shipper = Shipper(self.outbox, self.backend, config.upload_interval)
+        self.httpd = ThreadingHTTPServer((config.listen_host, config.listen_port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.agent = self
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.httpd.server_address[:2]
+
+    def verify(self, data) -> Decision:
+        gate_id = _clean(data.get("gate_id")) if hasattr(data, "get") else None
+        token = _clean(data.get("token"), TOKEN_MIN_LENGTH, TOKEN_MAX_LENGTH) if gate_id is not None else None
+        if token is None:
+            result = Decision("DENY", INVALID_REQUEST)
+        else:
+            result = self.state.decide(gate_id, token)
+        self.outbox.add(outbox_module.make_event(result, gate_id))
+        return result
+
+    def status(self) -> dict:
+        return {
+            "agent_id": self.config.agent_id,
+            "loaded": self.state.loaded,
+            "seq": self.state.seq,
+            "last_sync": self.syncer.last_success,
+            "events_pending": self.outbox.pending(),
+            "segments_buffered": len(self.outbox.segments()),
+            "segments_uploaded": self.shipper.uploaded,
+            "events_dropped": self.outbox.dropped,
+        }
+
+    def start(self) -> None:
+        """Initial sync (best effort), then sync, shipping and serving on background threads."""
+        try:
+            self.syncer.sync_once()
+            self.syncer.save(force=True)
+        except Exception as exc:  # noqa: BLE001 - serve from the saved copy when the backend is down
+            logger.warning("Initial sync failed, serving %s data: %s", "saved" if self.state.loaded else "no", exc)
+        for target, args in (
+            (self.syncer.run, (self._stop,)), (self.shipper.run, (self._stop,)), (self.httpd.serve_forever, (0.1,)),
+        ):
+            thread = threading.Thread(target=target, args=args, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Gate agent listening on %s:%s", *self.address)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.httpd.shutdown()
+        for thread in self._threads:
+            thread.join(self.config.request_timeout + 1)
+        self.httpd.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive for readers that reuse connections
+    disable_nagle_algorithm = True  # headers and body are separate writes: avoid the delayed-ACK stall
+    server_version = "openway-gate-agent"
+
+    def _send(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # noqa: N802 - BaseHTTPRequestHandler naming
+        agent = self.server.agent
+        path = self.path.split("?")[0]
+        if path == HEALTH_PATH:
+            loaded = agent.state.loaded
+            self._send(200 if loaded else 503, _body({"status": "ok" if loaded else "loading"}))
+        elif path == STATUS_PATH:
+            self._send(200, _body(agent.status()))
+        else:
+            self._send(404, _body({"detail": "Not found."}))
+
+    def do_POST(self):  # noqa: N802
+        started = time.perf_counter()
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if self.path.split("?")[0] != VERIFY_PATH:
+            self._send(404, _body({"detail": "Not found."}))
+            return
+        data, error = parse_verify_request(body, self.headers.get("Content-Type", ""))
+        if error is not None:
+            self._send(*error)
+            return
+        result = self.server.agent.verify(data)
+        self._send(200, response_body(result.decision, result.reason))
+        logger.debug("verify %s %s in %.3fms", result.decision, result.reason, (time.perf_counter() - started) * 1000)
+
+    def log_message(self, format, *args):  # noqa: A002 - BaseHTTPRequestHandler signature
+        logger.debug("%s - %s", self.address_string(), format % args)
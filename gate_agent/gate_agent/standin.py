@@ -0,0 +1,113 @@
+"""A local stand-in for the backend endpoints the agent uses, for tests and bench setups.
+
+Serves ``GET /api/v1/sync/changes`` from an in-memory change list (with the
+backend's ``since``/``limit``/``next``/``more`` paging) and accepts gzip
+NDJSON on ``POST /api/v1/access/events/bulk``, deduplicating on
+``idempotency_key``. ``fail_uploads`` makes the next N uploads fail with 503::
+
+    backend = StandInBackend()
+    backend.change("gate", 1, {"code": "gate-01"})
+    backend.start()
+    Config(backend_url=backend.url, ...)
+"""
+import gzip
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .upstream import EVENTS_PATH, SYNC_PATH
+
+
+class StandInBackend:
+    def __init__(self, token: str = "agent-token"):  # noqa: S107 - test fixture
+        self.token = token
+        self.changes: list[dict] = []
+        self.events: dict[str, dict] = {}  # idempotency key -> event
+        self.uploads = 0  # accepted upload requests, duplicates included
+        self.fail_uploads = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.backend = self
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def change(self, kind: str, object_id, data: dict | None = None) -> int:
+        """Append an upsert (or a tombstone when ``data`` is None); returns its seq."""
+        with self._lock:
+            seq = len(self.changes) + 1
+            self.changes.append({
+                "seq": seq, "kind": kind, "op": "delete" if data is None else "upsert",
+                "id": str(object_id), "data": data,
+            })
+            return seq
+
+    def page(self, since: int, limit: int) -> dict:
+        with self._lock:
+            rows = [c for c in self.changes if c["seq"] > since][:limit + 1]
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return {"changes": rows, "next": rows[-1]["seq"] if rows else since, "more": more}
+
+    def ingest(self, body: bytes) -> dict:
+        events = [json.loads(line) for line in gzip.decompress(body).splitlines() if line.strip()]
+        with self._lock:
+            self.uploads += 1
+            fresh = [e for e in events if e["idempotency_key"] not in self.events]
+            self.events.update((e["idempotency_key"], e) for e in fresh)
+        return {"accepted": len(fresh), "duplicates": len(events) - len(fresh)}
+
+    def start(self) -> "StandInBackend":
+        threading.Thread(target=self.httpd.serve_forever, args=(0.1,), daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _send(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        if self.headers.get("Authorization") == f"Token {self.server.backend.token}":
+            return True
+        self._send(401, {"detail": "Invalid token."})
+        return False
+
+    def do_GET(self):  # noqa: N802
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != SYNC_PATH:
+            self._send(404, {"detail": "Not found."})
+        elif self._authorized():
+            query = dict(urllib.parse.parse_qsl(url.query))
+            self._send(200, self.server.backend.page(int(query.get("since", 0)), int(query.get("limit", 1000))))
+
+    def do_POST(self):  # noqa: N802
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        backend = self.server.backend
+        if self.path != EVENTS_PATH:
+            self._send(404, {"detail": "Not found."})
+        elif self._authorized():
+            with backend._lock:
+                failing, backend.fail_uploads = backend.fail_uploads > 0, max(backend.fail_uploads - 1, 0)
+            if failing:
+                self._send(503, {"detail": "Unavailable"})
+            else:
+                self._send(200, backend.ingest(body))
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
@@ -0,0 +1,162 @@
+"""Local copy of the backend's authorization data, and the verify decision over it.
+
+Built from the change feed (``GET /api/v1/sync/changes``): every entry is
+``{"seq", "kind", "op", "id", "data"}`` with the object's full state or a
+tombstone, so applying them in order reproduces the backend tables that
+verify reads. :meth:`State.decide` follows the backend's branch order and
+reasons (``AuthzSnapshot.decide``).
+
+Tokens are only known by SHA-256 digest; the presented token is hashed once.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import NamedTuple
+
+from . import credentials
+
+UNKNOWN_GATE = "UNKNOWN_GATE"
+TOKEN_INVALID = "TOKEN_INVALID"
+DEVICE_NOT_FOUND = "DEVICE_NOT_FOUND"
+DEVICE_INACTIVE = "DEVICE_INACTIVE"
+DEVICE_MISMATCH = "DEVICE_MISMATCH"
+NO_PERMISSION = "NO_PERMISSION"
+OK = "OK"
+
+KINDS = ("gate", "user", "permission", "membership", "token", "device")
+
+
+class Decision(NamedTuple):
+    decision: str
+    reason: str
+    access_point_id: int | None = None
+    user_id: int | None = None
+    device_id: int | None = None
+
+
+def _deny(reason, *ids) -> Decision:
+    return Decision("DENY", reason, *ids)
+
+
+class State:
+    def __init__(self, credential_keys: dict[int, bytes] | None = None):
+        self.seq = 0
+        self.loaded = False  # until the first feed page or a saved copy is applied: nothing to decide from
+        self.credential_keys = credential_keys or {}
+        self._objects: dict[str, dict[str, dict]] = {kind: {} for kind in KINDS}
+        self._gates: dict[str, int] = {}  # code -> id
+        self._tokens: dict[str, int] = {}  # sha256 hex -> user id
+        self._devices: dict[int, tuple[int, bool]] = {}  # id -> (user id, active)
+        self._device_tokens: dict[str, tuple[int, int]] = {}  # sha256 hex -> (device id, user id)
+        self._active: dict[int, bool] = {}  # user id -> is_active
+        self._grants: frozenset[tuple[int, int]] = frozenset()  # (gate id, user id) allowed
+        self._lock = threading.Lock()
+
+    def apply(self, changes, next_seq: int) -> None:
+        """Apply one feed page in order and move to its ``next``; derived lookups are rebuilt once."""
+        with self._lock:
+            touched = set()
+            for change in changes:
+                objects = self._objects.get(change["kind"])
+                if objects is None:
+                    continue  # kinds added to the feed later
+                if change["op"] == "delete":
+                    objects.pop(change["id"], None)
+                else:
+                    objects[change["id"]] = change["data"]
+                touched.add(change["kind"])
+            self._rebuild(touched)
+            self.seq = next_seq
+            self.loaded = True
+
+    def _rebuild(self, kinds) -> None:
+        objects = self._objects
+        # New containers are swapped in whole, so verifies on other threads never see a half-built one
+        if "gate" in kinds:
+            self._gates = {data["code"]: int(gate_id) for gate_id, data in objects["gate"].items()}
+        if "user" in kinds:
+            self._active = {int(user_id): data["active"] for user_id, data in objects["user"].items()}
+        if "token" in kinds:
+            self._tokens = {digest: data["user"] for digest, data in objects["token"].items()}
+        if "device" in kinds:
+            devices = objects["device"].items()
+            self._devices = {int(device_id): (d["user"], d["active"]) for device_id, d in devices}
+            self._device_tokens = {d["token"]: (int(device_id), d["user"]) for device_id, d in devices}
+        if kinds & {"permission", "membership"}:
+            # Same resolution as the backend's EffectivePermission: any deny for (gate, user) wins
+            rules, groups = defaultdict(list), defaultdict(list)
+            for perm in objects["permission"].values():
+                if perm["user"] is not None:
+                    rules[perm["gate"], perm["user"]].append(perm["allow"])
+                if perm["group"] is not None:
+                    groups[perm["group"]].append((perm["gate"], perm["allow"]))
+            for member in objects["membership"].values():
+                for gate_id, allow in groups.get(member["group"], ()):
+                    rules[gate_id, member["user"]].append(allow)
+            self._grants = frozenset(key for key, allows in rules.items() if all(allows))
+
+    def decide(self, gate_code: str, token: str, now: float | None = None) -> Decision:
+        ap_id = self._gates.get(gate_code)
+        if ap_id is None:
+            return _deny(UNKNOWN_GATE)
+        if credentials.looks_like_credential(token):
+            try:
+                cred = credentials.parse(token, self.credential_keys, now)
+            except credentials.InvalidCredentialError:
+                return _deny(TOKEN_INVALID, ap_id)
+            return self._decide_device(ap_id, cred.user_id, cred.device_id)
+        digest = hashlib.sha256(token.encode()).hexdigest()
+        user_id = self._tokens.get(digest)
+        if user_id is None:
+            device = self._device_tokens.get(digest)
+            if device is None:
+                return _deny(TOKEN_INVALID, ap_id)
+            device_id, owner = device
+            return self._decide_device(ap_id, owner, device_id)
+        if not self._active.get(user_id, False):
+            return _deny(TOKEN_INVALID, ap_id, user_id)
+        if (ap_id, user_id) not in self._grants:
+            return _deny(NO_PERMISSION, ap_id, user_id)
+        return Decision("ALLOW", OK, ap_id, user_id)
+
+    def _decide_device(self, ap_id: int, user_id: int, device_id: int) -> Decision:
+        device = self._devices.get(device_id)
+        if device is None:
+            return _deny(DEVICE_NOT_FOUND, ap_id, user_id, device_id)
+        owner, active = device
+        if not active:
+            return _deny(DEVICE_INACTIVE, ap_id, user_id, device_id)
+        if owner != user_id:
+            return _deny(DEVICE_MISMATCH, ap_id, user_id, device_id)
+        if not self._active.get(user_id, False):
+            return _deny(TOKEN_INVALID, ap_id, user_id, device_id)
+        if (ap_id, user_id) not in self._grants:
+            return _deny(NO_PERMISSION, ap_id, user_id, device_id)
+        return Decision("ALLOW", OK, ap_id, user_id, device_id)
+
+    def save(self, path: Path) -> None:
+        """Write atomically, so an agent restarted without network still has data."""
+        with self._lock:
+            data = json.dumps({"seq": self.seq, "objects": self._objects}, separators=(",", ":"))
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def load(self, path: Path) -> bool:
+        try:
+            data = json.loads(path.read_text())
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            self.seq = data["seq"]
+            for kind in KINDS:
+                self._objects[kind] = data["objects"].get(kind, {})
+            self._rebuild(set(KINDS))
+            self.loaded = True
+        return True
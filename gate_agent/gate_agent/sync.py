@@ -0,0 +1,56 @@
+"""Keeps :class:`~.state.State` current from the backend change feed."""
+import logging
+import threading
+import time
+from pathlib import Path
+
+from .state import State
+from .upstream import Backend, UpstreamError
+
+logger = logging.getLogger("gate_agent.sync")
+
+SAVE_INTERVAL = 10.0  # seconds between state file writes while changes keep coming
+
+
+class Syncer:
+    def __init__(self, state: State, backend: Backend, path: Path, interval: float):
+        self.state = state
+        self.backend = backend
+        self.path = path
+        self.interval = interval
+        self.last_success: float | None = None
+        self._saved_seq = state.seq
+        self._saved_at = 0.0
+
+    def sync_once(self) -> int:
+        """Pull pages until the feed is drained; returns the number of changes applied."""
+        applied = 0
+        while True:
+            page = self.backend.changes(self.state.seq)
+            self.state.apply(page["changes"], page["next"])
+            applied += len(page["changes"])
+            if not page["more"]:
+                break
+        self.last_success = time.time()
+        return applied
+
+    def save(self, force: bool = False) -> None:
+        if self.state.seq == self._saved_seq and self.path.exists():
+            return
+        if force or time.monotonic() - self._saved_at >= SAVE_INTERVAL:
+            self.state.save(self.path)
+            self._saved_seq, self._saved_at = self.state.seq, time.monotonic()
+
+    def run(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                if self.sync_once():
+                    logger.debug("Synced to seq %s", self.state.seq)
+                self.save()
+            except UpstreamError as exc:
+                # Keep answering from the local copy; it is as current as the last successful sync
+                logger.warning("Sync failed: %s", exc)
+            except Exception:
+                logger.exception("Sync failed")
+            stop.wait(self.interval)
+        self.save(force=True)
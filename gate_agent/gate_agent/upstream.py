@@ -0,0 +1,53 @@
+"""HTTP client for the backend, on ``urllib`` so the agent needs no third-party packages."""
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from .config import Config
+
+SYNC_PATH = "/api/v1/sync/changes"
+EVENTS_PATH = "/api/v1/access/events/bulk"
+
+
+class UpstreamError(Exception):
+    """Request failed. ``retryable`` is False for rejections that resending cannot fix."""
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        return self.status is None or self.status >= 500 or self.status in (401, 403, 408, 429)
+
+
+class Backend:
+    def __init__(self, config: Config):
+        if urllib.parse.urlsplit(config.backend_url).scheme not in ("http", "https"):
+            raise ValueError(f"Backend URL must be http(s): {config.backend_url!r}")
+        self.base_url = config.backend_url
+        self.timeout = config.request_timeout
+        self.headers = {"Authorization": f"Token {config.token}"} if config.token else {}
+
+    def _send(self, request: urllib.request.Request) -> bytes:
+        for name, value in self.headers.items():
+            request.add_header(name, value)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as resp:  # noqa: S310 - scheme checked
+                return resp.read()
+        except urllib.error.HTTPError as exc:
+            raise UpstreamError(f"{request.get_method()} {request.full_url}: HTTP {exc.code}", exc.code) from None
+        except (urllib.error.URLError, OSError) as exc:
+            raise UpstreamError(f"{request.get_method()} {request.full_url}: {exc}") from None
+
+    def changes(self, since: int, limit: int = 5000) -> dict:
+        query = urllib.parse.urlencode({"since": since, "limit": limit})
+        url = f"{self.base_url}{SYNC_PATH}?{query}"
+        return json.loads(self._send(urllib.request.Request(url)))  # noqa: S310 - scheme checked in __init__
+
+    def upload_events(self, gzipped_ndjson: bytes) -> None:
+        self._send(urllib.request.Request(  # noqa: S310
+            f"{self.base_url}{EVENTS_PATH}", data=gzipped_ndjson, method="POST",
+            headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+        ))
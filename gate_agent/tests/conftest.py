@@ -0,0 +1,41 @@
+import pytest
+
+from gate_agent.config import Config
+from gate_agent.standin import StandInBackend
+
+
+@pytest.fixture
+def backend():
+    backend = StandInBackend().start()
+    yield backend
+    backend.stop()
+
+
+@pytest.fixture
+def config(backend, tmp_path):
+    return Config(
+        backend_url=backend.url, token=backend.token, listen_host="127.0.0.1", listen_port=0,
+        data_dir=str(tmp_path / "agent"), sync_interval=0.05, upload_interval=0.05, request_timeout=2,
+    )
+
+
+def seed(backend):
+    """Gate 1 "gate-01"; user 10 (active, direct grant), user 11 (via group 5), user 12 (no grant),
+    user 13 (inactive, granted); session tokens for each and devices 100 (user 10) / 101 (user 10, revoked)."""
+    import hashlib
+
+    def digest(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    backend.change("gate", 1, {"code": "gate-01"})
+    backend.change("gate", 2, {"code": "gate-02"})
+    for user_id, active in ((10, True), (11, True), (12, True), (13, False)):
+        backend.change("user", user_id, {"active": active})
+        backend.change("token", digest(f"session-{user_id}"), {"user": user_id})
+    backend.change("permission", 1, {"gate": 1, "user": 10, "group": None, "allow": True})
+    backend.change("permission", 2, {"gate": 1, "user": None, "group": 5, "allow": True})
+    backend.change("permission", 3, {"gate": 1, "user": 13, "group": None, "allow": True})
+    backend.change("permission", 4, {"gate": 1, "user": 12, "group": None, "allow": False})
+    backend.change("membership", "11:5", {"user": 11, "group": 5})
+    backend.change("device", 100, {"user": 10, "active": True, "token": digest("device-100-token")})
+    backend.change("device", 101, {"user": 10, "active": False, "token": digest("device-101-token")})
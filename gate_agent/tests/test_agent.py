@@ -0,0 +1,98 @@
+import http.client
+import json
+import time
+
+import pytest
+
+from gate_agent.server import Agent
+
+from .conftest import seed
+
+
+@pytest.fixture
+def agent(backend, config):
+    seed(backend)
+    agent = Agent(config)
+    agent.start()
+    yield agent
+    agent.stop()
+
+
+def request(agent, method, path, body=None, content_type="application/json"):
+    conn = http.client.HTTPConnection(*agent.address, timeout=5)
+    conn.request(method, path, body=body, headers={"Content-Type": content_type} if body is not None else {})
+    resp = conn.getresponse()
+    data = resp.read()
+    conn.close()
+    return resp.status, data
+
+
+def verify(agent, gate="gate-01", token="session-10"):
+    return request(agent, "POST", "/api/v1/access/verify", json.dumps({"gate_id": gate, "token": token}))
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_same_contract_as_backend(agent):
+    assert request(agent, "GET", "/health") == (200, b'{"status":"ok"}')
+    assert verify(agent) == (200, b'{"decision":"ALLOW","duration_ms":800,"reason":"OK"}')
+    assert verify(agent, token="session-12") == (200, b'{"decision":"DENY","reason":"NO_PERMISSION"}')
+    assert verify(agent, token="short") == (200, b'{"decision":"DENY","reason":"INVALID_REQUEST"}')
+    assert request(agent, "POST", "/api/v1/access/verify", b"{bad")[0] == 400
+    assert request(agent, "POST", "/api/v1/access/verify", b"x", "text/plain")[0] == 415
+    form = request(agent, "POST", "/api/v1/access/verify", b"gate_id=gate-01&token=session-11",
+                   "application/x-www-form-urlencoded")
+    assert json.loads(form[1])["decision"] == "ALLOW"
+
+
+def test_keep_alive_connection_serves_many_taps(agent):
+    conn = http.client.HTTPConnection(*agent.address, timeout=5)
+    body = json.dumps({"gate_id": "gate-01", "token": "session-10"})
+    started = time.perf_counter()
+    for _ in range(200):
+        conn.request("POST", "/api/v1/access/verify", body=body, headers={"Content-Type": "application/json"})
+        assert json.loads(conn.getresponse().read())["decision"] == "ALLOW"
+    conn.close()
+    assert (time.perf_counter() - started) / 200 < 0.01  # no backend round trip per tap
+
+
+def test_events_reach_backend_and_changes_reach_agent(agent, backend):
+    verify(agent)
+    verify(agent, token="session-12")
+    wait_for(lambda: len(backend.events) == 2)
+    assert sorted(e["reason"] for e in backend.events.values()) == ["NO_PERMISSION", "OK"]
+    assert all("session" not in json.dumps(e) for e in backend.events.values())
+    backend.change("permission", 1)  # user 10 loses the direct grant
+    wait_for(lambda: agent.state.seq == len(backend.changes))
+    assert json.loads(verify(agent)[1])["reason"] == "NO_PERMISSION"
+
+
+def test_keeps_serving_and_buffering_while_backend_is_down(agent, backend, config):
+    backend.stop()
+    assert json.loads(verify(agent)[1])["decision"] == "ALLOW"
+    wait_for(lambda: agent.status()["segments_buffered"] == 1)
+    agent.stop()
+    restarted = Agent(config)  # no network at start: answers from the saved copy
+    restarted.start()
+    try:
+        assert request(restarted, "GET", "/health")[0] == 200
+        assert json.loads(verify(restarted)[1])["decision"] == "ALLOW"
+        assert restarted.status()["loaded"]
+    finally:
+        restarted.stop()
+    assert len(restarted.outbox.segments()) == 2
+
+
+def test_health_is_unavailable_until_data_is_loaded(backend, config):
+    backend.stop()
+    agent = Agent(config)
+    agent.start()
+    try:
+        assert request(agent, "GET", "/health") == (503, b'{"status":"loading"}')
+    finally:
+        agent.stop()
@@ -0,0 +1,83 @@
+import gzip
+import json
+
+from gate_agent.outbox import Outbox, Shipper, make_event
+from gate_agent.state import Decision
+from gate_agent.upstream import Backend
+
+
+def events(n, gate="gate-01"):
+    return [make_event(Decision("ALLOW", "OK", 1, 10), gate) for _ in range(n)]
+
+
+def test_sealed_segments_are_gzip_ndjson_batches(tmp_path):
+    outbox = Outbox(tmp_path, batch_size=4)
+    for event in events(10):
+        outbox.add(event)
+    assert outbox.seal() == 10
+    segments = outbox.segments()
+    assert [len(gzip.decompress(p.read_bytes()).splitlines()) for p in segments] == [4, 4, 2]
+    first = json.loads(gzip.decompress(segments[0].read_bytes()).splitlines()[0])
+    assert set(first) == {"idempotency_key", "access_point_id", "user_id", "device_id", "decision", "reason",
+                          "created_at", "raw"}
+    assert first["raw"] == {"gate_id": "gate-01"}
+
+
+def test_failed_uploads_stay_buffered_and_retry_in_order(backend, config, tmp_path):
+    outbox = Outbox(tmp_path, batch_size=2)
+    shipper = Shipper(outbox, Backend(config), interval=0)
+    for event in events(3):
+        outbox.add(event)
+    backend.fail_uploads = 1
+    assert not shipper.ship_once()
+    assert len(outbox.segments()) == 2 and not backend.events
+    shipper._next_attempt = 0  # skip the backoff wait
+    assert shipper.ship_once()
+    assert outbox.segments() == [] and len(backend.events) == 3
+    assert shipper.uploaded == 2
+
+
+def test_backoff_grows_until_success(backend, config, tmp_path):
+    outbox = Outbox(tmp_path)
+    shipper = Shipper(outbox, Backend(config), interval=1)
+    outbox.add(events(1)[0])
+    backend.fail_uploads = 3
+    delays = []
+    for _ in range(3):
+        shipper._next_attempt = 0
+        shipper.ship_once()
+        delays.append(shipper._delay)
+    assert delays == [2, 4, 8]
+    shipper._next_attempt = 0
+    assert shipper.ship_once() and shipper._delay == 1
+
+
+def test_resent_segment_is_deduplicated_upstream(backend, config, tmp_path):
+    outbox = Outbox(tmp_path)
+    outbox.add(events(1)[0])
+    outbox.seal()
+    body = outbox.segments()[0].read_bytes()
+    Backend(config).upload_events(body)  # as if the response to the first upload was lost
+    Shipper(outbox, Backend(config), interval=0).ship_once()
+    assert (backend.uploads, len(backend.events)) == (2, 1)
+
+
+def test_rejected_segment_is_moved_aside(backend, config, tmp_path):
+    outbox = Outbox(tmp_path)
+    outbox.add(events(1)[0])
+    outbox.seal()
+    config.backend_url += "/missing"  # 404 cannot be fixed by resending
+    assert Shipper(outbox, Backend(config), interval=0).ship_once()
+    assert outbox.segments() == [] and len(list(outbox.rejected.iterdir())) == 1
+
+
+def test_size_limit_drops_oldest_segments(tmp_path):
+    outbox = Outbox(tmp_path, batch_size=1, max_bytes=1)
+    for event in events(3):
+        outbox.add(event)
+    outbox.seal()
+    assert len(outbox.segments()) == 0 and outbox.dropped == 3
+    outbox.max_bytes = 10_000
+    outbox.add(events(1)[0])
+    outbox.seal()
+    assert len(outbox.segments()) == 1
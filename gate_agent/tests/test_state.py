@@ -0,0 +1,110 @@
+import hashlib
+
+import pytest
+
+from gate_agent import credentials
+from gate_agent.state import State
+from gate_agent.sync import Syncer
+from gate_agent.upstream import Backend, UpstreamError
+
+from .conftest import seed
+
+# Issued by the backend (apps.access.credentials.issue) with key 3 = b"agent-test-key", now=0
+KEYS = {3: b"agent-test-key"}
+CREDENTIAL = "ow1.AyoHdzWUAAIFCcCflyMF_R7Hc-qSfw"  # user 42, device 7, groups (5, 9), expires 2033
+EXPIRED = "ow1.AyoHAAAAZABdEvag0wJpYTtdx4I"  # user 42, device 7, expired at t=100
+
+
+@pytest.fixture
+def state(backend, config, tmp_path):
+    seed(backend)
+    state = State(KEYS)
+    Syncer(state, Backend(config), tmp_path / "state.json", 1).sync_once()
+    return state
+
+
+def catch_up(state, backend):
+    page = backend.page(state.seq, 100)
+    state.apply(page["changes"], page["next"])
+
+
+def reasons(state, *cases):
+    return [state.decide(gate, token).reason for gate, token in cases]
+
+
+def test_branch_order_matches_backend(state):
+    assert reasons(
+        state,
+        ("gate-01", "session-10"), ("gate-01", "session-11"), ("gate-01", "session-12"), ("gate-01", "session-13"),
+        ("gate-01", "unknown-token"), ("gate-02", "session-10"), ("nope", "session-10"),
+    ) == ["OK", "OK", "NO_PERMISSION", "TOKEN_INVALID", "TOKEN_INVALID", "NO_PERMISSION", "UNKNOWN_GATE"]
+    assert tuple(state.decide("gate-01", "session-10")) == ("ALLOW", "OK", 1, 10, None)
+
+
+def test_device_tokens_and_credentials(state, backend):
+    assert tuple(state.decide("gate-01", "device-100-token")) == ("ALLOW", "OK", 1, 10, 100)
+    assert reasons(state, ("gate-01", "device-101-token")) == ["DEVICE_INACTIVE"]
+    assert reasons(state, ("gate-01", CREDENTIAL), ("gate-01", EXPIRED)) == ["DEVICE_NOT_FOUND", "TOKEN_INVALID"]
+    backend.change("user", 42, {"active": True})
+    backend.change("device", 7, {"user": 42, "active": True, "token": "00"})
+    backend.change("permission", 9, {"gate": 1, "user": 42, "group": None, "allow": True})
+    catch_up(state, backend)
+    assert reasons(state, ("gate-01", CREDENTIAL), ("gate-01", CREDENTIAL[:-2] + "AA")) == ["OK", "TOKEN_INVALID"]
+    backend.change("device", 7, {"user": 43, "active": True, "token": "00"})
+    catch_up(state, backend)
+    assert reasons(state, ("gate-01", CREDENTIAL)) == ["DEVICE_MISMATCH"]
+    state.credential_keys = {}
+    assert reasons(state, ("gate-01", CREDENTIAL)) == ["TOKEN_INVALID"]
+
+
+def test_credential_parser_matches_backend():
+    assert credentials.parse(CREDENTIAL, KEYS, now=0) == (3, 42, 7, 2_000_000_000)
+    with pytest.raises(credentials.InvalidCredentialError):
+        credentials.parse(CREDENTIAL, {3: b"other-key"}, now=0)
+    with pytest.raises(credentials.InvalidCredentialError):
+        credentials.parse(EXPIRED, KEYS, now=100)
+
+
+def test_changes_and_tombstones_apply_incrementally(state, backend):
+    backend.change("membership", "11:5")  # removed from the group
+    backend.change("token", hashlib.sha256(b"session-10").hexdigest())  # logged out
+    backend.change("user", 13, {"active": True})
+    backend.change("gate", 1, {"code": "gate-01-renamed"})
+    catch_up(state, backend)
+    assert state.seq == len(backend.changes)
+    assert reasons(state, ("gate-01-renamed", "session-11"), ("gate-01-renamed", "session-10"),
+                   ("gate-01-renamed", "session-13"), ("gate-01", "session-13")) == [
+        "NO_PERMISSION", "TOKEN_INVALID", "OK", "UNKNOWN_GATE"]
+
+
+def test_deny_wins_over_direct_and_group_grants(state, backend):
+    backend.change("membership", "10:5", {"user": 10, "group": 5})
+    backend.change("permission", 4, {"gate": 1, "user": 11, "group": None, "allow": False})
+    backend.change("permission", 5, {"gate": 2, "user": 10, "group": None, "allow": True})
+    backend.change("permission", 6, {"gate": 2, "user": None, "group": 5, "allow": False})
+    catch_up(state, backend)
+    assert reasons(state, ("gate-01", "session-10"), ("gate-01", "session-11"), ("gate-02", "session-10")) == [
+        "OK", "NO_PERMISSION", "NO_PERMISSION"]
+
+
+def test_paged_sync_and_saved_copy(backend, config, tmp_path):
+    seed(backend)
+    state = State()
+    syncer = Syncer(state, Backend(config), tmp_path / "state.json", 1)
+    backend_page = backend.page
+    pages = []
+    backend.page = lambda since, limit: pages.append(since) or backend_page(since, 5)
+    assert syncer.sync_once() == len(backend.changes)
+    assert pages == list(range(0, len(backend.changes), 5))
+    syncer.save(force=True)
+    restored = State()
+    assert restored.load(tmp_path / "state.json")
+    assert (restored.seq, restored.loaded) == (state.seq, True)
+    assert restored.decide("gate-01", "session-11") == state.decide("gate-01", "session-11")
+
+
+def test_sync_needs_the_token(backend, config, tmp_path):
+    config.token = "wrong"
+    with pytest.raises(UpstreamError) as exc:
+        Syncer(State(), Backend(config), tmp_path / "state.json", 1).sync_once()
+    assert exc.value.status == 401